@@ -9,16 +9,21 @@ class BattlesnakePlugin(object):
     trigger_tables = []
     timer_tables = []
     command_tables = []
+    # Attribute names mapped to softcode, to keep installed in-game. See
+    # battlesnake.core.softcode_helpers.
+    softcode_helpers = {}
 
     def __init__(self):
         self.protocol = None
 
-    def load_plugin_tables(self, protocol):
+    def load_plugin_tables(self, protocol, load_timers=True):
         """
         Handles loading the plugin's tables once the telnet protocol has
         successfully connected and authenticated.
 
         :param BattlesnakeTelnetProtocol protocol: The telnet protocol instance.
+        :keyword bool load_timers: If False, the timer tables are left out.
+            Timer tables start their timers as soon as they're created.
         :rtype: tuple
         :returns: A tuple in the form of (trigger_tables, timer_tables,
             command_tables). The telnet protocol loads these up for consideration
@@ -32,8 +37,9 @@ class BattlesnakePlugin(object):
 
         for trigger_table in self.trigger_tables:
             trigger_tables.append(trigger_table())
-        for timer_table in self.timer_tables:
-            timer_tables.append(timer_table(protocol))
+        if load_timers:
+            for timer_table in self.timer_tables:
+                timer_tables.append(timer_table(protocol))
         for command_table in self.command_tables:
             command_tables.append(command_table())
         return trigger_tables, timer_tables, command_tables
@@ -0,0 +1,194 @@
+"""
+Cheap call-site capture for outbound command debugging. Response watchers
+hang on to this so that :py:exc:`NoResponseMatchFoundError
+<battlesnake.core.response_watcher.NoResponseMatchFoundError>` can tell us
+where a timed out command came from.
+
+How much we capture is controlled by the ``think_debug_info`` setting in
+the ``[bot]`` section:
+
+* ``off`` - Capture nothing.
+* ``sampled`` - Capture the last few callers on every call. The whole stack
+  is captured for a small fraction of calls
+  (``think_debug_full_stack_sample_rate``).
+* ``full`` - Capture the whole stack on every call.
+
+Capturing only records each frame's code object and line number. File
+names, function names, and source lines are looked up when the call sites
+are formatted, which only happens if the command times out.
+"""
+
+import os
+import sys
+import random
+import inspect
+import linecache
+from collections import namedtuple
+
+from twisted.internet import defer
+
+from battlesnake.conf import settings
+
+DEBUG_INFO_OFF = 'off'
+DEBUG_INFO_SAMPLED = 'sampled'
+DEBUG_INFO_FULL = 'full'
+
+# How many callers to record in compact captures.
+DEFAULT_CALL_SITE_DEPTH = 4
+
+# Frames in these files are plumbing (inlineCallbacks and friends), and don't
+# tell us anything about where a command came from.
+_SKIPPED_FILENAMES = frozenset([
+    os.path.splitext(defer.__file__)[0] + '.py',
+])
+
+
+class CallSite(namedtuple('CallSite', ['filename', 'lineno', 'function'])):
+    """
+    A single frame's worth of call-site info. Unlike the records returned
+    by ``inspect.stack()``, this doesn't keep the frame alive.
+    """
+
+    __slots__ = ()
+
+    def __str__(self):
+        return "%s:%d in %s()" % (self.filename, self.lineno, self.function)
+
+
+class CapturedStack(object):
+    """
+    (code, line number) pairs captured from the stack, innermost first.
+    These are turned into :py:class:`CallSite` instances when needed.
+    """
+
+    __slots__ = ('frames', 'with_source')
+
+    def __init__(self, frames, with_source=False):
+        """
+        :param list frames: A list of (code, line number) tuples.
+        :keyword bool with_source: If True, each frame's source line is
+            included when formatting.
+        """
+
+        self.frames = frames
+        self.with_source = with_source
+
+    def get_call_sites(self):
+        """
+        :rtype: list
+        :returns: A list of :py:class:`CallSite` instances, innermost first.
+        """
+
+        return [CallSite(code.co_filename, lineno, code.co_name)
+                for code, lineno in self.frames]
+
+    def format(self):
+        """
+        :rtype: list
+        :returns: A list of strings, one per frame.
+        """
+
+        lines = []
+        for call_site in self.get_call_sites():
+            line = str(call_site)
+            if self.with_source:
+                source = linecache.getline(
+                    call_site.filename, call_site.lineno).strip()
+                if source:
+                    line += ": " + source
+            lines.append(line)
+        return lines
+
+
+def _capture_frames(depth, skip):
+    """
+    :type depth: int or None
+    :param depth: The maximum number of frames to record, or None for all
+        of them.
+    :param int skip: The number of frames above our caller to skip.
+    :rtype: list
+    :returns: A list of (code, line number) tuples, innermost first.
+    """
+
+    frames = []
+    frame = sys._getframe(skip + 1)
+    while frame is not None and (depth is None or len(frames) < depth):
+        code = frame.f_code
+        if code.co_filename not in _SKIPPED_FILENAMES:
+            frames.append((code, frame.f_lineno))
+        frame = frame.f_back
+    # Don't leave a reference cycle behind.
+    del frame
+    return frames
+
+
+def capture_call_sites(depth=DEFAULT_CALL_SITE_DEPTH, skip=0):
+    """
+    Walks up the stack from our caller, recording the file, line number, and
+    function name of each frame. No source files are read.
+
+    :keyword int depth: The maximum number of frames to record.
+    :keyword int skip: The number of frames above our caller to skip.
+    :rtype: list
+    :returns: A list of :py:class:`CallSite` instances, innermost first.
+    """
+
+    return CapturedStack(_capture_frames(depth, skip + 1)).get_call_sites()
+
+
+def get_caller_name(skip=0):
+    """
+    :keyword int skip: The number of additional frames to skip.
+    :rtype: str
+    :returns: The name of the function that called the function that
+        called us.
+    """
+
+    return sys._getframe(skip + 2).f_code.co_name
+
+
+def capture_debug_info():
+    """
+    Captures call-site info for the function that called us, according to
+    the ``think_debug_info`` setting. Pass the return value along as the
+    ``debug_info`` kwarg of :py:func:`think
+    <battlesnake.outbound_commands.mux_commands.think>` and
+    :py:meth:`expect <battlesnake.core.protocols.telnet.BattlesnakeTelnetProtocol.expect>`.
+
+    :rtype: CapturedStack or None
+    :returns: The captured call sites, or None if capture is off.
+    """
+
+    bot_settings = settings['bot']
+    mode = bot_settings['think_debug_info']
+    if mode == DEBUG_INFO_OFF:
+        return None
+
+    if mode == DEBUG_INFO_FULL or \
+            random.random() < bot_settings['think_debug_full_stack_sample_rate']:
+        return CapturedStack(_capture_frames(None, 1), with_source=True)
+    return CapturedStack(_capture_frames(DEFAULT_CALL_SITE_DEPTH, 1))
+
+
+def format_debug_info(debug_info):
+    """
+    Formats captured call-site info for display.
+
+    :param debug_info: The return value of :py:func:`capture_debug_info`,
+        a list of :py:class:`CallSite` instances, or the raw output of
+        ``inspect.stack()``.
+    :rtype: list
+    :returns: A list of strings, one per frame.
+    """
+
+    if isinstance(debug_info, CapturedStack):
+        return debug_info.format()
+    lines = []
+    for record in debug_info:
+        if isinstance(record, CallSite):
+            lines.append(str(record))
+        elif inspect.isframe(record[0]):
+            lines.append(repr(record[1:]))
+        else:
+            lines.append(repr(record))
+    return lines
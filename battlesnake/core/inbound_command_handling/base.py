@@ -17,6 +17,10 @@ class BaseCommand(object):
     # This is the command string that will cause the line reader to delegate
     # parsing to the child sub-class.
     command_name = None
+    # How long (in seconds) this command may run before the invoker is told
+    # it timed out. It keeps running, and its result is discarded.
+    # If None, the inbound_command_timeout setting is used. 0 means no limit.
+    timeout_secs = None
 
     def run(self, protocol, parsed_line, invoker_dbref):
         """
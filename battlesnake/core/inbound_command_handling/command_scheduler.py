@@ -0,0 +1,270 @@
+"""
+Limits how much inbound command work can be going on at once. Without this,
+a player spamming a command that makes a lot of MUX round trips could start
+any amount of concurrent work, and crowd out the arenas.
+
+Each invoker can only have so many commands running at a time, as can
+everyone put together. Commands beyond that wait in a bounded queue, in the
+order they came in. If the queue is full, the command is turned away with
+:py:exc:`CommandBusyError`. When a command runs for too long, the invoker
+gets :py:exc:`CommandTimeoutError`. The command can't be stopped (cancelling
+an ``inlineCallbacks`` generator doesn't stop it), so it keeps its slots
+until it really finishes. Otherwise, timed out commands would be a way
+around the limits.
+
+Both errors are :py:exc:`CommandError
+<battlesnake.core.inbound_command_handling.base.CommandError>` sub-classes,
+so the invoker gets told what happened.
+"""
+
+import time
+from collections import deque
+
+from twisted.internet.defer import Deferred, maybeDeferred
+
+from battlesnake.core.inbound_command_handling.base import CommandError
+from battlesnake.core.metrics import LatencyHistogram
+
+
+class CommandBusyError(CommandError):
+    """
+    Raised when there's no room in the queue for a command.
+    """
+
+    def __init__(self, message="Battlesnake is busy. Try again in a moment."):
+        CommandError.__init__(self, message)
+
+
+class CommandTimeoutError(CommandError):
+    """
+    Raised when a command runs longer than its timeout.
+    """
+
+    def __init__(self, message="Your command is taking too long. Its results "
+                               "will be discarded."):
+        CommandError.__init__(self, message)
+
+
+class _QueuedCommand(object):
+    """
+    A command waiting to run, or running.
+    """
+
+    def __init__(self, command, args, invoker_dbref):
+        self.command = command
+        self.args = args
+        self.invoker_dbref = invoker_dbref
+        self.queued_at = time.time()
+        self.started_at = None
+        # Fires when the command is done, times out, or is turned away.
+        self.deferred = Deferred()
+        self.timeout_call = None
+        self.timed_out = False
+
+    @property
+    def command_name(self):
+        return self.command.command_name
+
+
+class InboundCommandScheduler(object):
+    """
+    Runs inbound commands, subject to concurrency limits and timeouts.
+    """
+
+    def __init__(self, max_running=20, max_running_per_invoker=2,
+                 max_queued=100, max_queued_per_invoker=5, timeout_secs=30.0,
+                 clock=None):
+        """
+        :keyword int max_running: The most commands that may be running at
+            once. 0 means no limit.
+        :keyword int max_running_per_invoker: The most commands that a single
+            invoker may have running at once. 0 means no limit.
+        :keyword int max_queued: The most commands that may be waiting to
+            run. Commands beyond this are turned away.
+        :keyword int max_queued_per_invoker: The most commands that a single
+            invoker may have waiting to run.
+        :keyword float timeout_secs: How long a command may run before the
+            invoker is told it timed out, unless the command sets its own
+            ``timeout_secs``. 0 means no limit.
+        :keyword clock: An IReactorTime provider to schedule timeouts with.
+            Defaults to the global reactor.
+        """
+
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.clock = clock
+        self.max_running = max_running
+        self.max_running_per_invoker = max_running_per_invoker
+        self.max_queued = max_queued
+        self.max_queued_per_invoker = max_queued_per_invoker
+        self.timeout_secs = timeout_secs
+
+        self.queue = deque()
+        self.running = 0
+        # Invoker dbrefs mapped to how many commands they have running.
+        self.running_by_invoker = {}
+        # Invoker dbrefs mapped to how many commands they have queued.
+        self.queued_by_invoker = {}
+        # Metrics.
+        self.queue_wait = {}
+        self.run_time = {}
+        self.commands_run = 0
+        self.commands_rejected = 0
+        self.commands_timed_out = 0
+        self.peak_queue_depth = 0
+
+    def submit(self, command, protocol, parsed_line, invoker_dbref):
+        """
+        Runs a command as soon as the limits allow.
+
+        :param BaseCommand command: The command instance to run.
+        :param BattlesnakeTelnetProtocol protocol:
+        :param ParsedInboundCommandLine parsed_line: The parsed line.
+        :param str invoker_dbref: The DBRef of the invoking player.
+        :rtype: defer.Deferred
+        :returns: A Deferred that fires with the command's result, or errs
+            with :py:exc:`CommandBusyError` or :py:exc:`CommandTimeoutError`.
+        """
+
+        job = _QueuedCommand(
+            command, (protocol, parsed_line, invoker_dbref), invoker_dbref)
+        if self._can_start(invoker_dbref):
+            self._start(job)
+            return job.deferred
+
+        queued_for_invoker = self.queued_by_invoker.get(invoker_dbref, 0)
+        if len(self.queue) >= self.max_queued or \
+                queued_for_invoker >= self.max_queued_per_invoker:
+            self.commands_rejected += 1
+            job.deferred.errback(CommandBusyError())
+            return job.deferred
+
+        self.queue.append(job)
+        self.queued_by_invoker[invoker_dbref] = queued_for_invoker + 1
+        self.peak_queue_depth = max(self.peak_queue_depth, len(self.queue))
+        return job.deferred
+
+    def _can_start(self, invoker_dbref):
+        """
+        :rtype: bool
+        :returns: True if a command from ``invoker_dbref`` may start now.
+        """
+
+        if self.max_running and self.running >= self.max_running:
+            return False
+        if self.max_running_per_invoker and \
+                self.running_by_invoker.get(invoker_dbref, 0) >= \
+                self.max_running_per_invoker:
+            return False
+        return True
+
+    def _start(self, job):
+        job.started_at = time.time()
+        self._get_histogram(self.queue_wait, job.command_name).record(
+            job.started_at - job.queued_at)
+        self.running += 1
+        self.running_by_invoker[job.invoker_dbref] = \
+            self.running_by_invoker.get(job.invoker_dbref, 0) + 1
+
+        timeout_secs = getattr(job.command, 'timeout_secs', None)
+        if timeout_secs is None:
+            timeout_secs = self.timeout_secs
+        run_deferred = maybeDeferred(job.command.run, *job.args)
+        if timeout_secs and not run_deferred.called:
+            job.timeout_call = self.clock.callLater(
+                timeout_secs, self._time_out, job)
+        run_deferred.addBoth(self._on_finished, job)
+
+    def _time_out(self, job):
+        job.timed_out = True
+        self.commands_timed_out += 1
+        job.deferred.errback(CommandTimeoutError())
+
+    def _on_finished(self, result, job):
+        self._finish(job)
+        if job.timed_out:
+            # We already told the invoker, so the result is discarded.
+            return
+        if job.timeout_call:
+            job.timeout_call.cancel()
+        job.deferred.callback(result)
+
+    def _finish(self, job):
+        """
+        Releases a running command's slots, and starts whatever can run now.
+        """
+
+        self._get_histogram(self.run_time, job.command_name).record(
+            time.time() - job.started_at)
+        self.commands_run += 1
+        self.running -= 1
+        remaining = self.running_by_invoker[job.invoker_dbref] - 1
+        if remaining:
+            self.running_by_invoker[job.invoker_dbref] = remaining
+        else:
+            del self.running_by_invoker[job.invoker_dbref]
+        self._start_queued()
+
+    def _start_queued(self):
+        """
+        Starts queued commands, oldest first, skipping over any whose
+        invoker is still at their limit.
+        """
+
+        if not self.queue:
+            return
+        still_waiting = deque()
+        while self.queue:
+            job = self.queue.popleft()
+            if self._can_start(job.invoker_dbref):
+                self._dequeued(job)
+                self._start(job)
+            else:
+                still_waiting.append(job)
+                if self.max_running and self.running >= self.max_running:
+                    break
+        still_waiting.extend(self.queue)
+        self.queue = still_waiting
+
+    def _dequeued(self, job):
+        remaining = self.queued_by_invoker[job.invoker_dbref] - 1
+        if remaining:
+            self.queued_by_invoker[job.invoker_dbref] = remaining
+        else:
+            del self.queued_by_invoker[job.invoker_dbref]
+
+    def _get_histogram(self, histograms, command_name):
+        histogram = histograms.get(command_name)
+        if histogram is None:
+            histogram = histograms[command_name] = LatencyHistogram()
+        return histogram
+
+    def format_report(self, limit=None):
+        """
+        :keyword int limit: If specified, only show this many commands.
+        :rtype: list
+        :returns: A list of report lines, with the commands that have spent
+            the most total time queued first.
+        """
+
+        lines = [
+            "Inbound commands: %d running, %d queued (peak %d), "
+            "%d rejected, %d timed out" % (
+                self.running, len(self.queue), self.peak_queue_depth,
+                self.commands_rejected, self.commands_timed_out),
+            "%-20s %7s %10s %10s %10s %10s" % (
+                'Command', 'Count', 'Wait p50', 'Wait p99', 'Wait max',
+                'Run p99'),
+        ]
+        histograms = sorted(
+            self.queue_wait.items(), key=lambda item: item[1].total_secs,
+            reverse=True)
+        if limit:
+            histograms = histograms[:limit]
+        for command_name, wait in histograms:
+            run_time = self.run_time.get(command_name) or LatencyHistogram()
+            lines.append("%-20s %7d %10.0f %10.0f %10.1f %10.0f" % (
+                command_name[:20], wait.count, wait.percentile_ms(50),
+                wait.percentile_ms(99), wait.max_secs * 1000.0,
+                run_time.percentile_ms(99)))
+        return lines
@@ -0,0 +1,154 @@
+"""
+Round-trip latency metrics for outbound commands. Each request/response
+command (``think``, ``write_and_wait``, ``expect``) is timed from when it's
+issued until the response comes in or it times out. Timings are grouped by
+the name of the function that issued the command (``btgetxcodevalue``,
+``set_attr``, etc), so we can tell which call sites are slow.
+
+Latencies include any time spent waiting in the bot's outbound queues, since
+that's what the caller actually experiences.
+"""
+
+import time
+from bisect import bisect_left
+
+from battlesnake.core.response_watcher import NoResponseMatchFoundError
+
+# Upper bounds (in milliseconds) of the histogram buckets. Anything slower
+# than the last one lands in an overflow bucket.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class LatencyHistogram(object):
+    """
+    A fixed-bucket latency histogram for a single call site.
+    """
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_secs = 0.0
+        self.max_secs = 0.0
+        self.timeouts = 0
+        self.errors = 0
+
+    def record(self, latency_secs):
+        """
+        :param float latency_secs: How long a round trip took.
+        """
+
+        latency_ms = latency_secs * 1000.0
+        self.bucket_counts[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.count += 1
+        self.total_secs += latency_secs
+        if latency_secs > self.max_secs:
+            self.max_secs = latency_secs
+
+    @property
+    def mean_ms(self):
+        if not self.count:
+            return 0.0
+        return self.total_secs / self.count * 1000.0
+
+    def percentile_ms(self, perc):
+        """
+        :param float perc: 0...100
+        :rtype: float
+        :returns: The upper bound of the bucket that the given percentile
+            falls in. For the overflow bucket, the slowest round trip seen.
+        """
+
+        if not self.count:
+            return 0.0
+        threshold = self.count * perc / 100.0
+        running = 0
+        for index, bucket_count in enumerate(self.bucket_counts):
+            running += bucket_count
+            if running >= threshold and bucket_count:
+                break
+        if index < len(LATENCY_BUCKETS_MS):
+            return float(LATENCY_BUCKETS_MS[index])
+        return self.max_secs * 1000.0
+
+
+class RoundTripMetrics(object):
+    """
+    Keeps a :py:class:`LatencyHistogram` per call site.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.histograms = {}
+        self.started_at = time.time()
+
+    def track(self, deferred, call_site):
+        """
+        Times a round trip.
+
+        :param defer.Deferred deferred: Fires when the response comes in.
+            This should be called before anyone else adds callbacks to it.
+        :param str call_site: The name of the function that sent the command.
+        :rtype: defer.Deferred
+        :returns: ``deferred``, for convenience.
+        """
+
+        if not self.enabled:
+            return deferred
+        histogram = self.histograms.get(call_site)
+        if histogram is None:
+            histogram = self.histograms[call_site] = LatencyHistogram()
+        deferred.addCallbacks(
+            self._on_response, self._on_failure,
+            callbackArgs=(histogram, time.time()), errbackArgs=(histogram,))
+        return deferred
+
+    def _on_response(self, result, histogram, started_at):
+        histogram.record(time.time() - started_at)
+        return result
+
+    def _on_failure(self, failure, histogram):
+        if failure.check(NoResponseMatchFoundError):
+            histogram.timeouts += 1
+        else:
+            histogram.errors += 1
+        return failure
+
+    def reset(self):
+        """
+        Throws away everything recorded so far.
+        """
+
+        self.histograms = {}
+        self.started_at = time.time()
+
+    def format_report(self, limit=None):
+        """
+        :keyword int limit: If specified, only show this many call sites.
+        :rtype: list
+        :returns: A list of report lines, with the call sites that have
+            spent the most total time waiting on the MUX first.
+        """
+
+        lines = [
+            "Round trips over the last %d seconds:" % (
+                time.time() - self.started_at),
+            "%-30s %7s %8s %8s %8s %8s %6s" % (
+                'Call site', 'Count', 'Mean ms', 'p50 ms', 'p99 ms', 'Max ms',
+                'T/O'),
+        ]
+        histograms = sorted(
+            self.histograms.items(), key=lambda item: item[1].total_secs,
+            reverse=True)
+        if limit:
+            histograms = histograms[:limit]
+        for call_site, histogram in histograms:
+            lines.append("%-30s %7d %8.1f %8.0f %8.0f %8.1f %6d" % (
+                call_site[:30], histogram.count, histogram.mean_ms,
+                histogram.percentile_ms(50), histogram.percentile_ms(99),
+                histogram.max_secs * 1000.0, histogram.timeouts))
+        return lines
+
+
+# One set of metrics for the whole process. Round trips over the worker
+# connections are counted here too, alongside the primary connection's.
+ROUND_TRIP_METRICS = RoundTripMetrics()
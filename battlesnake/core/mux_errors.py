@@ -0,0 +1,87 @@
+"""
+Recognizes the MUX rejecting one of our commands, so that whoever is waiting
+on the command can find out right away instead of waiting out a timeout.
+
+There are two kinds of rejection:
+
+* Lines of their own, like ``Huh?`` for a command that doesn't exist. These
+  don't say which command they're about. The MUX runs our commands in
+  order, so when only one of them hasn't finished, the outbound scheduler
+  pins the error on it. Otherwise, the error is logged, and the line goes
+  on to the triggers and the command parser like any other.
+* Function errors in a 'think' result, like ``#-1 FUNCTION (FOO) NOT
+  FOUND``. Only errors that point to a bug or a missing power are caught.
+  Errors like ``#-1 NO MATCH`` can be a perfectly good answer, so those are
+  left for the caller.
+"""
+
+import re
+
+from battlesnake.core.utils import add_escaping_percent_sequences
+
+ERROR_HUH = 'huh'
+ERROR_PERMISSION_DENIED = 'permission_denied'
+ERROR_NO_MATCH = 'no_match'
+ERROR_FUNCTION = 'function'
+
+# (kind, regex) pairs for error lines.
+ERROR_LINE_PATTERNS = [
+    (ERROR_HUH, re.compile(r'^Huh\?  \(Type "help" for help\.\)')),
+    (ERROR_PERMISSION_DENIED, re.compile(r'^Permission denied\.')),
+    (ERROR_NO_MATCH, re.compile(r"^I don't see that here\.")),
+    (ERROR_NO_MATCH, re.compile(r"^I don't know which one you mean!")),
+]
+FUNCTION_ERROR_RE = re.compile(
+    r'^#-1 (FUNCTION \([^)]*\) (NOT FOUND|EXPECTS .*)|PERMISSION DENIED)')
+
+
+class MuxError(Exception):
+    """
+    Raised when the MUX rejects a command we sent.
+    """
+
+    def __init__(self, kind, mux_message, lines=None):
+        """
+        :param str kind: One of the ``ERROR_*`` constants.
+        :param str mux_message: What the MUX said.
+        :keyword list lines: The command's lines, if we know them.
+        """
+
+        self.kind = kind
+        self.mux_message = mux_message
+        self.lines = lines
+        self.message = "MUX error (%s): %s" % (kind, mux_message)
+        if lines:
+            self.message += "\r  Command: %s" % add_escaping_percent_sequences(
+                lines[0][:200])
+        Exception.__init__(self, self.message)
+
+
+def match_error_line(line):
+    """
+    :param str line: A line from the MUX.
+    :rtype: str or None
+    :returns: One of the ``ERROR_*`` constants if the line is the MUX
+        rejecting a command, or None if not.
+    """
+
+    for kind, regex in ERROR_LINE_PATTERNS:
+        if regex.match(line):
+            return kind
+    return None
+
+
+def check_think_result(result, thought):
+    """
+    A callback for 'think' Deferreds. Passes the result through, unless
+    it's a function error.
+
+    :param str result: The think's output.
+    :param str thought: What we asked the MUX to think.
+    :rtype: str
+    :raises: MuxError
+    """
+
+    if result.startswith('#-1 ') and FUNCTION_ERROR_RE.match(result):
+        raise MuxError(ERROR_FUNCTION, result, ['think ' + thought])
+    return result
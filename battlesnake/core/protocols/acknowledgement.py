@@ -0,0 +1,229 @@
+"""
+Acknowledgement strategies for commands that don't produce output of their
+own (@set, @force, @link, and friends). We find out that one of these has
+run by following it with a 'think' of a token, and waiting for the token to
+come back. Since the MUX runs our commands in order, seeing the token means
+that everything before it has run.
+
+* ``ACK_EACH`` - Every command gets its own token. This is the default.
+* ``ACK_SHARED`` - Every command written during a reactor turn shares a
+  single barrier token, sent at the end of the turn.
+* ``ACK_NONE`` - No token or watcher at all. The returned Deferred has
+  already fired. A periodic barrier lets us know (in the logs) if any of
+  these commands may not have run, and error lines from the MUX (see
+  :py:mod:`battlesnake.core.mux_errors`) that come in before the barrier
+  does get logged along with the commands they may be about.
+"""
+
+from twisted.internet import reactor, defer
+
+from battlesnake.core.protocols.outbound_scheduler import PRIORITIES
+
+ACK_EACH = 'each'
+ACK_SHARED = 'shared'
+ACK_NONE = 'none'
+ACK_MODES = (ACK_EACH, ACK_SHARED, ACK_NONE)
+
+# How many unacknowledged lines to include when reporting a failed barrier.
+MAX_REPORTED_LINES = 10
+
+
+class SharedAckBarrier(object):
+    """
+    Collects commands written during a reactor turn and acknowledges them
+    all with one barrier per priority class.
+    """
+
+    def __init__(self, send_barrier, clock=None):
+        """
+        :param callable send_barrier: Called with a priority class. Sends a
+            barrier command in that class and returns a Deferred that fires
+            once the MUX has reached it.
+        :keyword clock: Something providing IReactorTime. Defaults to the
+            reactor, but tests will want to pass a task.Clock.
+        """
+
+        self.send_barrier = send_barrier
+        self.clock = clock or reactor
+        self._pending = dict((priority, []) for priority in PRIORITIES)
+        self._flush_call = None
+        # Stats.
+        self.writes_acked = 0
+        self.barriers_sent = 0
+
+    def add(self, priority):
+        """
+        Registers interest in the next barrier for a priority class. Call
+        this after writing the command.
+
+        :param int priority: The priority class the command was written in.
+        :rtype: defer.Deferred
+        :returns: A Deferred that fires once the barrier comes back.
+        """
+
+        d = defer.Deferred()
+        self._pending[priority].append(d)
+        if self._flush_call is None:
+            self._flush_call = self.clock.callLater(0, self.flush)
+        return d
+
+    def flush(self):
+        """
+        Sends a barrier for each priority class with commands waiting on one.
+        """
+
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+        for priority in PRIORITIES:
+            waiting = self._pending[priority]
+            if not waiting:
+                continue
+            self._pending[priority] = []
+            d = self.send_barrier(priority)
+            d.addCallbacks(
+                self._fire_waiting, self._fail_waiting,
+                callbackArgs=(waiting,), errbackArgs=(waiting,))
+            self.writes_acked += len(waiting)
+            self.barriers_sent += 1
+
+    def _fire_waiting(self, result, waiting):
+        for d in waiting:
+            d.callback(result)
+
+    def _fail_waiting(self, failure, waiting):
+        for d in waiting:
+            d.errback(failure)
+
+
+class NoAckMonitor(object):
+    """
+    Keeps an eye on commands sent without an acknowledgement. Some time after
+    the first such command, a barrier is sent. If the barrier never comes
+    back, we log the commands that may not have run. If the MUX rejected
+    one of them, we log that too.
+    """
+
+    def __init__(self, send_barrier, interval, clock=None):
+        """
+        :param callable send_barrier: Called with no arguments. Sends a
+            barrier command and returns a Deferred that fires once the
+            MUX has reached it.
+        :param float interval: How long (in seconds) to wait after an
+            unacknowledged command before sending a barrier.
+        :keyword clock: Something providing IReactorTime. Defaults to the
+            reactor, but tests will want to pass a task.Clock.
+        """
+
+        self.send_barrier = send_barrier
+        self.interval = interval
+        self.clock = clock or reactor
+        self._unconfirmed = []
+        # Error lines that came in while the commands in _unconfirmed were
+        # waiting on a barrier, and couldn't be pinned on a command.
+        self._errors = []
+        # (lines, errors) for barriers that have been sent but haven't come
+        # back yet.
+        self._awaiting_barrier = []
+        self._barrier_call = None
+        # Stats.
+        self.writes_confirmed = 0
+        self.writes_unconfirmed = 0
+        self.writes_failed = 0
+        self.writes_possibly_failed = 0
+
+    def note_write(self, line):
+        """
+        Records a command that was sent without an acknowledgement.
+
+        :param str line: The command that was sent.
+        """
+
+        self._unconfirmed.append(line)
+        if self._barrier_call is None:
+            self._barrier_call = self.clock.callLater(
+                self.interval, self._send_barrier)
+
+    def note_error(self, mux_message, error=None):
+        """
+        Called with each error line from the MUX.
+
+        :param str mux_message: The error line.
+        :keyword MuxError error: The error, if the outbound scheduler pinned
+            it on a command.
+        """
+
+        if error is None:
+            # Any of our commands that haven't been confirmed yet could be
+            # what this is about.
+            if self._unconfirmed:
+                self._errors.append(mux_message)
+            for _, errors in self._awaiting_barrier:
+                errors.append(mux_message)
+            return
+
+        # The outbound scheduler has already logged the error along with
+        # the command, so it only has to be taken off our hands.
+        if not error.lines:
+            return
+        command = error.lines[0]
+        unconfirmed = [self._unconfirmed]
+        unconfirmed.extend(lines for lines, _ in self._awaiting_barrier)
+        for lines in unconfirmed:
+            if command in lines:
+                lines.remove(command)
+                self.writes_failed += 1
+                return
+
+    def _send_barrier(self):
+        self._barrier_call = None
+        awaiting = (self._unconfirmed, self._errors)
+        self._unconfirmed = []
+        self._errors = []
+        self._awaiting_barrier.append(awaiting)
+        d = self.send_barrier()
+        d.addCallbacks(
+            self._barrier_reached, self._barrier_failed,
+            callbackArgs=(awaiting,), errbackArgs=(awaiting,))
+
+    def _barrier_reached(self, result, awaiting):
+        self._awaiting_barrier.remove(awaiting)
+        lines, errors = awaiting
+        if not errors or not lines:
+            self.writes_confirmed += len(lines)
+            return
+        # They ran, but the errors could have come from any of them.
+        self.writes_possibly_failed += len(lines)
+        print "Error: The MUX reported %d error(s) while %d command(s) sent " \
+              "without an acknowledgement were running. Any of them may " \
+              "have failed:" % (len(errors), len(lines))
+        for mux_message in errors[:MAX_REPORTED_LINES]:
+            print "  !", mux_message
+        self._print_lines(lines)
+
+    def _barrier_failed(self, failure, awaiting):
+        self._awaiting_barrier.remove(awaiting)
+        lines, _ = awaiting
+        self.writes_unconfirmed += len(lines)
+        print "Error: No acknowledgement for %d command(s) sent without one. " \
+              "They may not have run: %s" % (
+                  len(lines), failure.getErrorMessage())
+        self._print_lines(lines)
+
+    def _print_lines(self, lines):
+        for line in lines[:MAX_REPORTED_LINES]:
+            print "  -", line
+        if len(lines) > MAX_REPORTED_LINES:
+            print "  ... and %d more" % (len(lines) - MAX_REPORTED_LINES)
+
+    def stop(self):
+        """
+        Cancels any scheduled barrier. Used when the connection goes away.
+        """
+
+        if self._barrier_call is not None and self._barrier_call.active():
+            self._barrier_call.cancel()
+        self._barrier_call = None
+        self._unconfirmed = []
+        self._errors = []
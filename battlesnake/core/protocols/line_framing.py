@@ -0,0 +1,140 @@
+"""
+A faster way to split what the MUX sends us into lines.
+
+Twisted's ``LineReceiver`` appends each chunk to a string buffer, then
+splits lines off of the front of it one at a time. The contact puller's
+responses are one very long line per map, which arrives spread over many
+chunks. Every chunk re-copies and re-scans everything buffered so far, and
+a chunk holding many lines gets copied once per line.
+
+:py:class:`TelnetLineFramer` checks each chunk for telnet IAC bytes. Chunks
+without any (nearly all of them) are split with a single ``str.split()``,
+and unfinished lines are kept as a list of pieces until their delimiter
+shows up. Chunks with IAC bytes have their telnet commands stripped out
+first. We don't negotiate any options, so they're dropped rather than
+answered.
+"""
+
+IAC = '\xff'
+SB = '\xfa'
+SE = '\xf0'
+# WILL, WONT, DO, and DONT are each followed by an option byte.
+OPTION_COMMANDS = ('\xfb', '\xfc', '\xfd', '\xfe')
+
+# IAC parser states.
+_STATE_DATA = 0
+_STATE_COMMAND = 1
+_STATE_OPTION = 2
+_STATE_SUBNEGOTIATION = 3
+_STATE_SUBNEGOTIATION_IAC = 4
+
+
+class TelnetLineFramer(object):
+    """
+    Turns chunks of received data into complete lines.
+    """
+
+    def __init__(self, delimiter='\n'):
+        """
+        :keyword str delimiter: The line delimiter. It's not included in
+            the lines we return.
+        """
+
+        self.delimiter = delimiter
+        # Pieces of a line whose delimiter hasn't arrived yet.
+        self._partial = []
+        self.partial_length = 0
+        self._iac_state = _STATE_DATA
+        # Stats.
+        self.chunks_received = 0
+        self.iac_chunks_received = 0
+
+    def feed(self, data):
+        """
+        :param str data: A chunk of data, as passed to ``dataReceived``.
+        :rtype: list
+        :returns: The lines completed by this chunk, in order, without
+            their delimiters.
+        """
+
+        self.chunks_received += 1
+        if self._iac_state != _STATE_DATA or IAC in data:
+            self.iac_chunks_received += 1
+            data = self._strip_iac(data)
+
+        lines = data.split(self.delimiter)
+        # Whatever follows the last delimiter is the start of the next line.
+        tail = lines.pop()
+        if not lines:
+            if tail:
+                self._partial.append(tail)
+                self.partial_length += len(tail)
+            return lines
+        if self._partial:
+            self._partial.append(lines[0])
+            lines[0] = ''.join(self._partial)
+            self._partial = []
+        if tail:
+            self._partial.append(tail)
+        self.partial_length = len(tail)
+        return lines
+
+    def clear(self):
+        """
+        Throws away the unfinished line.
+
+        :rtype: str
+        :returns: What we had of the unfinished line.
+        """
+
+        partial = ''.join(self._partial)
+        self._partial = []
+        self.partial_length = 0
+        return partial
+
+    def _strip_iac(self, data):
+        """
+        :param str data: A chunk that has telnet commands in it, or that
+            starts in the middle of one.
+        :rtype: str
+        :returns: The chunk, minus its telnet commands. An escaped IAC
+            (``IAC IAC``) becomes a single ``\\xff``.
+        """
+
+        kept = []
+        state = self._iac_state
+        pos = 0
+        data_len = len(data)
+        while pos < data_len:
+            if state == _STATE_DATA:
+                iac_pos = data.find(IAC, pos)
+                if iac_pos == -1:
+                    kept.append(data[pos:])
+                    break
+                kept.append(data[pos:iac_pos])
+                pos = iac_pos + 1
+                state = _STATE_COMMAND
+                continue
+
+            byte = data[pos]
+            pos += 1
+            if state == _STATE_COMMAND:
+                if byte == IAC:
+                    kept.append(IAC)
+                    state = _STATE_DATA
+                elif byte in OPTION_COMMANDS:
+                    state = _STATE_OPTION
+                elif byte == SB:
+                    state = _STATE_SUBNEGOTIATION
+                else:
+                    # A two byte command, like GA or NOP.
+                    state = _STATE_DATA
+            elif state == _STATE_OPTION:
+                state = _STATE_DATA
+            elif state == _STATE_SUBNEGOTIATION:
+                if byte == IAC:
+                    state = _STATE_SUBNEGOTIATION_IAC
+            elif state == _STATE_SUBNEGOTIATION_IAC:
+                state = _STATE_DATA if byte == SE else _STATE_SUBNEGOTIATION
+        self._iac_state = state
+        return ''.join(kept)
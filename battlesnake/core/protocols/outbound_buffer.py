@@ -0,0 +1,91 @@
+"""
+Outbound line buffering. A single pass through something like
+:py:func:`update_store_from_btfuncs` can fire off dozens of commands. Rather
+than hand each of them to the transport individually, we collect everything
+written during a reactor turn and hand it over in one write.
+"""
+
+from twisted.internet import reactor
+
+
+class OutboundLineBuffer(object):
+    """
+    Collects lines written during a single reactor turn, then writes them to
+    the transport all at once. The flush is scheduled with a zero-delay
+    ``callLater``, so it happens as soon as whatever is currently running
+    (a trigger, timer, or deferred chain) yields back to the reactor.
+    """
+
+    def __init__(self, delimiter='\r\n', clock=None):
+        """
+        :keyword str delimiter: Appended to each line.
+        :keyword clock: Something providing IReactorTime. Defaults to the
+            reactor, but tests will want to pass a task.Clock.
+        """
+
+        self.delimiter = delimiter
+        self.clock = clock or reactor
+        # Set this once the protocol has a connection.
+        self.transport = None
+        self._lines = []
+        self._flush_call = None
+        # Stats. These can help in figuring out how well writes are being
+        # coalesced.
+        self.lines_written = 0
+        self.transport_writes = 0
+
+    def write(self, line, flush=False):
+        """
+        Buffers a line for sending.
+
+        :param str line: The line to send, without a delimiter.
+        :keyword bool flush: If True, send everything that has been buffered
+            (including this line) immediately instead of waiting for the
+            end of the reactor turn.
+        """
+
+        self._lines.append(line)
+        self.lines_written += 1
+        if flush:
+            self.flush()
+        elif self._flush_call is None:
+            self._flush_call = self.clock.callLater(0, self.flush)
+
+    def flush(self):
+        """
+        Sends everything that is currently buffered in a single transport
+        write. Safe to call when the buffer is empty.
+        """
+
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+
+        if not self._lines or self.transport is None:
+            return
+
+        lines = self._lines
+        self._lines = []
+        lines.append('')
+        self.transport.write(self.delimiter.join(lines))
+        self.transport_writes += 1
+
+    def clear(self):
+        """
+        Throws away anything that hasn't been sent yet. Used when the
+        connection goes away.
+        """
+
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        self._lines = []
+
+    def pending_line_count(self):
+        """
+        :rtype: int
+        :returns: The number of lines waiting to be flushed.
+        """
+
+        return len(self._lines)
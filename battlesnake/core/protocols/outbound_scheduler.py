@@ -0,0 +1,244 @@
+"""
+Outbound command scheduling. Everything the bot sends to the MUX passes
+through here, which lets us prioritise combat-critical commands (AI orders)
+over background chatter (contact pulls, announcements), and cap how many
+request/response commands can be waiting on the MUX at once.
+
+When the MUX lags, requests that can't be sent yet wait in our queues
+instead of piling up in the MUX's input queue.
+"""
+
+import time
+from collections import deque
+
+from battlesnake.core.mux_errors import MuxError
+
+# Priority classes. Lower values go out first.
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITIES = (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)
+PRIORITY_NAMES = {
+    PRIORITY_HIGH: 'high',
+    PRIORITY_NORMAL: 'normal',
+    PRIORITY_LOW: 'low',
+}
+# The most sent-but-unfinished commands to remember, for pinning errors on.
+MAX_UNFINISHED_COMMANDS = 1000
+
+
+class OutboundScheduler(object):
+    """
+    Queues outbound commands by priority class. Commands are sent in FIFO
+    order within a class, and higher priority classes always go first.
+
+    A command may have a response watcher attached. These are
+    request/response commands, and count against ``max_in_flight`` until
+    their watcher's deferred fires (either with a response or a timeout).
+    The watcher isn't registered until the command is actually sent, so
+    time spent in our queues doesn't count against its timeout.
+
+    Commands without a watcher don't need an in-flight slot, but they still
+    wait their turn behind anything ahead of them in their class. This keeps
+    the relative ordering of commands within a class intact.
+    """
+
+    def __init__(self, send_line, watcher_manager, max_in_flight=0):
+        """
+        :param callable send_line: Called with each line to send.
+        :param ResponseWatcherManager watcher_manager: Watchers attached to
+            commands are registered with this when the command is sent.
+        :keyword int max_in_flight: The maximum number of request/response
+            commands that may be waiting on a response at once. 0 means
+            no limit.
+        """
+
+        self.send_line = send_line
+        self.watcher_manager = watcher_manager
+        self.max_in_flight = max_in_flight
+        self.queues = dict((priority, deque()) for priority in PRIORITIES)
+        self.in_flight = 0
+        # (lines, watcher) for commands that have been sent, oldest first.
+        # The MUX runs commands in order, so when a watcher's response comes
+        # in, everything sent before it is done too.
+        self.unfinished = deque(maxlen=MAX_UNFINISHED_COMMANDS)
+        # Watchers whose output the MUX queues (like @dolist's) that are
+        # still waiting. Their commands can err at any time.
+        self.out_of_order_pending = 0
+        # Metrics.
+        self.errors_pinned = 0
+        self.peak_queue_depth = 0
+        self.commands_sent = dict((priority, 0) for priority in PRIORITIES)
+        self.total_queue_wait_secs = dict(
+            (priority, 0.0) for priority in PRIORITIES)
+        # Guards against re-entering pump() from a watcher callback.
+        self._pumping = False
+
+    def submit(self, lines, priority=PRIORITY_NORMAL, watcher=None):
+        """
+        Queues a command for sending, then sends whatever we can.
+
+        :param list lines: One or more lines that make up the command.
+            These are always sent together.
+        :keyword int priority: One of the ``PRIORITY_*`` constants.
+        :keyword ResponseWatcher watcher: If this is a request/response
+            command, the watcher waiting on the response.
+        """
+
+        if isinstance(lines, basestring):
+            lines = [lines]
+        if watcher is not None:
+            # This fires first, so the slot is free again before the
+            # caller's callbacks go to send more commands.
+            watcher.deferred.addBoth(self._release_slot, watcher)
+        self.queues[priority].append((lines, watcher, time.time()))
+        depth = self.queue_depth()
+        if depth > self.peak_queue_depth:
+            self.peak_queue_depth = depth
+        self.pump()
+
+    def pump(self):
+        """
+        Sends queued commands in priority order until we run out of
+        commands or in-flight slots.
+        """
+
+        if self._pumping:
+            return
+        self._pumping = True
+        try:
+            for priority in PRIORITIES:
+                queue = self.queues[priority]
+                while queue:
+                    lines, watcher, queued_at = queue[0]
+                    if watcher is not None and self._is_at_capacity():
+                        # Nothing behind this may jump ahead of it, and
+                        # lower priority classes have to wait too.
+                        return
+                    queue.popleft()
+                    self._send(priority, lines, watcher, queued_at)
+        finally:
+            self._pumping = False
+
+    def _send(self, priority, lines, watcher, queued_at):
+        """
+        Sends a single command, registering its watcher first.
+        """
+
+        if watcher is not None:
+            self.in_flight += 1
+            if not watcher.responds_in_order:
+                self.out_of_order_pending += 1
+            self.watcher_manager.register_watcher(watcher)
+        self.unfinished.append((lines, watcher))
+        for line in lines:
+            self.send_line(line)
+        self.commands_sent[priority] += 1
+        self.total_queue_wait_secs[priority] += time.time() - queued_at
+
+    def _is_at_capacity(self):
+        return self.max_in_flight and self.in_flight >= self.max_in_flight
+
+    def _release_slot(self, result, watcher):
+        """
+        Fires when a request's response comes in or its watcher expires.
+        Passes ``result`` through untouched.
+        """
+
+        self.in_flight -= 1
+        if not watcher.responds_in_order:
+            self.out_of_order_pending -= 1
+        self._forget_through(watcher)
+        self.pump()
+        return result
+
+    def _forget_through(self, watcher):
+        """
+        Forgets about ``watcher``'s command, and everything sent before it.
+        """
+
+        for index, (_, sent_watcher) in enumerate(self.unfinished):
+            if sent_watcher is watcher:
+                for _ in range(index + 1):
+                    self.unfinished.popleft()
+                return
+
+    def pin_error(self, kind, mux_message):
+        """
+        Pins an error line from the MUX on the command it's about, and errs
+        that command's watcher with a :py:exc:`MuxError
+        <battlesnake.core.mux_errors.MuxError>`.
+
+        Error lines don't say which command they're about, so this is only
+        done when exactly one sent command hasn't finished. Commands
+        without a watcher are finished once a response to something sent
+        after them comes in. If more than one command could have caused
+        the error, or output the MUX queued (like ``@dolist``'s) is still
+        on its way, the error is only logged.
+
+        :param str kind: One of the ``ERROR_*`` constants from
+            :py:mod:`battlesnake.core.mux_errors`.
+        :param str mux_message: The error line.
+        :rtype: MuxError or None
+        :returns: The error, or None if it couldn't be pinned on a command.
+        """
+
+        if len(self.unfinished) != 1 or self.out_of_order_pending:
+            print "Unmatched MUX error:", mux_message
+            return None
+        lines, watcher = self.unfinished.popleft()
+        self.errors_pinned += 1
+        error = MuxError(kind, mux_message, lines)
+        if watcher is None or watcher.deferred.called:
+            # Nobody is waiting to hear about this one.
+            print error.message
+        else:
+            self.watcher_manager.fail_watcher(watcher, error)
+        return error
+
+    def clear(self):
+        """
+        Throws away everything queued. Used when the connection goes away.
+        Commands that were already sent keep their in-flight slots until
+        their watchers expire.
+        """
+
+        for queue in self.queues.values():
+            queue.clear()
+        self.unfinished.clear()
+
+    def queue_depth(self, priority=None):
+        """
+        :keyword int priority: If specified, only count this priority class.
+        :rtype: int
+        :returns: The number of commands waiting to be sent.
+        """
+
+        if priority is not None:
+            return len(self.queues[priority])
+        return sum(len(queue) for queue in self.queues.values())
+
+    def get_stats(self):
+        """
+        :rtype: dict
+        :returns: A snapshot of the scheduler's queue depths, in-flight
+            count, and per-class totals.
+        """
+
+        classes = {}
+        for priority in PRIORITIES:
+            sent = self.commands_sent[priority]
+            wait_secs = self.total_queue_wait_secs[priority]
+            classes[PRIORITY_NAMES[priority]] = {
+                'queue_depth': len(self.queues[priority]),
+                'sent': sent,
+                'avg_queue_wait_secs': wait_secs / sent if sent else 0.0,
+            }
+        return {
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'queue_depth': self.queue_depth(),
+            'peak_queue_depth': self.peak_queue_depth,
+            'errors_pinned': self.errors_pinned,
+            'classes': classes,
+        }
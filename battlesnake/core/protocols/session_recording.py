@@ -0,0 +1,256 @@
+"""
+Recording and replaying of MUX sessions. The recorder writes every line
+the protocol sends and receives to a file, along with a timestamp. The
+replayer feeds a recording's inbound lines back through
+:py:meth:`telnet_monitoring
+<battlesnake.core.protocols.telnet.BattlesnakeTelnetProtocol.telnet_monitoring>`
+with no MUX on the other end, timing how long each line takes to dispatch.
+This lets us benchmark the watcher, trigger, and command parsing layers
+against real traffic.
+
+Recordings are plain text, one record per line::
+
+    <timestamp>\\t<direction>\\t<line>
+
+Direction is ``<`` for lines from the MUX and ``>`` for lines we sent.
+The line is escaped with Python's ``string_escape`` codec.
+"""
+
+import time
+import heapq
+
+from twisted.internet import defer, reactor
+
+from battlesnake.core.response_watcher import NoResponseMatchFoundError
+from battlesnake.core.utils import COMPACT_TOKEN_LENGTH
+
+INBOUND = '<'
+OUTBOUND = '>'
+# Outbound lines starting with these have everything after the prefix
+# replaced, to keep passwords out of the recordings.
+REDACTED_PREFIXES = ('connect ',)
+# When replaying as fast as possible, yield to the reactor after this many
+# records, so that per-turn work (write coalescing, think batching,
+# watcher expiration) still happens.
+FAST_REPLAY_CHUNK_SIZE = 100
+# How long a replayed think's response watcher waits.
+REPLAY_WATCHER_TIMEOUT = 3.0
+# How many of the slowest lines to report.
+SLOWEST_LINE_COUNT = 10
+
+
+class SessionRecorder(object):
+    """
+    Writes timestamped inbound and outbound lines to a file.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: The file to record to. Appended to if it exists.
+        """
+
+        self.path = path
+        self.file = open(path, 'a')
+
+    def record_inbound(self, line):
+        """
+        :param str line: A line received from the MUX.
+        """
+
+        self._write_record(INBOUND, line)
+
+    def record_outbound(self, line):
+        """
+        :param str line: A line sent to the MUX.
+        """
+
+        for prefix in REDACTED_PREFIXES:
+            if line.startswith(prefix):
+                line = prefix + '<redacted>'
+                break
+        self._write_record(OUTBOUND, line)
+
+    def _write_record(self, direction, line):
+        self.file.write('%.6f\t%s\t%s\n' % (
+            time.time(), direction, line.encode('string_escape')))
+
+    def close(self):
+        self.file.close()
+
+
+def read_recording(path):
+    """
+    Reads a recording made by :py:class:`SessionRecorder`.
+
+    :param str path: The recording to read.
+    :rtype: generator
+    :returns: A generator of ``(timestamp, direction, line)`` tuples.
+    """
+
+    with open(path) as recording:
+        for record in recording:
+            timestamp, direction, line = record.rstrip('\n').split('\t', 2)
+            yield float(timestamp), direction, line.decode('string_escape')
+
+
+def get_think_token(line):
+    """
+    :param str line: An outbound line.
+    :rtype: str or None
+    :returns: The compact token that the line's output will start with,
+        if it's a think of one of our tokens.
+    """
+
+    if not line.startswith('think '):
+        return None
+    token = line[6:6 + COMPACT_TOKEN_LENGTH]
+    if len(token) != COMPACT_TOKEN_LENGTH or not token.isalnum():
+        return None
+    return token
+
+
+class SessionReplayer(object):
+    """
+    Feeds a recording's inbound lines through a protocol's monitoring state.
+    The protocol should be connected to a transport that throws away
+    whatever is written to it.
+
+    Recorded outbound thinks get a response watcher registered for their
+    token when they come up in the recording, just like the live bot would
+    have had. That way their responses take the same path through the
+    watcher manager that they did when the recording was made.
+    """
+
+    def __init__(self, protocol, records, speed=None, clock=None):
+        """
+        :param BattlesnakeTelnetProtocol protocol: The protocol to feed.
+        :param iterable records: ``(timestamp, direction, line)`` tuples, as
+            returned by :py:func:`read_recording`.
+        :keyword float speed: If None, replay as fast as possible. Otherwise,
+            a multiplier for the recording's original pace (1.0 is real time,
+            10.0 is ten times as fast).
+        :keyword clock: Something providing IReactorTime. Defaults to the
+            reactor, but tests will want to pass a task.Clock.
+        """
+
+        self.protocol = protocol
+        self.records = iter(records)
+        self.speed = speed
+        self.clock = clock or reactor
+        self.stats = ReplayStats()
+        self._deferred = None
+        self._first_timestamp = None
+        self._started_at = None
+        self._next_record = None
+
+    def run(self):
+        """
+        Starts the replay.
+
+        :rtype: defer.Deferred
+        :returns: A Deferred that fires with a :py:class:`ReplayStats` once
+            the whole recording has been replayed.
+        """
+
+        self._deferred = defer.Deferred()
+        self._started_at = self.clock.seconds()
+        self._next_record = next(self.records, None)
+        self.clock.callLater(0, self._replay_due_records)
+        return self._deferred
+
+    def _replay_due_records(self):
+        """
+        Replays every record that's due, then schedules the next batch.
+        """
+
+        replayed = 0
+        while self._next_record is not None:
+            timestamp, direction, line = self._next_record
+            if self._first_timestamp is None:
+                self._first_timestamp = timestamp
+            delay = self._get_delay(timestamp)
+            if delay > 0:
+                self.clock.callLater(delay, self._replay_due_records)
+                return
+            if self.speed is None and replayed >= FAST_REPLAY_CHUNK_SIZE:
+                self.clock.callLater(0, self._replay_due_records)
+                return
+            self._replay_record(direction, line)
+            replayed += 1
+            self._next_record = next(self.records, None)
+        self._deferred.callback(self.stats)
+
+    def _get_delay(self, timestamp):
+        """
+        :rtype: float
+        :returns: How many seconds from now the record at ``timestamp``
+            should be replayed.
+        """
+
+        if self.speed is None:
+            return 0
+        offset = (timestamp - self._first_timestamp) / self.speed
+        return self._started_at + offset - self.clock.seconds()
+
+    def _replay_record(self, direction, line):
+        if direction == OUTBOUND:
+            token = get_think_token(line)
+            if token:
+                d = self.protocol.watcher_manager.watch_token(
+                    token, timeout_secs=REPLAY_WATCHER_TIMEOUT)
+                d.addErrback(lambda failure: failure.trap(
+                    NoResponseMatchFoundError))
+            return
+
+        started = time.time()
+        self.protocol.telnet_monitoring(line)
+        self.stats.record(line, time.time() - started)
+
+
+class ReplayStats(object):
+    """
+    Per-line dispatch timings from a replay.
+    """
+
+    def __init__(self):
+        self.timings = []
+        self._slowest = []
+
+    def record(self, line, elapsed_secs):
+        """
+        :param str line: The line that was dispatched.
+        :param float elapsed_secs: How long dispatching it took.
+        """
+
+        self.timings.append(elapsed_secs)
+        entry = (elapsed_secs, line)
+        if len(self._slowest) < SLOWEST_LINE_COUNT:
+            heapq.heappush(self._slowest, entry)
+        elif entry > self._slowest[0]:
+            heapq.heapreplace(self._slowest, entry)
+
+    def format_report(self):
+        """
+        :rtype: list
+        :returns: A list of report lines.
+        """
+
+        if not self.timings:
+            return ["No inbound lines were replayed."]
+        timings = sorted(self.timings)
+        count = len(timings)
+        total = sum(timings)
+
+        def usec_at(perc):
+            return timings[int(round((count - 1) * perc / 100.0))] * 1e6
+
+        lines = [
+            "Inbound lines replayed: %d" % count,
+            "Total dispatch time:    %.3fs" % total,
+            "Per line (usec):        mean %.1f  p50 %.1f  p99 %.1f  max %.1f" % (
+                total / count * 1e6, usec_at(50), usec_at(99), timings[-1] * 1e6),
+            "Slowest lines:",
+        ]
+        for elapsed_secs, line in sorted(self._slowest, reverse=True):
+            lines.append("  %8.1f usec  %r" % (elapsed_secs * 1e6, line[:70]))
+        return lines
@@ -1,22 +1,44 @@
 from StringIO import StringIO
 
 from twisted.conch.telnet import StatefulTelnetProtocol
-from twisted.internet.defer import inlineCallbacks, maybeDeferred
+from twisted.internet.defer import inlineCallbacks, succeed
 from twisted.internet.error import ReactorNotRunning
-from twisted.internet.protocol import ClientFactory
+from twisted.internet.protocol import ClientFactory, \
+    ReconnectingClientFactory
 from twisted.internet import reactor
 
 from battlesnake.conf import settings
+from battlesnake.core.call_sites import get_caller_name
 from battlesnake.core.inbound_command_handling.base import CommandError
+from battlesnake.core.metrics import ROUND_TRIP_METRICS
+from battlesnake.core.mux_errors import match_error_line
 from battlesnake.outbound_commands import think_fn_wrappers
 from battlesnake.outbound_commands import hudinfo_commands
 from battlesnake.outbound_commands import mux_commands
 
 from battlesnake.core.inbound_command_handling.btargparse import \
     BTMuxArgumentParserExit
+from battlesnake.core.inbound_command_handling.command_scheduler import \
+    InboundCommandScheduler
+from battlesnake.core.protocols.acknowledgement import ACK_EACH, \
+    ACK_SHARED, ACK_NONE, SharedAckBarrier, NoAckMonitor
+from battlesnake.core.protocols.line_framing import TelnetLineFramer
+from battlesnake.core.protocols.outbound_buffer import OutboundLineBuffer
+from battlesnake.core.protocols.outbound_scheduler import OutboundScheduler, \
+    PRIORITY_NORMAL, PRIORITY_LOW
+from battlesnake.core.protocols.session_recording import SessionRecorder
+from battlesnake.core.protocols.think_batcher import ThinkBatcher
+from battlesnake.core.protocols.worker_pool import WorkerConnectionPool, \
+    parse_worker_accounts
 from battlesnake.core.py_importer import import_class
-from battlesnake.core.utils import generate_unique_token
-from battlesnake.core.response_watcher import ResponseWatcherManager
+from battlesnake.core.read_cache import ReadThroughCache
+from battlesnake.core.softcode_helpers import SoftcodeHelperLibrary
+from battlesnake.core.timer_scheduler import TimerScheduler
+from battlesnake.core.triggers import TriggerEngine
+from battlesnake.core.utils import generate_unique_token, \
+    generate_compact_token
+from battlesnake.core.response_watcher import ResponseWatcherManager, \
+    ResponseWatcher, TokenResponseWatcher, FramedResponseWatcher
 from battlesnake.core.inbound_command_handling.command_parser import parse_line
 
 
@@ -41,45 +63,222 @@ class BattlesnakeTelnetProtocol(StatefulTelnetProtocol):
       process supervisor is left to restart it.
     """
 
+    # If False, session_recording_path is ignored.
+    records_session = True
+
     def __init__(self, cmd_prefix, cmd_kwarg_delimiter, cmd_kwarg_list_delimiter,
                  plugins):
+        self._init_connection()
         self.cmd_prefix = cmd_prefix
         self.cmd_kwarg_delimiter = cmd_kwarg_delimiter
         self.cmd_kwarg_list_delimiter = cmd_kwarg_list_delimiter
         self.command_tables = []
         self.trigger_tables = []
+        # Re-built from trigger_tables once the plugins are loaded.
+        self.trigger_engine = TriggerEngine(self.trigger_tables)
         self.timer_tables = []
-        self.watcher_manager = ResponseWatcherManager()
+        self.timer_scheduler = TimerScheduler(
+            self, start_jitter=settings['bot']['timer_start_jitter'])
+        ROUND_TRIP_METRICS.enabled = settings['bot']['round_trip_metrics']
         self.hudinfo_enabled = settings['bot']['enable_hudinfo']
+        self.softcode_helpers = SoftcodeHelperLibrary(
+            obj=settings['bot']['softcode_helper_object'])
+        self.read_cache = ReadThroughCache(
+            enabled=settings['bot']['read_cache_enabled'])
+        self.command_scheduler = InboundCommandScheduler(
+            max_running=settings['bot']['inbound_command_max_running'],
+            max_running_per_invoker=settings['bot'][
+                'inbound_command_max_running_per_invoker'],
+            max_queued=settings['bot']['inbound_command_max_queued'],
+            max_queued_per_invoker=settings['bot'][
+                'inbound_command_max_queued_per_invoker'],
+            timeout_secs=settings['bot']['inbound_command_timeout'])
         # This is populated once we set a key in-game.
         self.hudinfo_key = None
         self.plugins = plugins
+        # Set by the factory if there are worker accounts configured.
+        self.worker_pool = None
+        self._worker_factories = []
+
+    def _init_connection(self):
+        """
+        Sets up what every connection needs to send requests and match their
+        responses. Worker connections only get this part.
+        """
+
+        self.watcher_manager = ResponseWatcherManager()
+        if settings['bot']['coalesce_outbound_writes']:
+            self.outbound_buffer = OutboundLineBuffer(delimiter=self.delimiter)
+        else:
+            self.outbound_buffer = None
+        self.outbound_scheduler = OutboundScheduler(
+            self._send_line, self.watcher_manager,
+            max_in_flight=settings['bot']['max_in_flight_requests'])
+        if settings['bot']['batch_thinks']:
+            self.think_batcher = ThinkBatcher(
+                self._submit_token_request,
+                max_line_length=settings['bot']['think_batch_max_length'])
+        else:
+            self.think_batcher = None
+        self.shared_ack_barrier = SharedAckBarrier(self._send_ack_barrier)
+        # The barrier goes out in the lowest priority class, so that it
+        # can't overtake anything sent before it.
+        self.no_ack_monitor = NoAckMonitor(
+            lambda: self._send_ack_barrier(PRIORITY_LOW),
+            interval=settings['bot']['no_ack_barrier_interval'])
+        if settings['bot']['fast_line_framing']:
+            self.line_framer = TelnetLineFramer(delimiter=self.delimiter)
+        else:
+            self.line_framer = None
+        recording_path = settings['bot']['session_recording_path']
+        if recording_path and self.records_session:
+            self.session_recorder = SessionRecorder(recording_path)
+        else:
+            self.session_recorder = None
 
     def connectionMade(self):
         print "Connection established."
+        if self.outbound_buffer:
+            self.outbound_buffer.transport = self.transport
         # Start looking for a trigger string on the connection banner to
         # tip us off to authenticate.
         self.state = 'login_prompt'
 
     def connectionLost(self, reason):
         print "Connection lost."
-        StatefulTelnetProtocol.connectionLost(self, reason)
+        self._clean_up_connection(reason)
+        if self.worker_pool:
+            self._stop_workers()
         try:
             # noinspection PyUnresolvedReferences
             reactor.stop()
         except ReactorNotRunning:
             pass
 
-    def write(self, line):
+    def _clean_up_connection(self, reason):
+        """
+        Throws away anything queued for sending.
+        """
+
+        self.outbound_scheduler.clear()
+        self.no_ack_monitor.stop()
+        if self.session_recorder:
+            self.session_recorder.close()
+        if self.outbound_buffer:
+            self.outbound_buffer.clear()
+            self.outbound_buffer.transport = None
+        StatefulTelnetProtocol.connectionLost(self, reason)
+
+    def dataReceived(self, data):
+        if not self.line_framer:
+            return StatefulTelnetProtocol.dataReceived(self, data)
+
+        for line in self.line_framer.feed(data):
+            if len(line) > self.MAX_LENGTH:
+                return self.lineLengthExceeded(line)
+            why = self.lineReceived(line)
+            if why or self.transport and self.transport.disconnecting:
+                return why
+        if self.line_framer.partial_length > self.MAX_LENGTH:
+            return self.lineLengthExceeded(self.line_framer.clear())
+
+    def lineReceived(self, line):
+        if self.session_recorder:
+            self.session_recorder.record_inbound(line)
+        StatefulTelnetProtocol.lineReceived(self, line)
+
+    def write(self, line, flush=False, priority=PRIORITY_NORMAL):
         """
-        Sends a line of text to the MUX.
+        Sends a line of text to the MUX. The line goes through the outbound
+        scheduler, so it may wait behind higher priority commands. Unless
+        ``coalesce_outbound_writes`` is turned off, lines are buffered and
+        sent together at the end of the current reactor turn.
 
         :param string line: The command to send.
+        :keyword bool flush: If True, send this line (and anything buffered
+            before it) right away. Only latency-critical callers should need
+            this, since the buffer is flushed before the reactor gets back
+            around to reading from the socket anyway.
+        :keyword int priority: One of the ``PRIORITY_*`` constants from
+            :py:mod:`battlesnake.core.protocols.outbound_scheduler`.
+        """
+
+        self._flush_think_batch()
+        self.outbound_scheduler.submit([line], priority=priority)
+        if flush:
+            self.flush()
+
+    def get_connection(self, shard_key=None):
+        """
+        Picks a connection to send a read-only request over. This is one of
+        the worker connections if there are any, and this connection if not.
+        See :py:mod:`battlesnake.core.protocols.worker_pool`.
+
+        :keyword shard_key: If given, requests with the same key always go
+            over the same connection.
+        :rtype: BattlesnakeTelnetProtocol
+        """
+
+        if self.worker_pool is None:
+            return self
+        return self.worker_pool.get_connection(shard_key)
+
+    def _start_workers(self):
+        """
+        Connects and logs in each of the worker pool's accounts. Workers
+        reconnect on their own if they're disconnected.
+        """
+
+        print "Starting %d worker connection(s)..." % len(self.worker_pool)
+        for slot, (username, password) in enumerate(self.worker_pool.accounts):
+            factory = WorkerTelnetFactory(self, slot, username, password)
+            self._worker_factories.append(factory)
+            # noinspection PyUnresolvedReferences
+            reactor.connectTCP(
+                settings['mux']['hostname'], settings['mux']['port'], factory)
+
+    def _stop_workers(self):
+        for factory in self._worker_factories:
+            factory.stopTrying()
+            worker = factory.get_protocol_instance()
+            if worker and worker.transport:
+                worker.transport.loseConnection()
+
+    def _flush_think_batch(self):
+        """
+        Sends any batched thinks ahead of whatever is about to be written,
+        so that the MUX sees our commands in the order they were issued.
+        """
+
+        if self.think_batcher:
+            self.think_batcher.flush()
+
+    def _send_line(self, line):
+        """
+        Hands a line that the outbound scheduler has cleared for sending
+        off to the transport.
+
+        :param string line: The line to send.
+        """
+
+        if self.session_recorder:
+            self.session_recorder.record_outbound(line)
+        if self.outbound_buffer:
+            self.outbound_buffer.write(line)
+        else:
+            self.sendLine(line)
+
+    def flush(self):
+        """
+        Immediately sends any lines that are buffered for sending.
         """
 
-        self.sendLine(line)
+        self._flush_think_batch()
+        if self.outbound_buffer:
+            self.outbound_buffer.flush()
 
-    def write_and_wait(self, line, ack_regex_str=None):
+    def write_and_wait(self, line, ack_regex_str=None, priority=PRIORITY_NORMAL,
+                       ack_mode=ACK_EACH):
         """
         This is used for commands where we don't necessarily care about the
         output, but we want to make sure that the command completed execution.
@@ -90,25 +289,159 @@ class BattlesnakeTelnetProtocol(StatefulTelnetProtocol):
             out something better in the future.
 
         :param string line: The command to send.
+        :keyword int priority: One of the ``PRIORITY_*`` constants from
+            :py:mod:`battlesnake.core.protocols.outbound_scheduler`.
+        :keyword str ack_mode: One of the ``ACK_*`` constants from
+            :py:mod:`battlesnake.core.protocols.acknowledgement`. Ignored if
+            ``ack_regex_str`` is given. With ``ACK_NONE``, the returned
+            Deferred has already fired.
+        :rtype: defer.Deferred
         """
 
+        if not ack_regex_str and ack_mode == ACK_SHARED:
+            self.write(line, priority=priority)
+            return ROUND_TRIP_METRICS.track(
+                self.shared_ack_barrier.add(priority), get_caller_name())
+        elif not ack_regex_str and ack_mode == ACK_NONE:
+            self.write(line, priority=priority)
+            self.no_ack_monitor.note_write(line)
+            return succeed(None)
+
+        lines = [line]
         if not ack_regex_str:
             # No acknowledgement regex was specified, so we'll generate a
-            # token and run a 'think' after the command.
-            postfix_token = generate_unique_token()
-            postfix_line = "think " + postfix_token
-            regex_str = r'{postfix}\r$'.format(postfix=postfix_token)
-            deferred = self.expect(regex_str)
-            self.sendLine(postfix_line)
+            # token and run a 'think' after the command. The MUX runs our
+            # commands in order, so seeing the token means the command ran.
+            postfix_token = generate_compact_token()
+            lines.append("think " + postfix_token)
+            watcher = TokenResponseWatcher(
+                postfix_token, timeout_secs=3.0, debug_info=None)
         else:
-            postfix_line = None
-            deferred = self.expect(ack_regex_str)
+            watcher = ResponseWatcher(
+                ack_regex_str, timeout_secs=3.0, return_regex_group=None,
+                debug_info=None)
+
+        ROUND_TRIP_METRICS.track(watcher.deferred, get_caller_name())
+        self._flush_think_batch()
+        self.outbound_scheduler.submit(lines, priority=priority, watcher=watcher)
+        return watcher.deferred
 
-        self.sendLine(line)
+    def write_and_expect_token(self, line, token, timeout_secs=3.0,
+                               debug_info=None, priority=PRIORITY_NORMAL):
+        """
+        Sends a line whose output will start with ``token``, and waits for
+        it. This is how 'think' requests are made. Unlike calling
+        :py:meth:`expect_token` then :py:meth:`write`, the timeout doesn't
+        start until the line actually leaves the outbound scheduler.
 
-        if postfix_line:
-            self.sendLine(postfix_line)
-        return deferred
+        :param string line: The command to send.
+        :param str token: A token from
+            :py:func:`battlesnake.core.utils.generate_compact_token`.
+        :keyword float timeout_secs: How many seconds to wait once sent.
+        :keyword debug_info: Something to repr() if the watcher expires without
+            ever being fired. Should help a developer track down where this
+            watcher was created from.
+        :keyword int priority: One of the ``PRIORITY_*`` constants from
+            :py:mod:`battlesnake.core.protocols.outbound_scheduler`.
+        :rtype: defer.Deferred
+        :returns: A Deferred that fires with the rest of the line following
+            the token.
+        """
+
+        self._flush_think_batch()
+        return self._submit_token_request(
+            line, token, timeout_secs, debug_info, priority)
+
+    def _submit_token_request(self, line, token, timeout_secs, debug_info,
+                              priority):
+        """
+        Queues a line with the outbound scheduler, along with a watcher
+        for its token. The think batcher sends its batches through here.
+
+        :rtype: defer.Deferred
+        """
+
+        watcher = TokenResponseWatcher(token, timeout_secs, debug_info)
+        self.outbound_scheduler.submit([line], priority=priority, watcher=watcher)
+        return watcher.deferred
+
+    def write_and_expect(self, line, regex_str, timeout_secs=3.0,
+                         return_regex_group=None, debug_info=None,
+                         priority=PRIORITY_NORMAL):
+        """
+        Sends a line, and waits for output that matches ``regex_str``. Unlike
+        calling :py:meth:`expect` then :py:meth:`write`, the timeout doesn't
+        start until the line is sent, and if the MUX rejects the line, the
+        Deferred errs with a :py:exc:`MuxError
+        <battlesnake.core.mux_errors.MuxError>` right away.
+
+        :param string line: The command to send.
+        :param basestring regex_str: A regular expression string to match
+            against.
+        :keyword float timeout_secs: How many seconds to wait once sent.
+        :keyword basestring return_regex_group: See :py:meth:`expect`.
+        :keyword debug_info: Something to repr() if the watcher expires without
+            ever being fired. Should help a developer track down where this
+            watcher was created from.
+        :keyword int priority: One of the ``PRIORITY_*`` constants from
+            :py:mod:`battlesnake.core.protocols.outbound_scheduler`.
+        :rtype: defer.Deferred
+        """
+
+        self._flush_think_batch()
+        watcher = ResponseWatcher(
+            regex_str, timeout_secs, return_regex_group, debug_info)
+        self.outbound_scheduler.submit([line], priority=priority, watcher=watcher)
+        return ROUND_TRIP_METRICS.track(watcher.deferred, get_caller_name())
+
+    def write_and_expect_framed(self, lines, token, timeout_secs=3.0,
+                                debug_info=None, priority=PRIORITY_NORMAL,
+                                capture_regex_str=None):
+        """
+        Sends one or more lines whose output is framed with ``token``, and
+        collects the whole response. See
+        :py:class:`FramedResponseWatcher
+        <battlesnake.core.response_watcher.FramedResponseWatcher>` for the
+        framing format. The lines are sent together, and the timeout doesn't
+        start until they leave the outbound scheduler.
+
+        :param list lines: The lines to send.
+        :param str token: A token from
+            :py:func:`battlesnake.core.utils.generate_compact_token`.
+        :keyword float timeout_secs: How many seconds to wait for each line
+            of the response.
+        :keyword debug_info: Something to repr() if the watcher expires without
+            ever being fired. Should help a developer track down where this
+            watcher was created from.
+        :keyword int priority: One of the ``PRIORITY_*`` constants from
+            :py:mod:`battlesnake.core.protocols.outbound_scheduler`.
+        :keyword str capture_regex_str: If specified, only lines that match
+            this are captured between the begin and end sentinels.
+        :rtype: defer.Deferred
+        :returns: A Deferred that fires with a list of the response's lines.
+        """
+
+        self._flush_think_batch()
+        watcher = FramedResponseWatcher(
+            token, timeout_secs, debug_info, capture_regex_str)
+        self.outbound_scheduler.submit(lines, priority=priority, watcher=watcher)
+        return watcher.deferred
+
+    def _send_ack_barrier(self, priority):
+        """
+        Sends a barrier that acknowledges everything written before it in
+        ``priority``'s class (and any higher class).
+
+        :param int priority: The priority class to send the barrier in.
+        :rtype: defer.Deferred
+        """
+
+        token = generate_compact_token()
+        if self.think_batcher:
+            # This can share a round trip with any thinks in the same turn.
+            return self.think_batcher.think(token, '', priority=priority)
+        return self._submit_token_request(
+            "think " + token, token, 3.0, None, priority)
 
     def expect(self, regex_str, timeout_secs=3.0, return_regex_group=None,
                debug_info=None):
@@ -133,11 +466,53 @@ class BattlesnakeTelnetProtocol(StatefulTelnetProtocol):
         :rtype: defer.Deferred
         """
 
-        return self.watcher_manager.watch(
+        deferred = self.watcher_manager.watch(
             regex_str,
             timeout_secs=timeout_secs,
             return_regex_group=return_regex_group,
             debug_info=debug_info)
+        return ROUND_TRIP_METRICS.track(deferred, get_caller_name())
+
+    def expect_token(self, token, timeout_secs=3.0, debug_info=None):
+        """
+        A cheaper alternative to :py:meth:`expect` for the common case of
+        waiting on a line that starts with a token we generated. The deferred
+        is called back with the rest of the line following the token.
+
+        :param str token: A token from
+            :py:func:`battlesnake.core.utils.generate_compact_token`.
+        :keyword float timeout_secs: How many seconds to wait.
+        :keyword debug_info: Something to repr() if the watcher expires without
+            ever being fired. Should help a developer track down where this
+            watcher was created from.
+        :rtype: defer.Deferred
+        """
+
+        return self.watcher_manager.watch_token(
+            token, timeout_secs=timeout_secs, debug_info=debug_info)
+
+    def expect_framed(self, token, timeout_secs=3.0, debug_info=None,
+                      capture_regex_str=None):
+        """
+        Like :py:meth:`expect_token`, but for responses that may span many
+        lines. See :py:meth:`write_and_expect_framed`.
+
+        :param str token: A token from
+            :py:func:`battlesnake.core.utils.generate_compact_token`.
+        :keyword float timeout_secs: How many seconds to wait for each line
+            of the response.
+        :keyword debug_info: Something to repr() if the watcher expires without
+            ever being fired. Should help a developer track down where this
+            watcher was created from.
+        :keyword str capture_regex_str: If specified, only lines that match
+            this are captured between the begin and end sentinels.
+        :rtype: defer.Deferred
+        :returns: A Deferred that fires with a list of the response's lines.
+        """
+
+        return self.watcher_manager.watch_framed(
+            token, timeout_secs=timeout_secs, debug_info=debug_info,
+            capture_regex_str=capture_regex_str)
 
     @inlineCallbacks
     def _gen_and_set_hudinfo_key(self):
@@ -153,7 +528,24 @@ class BattlesnakeTelnetProtocol(StatefulTelnetProtocol):
         else:
             print "Error: Unable to set HUDINFO key %s" % potential_key
 
-    def _load_plugins(self):
+    @inlineCallbacks
+    def _install_softcode_helpers_and_load_plugins(self):
+        """
+        Makes sure the plugins' softcode helpers are installed before their
+        timers start using them. If the install fails, callers fall back
+        to sending the full softcode.
+        """
+
+        for plugin in self.plugins:
+            self.softcode_helpers.register(plugin.softcode_helpers)
+        if self.softcode_helpers.helpers:
+            try:
+                yield self.softcode_helpers.install(self)
+            except Exception as exc:
+                print "Error: Unable to install softcode helpers: %s" % exc
+        self._load_plugins()
+
+    def _load_plugins(self, dispatch_only=False):
         """
         Plugins are how timers, triggers, and commands are grouped together.
         Cycle through the instantiated plugins that were loaded at initial
@@ -161,14 +553,23 @@ class BattlesnakeTelnetProtocol(StatefulTelnetProtocol):
 
         The end result of this method will be fully populated command,
         trigger, and timer tables.
+
+        :keyword bool dispatch_only: If True, only the trigger and command
+            tables are loaded. No timers are started, and the plugins'
+            setup methods aren't run. Used when replaying a session.
         """
 
         for plugin in self.plugins:
             trigger_tables, timer_tables, command_tables = \
-                plugin.load_plugin_tables(self)
+                plugin.load_plugin_tables(self, load_timers=not dispatch_only)
             self.trigger_tables += trigger_tables
             self.timer_tables += timer_tables
             self.command_tables += command_tables
+        # Compile all of the triggers down before anything gets fired.
+        self.trigger_engine = TriggerEngine(self.trigger_tables)
+        if dispatch_only:
+            return
+        for plugin in self.plugins:
             plugin.do_after_plugin_is_loaded()
 
     #
@@ -179,10 +580,17 @@ class BattlesnakeTelnetProtocol(StatefulTelnetProtocol):
         if 'QUIT' in line:
             # Found the trigger phase. Change state and send credentials.
             self.state = 'authenticate'
-            bot_username = settings['account']['username']
-            bot_password = settings['account']['password']
+            bot_username, bot_password = self.get_credentials()
             self.write('connect "%s" %s' % (bot_username, bot_password))
 
+    def get_credentials(self):
+        """
+        :rtype: tuple
+        :returns: A tuple in the form of (username, password) to log in with.
+        """
+
+        return settings['account']['username'], settings['account']['password']
+
     def telnet_authenticate(self, line):
         if 'Connected.' in line:
             # Authentication was successful, go active.
@@ -193,11 +601,12 @@ class BattlesnakeTelnetProtocol(StatefulTelnetProtocol):
             }
             think_fn_wrappers.set_attrs(
                 protocol=self, obj='me', attr_dict=botinfo_attribs)
-            self.watcher_manager.start_expiration_loop()
             self.state = 'monitoring'
             if self.hudinfo_enabled:
                 self._gen_and_set_hudinfo_key()
-            self._load_plugins()
+            if self.worker_pool:
+                self._start_workers()
+            self._install_softcode_helpers_and_load_plugins()
         elif 'or has a different password.' in line:
             # Invalid username/password. Poop out.
             print "Failure to authenticate."
@@ -210,10 +619,11 @@ class BattlesnakeTelnetProtocol(StatefulTelnetProtocol):
             # and we found the match.
             return
 
-        for trigger_table in self.trigger_tables:
-            matched_trigger = trigger_table.match_line(line)
-            if not matched_trigger:
-                continue
+        if self._pin_error_line(line):
+            return
+
+        matched_trigger = self.trigger_engine.match_line(line)
+        if matched_trigger:
             trigger_obj, re_match = matched_trigger
             trigger_obj().run(self, line, re_match)
             return
@@ -235,11 +645,32 @@ class BattlesnakeTelnetProtocol(StatefulTelnetProtocol):
             invoker_dbref = parsed_line.invoker_dbref
             command_instance = matched_command()
             # Outbound commands are executed through their run() method. These
-            # may or may not return deferreds.
-            d = maybeDeferred(
-                command_instance.run, self, parsed_line, invoker_dbref)
+            # may or may not return deferreds. The scheduler may hold on to
+            # the command until the invoker's earlier commands are done.
+            d = self.command_scheduler.submit(
+                command_instance, self, parsed_line, invoker_dbref)
             d.addErrback(self._command_errback, invoker_dbref)
 
+    def _pin_error_line(self, line):
+        """
+        If ``line`` is the MUX rejecting one of our commands, fails whatever
+        is waiting on the command. See
+        :py:mod:`battlesnake.core.mux_errors`.
+
+        :rtype: bool
+        :returns: True if the line was pinned on one of our commands. Error
+            lines that couldn't be pinned may have come from someone else
+            (a player can @pemit us "Huh?"), so they're handled as usual.
+        """
+
+        error_kind = match_error_line(line)
+        if not error_kind:
+            return False
+        mux_message = line.rstrip('\r')
+        error = self.outbound_scheduler.pin_error(error_kind, mux_message)
+        self.no_ack_monitor.note_error(mux_message, error)
+        return error is not None
+
     def _command_errback(self, err, invoker_dbref):
         """
         Inbound commands may or may not be a deferred, so we have to
@@ -284,6 +715,10 @@ class BattlesnakeTelnetFactory(ClientFactory):
             plugins=self._load_and_return_plugins(),
         )
         protocol.factory = self
+        worker_accounts = settings['bot']['worker_accounts']
+        if worker_accounts:
+            protocol.worker_pool = WorkerConnectionPool(
+                protocol, parse_worker_accounts(worker_accounts))
         self._latest_proto = protocol
         return protocol
 
@@ -307,3 +742,97 @@ class BattlesnakeTelnetFactory(ClientFactory):
             plugin_class = import_class(plugin)
             plugins.append(plugin_class())
         return plugins
+
+
+# noinspection PyClassHasNoInit,PyClassicStyleClass
+class WorkerTelnetProtocol(BattlesnakeTelnetProtocol):
+    """
+    One of the primary connection's worker connections. Workers log in as
+    their own player, and only ever send requests and match the responses.
+    They don't load plugins, so triggers, timers, and inbound commands are
+    left to the primary connection.
+    """
+
+    records_session = False
+
+    def __init__(self, primary, slot, username, password):
+        """
+        :param BattlesnakeTelnetProtocol primary: The bot's main connection.
+        :param int slot: This worker's slot in the primary's worker pool.
+        :param str username: The player to log in as.
+        :param str password: The player's password.
+        """
+
+        # The primary's plugin, timer, trigger, and inbound command
+        # machinery would go unused here, so only the request/response
+        # parts get set up.
+        self._init_connection()
+        self.primary = primary
+        # Writes only go over the primary, so its cache is the one that
+        # gets invalidated.
+        self.read_cache = primary.read_cache
+        self.slot = slot
+        self.username = username
+        self.password = password
+        self.hudinfo_enabled = False
+        self.worker_pool = None
+
+    def connectionMade(self):
+        print "Worker %s connected." % self.username
+        if self.outbound_buffer:
+            self.outbound_buffer.transport = self.transport
+        self.state = 'login_prompt'
+
+    def connectionLost(self, reason):
+        print "Worker %s disconnected." % self.username
+        self.primary.worker_pool.worker_lost(self.slot, self)
+        self._clean_up_connection(reason)
+
+    def get_credentials(self):
+        return self.username, self.password
+
+    def telnet_authenticate(self, line):
+        if 'Connected.' in line:
+            self.state = 'monitoring'
+            self.factory.resetDelay()
+            self.primary.worker_pool.worker_ready(self.slot, self)
+        elif 'or has a different password.' in line:
+            print "Worker %s failed to authenticate." % self.username
+            self.factory.stopTrying()
+            self.transport.loseConnection()
+
+    def telnet_monitoring(self, line):
+        if not self.watcher_manager.match_line(line):
+            self._pin_error_line(line)
+
+
+# noinspection PyAttributeOutsideInit,PyClassHasNoInit,PyClassicStyleClass
+class WorkerTelnetFactory(ReconnectingClientFactory):
+    """
+    Creates the connection for one of the worker pool's slots, and keeps
+    re-creating it if it goes away.
+    """
+
+    maxDelay = 30
+
+    def __init__(self, primary, slot, username, password):
+        self.primary = primary
+        self.slot = slot
+        self.username = username
+        self.password = password
+        self._latest_proto = None
+
+    def buildProtocol(self, addr):
+        protocol = WorkerTelnetProtocol(
+            self.primary, self.slot, self.username, self.password)
+        protocol.factory = self
+        self._latest_proto = protocol
+        return protocol
+
+    def get_protocol_instance(self):
+        """
+        :rtype: WorkerTelnetProtocol
+        :returns: The most recently created worker protocol instance.
+        """
+
+        return self._latest_proto
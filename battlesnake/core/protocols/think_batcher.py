@@ -0,0 +1,205 @@
+"""
+Batching for 'think' requests. Callers frequently fire off a handful of
+independent reads in the same reactor turn (an XCODE value for every unit
+in an arena, for example). Rather than pay a round trip and a watcher for
+each of them, we merge them into a single think::
+
+    think <batch token><token 1><thought 1><token 2><thought 2>...<batch token>
+
+The MUX evaluates the thoughts in order, just as it would have for separate
+thinks. The response line is split back up on the per-item tokens, and each
+caller's Deferred gets its own piece. The batch token at the end shows that
+the last item's output wasn't cut off.
+
+Batched thoughts share setq() registers and the MUX's per-command limits,
+and one that outputs a line break spoils the whole batch. Thinks are only
+batched when the caller says they're safe to, which the short read-only
+wrappers in :py:mod:`battlesnake.outbound_commands.think_fn_wrappers` do.
+"""
+
+from twisted.internet import reactor
+from twisted.python.failure import Failure
+
+from battlesnake.core.protocols.outbound_scheduler import PRIORITIES, \
+    PRIORITY_NORMAL
+from battlesnake.core.response_watcher import TokenResponseWatcher, \
+    NoResponseMatchFoundError
+from battlesnake.core.utils import generate_compact_token
+
+
+class ThinkBatcher(object):
+    """
+    Collects batchable thinks made during a single reactor turn and sends
+    them as one think per priority class.
+
+    Anything else the protocol writes flushes the batch first, so the MUX
+    still sees commands in the order they were issued.
+    """
+
+    def __init__(self, send_request, max_line_length, clock=None):
+        """
+        :param callable send_request: Sends a line and returns a Deferred
+            for the remainder of the response line that starts with the
+            given token. Called as ``send_request(line, token, timeout_secs,
+            debug_info, priority)``.
+        :param int max_line_length: The longest batched think we'll send.
+            Thoughts that would push a batch past this start a new batch.
+        :keyword clock: Something providing IReactorTime. Defaults to the
+            reactor, but tests will want to pass a task.Clock.
+        """
+
+        self.send_request = send_request
+        self.max_line_length = max_line_length
+        self.clock = clock or reactor
+        self._pending = dict((priority, []) for priority in PRIORITIES)
+        self._pending_lengths = dict((priority, 0) for priority in PRIORITIES)
+        self._flush_call = None
+        # Stats.
+        self.thinks_batched = 0
+        self.batches_sent = 0
+
+    def think(self, token, thought, timeout_secs=3.0, debug_info=None,
+              priority=PRIORITY_NORMAL):
+        """
+        Queues a think for the current batch.
+
+        :param str token: A token from
+            :py:func:`battlesnake.core.utils.generate_compact_token`.
+            The thought's result is prefixed with this.
+        :param str thought: The string to pass into the 'think' command.
+        :keyword float timeout_secs: How many seconds to wait once sent.
+        :keyword debug_info: Something to repr() if the think times out.
+        :keyword int priority: The outbound scheduler priority class.
+        :rtype: defer.Deferred
+        :returns: A Deferred that fires with the thought's output.
+        """
+
+        item = TokenResponseWatcher(token, timeout_secs, debug_info)
+        item.thought = thought
+        item_length = len(token) + len(thought)
+        pending = self._pending[priority]
+        if pending and self._pending_lengths[priority] + item_length > \
+                self.max_line_length:
+            self._send_batch(priority)
+        self._pending[priority].append(item)
+        self._pending_lengths[priority] += item_length
+        if self._flush_call is None:
+            self._flush_call = self.clock.callLater(0, self.flush)
+        return item.deferred
+
+    def flush(self):
+        """
+        Sends everything that's waiting to be batched.
+        """
+
+        if self._flush_call is not None:
+            if self._flush_call.active():
+                self._flush_call.cancel()
+            self._flush_call = None
+        for priority in PRIORITIES:
+            if self._pending[priority]:
+                self._send_batch(priority)
+
+    def _send_batch(self, priority):
+        """
+        Sends the pending thinks for a priority class. A lone think goes out
+        as a regular think under its own token.
+        """
+
+        items = self._pending[priority]
+        self._pending[priority] = []
+        self._pending_lengths[priority] = 0
+
+        if len(items) == 1:
+            item = items[0]
+            d = self.send_request(
+                'think %s%s' % (item.token, item.thought), item.token,
+                item.timeout_secs, item.debug_info, priority)
+            d.chainDeferred(item.deferred)
+            return
+
+        batch_token = generate_compact_token()
+        line = ''.join(
+            ['think ', batch_token] +
+            ['%s%s' % (queued.token, queued.thought) for queued in items] +
+            [batch_token])
+        timeout_secs = max(item.timeout_secs for item in items)
+        d = self.send_request(
+            line, batch_token, timeout_secs, items[0].debug_info, priority)
+        d.addCallbacks(
+            self._demux_response, self._fail_items,
+            callbackArgs=(items, batch_token), errbackArgs=(items,))
+        self.thinks_batched += len(items)
+        self.batches_sent += 1
+
+    def _demux_response(self, response, items, batch_token):
+        """
+        Splits a batched response up and fires each item's Deferred with
+        its piece.
+        """
+
+        results = split_batched_response(
+            response, [item.token for item in items], batch_token)
+        for item, result in zip(items, results):
+            if result is None:
+                # The response got cut off before this item's output.
+                item.deferred.errback(ThinkBatchTruncatedError(item))
+            else:
+                item.deferred.callback(result)
+
+    def _fail_items(self, failure, items):
+        """
+        The whole batch failed. Pass the failure along to each item,
+        re-wrapping timeouts so that each item reports its own debug info.
+        """
+
+        for item in items:
+            if failure.check(NoResponseMatchFoundError):
+                item.deferred.errback(
+                    Failure(NoResponseMatchFoundError(item)))
+            else:
+                item.deferred.errback(failure)
+
+
+def split_batched_response(response, tokens, closing_token):
+    """
+    Splits a batched think's output up by item token.
+
+    :param str response: The output that followed the batch token.
+    :param list tokens: The item tokens, in the order that they were sent.
+    :param str closing_token: The token that follows the last item's output.
+    :rtype: list
+    :returns: A list with one entry per token. Each entry is the output of
+        that token's thought, or None if the output was missing (usually
+        because the MUX truncated a long response).
+    """
+
+    results = []
+    pos = 0
+    num_tokens = len(tokens)
+    for index, token in enumerate(tokens):
+        if not response.startswith(token, pos):
+            results.extend([None] * (num_tokens - index))
+            break
+        start = pos + len(token)
+        if index + 1 < num_tokens:
+            end = response.find(tokens[index + 1], start)
+        else:
+            end = response.find(closing_token, start)
+        if end == -1:
+            # There's no telling whether this item's output is complete.
+            results.extend([None] * (num_tokens - index))
+            break
+        results.append(response[start:end])
+        pos = end
+    return results
+
+
+class ThinkBatchTruncatedError(NoResponseMatchFoundError):
+    """
+    Raised when a batched think's response doesn't include output for one
+    of its items. The MUX truncates long output, so this can happen when a
+    batch's thoughts produce a lot of it.
+    """
+
+    message_prefix = "Batched think output truncated"
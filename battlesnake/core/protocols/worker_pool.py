@@ -0,0 +1,153 @@
+"""
+The MUX works through each connection's input queue one command at a time,
+so with a single connection every arena's contact pulls, spawns, and orders
+wait in the same line. A pool of extra "worker" connections, each logged in
+as its own player, gives us more lines to wait in.
+
+Only read-only traffic is sent through the workers: thinks that don't
+depend on ``me``, and don't need to see the results of writes that the
+primary connection hasn't had acknowledged yet. Commands sent over
+different connections can run in any order relative to each other.
+Everything else, including inbound command handling, stays on the primary
+connection.
+
+Requests with a shard key (an arena's map dbref, for example) always go to
+the same worker, so they keep their relative order. Requests without one
+go to whichever worker has the least waiting on it.
+"""
+
+import zlib
+
+
+def parse_worker_accounts(raw_accounts):
+    """
+    :param list raw_accounts: The ``worker_accounts`` setting. Each item is
+        a username and password, separated by a space.
+    :rtype: list
+    :returns: A list of (username, password) tuples.
+    """
+
+    accounts = []
+    for raw_account in raw_accounts:
+        username, password = raw_account.strip().split(' ', 1)
+        accounts.append((username, password))
+    return accounts
+
+
+class WorkerConnectionPool(object):
+    """
+    Hands out connections to send read-only requests over. Each worker
+    account has a fixed slot in the pool, which is empty while that worker
+    is disconnected or logging in.
+    """
+
+    def __init__(self, primary, accounts):
+        """
+        :param BattlesnakeTelnetProtocol primary: The bot's main connection.
+            Used when no workers are available.
+        :param list accounts: A list of (username, password) tuples, one per
+            worker connection.
+        """
+
+        self.primary = primary
+        self.accounts = accounts
+        self.workers = [None] * len(accounts)
+        # Metrics.
+        self.requests_routed = [0] * len(accounts)
+        self.requests_on_primary = 0
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def worker_ready(self, slot, protocol):
+        """
+        Called by a worker once it has logged in.
+
+        :param int slot: The worker's slot in the pool.
+        :param BattlesnakeTelnetProtocol protocol: The worker's connection.
+        """
+
+        self.workers[slot] = protocol
+
+    def worker_lost(self, slot, protocol):
+        """
+        Called by a worker when its connection goes away.
+
+        :param int slot: The worker's slot in the pool.
+        :param BattlesnakeTelnetProtocol protocol: The worker's connection.
+        """
+
+        if self.workers[slot] is protocol:
+            self.workers[slot] = None
+
+    def get_slot(self, shard_key):
+        """
+        :param shard_key: Something with a stable ``str()``.
+        :rtype: int
+        :returns: The slot that requests for ``shard_key`` go to.
+        """
+
+        return (zlib.crc32(str(shard_key)) & 0xffffffff) % len(self.workers)
+
+    def get_connection(self, shard_key=None):
+        """
+        Picks a connection to send a read-only request over.
+
+        :keyword shard_key: If given, requests with the same key always go
+            to the same worker (or the primary, while that worker is down).
+        :rtype: BattlesnakeTelnetProtocol
+        """
+
+        if not self.workers:
+            return self.primary
+
+        if shard_key is not None:
+            slot = self.get_slot(shard_key)
+            worker = self.workers[slot]
+        else:
+            slot, worker = None, None
+            best_load = None
+            for candidate_slot, candidate in enumerate(self.workers):
+                if candidate is None:
+                    continue
+                load = self._get_load(candidate)
+                if best_load is None or load < best_load:
+                    slot, worker, best_load = candidate_slot, candidate, load
+
+        if worker is None:
+            self.requests_on_primary += 1
+            return self.primary
+        self.requests_routed[slot] += 1
+        return worker
+
+    def _get_load(self, protocol):
+        """
+        :rtype: int
+        :returns: How many requests are waiting on ``protocol``, either in
+            its queues or on the MUX.
+        """
+
+        scheduler = protocol.outbound_scheduler
+        return scheduler.in_flight + scheduler.queue_depth()
+
+    def get_stats(self):
+        """
+        :rtype: dict
+        :returns: A snapshot of each worker's state and how many requests
+            have been routed to it.
+        """
+
+        workers = []
+        for slot, (username, _) in enumerate(self.accounts):
+            worker = self.workers[slot]
+            workers.append({
+                'username': username,
+                'connected': worker is not None,
+                'load': self._get_load(worker) if worker else 0,
+                'requests_routed': self.requests_routed[slot],
+            })
+        return {
+            'workers': workers,
+            'workers_connected': len([w for w in self.workers if w]),
+            'requests_on_primary': self.requests_on_primary,
+        }
@@ -0,0 +1,186 @@
+"""
+A read-through cache for values that hardly ever change in-game, like a
+map's dimensions or an attribute pointing at another object. Callers opt in
+per read by passing a TTL, so nothing is cached unless someone has decided
+that a slightly stale answer is fine.
+
+Entries are keyed by (dbref, name). Attribute names are used as-is, and
+XCODE values are stored as ``XCODE:<key>``. Only dbrefs are cached, since
+we can't tell which object a string like ``me`` or ``*Player`` refers to
+when it comes time to invalidate.
+
+The bot's own writes invalidate what they touch (see the write wrappers in
+:py:mod:`battlesnake.outbound_commands.think_fn_wrappers`). Changes made
+in-game by someone else are only picked up when the entry's TTL runs out.
+"""
+
+from twisted.internet.defer import Deferred, succeed
+from twisted.python.failure import Failure
+
+from battlesnake.core.utils import is_valid_dbref
+
+XCODE_PREFIX = 'XCODE:'
+# A TTL for values that only change when the bot changes them, like map
+# dimensions. This mostly guards against changes made by hand in-game.
+STATIC_VALUE_TTL = 300.0
+
+
+def xcode_name(key):
+    """
+    :param str key: An XCODE key, like ``mapwidth``.
+    :rtype: str
+    :returns: The name that the XCODE value is cached under.
+    """
+
+    return XCODE_PREFIX + key.upper()
+
+
+class _InFlightRead(object):
+    """
+    A read that has gone out to the MUX, and everyone waiting on it.
+    """
+
+    def __init__(self):
+        self.waiting = []
+
+
+class ReadThroughCache(object):
+    """
+    Caches MUX reads, and merges identical reads that are in flight at the
+    same time.
+    """
+
+    def __init__(self, enabled=True, clock=None):
+        """
+        :keyword bool enabled: If False, every read goes to the MUX. Reads
+            are still merged while they're in flight.
+        :keyword clock: An IReactorTime provider. Defaults to the reactor.
+        """
+
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.clock = clock
+        self.enabled = enabled
+        # (dbref, name) keys mapped to (expires_at, value) tuples.
+        self._entries = {}
+        # (dbref, name) keys mapped to _InFlightRead instances.
+        self._in_flight = {}
+        # Stats.
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def get(self, obj, name, fetch, ttl):
+        """
+        :param str obj: The object being read from.
+        :param str name: The attribute name, or an :py:func:`xcode_name`.
+        :param callable fetch: Called with no arguments to read the value
+            from the MUX. Returns a Deferred.
+        :param float ttl: How long (in seconds) the value may be served
+            from the cache.
+        :rtype: defer.Deferred
+        :returns: A Deferred that fires with the value.
+        """
+
+        if not is_valid_dbref(obj):
+            return fetch()
+        key = (obj, name.upper())
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > self.clock.seconds():
+                self.hits += 1
+                return succeed(entry[1])
+            del self._entries[key]
+
+        read = self._in_flight.get(key)
+        if read is not None:
+            self.coalesced += 1
+            waiter = Deferred()
+            read.waiting.append(waiter)
+            return waiter
+
+        self.misses += 1
+        read = self._in_flight[key] = _InFlightRead()
+        deferred = fetch()
+        deferred.addBoth(self._read_finished, key, read, ttl)
+        return deferred
+
+    def _read_finished(self, result, key, read, ttl):
+        """
+        Stores the value (unless it was invalidated while we were waiting
+        on it) and hands it to everyone else who asked for it.
+        """
+
+        if self._in_flight.get(key) is read:
+            del self._in_flight[key]
+            if self.enabled and ttl > 0 and not isinstance(result, Failure):
+                self._entries[key] = (self.clock.seconds() + ttl, result)
+        for waiter in read.waiting:
+            waiter.callback(result)
+        return result
+
+    def invalidate(self, obj, name=None):
+        """
+        Forgets cached values. Reads in flight for them finish as normal,
+        but their values aren't stored, since they may have been read
+        before the change.
+
+        :param str obj: The object that was written to. If this isn't a
+            dbref, everything is forgotten.
+        :keyword str name: The attribute name or :py:func:`xcode_name`
+            that was written to. If None, everything for ``obj`` is
+            forgotten.
+        """
+
+        self.invalidations += 1
+        if not is_valid_dbref(obj):
+            self.clear()
+            return
+        if name is not None:
+            key = (obj, name.upper())
+            self._entries.pop(key, None)
+            self._in_flight.pop(key, None)
+            return
+        for store in (self._entries, self._in_flight):
+            for key in [stored for stored in store if stored[0] == obj]:
+                del store[key]
+
+    def clear(self):
+        """
+        Forgets every cached value.
+        """
+
+        self._entries.clear()
+        self._in_flight.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def invalidate_on_write(protocol, deferred, obj, names=None):
+    """
+    Forgets cached values that a write is about to change. This is done
+    when the write is sent, and again once it's done, in case a read was
+    sent ahead of it.
+
+    :param BattlesnakeTelnetProtocol protocol:
+    :param defer.Deferred deferred: Fires when the write is done.
+    :param str obj: The object being written to.
+    :keyword list names: The attribute names or :py:func:`xcode_name` values
+        being written. If None, everything for ``obj`` is forgotten.
+    :rtype: defer.Deferred
+    :returns: ``deferred``, so this can wrap the write call.
+    """
+
+    def invalidate(result=None):
+        if names is None:
+            protocol.read_cache.invalidate(obj)
+        else:
+            for name in names:
+                protocol.read_cache.invalidate(obj, name)
+        return result
+
+    invalidate()
+    deferred.addBoth(invalidate)
+    return deferred
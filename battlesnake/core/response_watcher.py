@@ -6,13 +6,18 @@ command in-game to return the list of connected players.
 
 import re
 import uuid
-import datetime
 
 from twisted.internet import defer
-from twisted.internet.task import LoopingCall
 
-from battlesnake.conf import settings
-from battlesnake.core.utils import add_escaping_percent_sequences
+from battlesnake.core.call_sites import format_debug_info
+from battlesnake.core.utils import add_escaping_percent_sequences, \
+    COMPACT_TOKEN_LENGTH
+
+# Framed responses are made up of lines that start with the request's
+# token, followed by one of these markers. See FramedResponseWatcher.
+FRAME_BEGIN = '+'
+FRAME_CHUNK = '.'
+FRAME_END = '-'
 
 
 class ResponseWatcherManager(object):
@@ -22,9 +27,27 @@ class ResponseWatcherManager(object):
     through this object.
     """
 
-    def __init__(self):
+    def __init__(self, clock=None):
+        """
+        :keyword clock: An IReactorTime provider to schedule expirations
+            with. Defaults to the global reactor.
+        """
+
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.clock = clock
+        # Watchers that match against arbitrary regular expressions. Every
+        # one of these is tried against each line that doesn't match a token.
         self.watcher_store = {}
-        self.expiration_loop = LoopingCall(self.expire_stale_watchers)
+        # Watchers keyed by the compact token that their response lines
+        # start with. These are resolved with a single dict lookup.
+        self.token_watchers = {}
+        # FramedResponseWatchers, keyed by token. These stay put until their
+        # end sentinel arrives.
+        self.framed_watchers = {}
+        # Framed watchers that have seen their begin sentinel, and are
+        # capturing un-tokened lines.
+        self.capturing_watchers = []
 
     def watch(self, regex_str, timeout_secs, return_regex_group, debug_info=None):
         """
@@ -50,9 +73,59 @@ class ResponseWatcherManager(object):
         :param ResponseWatcher watcher: The watcher to register.
         """
 
-        tdelt = datetime.timedelta(seconds=watcher.timeout_secs)
-        watcher.timeout = datetime.datetime.now() + tdelt
-        self.watcher_store[watcher.id] = watcher
+        # Each watcher gets its own delayed call, so expiration fires on time
+        # and we never have to go looking through the stores for stale entries.
+        watcher.expiry_call = self.clock.callLater(
+            watcher.timeout_secs, self._expire_watcher, watcher)
+        if isinstance(watcher, FramedResponseWatcher):
+            self.framed_watchers[watcher.token] = watcher
+        elif isinstance(watcher, TokenResponseWatcher):
+            self.token_watchers[watcher.token] = watcher
+        else:
+            self.watcher_store[watcher.id] = watcher
+
+    def watch_token(self, token, timeout_secs, debug_info=None):
+        """
+        Creates and registers a watcher for a line that starts with
+        ``token``. This is the fast path used for 'think' responses. The
+        Deferred fires with whatever follows the token on the line.
+
+        :param str token: A token from
+            :py:func:`battlesnake.core.utils.generate_compact_token`.
+        :param float timeout_secs: How many seconds to wait.
+        :keyword debug_info: Something to repr() if the watcher expires without
+            ever being fired. Should help a developer track down where this
+            watcher was created from.
+        :rtype: defer.Deferred
+        """
+
+        mon = TokenResponseWatcher(token, timeout_secs, debug_info)
+        self.register_watcher(mon)
+        return mon.deferred
+
+    def watch_framed(self, token, timeout_secs, debug_info=None,
+                     capture_regex_str=None):
+        """
+        Creates and registers a watcher for a response that may span any
+        number of lines. See :py:class:`FramedResponseWatcher`. The Deferred
+        fires with a list of the response's lines.
+
+        :param str token: A token from
+            :py:func:`battlesnake.core.utils.generate_compact_token`.
+        :param float timeout_secs: How many seconds to wait. This starts
+            over each time another line of the response comes in.
+        :keyword debug_info: Something to repr() if the watcher expires without
+            ever being fired. Should help a developer track down where this
+            watcher was created from.
+        :keyword str capture_regex_str: If specified, only lines that match
+            this are captured between the begin and end sentinels.
+        :rtype: defer.Deferred
+        """
+
+        mon = FramedResponseWatcher(
+            token, timeout_secs, debug_info, capture_regex_str)
+        self.register_watcher(mon)
+        return mon.deferred
 
     def match_line(self, line):
         """
@@ -65,42 +138,121 @@ class ResponseWatcherManager(object):
         :returns: A MatchObject if ther was a match, or None if not.
         """
 
-        for watcher_id, watcher in self.watcher_store.items():
+        if self.token_watchers:
+            watcher = self.token_watchers.pop(line[:COMPACT_TOKEN_LENGTH], None)
+            if watcher is not None:
+                value = line[COMPACT_TOKEN_LENGTH:]
+                if value.endswith('\r'):
+                    value = value[:-1]
+                watcher.expiry_call.cancel()
+                watcher.deferred.callback(value)
+                return True
+
+        if self.framed_watchers and self._match_framed_line(line):
+            return True
+
+        if not self.watcher_store:
+            return False
+
+        for watcher_id, watcher in self.watcher_store.iteritems():
             match = watcher.line_regex.search(line)
-            if not match:
-                continue
-            # At this point, we can assume there was a match.
-            if watcher.return_regex_group:
-                watcher.deferred.callback(match.group(watcher.return_regex_group))
+            if match:
+                break
+        else:
+            return False
+
+        # Get the watcher out of the store before firing the callbacks, since
+        # they may very well register new watchers.
+        del self.watcher_store[watcher_id]
+        watcher.expiry_call.cancel()
+        if watcher.return_regex_group:
+            watcher.deferred.callback(match.group(watcher.return_regex_group))
+        else:
+            watcher.deferred.callback(match)
+        return True
+
+    def _match_framed_line(self, line):
+        """
+        Feeds a line to the framed watcher that it belongs to, if any.
+
+        :param basestring line: The line read by the protocol.
+        :rtype: bool
+        :returns: True if the line was part of a framed response.
+        """
+
+        watcher = self.framed_watchers.get(line[:COMPACT_TOKEN_LENGTH])
+        if watcher is not None:
+            value = line[COMPACT_TOKEN_LENGTH:]
+            if value.endswith('\r'):
+                value = value[:-1]
+            watcher.feed_framing(value)
+            if watcher.capturing and watcher not in self.capturing_watchers:
+                self.capturing_watchers.append(watcher)
+        else:
+            for watcher in self.capturing_watchers:
+                if watcher.capture_line(line):
+                    break
             else:
-                watcher.deferred.callback(match)
-            del self.watcher_store[watcher_id]
-            return True
-        return False
+                return False
+
+        if watcher.is_complete():
+            del self.framed_watchers[watcher.token]
+            if watcher in self.capturing_watchers:
+                self.capturing_watchers.remove(watcher)
+            watcher.expiry_call.cancel()
+            watcher.deferred.callback(watcher.get_result())
+        else:
+            # Big responses can take a while to come in. As long as they're
+            # still coming, keep waiting.
+            watcher.expiry_call.reset(watcher.timeout_secs)
+        return True
+
+    def fail_watcher(self, watcher, exc):
+        """
+        Stops a watcher and errbacks its deferred, without waiting for its
+        timeout.
+
+        :param ResponseWatcher watcher: The watcher to fail.
+        :param Exception exc: What to errback with.
+        """
 
-    def start_expiration_loop(self):
+        if watcher.expiry_call and watcher.expiry_call.active():
+            watcher.expiry_call.cancel()
+        self._remove_watcher(watcher)
+        if not watcher.deferred.called:
+            watcher.deferred.errback(exc)
+
+    def _expire_watcher(self, watcher):
         """
-        Fires up the expiration loop.
+        Called when a watcher's timeout elapses without a match. Errbacks
+        the watcher's deferred with a :py:exc:`NoResponseMatchFoundError`.
+
+        :param ResponseWatcher watcher: The watcher that timed out.
         """
 
-        loop_interval = settings['bot']['response_watcher_expire_check_interval']
-        print "* Response watcher expiration loop interval: %ss" % loop_interval
-        self.expiration_loop.start(loop_interval)
+        self._remove_watcher(watcher)
+        if not watcher.deferred.called:
+            watcher.deferred.errback(NoResponseMatchFoundError(watcher))
+
+    def _remove_watcher(self, watcher):
+        if isinstance(watcher, FramedResponseWatcher):
+            store = self.framed_watchers
+            if watcher in self.capturing_watchers:
+                self.capturing_watchers.remove(watcher)
+        elif isinstance(watcher, TokenResponseWatcher):
+            store = self.token_watchers
+        else:
+            store = self.watcher_store
+        store.pop(watcher.id, None)
 
-    def expire_stale_watchers(self):
+    def pending_watcher_count(self):
         """
-        Goes through the list of watchers and errbacks any that haven't
-        been matched in their allotted time window.
+        :rtype: int
+        :returns: The number of watchers still waiting on a response.
         """
 
-        now = datetime.datetime.now()
-        for watcher_id, watcher in self.watcher_store.items():
-            if watcher.deferred.called:
-                del self.watcher_store[watcher_id]
-                continue
-            if now >= watcher.timeout:
-                watcher.deferred.errback(NoResponseMatchFoundError(watcher))
-                del self.watcher_store[watcher_id]
+        return len(self.watcher_store) + len(self.token_watchers) + \
+            len(self.framed_watchers)
 
 
 class ResponseWatcher(object):
@@ -108,28 +260,161 @@ class ResponseWatcher(object):
     Encapsulates everything we need to wait for an expected output.
     """
 
+    # If False, the response may arrive after the responses to commands
+    # sent after ours. Error lines are never pinned on these.
+    responds_in_order = True
+
     def __init__(self, regex_str, timeout_secs, return_regex_group, debug_info):
         self.id = uuid.uuid4().hex
         self.timeout_secs = timeout_secs
         # This gets populated when this watcher is registered with the manager.
-        self.timeout = None
+        self.expiry_call = None
         self.deferred = defer.Deferred()
         self.line_regex = re.compile(regex_str)
         self.return_regex_group = return_regex_group
         self.debug_info = debug_info
 
+    @property
+    def pattern(self):
+        """
+        :rtype: str
+        :returns: A human-readable description of what we're waiting for.
+        """
+
+        return self.line_regex.pattern
+
+
+class TokenResponseWatcher(ResponseWatcher):
+    """
+    Waits for a line that starts with a compact token. No regular expression
+    is involved, the manager looks these up by token.
+    """
+
+    # noinspection PyMissingConstructor
+    def __init__(self, token, timeout_secs, debug_info):
+        self.id = token
+        self.token = token
+        self.timeout_secs = timeout_secs
+        # This gets populated when this watcher is registered with the manager.
+        self.expiry_call = None
+        self.deferred = defer.Deferred()
+        self.line_regex = None
+        self.return_regex_group = None
+        self.debug_info = debug_info
+
+    @property
+    def pattern(self):
+        return "token " + self.token
+
+
+class FramedResponseWatcher(TokenResponseWatcher):
+    """
+    Collects a response that may not fit on one line. Every framing line
+    starts with the watcher's token, followed by a marker:
+
+    * ``<token>+`` - The begin sentinel. Lines that follow it (and that match
+      ``capture_regex_str``, if given) are captured until the end sentinel.
+      This is how the output of commands like ``hudinfo c`` is collected.
+    * ``<token>.<seq>:<data>`` - A chunk of the response. Sequence numbers
+      start at 1. Chunks may arrive in any order, and are put back in order.
+    * ``<token>-<count>`` - The end sentinel. If ``count`` is given, we also
+      wait until that many chunks have arrived. Anything after a ``:``
+      following the count is ignored.
+
+    The result is a list of the captured lines, followed by the chunks in
+    sequence order.
+    """
+
+    def __init__(self, token, timeout_secs, debug_info, capture_regex_str=None):
+        TokenResponseWatcher.__init__(self, token, timeout_secs, debug_info)
+        if capture_regex_str:
+            self.capture_regex = re.compile(capture_regex_str)
+        else:
+            self.capture_regex = None
+        self.capturing = False
+        self.captured_lines = []
+        # Sequence numbers mapped to chunk data.
+        self.chunks = {}
+        self.ended = False
+        self.expected_chunks = None
+
+    def feed_framing(self, value):
+        """
+        :param str value: A framing line, minus the token.
+        """
+
+        marker = value[:1]
+        if marker == FRAME_CHUNK:
+            seq, _, data = value[1:].partition(':')
+            if seq.isdigit():
+                self.chunks[int(seq)] = data
+        elif marker == FRAME_BEGIN:
+            self.capturing = True
+        elif marker == FRAME_END:
+            self.capturing = False
+            self.ended = True
+            count = value[1:].partition(':')[0]
+            if count.isdigit():
+                self.expected_chunks = int(count)
+
+    def capture_line(self, line):
+        """
+        :param str line: A line that doesn't start with our token.
+        :rtype: bool
+        :returns: True if the line is part of our response.
+        """
+
+        if self.capture_regex and not self.capture_regex.search(line):
+            return False
+        if line.endswith('\r'):
+            line = line[:-1]
+        self.captured_lines.append(line)
+        return True
+
+    def is_complete(self):
+        """
+        :rtype: bool
+        :returns: True if the whole response is in.
+        """
+
+        if not self.ended:
+            return False
+        return self.expected_chunks is None or \
+            len(self.chunks) >= self.expected_chunks
+
+    def get_result(self):
+        """
+        :rtype: list
+        :returns: The captured lines, followed by the chunks in order.
+        """
+
+        return self.captured_lines + [
+            self.chunks[seq] for seq in sorted(self.chunks)]
+
+    @property
+    def responds_in_order(self):
+        # Captured output comes back in order, but chunks may not.
+        return self.capturing
+
+    @property
+    def pattern(self):
+        return "framed response %s (%d lines, %d chunks so far)" % (
+            self.token, len(self.captured_lines), len(self.chunks))
+
 
 class NoResponseMatchFoundError(Exception):
     """
     Raised when no match for expected output is found within the timeout window.
     """
 
+    message_prefix = "No response watch match found"
+
     def __init__(self, watcher, *args):
         self.watcher = watcher
-        self.message = "No response watch match found: %s" % watcher.line_regex.pattern
+        self.message = "%s: %s" % (self.message_prefix, watcher.pattern)
         if watcher.debug_info:
             self.message += "\r"
-            for record in watcher.debug_info:
-                self.message += "\r" + add_escaping_percent_sequences(repr(record[1:]))
+            for line in format_debug_info(watcher.debug_info):
+                self.message += "\r" + add_escaping_percent_sequences(line)
         Exception.__init__(
             self, self.message, watcher, *args)
@@ -0,0 +1,111 @@
+"""
+Softcode that the bot keeps installed in-game, so that hot paths can send a
+short ``u()`` call instead of the same big expression over and over. This
+saves bandwidth, and the MUX doesn't have to parse the expression from
+scratch on every request.
+
+Plugins list their helpers in their ``softcode_helpers`` dict, which maps
+attribute names to softcode. The helpers are installed on the bot's player
+object (or ``softcode_helper_object``) after it logs in. The installed
+version is a checksum of every helper, stored alongside them. If it doesn't
+match ours at startup, all of the helpers are set again. Changing any
+helper's code is enough to get it reinstalled.
+"""
+
+import zlib
+
+from twisted.internet.defer import inlineCallbacks, DeferredList
+
+from battlesnake.core.call_sites import capture_debug_info
+from battlesnake.outbound_commands import mux_commands
+
+# Holds the installed helpers' version. This is set after all of the
+# helpers, so an interrupted install gets redone on the next startup.
+VERSION_ATTR = 'BATTLESNAKE_HELPERS_VERSION.D'
+
+
+class SoftcodeHelperLibrary(object):
+    """
+    The set of helpers to keep installed, and where they are.
+    """
+
+    def __init__(self, obj='me'):
+        """
+        :keyword str obj: A MUX object string for the object that holds the
+            helpers. It should be owned by the bot.
+        """
+
+        self.obj = obj
+        # Attribute names mapped to softcode.
+        self.helpers = {}
+        # Set once we've looked the object up. Worker connections log in as
+        # a different player, so the helpers are always called by dbref.
+        self.obj_dbref = None
+        self.installed = False
+
+    def register(self, helpers):
+        """
+        :param dict helpers: Attribute names mapped to softcode. Names are
+            case-insensitive, like on the MUX.
+        """
+
+        for attr, code in helpers.items():
+            attr = attr.upper()
+            assert self.helpers.get(attr, code) == code, \
+                "Conflicting softcode helpers for %s" % attr
+            self.helpers[attr] = code
+
+    @property
+    def version(self):
+        """
+        :rtype: str
+        :returns: A checksum of all of the registered helpers.
+        """
+
+        checksum = 0
+        for attr, code in sorted(self.helpers.items()):
+            checksum = zlib.crc32('%s:%s\n' % (attr, code), checksum)
+        return '%08x' % (checksum & 0xffffffff)
+
+    def u(self, attr, *args):
+        """
+        :param str attr: The helper's attribute name.
+        :rtype: str
+        :returns: A softcode call to the helper with ``args``. Only valid
+            once the helpers are installed.
+        """
+
+        assert self.installed, "Softcode helpers aren't installed yet."
+        return '[u(%s/%s%s)]' % (
+            self.obj_dbref, attr, ''.join(',' + arg for arg in args))
+
+    @inlineCallbacks
+    def install(self, protocol):
+        """
+        Checks the installed helpers' version, and (re)installs them if it
+        doesn't match.
+
+        :param BattlesnakeTelnetProtocol protocol:
+        :rtype: defer.Deferred
+        """
+
+        result = yield mux_commands.think(
+            protocol, '[num({obj})]:[get({obj}/{attr})]'.format(
+                obj=self.obj, attr=VERSION_ATTR),
+            debug_info=capture_debug_info())
+        self.obj_dbref, _, installed_version = result.partition(':')
+        version = self.version
+        if installed_version == version:
+            print "Softcode helpers are up to date (version %s)." % version
+            self.installed = True
+            return
+
+        print "Installing %d softcode helpers (version %s, was %s)..." % (
+            len(self.helpers), version, installed_version or 'none')
+        yield DeferredList([
+            mux_commands.set_attr(protocol, self.obj_dbref, attr, code)
+            for attr, code in sorted(self.helpers.items())
+        ], fireOnOneErrback=True, consumeErrors=True)
+        yield mux_commands.set_attr(
+            protocol, self.obj_dbref, VERSION_ATTR, version)
+        self.installed = True
@@ -0,0 +1,257 @@
+"""
+Runs every :py:class:`IntervalTimer <battlesnake.core.timers.IntervalTimer>`
+off of a single delayed call, rather than a LoopingCall each.
+
+Fire times are worked out from the timer's schedule, not from when it last
+ran, so timers don't drift later and later. If the reactor falls more than
+a whole interval behind, the missed fires are dropped rather than run in a
+burst. Each timer's schedule starts at a random offset (up to
+``start_jitter`` seconds), so timers with the same interval don't all fire
+in the same reactor turn.
+
+A timer whose ``run()`` returns a Deferred is still running until it
+fires. If the timer comes due again before then, its ``overrun_policy``
+decides what happens:
+
+* ``OVERRUN_SKIP`` - The fire is skipped.
+* ``OVERRUN_COALESCE`` - Any number of overlapping fires become one, which
+  runs as soon as the current run finishes.
+* ``OVERRUN_QUEUE`` - Overlapping fires are run one after another once the
+  current run finishes, up to ``max_queued_fires`` of them. Beyond that,
+  fires are skipped.
+"""
+
+import time
+import heapq
+import random
+import itertools
+
+from twisted.internet.defer import maybeDeferred
+
+from battlesnake.core.metrics import LatencyHistogram
+
+OVERRUN_SKIP = 'skip'
+OVERRUN_COALESCE = 'coalesce'
+OVERRUN_QUEUE = 'queue'
+OVERRUN_POLICIES = (OVERRUN_SKIP, OVERRUN_COALESCE, OVERRUN_QUEUE)
+
+
+class _ScheduledTimer(object):
+    """
+    A timer's schedule, state, and stats.
+    """
+
+    def __init__(self, timer_class, next_due):
+        self.timer_class = timer_class
+        self.interval = timer_class.interval
+        self.overrun_policy = timer_class.overrun_policy
+        assert self.overrun_policy in OVERRUN_POLICIES, \
+            "Invalid overrun policy: %s" % self.overrun_policy
+        self.next_due = next_due
+        self.running = False
+        # Fires waiting on the current run to finish.
+        self.pending_fires = 0
+        self.stopped = False
+        # Stats.
+        self.run_durations = LatencyHistogram()
+        self.fires = 0
+        self.skipped = 0
+        self.coalesced = 0
+        self.queued = 0
+        self.failures = 0
+        self.max_lateness_secs = 0.0
+
+    @property
+    def name(self):
+        return self.timer_class.__name__
+
+
+class TimerScheduler(object):
+    """
+    Fires all of a protocol's interval timers.
+    """
+
+    def __init__(self, protocol, start_jitter=1.0, max_queued_fires=10,
+                 clock=None):
+        """
+        :param BattlesnakeTelnetProtocol protocol: Passed to each timer's
+            ``fire()``.
+        :keyword float start_jitter: Each timer's first fire is put off by a
+            random amount up to this many seconds (or its interval, if that's
+            shorter).
+        :keyword int max_queued_fires: The most fires that an
+            ``OVERRUN_QUEUE`` timer can have waiting.
+        :keyword clock: An IReactorTime provider. Defaults to the reactor.
+        """
+
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.clock = clock
+        self.protocol = protocol
+        self.start_jitter = start_jitter
+        self.max_queued_fires = max_queued_fires
+        self.timers = []
+        # (next_due, sequence, _ScheduledTimer) tuples.
+        self._heap = []
+        self._sequence = itertools.count()
+        self._wakeup_call = None
+
+    def add_timer(self, timer_class, run_now=False):
+        """
+        Starts firing an IntervalTimer sub-class on its interval.
+
+        :param timer_class: An IntervalTimer sub-class.
+        :keyword bool run_now: If True, fire the timer right away. Its
+            schedule then starts from now, without any jitter.
+        :rtype: _ScheduledTimer
+        """
+
+        now = self.clock.seconds()
+        if run_now:
+            first_due = now
+        else:
+            jitter = random.uniform(0, min(self.start_jitter, timer_class.interval))
+            first_due = now + timer_class.interval + jitter
+        timer = _ScheduledTimer(timer_class, first_due)
+        self.timers.append(timer)
+        self._push(timer)
+        return timer
+
+    def remove_timer(self, timer):
+        """
+        Stops firing a timer. A run that's in progress isn't interrupted.
+
+        :param _ScheduledTimer timer: Something returned by
+            :py:meth:`add_timer`.
+        """
+
+        timer.stopped = True
+        self.timers.remove(timer)
+
+    def stop(self):
+        """
+        Stops firing all timers.
+        """
+
+        for timer in list(self.timers):
+            self.remove_timer(timer)
+        if self._wakeup_call and self._wakeup_call.active():
+            self._wakeup_call.cancel()
+        self._wakeup_call = None
+        self._heap = []
+
+    def _push(self, timer):
+        heapq.heappush(
+            self._heap, (timer.next_due, next(self._sequence), timer))
+        self._schedule_wakeup()
+
+    def _schedule_wakeup(self):
+        """
+        Makes sure we wake up in time for the next timer that's due.
+        """
+
+        if not self._heap:
+            return
+        next_due = self._heap[0][0]
+        if self._wakeup_call and self._wakeup_call.active():
+            if self._wakeup_call.getTime() <= next_due:
+                return
+            self._wakeup_call.cancel()
+        delay = max(0.0, next_due - self.clock.seconds())
+        self._wakeup_call = self.clock.callLater(delay, self._wake_up)
+
+    def _wake_up(self):
+        self._wakeup_call = None
+        now = self.clock.seconds()
+        while self._heap and self._heap[0][0] <= now:
+            due, _, timer = heapq.heappop(self._heap)
+            if timer.stopped:
+                continue
+            timer.max_lateness_secs = max(timer.max_lateness_secs, now - due)
+            self._on_due(timer)
+            # Stay on the original schedule. If we fell more than an
+            # interval behind, skip ahead rather than firing repeatedly.
+            timer.next_due = due + timer.interval
+            if timer.next_due <= now:
+                missed = int((now - timer.next_due) / timer.interval) + 1
+                timer.next_due += missed * timer.interval
+            heapq.heappush(
+                self._heap, (timer.next_due, next(self._sequence), timer))
+        self._schedule_wakeup()
+
+    def _on_due(self, timer):
+        if not timer.running:
+            self._run(timer)
+        elif timer.overrun_policy == OVERRUN_SKIP:
+            timer.skipped += 1
+        elif timer.overrun_policy == OVERRUN_COALESCE:
+            if timer.pending_fires:
+                timer.coalesced += 1
+            timer.pending_fires = 1
+        elif timer.pending_fires < self.max_queued_fires:
+            timer.queued += 1
+            timer.pending_fires += 1
+        else:
+            timer.skipped += 1
+
+    def _run(self, timer):
+        timer.running = True
+        timer.fires += 1
+        started_at = time.time()
+        d = maybeDeferred(timer.timer_class.fire, self.protocol)
+        d.addErrback(self._on_failure, timer)
+        d.addBoth(self._on_finished, timer, started_at)
+
+    def _on_failure(self, failure, timer):
+        timer.failures += 1
+        print "Timer %s failed:" % timer.name
+        failure.printTraceback()
+
+    def _on_finished(self, _, timer, started_at):
+        timer.running = False
+        timer.run_durations.record(time.time() - started_at)
+        if timer.pending_fires and not timer.stopped:
+            timer.pending_fires -= 1
+            self._run(timer)
+
+    def get_stats(self):
+        """
+        :rtype: dict
+        :returns: Timer names mapped to dicts of their stats.
+        """
+
+        stats = {}
+        for timer in self.timers:
+            stats[timer.name] = {
+                'interval': timer.interval,
+                'overrun_policy': timer.overrun_policy,
+                'running': timer.running,
+                'fires': timer.fires,
+                'skipped': timer.skipped,
+                'coalesced': timer.coalesced,
+                'queued': timer.queued,
+                'failures': timer.failures,
+                'mean_run_ms': timer.run_durations.mean_ms,
+                'max_run_ms': timer.run_durations.max_secs * 1000.0,
+                'max_lateness_ms': timer.max_lateness_secs * 1000.0,
+            }
+        return stats
+
+    def format_report(self):
+        """
+        :rtype: list
+        :returns: A list of report lines, one per timer.
+        """
+
+        lines = [
+            "%-28s %6s %6s %6s %8s %8s %8s" % (
+                'Timer', 'Fires', 'Skip', 'Queue', 'Mean ms', 'p99 ms',
+                'Late ms'),
+        ]
+        for timer in sorted(self.timers, key=lambda timer: timer.name):
+            lines.append("%-28s %6d %6d %6d %8.1f %8.0f %8.1f" % (
+                timer.name[:28], timer.fires, timer.skipped,
+                timer.queued + timer.coalesced, timer.run_durations.mean_ms,
+                timer.run_durations.percentile_ms(99),
+                timer.max_lateness_secs * 1000.0))
+        return lines
@@ -4,7 +4,8 @@ Timers are things that happen indefinitely on a pre-determined schedule.
 
 from txscheduling.cron import CronSchedule
 from txscheduling.task import ScheduledCall
-from twisted.internet.task import LoopingCall
+
+from battlesnake.core.timer_scheduler import OVERRUN_SKIP
 
 
 class TimerTable(object):
@@ -40,12 +41,13 @@ class TimerTable(object):
     def _register_interval_timer(self, timer_class):
         """
         Registers an IntervalTimer sub-class. These fire on intervals
-        measured in seconds.
+        measured in seconds, from the protocol's shared
+        :py:class:`TimerScheduler <battlesnake.core.timer_scheduler.TimerScheduler>`.
         """
 
-        lc = LoopingCall(timer_class.fire, self.protocol)
-        run_now = timer_class.run_after_registration
-        lc.start(timer_class.interval, now=run_now)
+        timer = self.protocol.timer_scheduler.add_timer(
+            timer_class, run_now=timer_class.run_after_registration)
+        self._timers.append(timer)
 
     def _register_crontab_timer(self, timer_class):
         """
@@ -90,11 +92,12 @@ class BaseTimer(object):
         if cls.pause_when_bot_is_disconnected and protocol.transport is None:
             return
         t = cls()
-        t.run(protocol)
+        return t.run(protocol)
 
     def run(self, protocol):
         """
-        This is called when the Timer is fired.
+        This is called when the Timer is fired. If this returns a Deferred,
+        the timer is considered to be running until it fires.
 
         :param BattlesnakeTelnetProtocol protocol: A reference back to the
             top level telnet protocol instance.
@@ -122,6 +125,10 @@ class IntervalTimer(BaseTimer):
 
     # An interval int in seconds.
     interval = None
+    # What to do if the timer comes due while its last run's Deferred
+    # hasn't fired yet. One of the OVERRUN_* constants from
+    # battlesnake.core.timer_scheduler.
+    overrun_policy = OVERRUN_SKIP
     # If this is True, the timer is ran immediately following registration.
     # If your timer requires interacting with the MUX, don't set this, as
     # registration happens before the bot connects to the game.
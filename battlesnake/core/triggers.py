@@ -4,6 +4,10 @@ they can be matched and fired repeatedly. They also don't use deferreds,
 and instead run the callback function directly.
 """
 
+import re
+import sre_parse
+import sre_constants
+
 
 class TriggerTable(object):
     """
@@ -48,6 +52,270 @@ class TriggerTable(object):
             return trigger, match
 
 
+class TriggerEngine(object):
+    """
+    Matches lines against all of the triggers in a list of TriggerTables.
+    The telnet protocol builds one of these once the plugins are loaded.
+    Semantics are the same as trying each table's
+    :py:meth:`TriggerTable.match_line` in turn: the first trigger (in table
+    order) to match wins.
+
+    Rather than running every trigger's regex against every line, we:
+
+    * Skip triggers whose literal prefilter (declared or derived from the
+      regex) doesn't appear in the line. All of the prefilters are checked
+      at once with a single regex search.
+    * Fold the triggers without a prefilter into one combined regex, which
+      tells us in one search whether any of them can match, and which one
+      matches first.
+
+    Lines that don't match anything (the vast majority) cost two searches,
+    no matter how many triggers are registered.
+    """
+
+    def __init__(self, trigger_tables):
+        """
+        :param list trigger_tables: A list of TriggerTable instances.
+        """
+
+        self._entries = []
+        for trigger_table in trigger_tables:
+            for trigger in trigger_table._triggers:
+                self._entries.append(_TriggerEntry(trigger))
+
+        prefilters = set([entry.prefilter for entry in self._entries
+                          if entry.prefilter is not None])
+        if prefilters:
+            self._prefilter_gate = re.compile(
+                '|'.join(re.escape(prefilter) for prefilter in prefilters))
+        else:
+            self._prefilter_gate = None
+
+        self._combined_regex, self._combined_positions = \
+            self._compile_combined_regex()
+        # If any triggers have neither a prefilter nor a spot in the combined
+        # regex, we can't rule out a match without running them.
+        self._has_unfiltered_entries = any(
+            entry.prefilter is None and not entry.combined
+            for entry in self._entries)
+
+    def _compile_combined_regex(self):
+        """
+        Builds an alternation of all of the combinable triggers without
+        prefilters. Each alternative is wrapped in a group so we can tell
+        which trigger matched.
+
+        :rtype: tuple
+        :returns: A tuple in the form of (compiled regex or None, dict mapping
+            the combined regex's group numbers to entry positions).
+        """
+
+        alternatives = []
+        positions = {}
+        for position, entry in enumerate(self._entries):
+            if entry.prefilter is not None or entry.combinable_pattern is None:
+                continue
+            alternatives.append((position, entry))
+
+        if not alternatives:
+            return None, {}
+
+        pattern_parts = []
+        for position, entry in alternatives:
+            pattern_parts.append('(?P<_trigger%d>%s)' % (
+                position, entry.combinable_pattern))
+        try:
+            combined_regex = re.compile('|'.join(pattern_parts))
+        except (re.error, AssertionError, OverflowError):
+            # Too many groups, or something else we didn't anticipate.
+            # The triggers still work, just individually.
+            return None, {}
+
+        for position, entry in alternatives:
+            entry.combined = True
+            group_num = combined_regex.groupindex['_trigger%d' % position]
+            positions[group_num] = position
+        return combined_regex, positions
+
+    def match_line(self, line):
+        """
+        Given a line read by the upstream protocol, see if it matches any
+        of the triggers. If so, return the trigger and the re.MatchGroup.
+
+        :param basestring line: The line read by the protocol.
+        :rtype: tuple or None
+        :returns: If a match was found, return a tuple in the form of
+            (Trigger instance, re.MatchGroup). If no match was found,
+            return None instead.
+        """
+
+        prefilter_hit = self._prefilter_gate is not None and \
+            self._prefilter_gate.search(line) is not None
+        # The position of the first combined trigger known to match.
+        combined_hit = None
+        if self._combined_regex is not None:
+            combined_match = self._combined_regex.search(line)
+            if combined_match:
+                combined_hit = self._combined_positions[combined_match.lastindex]
+
+        if not prefilter_hit and combined_hit is None and \
+                not self._has_unfiltered_entries:
+            return None
+
+        # Something might match. Go through the triggers in order, since an
+        # earlier one could match further along in the line than the one
+        # the combined regex found. We never get past combined_hit, since
+        # that trigger is known to match.
+        for entry in self._entries:
+            if entry.combined:
+                if combined_hit is None:
+                    continue
+            elif entry.prefilter is not None:
+                if not prefilter_hit or entry.prefilter not in line:
+                    continue
+            match = entry.regex.search(line)
+            if match:
+                return entry.trigger, match
+
+
+class _TriggerEntry(object):
+    """
+    A trigger, plus everything TriggerEngine figured out about its regex.
+    """
+
+    def __init__(self, trigger):
+        self.trigger = trigger
+        self.regex = trigger.line_regex
+        if trigger.line_prefilter is not None:
+            self.prefilter = trigger.line_prefilter
+        else:
+            self.prefilter = derive_required_literal(self.regex)
+        self.combinable_pattern = get_combinable_pattern(self.regex)
+        # Set by TriggerEngine if this trigger ends up in the combined regex.
+        self.combined = False
+
+
+# Anything below this length isn't worth bothering with as a prefilter.
+MIN_PREFILTER_LENGTH = 2
+_DEFAULT_REGEX_FLAGS = re.compile('').flags
+_NAMED_GROUP_RE = re.compile(r'(?<!\\)\(\?P<[A-Za-z_]\w*>')
+_LEADING_WILDCARD_RE = re.compile(r'^\.\*\??')
+
+
+def _iter_parsed_ops(parsed):
+    """
+    Recursively iterates over all (opcode, argument) pairs in a parsed
+    regex, including those nested in groups, branches, and repeats.
+    """
+
+    for op, av in parsed:
+        yield op, av
+        if op == sre_constants.SUBPATTERN:
+            # The sub-pattern is always the last item, though the number of
+            # items before it differs between Python versions.
+            for nested in _iter_parsed_ops(av[-1]):
+                yield nested
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            for nested in _iter_parsed_ops(av[2]):
+                yield nested
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                for nested in _iter_parsed_ops(branch):
+                    yield nested
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            for nested in _iter_parsed_ops(av[1]):
+                yield nested
+
+
+def _literal_runs(parsed):
+    """
+    Finds the runs of literal characters that any match of the parsed regex
+    must contain. Only looks at the top level and at groups, since
+    anything inside a branch or repeat is optional.
+
+    :rtype: list
+    :returns: A list of literal strings.
+    """
+
+    runs = []
+    current_run = []
+    for op, av in parsed:
+        if op == sre_constants.LITERAL:
+            current_run.append(unichr(av) if av > 255 else chr(av))
+            continue
+        if current_run:
+            runs.append(''.join(current_run))
+            current_run = []
+        if op == sre_constants.SUBPATTERN:
+            runs.extend(_literal_runs(av[-1]))
+    if current_run:
+        runs.append(''.join(current_run))
+    return runs
+
+
+def derive_required_literal(regex):
+    """
+    Tries to find a literal string that must appear in every line the given
+    regex matches. Searching for this with ``in`` is a lot cheaper than
+    running the regex.
+
+    :param regex: A compiled regular expression.
+    :rtype: str or None
+    :returns: The longest required literal, or None if we couldn't find one
+        worth using.
+    """
+
+    if regex.flags & re.IGNORECASE:
+        return None
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except (re.error, sre_constants.error):
+        return None
+
+    runs = _literal_runs(parsed)
+    if not runs:
+        return None
+    longest = max(runs, key=len)
+    if len(longest) < MIN_PREFILTER_LENGTH:
+        return None
+    return longest
+
+
+def get_combinable_pattern(regex):
+    """
+    Rewrites a trigger's regex so that it can be safely dropped into a
+    larger alternation: named groups are made anonymous (so names can't
+    clash between triggers) and a leading ``.*`` is removed, since it only
+    makes the search slower without changing whether there is a match.
+
+    :param regex: A compiled regular expression.
+    :rtype: str or None
+    :returns: The rewritten pattern, or None if this regex can't be combined.
+        Patterns with back-references or non-default flags can't be.
+    """
+
+    if regex.flags != _DEFAULT_REGEX_FLAGS:
+        return None
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except (re.error, sre_constants.error):
+        return None
+    for op, _ in _iter_parsed_ops(parsed):
+        if op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            return None
+
+    pattern = _NAMED_GROUP_RE.sub('(', regex.pattern)
+    pattern = _LEADING_WILDCARD_RE.sub('', pattern)
+    # Make sure the rewrite didn't mangle anything.
+    try:
+        rewritten = re.compile(pattern)
+    except re.error:
+        return None
+    if rewritten.groupindex or rewritten.groups != regex.groups:
+        return None
+    return pattern
+
+
 class Trigger(object):
     """
     Encapsulates everything needed to match a line of output to a particular
@@ -56,6 +324,10 @@ class Trigger(object):
 
     # This must be set to a compiled regexp in your sub-class.
     line_regex = None
+    # An optional literal string that must appear in every line this trigger
+    # matches. Lines without it are skipped without running line_regex. If
+    # this is left as None, we'll try to work one out from line_regex.
+    line_prefilter = None
 
     def run(self, protocol, line, re_match):
         """
@@ -8,6 +8,8 @@ another module.
 
 import uuid
 import math
+import random
+import itertools
 
 from battlesnake.core.ansi import remove_ansi_codes, ANSI_HI_YELLOW, \
     ANSI_HI_BLUE, ANSI_NORMAL
@@ -62,6 +64,44 @@ def generate_unique_token():
     return uuid.uuid4().hex
 
 
+# Lower-case alphanumerics make it through MUX evaluation unaltered.
+COMPACT_TOKEN_ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyz'
+# A per-process salt keeps us from matching responses left over from a
+# previous bot session.
+COMPACT_TOKEN_SALT_LENGTH = 4
+COMPACT_TOKEN_COUNTER_LENGTH = 6
+# All compact tokens are exactly this long. Response watchers rely on this
+# to pull the token off the front of a line with a single slice.
+COMPACT_TOKEN_LENGTH = COMPACT_TOKEN_SALT_LENGTH + COMPACT_TOKEN_COUNTER_LENGTH
+
+_compact_token_salt = ''.join(
+    random.choice(COMPACT_TOKEN_ALPHABET)
+    for _ in range(COMPACT_TOKEN_SALT_LENGTH))
+_compact_token_counter = itertools.count()
+
+
+def generate_compact_token():
+    """
+    Generates a short, fixed-length token that is unique within this
+    process (until the counter wraps after a couple billion tokens). These
+    are much cheaper to generate, send, and match than the tokens from
+    :py:func:`generate_unique_token`, which makes them a good fit for the
+    high volume response watchers.
+
+    :rtype: str
+    :returns: A token that is exactly ``COMPACT_TOKEN_LENGTH`` characters long.
+    """
+
+    alphabet = COMPACT_TOKEN_ALPHABET
+    base = len(alphabet)
+    counter = next(_compact_token_counter) % (base ** COMPACT_TOKEN_COUNTER_LENGTH)
+    digits = []
+    for _ in range(COMPACT_TOKEN_COUNTER_LENGTH):
+        counter, remainder = divmod(counter, base)
+        digits.append(alphabet[remainder])
+    return _compact_token_salt + ''.join(reversed(digits))
+
+
 def is_valid_dbref(dbref):
     """
     :param str dbref: The DBRef string to validate.
@@ -0,0 +1,12 @@
+"""
+A stand-in for BTMux, for exercising the bot without a live game. The fake
+MUX accepts the bot's login, evaluates a useful subset of softcode (including
+the btfuncs that the bot calls) against an in-memory world, and can inject
+latency and jitter into its responses.
+
+* :py:mod:`battlesnake.fake_mux.world` - Objects, attributes, flags, and
+  XCODE values.
+* :py:mod:`battlesnake.fake_mux.softcode` - The softcode evaluator.
+* :py:mod:`battlesnake.fake_mux.server` - The Twisted server that the bot
+  connects to.
+"""
@@ -0,0 +1,393 @@
+"""
+The fake MUX's network side. The bot connects to this just like it would to
+a real MUX: it sees a login banner, sends its credentials, and from then on
+every line it sends is ran as a command.
+
+Commands can be delayed to simulate a laggy game. Each command waits
+``latency`` seconds, give or take up to ``jitter`` seconds, before it runs.
+Commands always run in the order that they were received, like they would
+on the real thing. ``command_cost`` makes every command occupy the (single
+threaded) server for a while, so that a flood of commands backs up.
+``connection_cost`` does the same per connection, like the real thing's
+per-connection command quota: each connection's commands are worked through
+one at a time, but other connections' commands don't wait on them.
+"""
+
+import re
+import random
+
+from twisted.internet import reactor
+from twisted.internet.protocol import ServerFactory
+from twisted.protocols.basic import LineReceiver
+
+from battlesnake.fake_mux.softcode import EvalContext, evaluate
+from battlesnake.fake_mux.world import TYPE_PLAYER
+
+BANNER = [
+    "Welcome to the fake BattletechMUX.",
+    'Use "connect <name> <password>" to connect, or "QUIT" to disconnect.',
+]
+CONNECT_RE = re.compile(r'^connect\s+(?:"([^"]+)"|(\S+))\s+(.*)$', re.I)
+HUH_MESSAGE = 'Huh?  (Type "help" for help.)'
+# Command aliases, mapped to the command that they stand in for.
+COMMAND_ALIASES = {
+    '@fo': '@force',
+    '@dest': '@destroy',
+}
+
+
+class FakeMuxProtocol(LineReceiver):
+    """
+    A single connection to the fake MUX.
+    """
+
+    # Clients may end their lines with either '\n' or '\r\n'. We always
+    # send '\r\n', like the real thing.
+    delimiter = '\n'
+
+    def sendLine(self, line):
+        self.transport.write(line + '\r\n')
+
+    def connectionMade(self):
+        self.player = None
+        # When the last command we scheduled is going to run.
+        self._last_run_at = 0.0
+        for line in BANNER:
+            self.sendLine(line)
+
+    def connectionLost(self, reason):
+        self.connected = 0
+        if self.player is not None:
+            self.factory.world.connected_players.pop(self.player.dbref, None)
+
+    def lineReceived(self, line):
+        self.factory.schedule_command(self, line.rstrip('\r'))
+
+    def send_output(self, output):
+        """
+        Sends command output, which may span multiple lines.
+        """
+
+        for line in output.split('\r\n'):
+            self.sendLine(line)
+
+    def run_command(self, line):
+        """
+        Runs a single command from the client.
+
+        :param str line: The command to run.
+        """
+
+        self.factory.commands_ran += 1
+        if self.player is None:
+            self._handle_login(line)
+            return
+
+        command, _, args = line.partition(' ')
+        command, _, switches = command.lower().partition('/')
+        command = COMMAND_ALIASES.get(command, command)
+        handler = COMMAND_HANDLERS.get(command)
+        if handler is None:
+            self.sendLine(HUH_MESSAGE)
+            return
+        self.factory.command_counts[command] = \
+            self.factory.command_counts.get(command, 0) + 1
+        output = handler(self, args, switches)
+        if output is not None:
+            self.send_output(output)
+
+    def _handle_login(self, line):
+        if line.strip().upper() == 'QUIT':
+            self.transport.loseConnection()
+            return
+        match = CONNECT_RE.match(line)
+        if not match:
+            self.sendLine("Please connect first.")
+            return
+        name = match.group(1) or match.group(2)
+        password = match.group(3).strip()
+        accounts = self.factory.accounts
+        if accounts is not None and accounts.get(name) != password:
+            self.sendLine(
+                "Either that player does not exist, or has a different password.")
+            return
+
+        world = self.factory.world
+        self.player = world.find_player(name)
+        if self.player is None:
+            self.player = world.create_object(
+                name, TYPE_PLAYER, location=world.get_object('#0'))
+        world.connected_players[self.player.dbref] = self.sendLine
+        self.sendLine("Connected.")
+
+    def evaluate(self, text):
+        """
+        :param str text: Softcode to evaluate as our player.
+        :rtype: str
+        """
+
+        return evaluate(text, EvalContext(self.factory.world, self.player))
+
+    def _split_assignment(self, args):
+        """
+        :rtype: tuple
+        :returns: A tuple in the form of (object, right hand side). The
+            object is None if the left hand side doesn't match anything.
+        """
+
+        lhs, _, rhs = args.partition('=')
+        return self.factory.world.match_object(lhs, self.player), rhs
+
+    #
+    ## Command handlers. Each of these returns its output (or None).
+
+    def cmd_think(self, args, switches):
+        return self.evaluate(args)
+
+    def cmd_say(self, args, switches):
+        return 'You say, "%s"' % self.evaluate(args)
+
+    def cmd_idle(self, args, switches):
+        return None
+
+    def cmd_quit(self, args, switches):
+        self.transport.loseConnection()
+
+    def cmd_set(self, args, switches):
+        obj, value = self._split_assignment(args)
+        if obj is None:
+            return "I don't see that here."
+        if ':' in value:
+            attr_name, attr_value = value.split(':', 1)
+            obj.set_attr(attr_name.strip(), attr_value)
+        elif value.startswith('!'):
+            obj.flags.discard(value[1:].strip().upper())
+        else:
+            obj.flags.add(value.strip().upper())
+        return "Set."
+
+    def cmd_pemit(self, args, switches):
+        targets, _, message = args.partition('=')
+        world = self.factory.world
+        message = self.evaluate(message)
+        for target_name in targets.split():
+            target = world.match_object(target_name, self.player)
+            if target is not None:
+                world.notify(target, message)
+
+    def cmd_remit(self, args, switches):
+        room, message = self._split_assignment(args)
+        if room is None:
+            return "I don't see that here."
+        message = self.evaluate(message)
+        for obj in room.contents:
+            self.factory.world.notify(obj, message)
+
+    def cmd_cemit(self, args, switches):
+        channel, _, message = args.partition('=')
+        self.factory.world.channel_emits.append(
+            (channel.strip(), self.evaluate(message)))
+
+    def cmd_force(self, args, switches):
+        obj, command = self._split_assignment(args)
+        if obj is None:
+            return "I don't see that here."
+        command = command.strip()
+        if command.startswith('{') and command.endswith('}'):
+            command = command[1:-1]
+        if obj is self.player:
+            self.run_command(command)
+        else:
+            # We don't simulate AIs or players, so keep track of what they
+            # were told to do instead.
+            obj.forced_commands.append(command)
+
+    def cmd_dolist(self, args, switches):
+        # The real thing queues these. Running them right away is fine for
+        # our purposes, since framed responses don't care about ordering.
+        raw_list, _, command = args.partition('=')
+        items = self.evaluate(raw_list).split()
+        command = command.strip()
+        if command.startswith('{') and command.endswith('}'):
+            command = command[1:-1]
+        for position, item in enumerate(items, start=1):
+            self.run_command(
+                command.replace('##', item).replace('#@', str(position)))
+
+    def cmd_trigger(self, args, switches):
+        obj_attr, _, params = args.partition('=')
+        obj_name, _, attr_name = obj_attr.partition('/')
+        obj = self.factory.world.match_object(obj_name, self.player)
+        if obj is None:
+            return "I don't see that here."
+        self.factory.world.triggers.append(
+            (obj.dbref, attr_name.strip().upper(), params))
+        return "Triggered."
+
+    def cmd_startup(self, args, switches):
+        obj, value = self._split_assignment(args)
+        if obj is None:
+            return "I don't see that here."
+        obj.set_attr('STARTUP', value)
+        return "Set."
+
+    def cmd_mechdesc(self, args, switches):
+        obj, value = self._split_assignment(args)
+        if obj is None:
+            return "I don't see that here."
+        obj.set_attr('MECHDESC', self.evaluate(value))
+        return "Set."
+
+    def cmd_lock(self, args, switches):
+        obj, value = self._split_assignment(args)
+        if obj is None:
+            return "I don't see that here."
+        obj.locks[switches or 'default'] = value
+        return "Locked."
+
+    def cmd_link(self, args, switches):
+        obj, target = self._split_assignment(args)
+        target = self.factory.world.match_object(target, self.player)
+        if obj is None or target is None:
+            return "I don't see that here."
+        obj.link = target
+        return "Linked."
+
+    def cmd_parent(self, args, switches):
+        obj, parent = self._split_assignment(args)
+        parent = self.factory.world.match_object(parent, self.player)
+        if obj is None or parent is None:
+            return "I don't see that here."
+        obj.parent = parent
+        return "Parent set."
+
+    def cmd_chzone(self, args, switches):
+        obj, zone = self._split_assignment(args)
+        zone = self.factory.world.match_object(zone, self.player)
+        if obj is None or zone is None:
+            return "I don't see that here."
+        obj.zone = zone
+        return "Zone changed."
+
+    def cmd_name(self, args, switches):
+        obj, name = self._split_assignment(args)
+        if obj is None:
+            return "I don't see that here."
+        obj.name = self.evaluate(name)
+        return "Name set."
+
+    def cmd_destroy(self, args, switches):
+        obj = self.factory.world.match_object(args, self.player)
+        if obj is None:
+            return "I don't see that here."
+        self.factory.world.destroy_object(obj)
+        return "Destroyed."
+
+    def cmd_noop(self, args, switches):
+        """
+        Commands that we accept, but that don't do anything here.
+        """
+
+        return None
+
+
+COMMAND_HANDLERS = {
+    'think': FakeMuxProtocol.cmd_think,
+    'say': FakeMuxProtocol.cmd_say,
+    'idle': FakeMuxProtocol.cmd_idle,
+    'quit': FakeMuxProtocol.cmd_quit,
+    '@set': FakeMuxProtocol.cmd_set,
+    '@pemit': FakeMuxProtocol.cmd_pemit,
+    '@remit': FakeMuxProtocol.cmd_remit,
+    '@cemit': FakeMuxProtocol.cmd_cemit,
+    '@force': FakeMuxProtocol.cmd_force,
+    '@dolist': FakeMuxProtocol.cmd_dolist,
+    '@trigger': FakeMuxProtocol.cmd_trigger,
+    '@startup': FakeMuxProtocol.cmd_startup,
+    '@mechdesc': FakeMuxProtocol.cmd_mechdesc,
+    '@lock': FakeMuxProtocol.cmd_lock,
+    '@link': FakeMuxProtocol.cmd_link,
+    '@parent': FakeMuxProtocol.cmd_parent,
+    '@chzone': FakeMuxProtocol.cmd_chzone,
+    '@name': FakeMuxProtocol.cmd_name,
+    '@destroy': FakeMuxProtocol.cmd_destroy,
+    '@xtype': FakeMuxProtocol.cmd_noop,
+    '@drain': FakeMuxProtocol.cmd_noop,
+    '@notify': FakeMuxProtocol.cmd_noop,
+    '@newpassword': FakeMuxProtocol.cmd_noop,
+}
+
+
+class FakeMuxFactory(ServerFactory):
+    """
+    Holds the world and the latency settings that every connection shares.
+    """
+
+    protocol = FakeMuxProtocol
+
+    def __init__(self, world, latency=0.0, jitter=0.0, command_cost=0.0,
+                 connection_cost=0.0, accounts=None, clock=None, seed=None):
+        """
+        :param FakeWorld world: The world that commands run against.
+        :keyword float latency: How long (in seconds) each command waits
+            before running.
+        :keyword float jitter: Each command's wait varies by up to this many
+            seconds either way.
+        :keyword float command_cost: How long (in seconds) each command keeps
+            the server busy. Commands from all connections queue up behind
+            each other.
+        :keyword float connection_cost: How long (in seconds) each command
+            keeps its own connection busy. Only commands from the same
+            connection queue up behind each other.
+        :keyword dict accounts: Player names mapped to passwords. If None,
+            any name and password is let in.
+        :keyword clock: Something providing IReactorTime. Defaults to the
+            reactor, but tests will want to pass a task.Clock.
+        :keyword seed: Seeds the jitter, for repeatable runs.
+        """
+
+        self.world = world
+        self.latency = latency
+        self.jitter = jitter
+        self.command_cost = command_cost
+        self.connection_cost = connection_cost
+        self.accounts = accounts
+        self.clock = clock or reactor
+        self.random = random.Random(seed)
+        # When the server is done with the last command it scheduled.
+        self._busy_until = 0.0
+        # Stats.
+        self.commands_ran = 0
+        self.command_counts = {}
+
+    def schedule_command(self, protocol, line):
+        """
+        Runs a command once its simulated delay is up. Commands from a
+        connection never run out of order.
+
+        :param FakeMuxProtocol protocol: The connection the command came in on.
+        :param str line: The command.
+        """
+
+        if not self.latency and not self.jitter and not self.command_cost \
+                and not self.connection_cost:
+            protocol.run_command(line)
+            return
+
+        now = self.clock.seconds()
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.uniform(-self.jitter, self.jitter)
+        run_at = max(now + delay, protocol._last_run_at, self._busy_until)
+        protocol._last_run_at = run_at + self.connection_cost
+        self._busy_until = run_at + self.command_cost
+        self.clock.callLater(
+            max(0.0, run_at - now), self._run_if_connected, protocol, line)
+
+    def _run_if_connected(self, protocol, line):
+        if protocol.connected:
+            protocol.run_command(line)
+
+    def reset_stats(self):
+        self.commands_ran = 0
+        self.command_counts = {}
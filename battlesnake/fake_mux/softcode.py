@@ -0,0 +1,866 @@
+"""
+A small softcode evaluator for the fake MUX. It handles the parts of MUX
+evaluation that the bot relies on:
+
+* ``[...]`` function evaluation, including nested calls in arguments.
+* ``{...}`` grouping, which protects its contents from evaluation.
+* ``%`` substitutions (``%r``, ``%b``, ``%q0``, ``%0``, ``%#``, etc).
+  ANSI substitutions (``%ch``, ``%cn``, etc) are dropped.
+* ``\\`` escapes.
+* ``##`` and ``#@`` in iter().
+
+Functions are registered with :py:func:`softcode_function`. Anything that
+isn't registered evaluates to ``#-1 FUNCTION (NAME) NOT FOUND``, just like
+on the real thing.
+"""
+
+import re
+import fnmatch
+
+from battlesnake.fake_mux.world import CREATE_TYPES, TYPE_ROOM
+
+# Matches a function call at the start of an expression.
+FUNCTION_START_RE = re.compile(r'\s*([A-Za-z_][A-Za-z0-9_]*)\(')
+# Characters that mean something to the evaluator.
+SPECIAL_CHARS_RE = re.compile(r'[\[{%\\]')
+_CLOSERS = {'(': ')', '[': ']', '{': '}'}
+# Nested evaluation deeper than this is almost certainly a runaway u().
+MAX_EVAL_DEPTH = 50
+
+# Name -> (callable, min args, max args, lazy)
+FUNCTIONS = {}
+
+
+class EvalContext(object):
+    """
+    The state that an evaluation carries around.
+    """
+
+    def __init__(self, world, enactor, executor=None, args=None,
+                 registers=None):
+        """
+        :param FakeWorld world: The world to evaluate against.
+        :param MuxObject enactor: The object that caused the evaluation.
+            ``%#``.
+        :keyword MuxObject executor: The object doing the evaluating. ``%!``
+            and 'me'. Defaults to the enactor.
+        :keyword list args: ``%0`` through ``%9``.
+        :keyword dict registers: setq() registers. Shared with nested u()
+            calls, like on the real thing.
+        """
+
+        self.world = world
+        self.enactor = enactor
+        self.executor = executor or enactor
+        self.args = args or []
+        self.registers = registers if registers is not None else {}
+        self.depth = 0
+
+    def for_u(self, executor, args):
+        """
+        :rtype: EvalContext
+        :returns: A context for evaluating an attribute with u().
+        """
+
+        ctx = EvalContext(
+            self.world, self.enactor, executor=executor, args=args,
+            registers=self.registers)
+        ctx.depth = self.depth + 1
+        return ctx
+
+    def match(self, name):
+        """
+        :rtype: MuxObject or None
+        """
+
+        return self.world.match_object(name, self.executor)
+
+
+def softcode_function(name, min_args=0, max_args=None, lazy=False):
+    """
+    Registers a softcode function.
+
+    :param str name: The function's name. Case-insensitive.
+    :keyword int min_args: The fewest arguments the function accepts.
+    :keyword int max_args: The most arguments the function accepts.
+        None for no limit.
+    :keyword bool lazy: If True, the function is handed its arguments
+        unevaluated, and evaluates them itself (as needed).
+    """
+
+    def register(fn):
+        FUNCTIONS[name.upper()] = (fn, min_args, max_args, lazy)
+        return fn
+    return register
+
+
+def evaluate(text, ctx, check_function=True):
+    """
+    Evaluates a string of softcode.
+
+    :param str text: The softcode to evaluate.
+    :param EvalContext ctx: The evaluation context.
+    :keyword bool check_function: If True and ``text`` starts with a
+        function call, the call is evaluated. This is the case for the
+        contents of ``[]`` and for function arguments.
+    :rtype: str
+    """
+
+    if ctx.depth > MAX_EVAL_DEPTH:
+        return '#-1 TOO MANY LEVELS OF RECURSION'
+    out = []
+    pos = 0
+    if check_function:
+        match = FUNCTION_START_RE.match(text)
+        if match:
+            close = find_closing(text, match.end(), ')')
+            if close != -1:
+                out.append(call_function(
+                    match.group(1), split_args(text[match.end():close]), ctx))
+                pos = close + 1
+
+    length = len(text)
+    while pos < length:
+        special = SPECIAL_CHARS_RE.search(text, pos)
+        if special is None:
+            out.append(text[pos:])
+            break
+        start = special.start()
+        if start > pos:
+            out.append(text[pos:start])
+        char = text[start]
+        if char == '%':
+            sub, pos = _percent_substitution(text, start + 1, ctx)
+            out.append(sub)
+        elif char == '\\':
+            out.append(text[start + 1:start + 2])
+            pos = start + 2
+        else:
+            close = find_closing(text, start + 1, _CLOSERS[char])
+            if close == -1:
+                # Unbalanced, it's just text.
+                out.append(char)
+                pos = start + 1
+            elif char == '[':
+                ctx.depth += 1
+                out.append(evaluate(text[start + 1:close], ctx))
+                ctx.depth -= 1
+                pos = close + 1
+            else:
+                # Braces protect their contents from evaluation.
+                out.append(text[start + 1:close])
+                pos = close + 1
+    return ''.join(out)
+
+
+def find_closing(text, start, closer):
+    """
+    Finds the character that closes a group, skipping over any nested groups
+    and escaped characters along the way.
+
+    :param str text: The text to search.
+    :param int start: The index just after the group's opening character.
+    :param str closer: The character that closes the group.
+    :rtype: int
+    :returns: The closing character's index, or -1 if the group is never
+        closed.
+    """
+
+    stack = []
+    pos = start
+    length = len(text)
+    while pos < length:
+        char = text[pos]
+        if char == '\\' or char == '%':
+            pos += 2
+            continue
+        if stack:
+            if char == stack[-1]:
+                stack.pop()
+            elif char in _CLOSERS and stack[-1] != '}':
+                # Nothing but braces count inside of braces.
+                stack.append(_CLOSERS[char])
+            elif char == '{':
+                stack.append('}')
+        elif char == closer:
+            return pos
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        pos += 1
+    return -1
+
+
+def split_args(text, delimiter=','):
+    """
+    Splits a function's arguments up on top-level delimiters.
+
+    :param str text: Everything between the function's parenthesis.
+    :keyword str delimiter: The argument delimiter.
+    :rtype: list
+    :returns: The unevaluated arguments.
+    """
+
+    if not text.strip():
+        return []
+    args = []
+    start = 0
+    while True:
+        end = find_closing(text, start, delimiter)
+        if end == -1:
+            args.append(text[start:])
+            return args
+        args.append(text[start:end])
+        start = end + 1
+
+
+def call_function(name, raw_args, ctx):
+    """
+    Calls a softcode function.
+
+    :param str name: The function's name.
+    :param list raw_args: The function's unevaluated arguments.
+    :param EvalContext ctx: The evaluation context.
+    :rtype: str
+    """
+
+    name = name.upper()
+    registered = FUNCTIONS.get(name)
+    if registered is None:
+        return '#-1 FUNCTION (%s) NOT FOUND' % name
+    fn, min_args, max_args, lazy = registered
+    num_args = len(raw_args)
+    if num_args < min_args or (max_args is not None and num_args > max_args):
+        if min_args == max_args:
+            return '#-1 FUNCTION (%s) EXPECTS %d ARGUMENTS' % (name, min_args)
+        elif max_args is None:
+            return '#-1 FUNCTION (%s) EXPECTS AT LEAST %d ARGUMENTS' % (
+                name, min_args)
+        return '#-1 FUNCTION (%s) EXPECTS BETWEEN %d AND %d ARGUMENTS' % (
+            name, min_args, max_args)
+    if lazy:
+        args = raw_args
+    else:
+        args = [evaluate_arg(arg, ctx) for arg in raw_args]
+    return fn(ctx, *args)
+
+
+def evaluate_arg(raw_arg, ctx):
+    """
+    Evaluates a single function argument. Leading and trailing whitespace
+    is trimmed first.
+    """
+
+    ctx.depth += 1
+    try:
+        return evaluate(raw_arg.strip(), ctx)
+    finally:
+        ctx.depth -= 1
+
+
+def _percent_substitution(text, pos, ctx):
+    """
+    :param str text: The text being evaluated.
+    :param int pos: The index just after the '%'.
+    :rtype: tuple
+    :returns: A tuple in the form of (substitution, next index).
+    """
+
+    code = text[pos:pos + 1]
+    lowered = code.lower()
+    if lowered == 'r':
+        return '\r\n', pos + 1
+    elif lowered == 'b':
+        return ' ', pos + 1
+    elif lowered == 't':
+        return '\t', pos + 1
+    elif code == '#':
+        return ctx.enactor.dbref, pos + 1
+    elif code == '!':
+        return ctx.executor.dbref, pos + 1
+    elif lowered == 'n':
+        return ctx.enactor.name, pos + 1
+    elif code.isdigit():
+        index = int(code)
+        return (ctx.args[index] if index < len(ctx.args) else ''), pos + 1
+    elif lowered == 'q':
+        register = text[pos + 1:pos + 2].lower()
+        return ctx.registers.get(register, ''), pos + 2
+    elif lowered == 'c' or lowered == 'x':
+        # ANSI. We don't do colors.
+        return '', pos + 2
+    return code, pos + 1
+
+
+#
+## Helpers.
+
+def is_true(value):
+    """
+    :param str value: A softcode value.
+    :rtype: bool
+    :returns: Whether MUX considers ``value`` to be true.
+    """
+
+    value = value.strip()
+    if not value or value.startswith('#-'):
+        return False
+    try:
+        return float(value) != 0
+    except ValueError:
+        return True
+
+
+def to_number(value):
+    """
+    :rtype: int or float
+    :returns: ``value`` as a number. Anything non-numeric is 0.
+    """
+
+    value = value.strip()
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return 0
+
+
+def format_number(value):
+    """
+    :rtype: str
+    :returns: ``value`` formatted the way MUX formats numbers, without
+        trailing zeroes.
+    """
+
+    if isinstance(value, float):
+        if value == int(value):
+            return str(int(value))
+        return ('%.6f' % value).rstrip('0')
+    return str(value)
+
+
+def split_list(value, delimiter=None):
+    """
+    Splits a softcode list. Space-delimited lists ignore extra spaces.
+    """
+
+    if not delimiter or delimiter == ' ':
+        return value.split()
+    if not value:
+        return []
+    return value.split(delimiter)
+
+
+def split_obj_attr(value):
+    """
+    :param str value: An 'obj/attr' string.
+    :rtype: tuple
+    :returns: A tuple in the form of (obj, attr). If there's no slash,
+        obj is None.
+    """
+
+    if '/' not in value:
+        return None, value.strip()
+    obj, attr = value.split('/', 1)
+    return obj.strip(), attr.strip()
+
+
+def _get_attr(ctx, obj_attr):
+    """
+    :rtype: tuple
+    :returns: A tuple in the form of (object, attribute value). The object
+        is None if it couldn't be found.
+    """
+
+    obj_name, attr_name = split_obj_attr(obj_attr)
+    obj = ctx.executor if obj_name is None else ctx.match(obj_name)
+    if obj is None:
+        return None, None
+    return obj, obj.get_attr(attr_name)
+
+
+def _bool(value):
+    return '1' if value else '0'
+
+
+def _parse_xcode_value(value):
+    """
+    XCODE values are typed. Numbers are stored as numbers, everything else
+    as a string.
+    """
+
+    value = value.strip()
+    for value_type in (int, float):
+        try:
+            return value_type(value)
+        except ValueError:
+            pass
+    return value
+
+
+#
+## Control flow and registers.
+
+@softcode_function('iter', min_args=2, max_args=4, lazy=True)
+def fn_iter(ctx, raw_list, raw_expr, raw_delim=' ', raw_osep=None):
+    delim = evaluate_arg(raw_delim, ctx) or ' '
+    osep = ' ' if raw_osep is None else evaluate_arg(raw_osep, ctx)
+    items = split_list(evaluate_arg(raw_list, ctx), delim)
+    raw_expr = raw_expr.strip()
+    results = []
+    for position, item in enumerate(items, start=1):
+        expr = raw_expr.replace('##', item).replace('#@', str(position))
+        results.append(evaluate_arg(expr, ctx))
+    return osep.join(results)
+
+
+@softcode_function('if', min_args=2, max_args=3, lazy=True)
+def fn_if(ctx, raw_cond, raw_true, raw_false=''):
+    if is_true(evaluate_arg(raw_cond, ctx)):
+        return evaluate_arg(raw_true, ctx)
+    return evaluate_arg(raw_false, ctx)
+
+FUNCTIONS['IFELSE'] = FUNCTIONS['IF']
+
+
+@softcode_function('switch', min_args=3, lazy=True)
+def fn_switch(ctx, raw_value, *raw_cases):
+    value = evaluate_arg(raw_value, ctx)
+    for index in range(0, len(raw_cases) - 1, 2):
+        pattern = evaluate_arg(raw_cases[index], ctx)
+        if fnmatch.fnmatch(value.lower(), pattern.lower()):
+            return evaluate_arg(raw_cases[index + 1], ctx)
+    if len(raw_cases) % 2:
+        return evaluate_arg(raw_cases[-1], ctx)
+    return ''
+
+
+@softcode_function('setq', min_args=2, max_args=2)
+def fn_setq(ctx, register, value):
+    ctx.registers[register.lower()] = value
+    return ''
+
+
+@softcode_function('setr', min_args=2, max_args=2)
+def fn_setr(ctx, register, value):
+    ctx.registers[register.lower()] = value
+    return value
+
+
+@softcode_function('r', min_args=1, max_args=1)
+def fn_r(ctx, register):
+    return ctx.registers.get(register.lower(), '')
+
+
+@softcode_function('u', min_args=1)
+def fn_u(ctx, obj_attr, *args):
+    obj, value = _get_attr(ctx, obj_attr)
+    if obj is None:
+        return '#-1 NO MATCH'
+    if not value:
+        return ''
+    return evaluate(value, ctx.for_u(obj, list(args)))
+
+
+@softcode_function('filter', min_args=2, max_args=3)
+def fn_filter(ctx, obj_attr, items, delim=' '):
+    obj, value = _get_attr(ctx, obj_attr)
+    if obj is None:
+        return '#-1 NO MATCH'
+    kept = [
+        item for item in split_list(items, delim)
+        if value and evaluate(value, ctx.for_u(obj, [item])).strip() == '1']
+    return (delim or ' ').join(kept)
+
+
+#
+## Math and logic.
+
+@softcode_function('add', min_args=1)
+def fn_add(ctx, *values):
+    return format_number(sum(to_number(value) for value in values))
+
+
+@softcode_function('sub', min_args=2, max_args=2)
+def fn_sub(ctx, value1, value2):
+    return format_number(to_number(value1) - to_number(value2))
+
+
+@softcode_function('mul', min_args=1)
+def fn_mul(ctx, *values):
+    product = 1
+    for value in values:
+        product *= to_number(value)
+    return format_number(product)
+
+
+@softcode_function('eq', min_args=2, max_args=2)
+def fn_eq(ctx, value1, value2):
+    return _bool(to_number(value1) == to_number(value2))
+
+
+@softcode_function('neq', min_args=2, max_args=2)
+def fn_neq(ctx, value1, value2):
+    return _bool(to_number(value1) != to_number(value2))
+
+
+@softcode_function('gt', min_args=2, max_args=2)
+def fn_gt(ctx, value1, value2):
+    return _bool(to_number(value1) > to_number(value2))
+
+
+@softcode_function('gte', min_args=2, max_args=2)
+def fn_gte(ctx, value1, value2):
+    return _bool(to_number(value1) >= to_number(value2))
+
+
+@softcode_function('lt', min_args=2, max_args=2)
+def fn_lt(ctx, value1, value2):
+    return _bool(to_number(value1) < to_number(value2))
+
+
+@softcode_function('lte', min_args=2, max_args=2)
+def fn_lte(ctx, value1, value2):
+    return _bool(to_number(value1) <= to_number(value2))
+
+
+@softcode_function('t', min_args=1, max_args=1)
+def fn_t(ctx, value):
+    return _bool(is_true(value))
+
+
+@softcode_function('not', min_args=1, max_args=1)
+def fn_not(ctx, value):
+    return _bool(not is_true(value))
+
+
+@softcode_function('and', min_args=1)
+def fn_and(ctx, *values):
+    return _bool(all(is_true(value) for value in values))
+
+
+@softcode_function('or', min_args=1)
+def fn_or(ctx, *values):
+    return _bool(any(is_true(value) for value in values))
+
+
+#
+## Strings and lists.
+
+@softcode_function('strlen', min_args=1, max_args=1)
+def fn_strlen(ctx, value):
+    return str(len(value))
+
+
+@softcode_function('strmatch', min_args=2, max_args=2)
+def fn_strmatch(ctx, value, pattern):
+    return _bool(fnmatch.fnmatch(value.lower(), pattern.lower()))
+
+
+@softcode_function('comp', min_args=2, max_args=2)
+def fn_comp(ctx, value1, value2):
+    return str(cmp(value1, value2))
+
+
+@softcode_function('space', min_args=0, max_args=1)
+def fn_space(ctx, count='1'):
+    return ' ' * max(0, int(to_number(count)))
+
+
+@softcode_function('ljust', min_args=2, max_args=3)
+def fn_ljust(ctx, value, width, fill=' '):
+    return value.ljust(int(to_number(width)), fill[:1] or ' ')
+
+
+@softcode_function('rjust', min_args=2, max_args=3)
+def fn_rjust(ctx, value, width, fill=' '):
+    return value.rjust(int(to_number(width)), fill[:1] or ' ')
+
+
+@softcode_function('cat', min_args=0)
+def fn_cat(ctx, *values):
+    return ' '.join(values)
+
+
+@softcode_function('words', min_args=0, max_args=2)
+def fn_words(ctx, items='', delim=' '):
+    return str(len(split_list(items, delim)))
+
+
+@softcode_function('first', min_args=0, max_args=2)
+def fn_first(ctx, items='', delim=' '):
+    items = split_list(items, delim)
+    return items[0] if items else ''
+
+
+@softcode_function('rest', min_args=0, max_args=2)
+def fn_rest(ctx, items='', delim=' '):
+    return (delim or ' ').join(split_list(items, delim)[1:])
+
+
+@softcode_function('member', min_args=2, max_args=3)
+def fn_member(ctx, items, item, delim=' '):
+    items = split_list(items, delim)
+    return str(items.index(item) + 1) if item in items else '0'
+
+
+@softcode_function('setdiff', min_args=2, max_args=3)
+def fn_setdiff(ctx, items1, items2, delim=' '):
+    exclude = set(split_list(items2, delim))
+    result = sorted(set(split_list(items1, delim)) - exclude)
+    return (delim or ' ').join(result)
+
+
+#
+## Objects.
+
+@softcode_function('create', min_args=1, max_args=3)
+def fn_create(ctx, name, cost='', otype='t'):
+    otype = CREATE_TYPES.get(otype.strip().lower()[:1] or 't')
+    if otype is None:
+        return '#-1 INVALID TYPE'
+    location = None if otype == TYPE_ROOM else ctx.executor
+    return ctx.world.create_object(name, otype, location=location).dbref
+
+
+@softcode_function('tel', min_args=2, max_args=2)
+def fn_tel(ctx, obj_name, dest_name):
+    obj = ctx.match(obj_name)
+    dest = ctx.match(dest_name)
+    if obj is None or dest is None:
+        return '#-1 NO MATCH'
+    ctx.world.move_object(obj, dest)
+    return ''
+
+
+@softcode_function('name', min_args=1, max_args=1)
+def fn_name(ctx, obj_name):
+    obj = ctx.match(obj_name)
+    return obj.name if obj else '#-1 NO MATCH'
+
+
+@softcode_function('num', min_args=1, max_args=1)
+def fn_num(ctx, obj_name):
+    obj = ctx.match(obj_name)
+    return obj.dbref if obj else '#-1 NO MATCH'
+
+
+@softcode_function('loc', min_args=1, max_args=1)
+def fn_loc(ctx, obj_name):
+    obj = ctx.match(obj_name)
+    if obj is None:
+        return '#-1 NO MATCH'
+    return obj.location.dbref if obj.location else '#-1'
+
+
+@softcode_function('lcon', min_args=1, max_args=1)
+def fn_lcon(ctx, obj_name):
+    obj = ctx.match(obj_name)
+    if obj is None:
+        return '#-1 NO MATCH'
+    return ' '.join(content.dbref for content in obj.contents)
+
+
+@softcode_function('children', min_args=1, max_args=1)
+def fn_children(ctx, obj_name):
+    obj = ctx.match(obj_name)
+    if obj is None:
+        return '#-1 NO MATCH'
+    return ' '.join(child.dbref for child in ctx.world.children(obj))
+
+
+@softcode_function('hasflag', min_args=2, max_args=2)
+def fn_hasflag(ctx, obj_name, flag):
+    obj = ctx.match(obj_name)
+    if obj is None:
+        return '#-1 NO MATCH'
+    return _bool(flag.strip().upper() in obj.flags)
+
+
+@softcode_function('get', min_args=1, max_args=1)
+def fn_get(ctx, obj_attr):
+    obj, value = _get_attr(ctx, obj_attr)
+    if obj is None:
+        return '#-1 NO MATCH'
+    return value or ''
+
+
+@softcode_function('default', min_args=2, max_args=2, lazy=True)
+def fn_default(ctx, raw_obj_attr, raw_default):
+    obj, value = _get_attr(ctx, evaluate_arg(raw_obj_attr, ctx))
+    if value:
+        return value
+    return evaluate_arg(raw_default, ctx)
+
+
+@softcode_function('set', min_args=2, max_args=2)
+def fn_set(ctx, obj_name, value):
+    obj = ctx.match(obj_name)
+    if obj is None:
+        return '#-1 NO MATCH'
+    if ':' in value:
+        attr_name, attr_value = value.split(':', 1)
+        obj.set_attr(attr_name.strip(), attr_value)
+    elif value.startswith('!'):
+        obj.flags.discard(value[1:].strip().upper())
+    else:
+        obj.flags.add(value.strip().upper())
+    return ''
+
+
+@softcode_function('pemit', min_args=2, max_args=2)
+def fn_pemit(ctx, targets, message):
+    for target_name in targets.split():
+        target = ctx.match(target_name)
+        if target is not None:
+            ctx.world.notify(target, message)
+    return ''
+
+
+@softcode_function('cemit', min_args=2, max_args=2)
+def fn_cemit(ctx, channel, message):
+    ctx.world.channel_emits.append((channel, message))
+    return ''
+
+
+@softcode_function('lwho', min_args=0, max_args=0)
+def fn_lwho(ctx):
+    return ' '.join(ctx.world.connected_players.keys())
+
+
+#
+## BattletechMUX.
+
+def _match_unit(ctx, obj_name):
+    obj = ctx.match(obj_name)
+    if obj is None or not obj.is_unit():
+        return None
+    return obj
+
+
+@softcode_function('btloadmech', min_args=2, max_args=2)
+def fn_btloadmech(ctx, obj_name, ref):
+    obj = ctx.match(obj_name)
+    if obj is None:
+        return '#-1 NO MATCH'
+    if not ctx.world.load_unit(obj, ref.strip()):
+        return '#-1 UNABLE TO LOAD TEMPLATE'
+    return '1'
+
+
+@softcode_function('btloadmap', min_args=2, max_args=3)
+def fn_btloadmap(ctx, obj_name, map_name, clear=''):
+    obj = ctx.match(obj_name)
+    if obj is None:
+        return '#-1 NO MATCH'
+    ctx.world.load_map(obj, map_name.strip())
+    return '1'
+
+
+@softcode_function('btsetmaphex', min_args=5, max_args=5)
+def fn_btsetmaphex(ctx, map_name, x, y, terrain, elevation):
+    map_obj = ctx.match(map_name)
+    if map_obj is None or not map_obj.is_map():
+        return '#-1 INVALID MAP'
+    map_obj.hexes[(to_number(x), to_number(y))] = (terrain, to_number(elevation))
+    return '1'
+
+
+@softcode_function('btsetxy', min_args=4, max_args=5)
+def fn_btsetxy(ctx, obj_name, map_name, x, y, z=None):
+    unit = _match_unit(ctx, obj_name)
+    if unit is None:
+        return '#-1 INVALID TARGET'
+    map_obj = ctx.match(map_name)
+    if map_obj is None or not map_obj.is_map():
+        return '#-1 INVALID MAP'
+    if not ctx.world.place_unit(unit, map_obj, to_number(x), to_number(y), z):
+        return '#-1 INVALID COORDINATES'
+    return '1'
+
+
+@softcode_function('btgetxcodevalue', min_args=2, max_args=2)
+def fn_btgetxcodevalue(ctx, obj_name, key):
+    obj = ctx.match(obj_name)
+    if obj is None or obj.xcode is None:
+        return '#-1 INVALID TARGET'
+    value = obj.xcode.get(key.strip().lower())
+    if value is None:
+        return '#-1 INVALID XCODE VALUE'
+    return format_number(value) if isinstance(value, float) else str(value)
+
+
+@softcode_function('btsetxcodevalue', min_args=3, max_args=3)
+def fn_btsetxcodevalue(ctx, obj_name, key, value):
+    obj = ctx.match(obj_name)
+    if obj is None or obj.xcode is None:
+        return '#-1 INVALID TARGET'
+    obj.xcode[key.strip().lower()] = _parse_xcode_value(value)
+    return '1'
+
+
+@softcode_function('btgetxcodevalue_ref', min_args=2, max_args=2)
+def fn_btgetxcodevalue_ref(ctx, ref, key):
+    template = ctx.world.unit_templates.get(ref.strip())
+    if template is None:
+        return '#-1 NO SUCH TEMPLATE'
+    value = template.get_xcode_values().get(key.strip().lower())
+    if value is None:
+        return '#-1 INVALID XCODE VALUE'
+    return format_number(value) if isinstance(value, float) else str(value)
+
+
+@softcode_function('btdesignex', min_args=1, max_args=1)
+def fn_btdesignex(ctx, ref):
+    return _bool(ref.strip() in ctx.world.unit_templates)
+
+
+@softcode_function('btgetbv2_ref', min_args=1, max_args=1)
+def fn_btgetbv2_ref(ctx, ref):
+    template = ctx.world.unit_templates.get(ref.strip())
+    if template is None:
+        return '#-1 NO SUCH TEMPLATE'
+    return str(template.bv2)
+
+
+def _format_partslist(parts):
+    return '|'.join(
+        '%s:%d' % (part, quantity) for part, quantity in sorted(parts.items()))
+
+
+@softcode_function('btunitpartslist', min_args=1, max_args=1)
+def fn_btunitpartslist(ctx, obj_name):
+    unit = _match_unit(ctx, obj_name)
+    if unit is None:
+        return '#-1 INVALID TARGET'
+    return _format_partslist(unit.unit_template.parts)
+
+
+@softcode_function('btunitpartslist_ref', min_args=1, max_args=1)
+def fn_btunitpartslist_ref(ctx, ref):
+    template = ctx.world.unit_templates.get(ref.strip())
+    if template is None:
+        return '#-1 NO SUCH TEMPLATE'
+    return _format_partslist(template.parts)
+
+
+@softcode_function('btarmorstatus', min_args=2, max_args=2)
+def fn_btarmorstatus(ctx, obj_name, section):
+    unit = _match_unit(ctx, obj_name)
+    if unit is None:
+        return '#-1 INVALID TARGET'
+    xcode = unit.xcode
+    # We don't track armor per-section, so everything is 'all'.
+    return '%d/%d|%d/%d' % (
+        xcode['armor'], xcode['max_armor'],
+        xcode['internals'], xcode['max_internals'])
+
+
+@softcode_function('btsetcharvalue', min_args=4, max_args=4)
+def fn_btsetcharvalue(ctx, obj_name, skill_or_attrib, value, mode):
+    obj = ctx.match(obj_name)
+    if obj is None:
+        return '#-1 NO MATCH'
+    obj.char_values[skill_or_attrib.strip().lower()] = to_number(value)
+    return '1'
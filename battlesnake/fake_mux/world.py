@@ -0,0 +1,486 @@
+"""
+The fake MUX's in-memory world. This is nowhere near a full MUX database,
+just enough of one to answer the questions the bot asks: objects with names,
+flags, attributes, locations, and parents, plus XCODE values for units and
+maps.
+"""
+
+import random
+import string
+import itertools
+
+# Object types, as returned by type().
+TYPE_ROOM = 'ROOM'
+TYPE_THING = 'THING'
+TYPE_EXIT = 'EXIT'
+TYPE_PLAYER = 'PLAYER'
+# create() takes these single-letter types.
+CREATE_TYPES = {'r': TYPE_ROOM, 't': TYPE_THING, 'e': TYPE_EXIT}
+
+# How big a map is if btloadmap() is given a map that we don't know about.
+DEFAULT_MAP_SIZE = (30, 30)
+
+
+class UnitTemplate(object):
+    """
+    A unit reference (template), as loaded by btloadmech().
+    """
+
+    def __init__(self, ref, mechname, tons, unit_type='Mech',
+                 move_type='Biped', maxspeed=64.5, armor=200, internals=100,
+                 bv2=1000, parts=None):
+        """
+        :param str ref: The reference, ie: 'AS7-D'.
+        :param str mechname: The unit's name, ie: 'Atlas'.
+        :param int tons: The unit's weight.
+        :keyword str unit_type: 'Mech', 'Vehicle', 'VTOL', etc.
+        :keyword str move_type: 'Biped', 'Tracked', 'Hover', etc.
+        :keyword float maxspeed: Top speed, in kph.
+        :keyword int armor: Total armor points.
+        :keyword int internals: Total internal structure points.
+        :keyword int bv2: The unit's battle value.
+        :keyword dict parts: Part names mapped to quantities.
+        """
+
+        self.ref = ref
+        self.mechname = mechname
+        self.tons = tons
+        self.unit_type = unit_type
+        self.move_type = move_type
+        self.maxspeed = maxspeed
+        self.armor = armor
+        self.internals = internals
+        self.bv2 = bv2
+        self.parts = parts or {}
+
+    def get_xcode_values(self):
+        """
+        :rtype: dict
+        :returns: The XCODE values that a freshly loaded unit of this
+            type starts out with.
+        """
+
+        return {
+            'id': '',
+            'mechname': self.mechname,
+            'mechtype': self.unit_type,
+            'mechmovetype': self.move_type,
+            'tons': self.tons,
+            'maxspeed': self.maxspeed,
+            'x': 0, 'y': 0, 'z': 0,
+            'speed': 0.0,
+            'heading': 0,
+            'heat': 0.0,
+            'status': '',
+            'status2': '',
+            'critstatus': '',
+            'critstatus2': '',
+            'target': -1,
+            'team': 0,
+            'shots_fired': 0,
+            'shots_hit': 0,
+            'shots_missed': 0,
+            'damage_inflicted': 0,
+            'damage_taken': 0,
+            'units_killed': 0,
+            'hexes_walked': 0.0,
+            'armor': self.armor,
+            'max_armor': self.armor,
+            'internals': self.internals,
+            'max_internals': self.internals,
+        }
+
+
+# A small library of refs to spawn. Scenarios are free to add more.
+DEFAULT_UNIT_TEMPLATES = [
+    UnitTemplate(
+        'AS7-D', 'Atlas', 100, maxspeed=32.25, armor=304, internals=152,
+        bv2=1897, parts={'AC/20': 1, 'LRM-20': 1, 'SRM-6': 1, 'MediumLaser': 4}),
+    UnitTemplate(
+        'HBK-4G', 'Hunchback', 50, maxspeed=53.75, armor=160, internals=83,
+        bv2=1041, parts={'AC/20': 1, 'MediumLaser': 2, 'SmallLaser': 1}),
+    UnitTemplate(
+        'LCT-1V', 'Locust', 20, maxspeed=129.0, armor=64, internals=33,
+        bv2=432, parts={'MediumLaser': 1, 'MachineGun': 2}),
+    UnitTemplate(
+        'Demolisher', 'Demolisher Heavy Tank', 80, unit_type='Vehicle',
+        move_type='Tracked', maxspeed=32.25, armor=160, internals=80,
+        bv2=1016, parts={'AC/20': 2}),
+]
+
+
+class MuxObject(object):
+    """
+    A single object in the world.
+    """
+
+    def __init__(self, dbref, name, otype):
+        self.dbref = dbref
+        self.name = name
+        self.otype = otype
+        self.flags = set()
+        # Attribute names are case-insensitive, so keys are upper-cased.
+        self.attrs = {}
+        self.location = None
+        self.contents = []
+        self.parent = None
+        self.zone = None
+        self.link = None
+        self.locks = {}
+        # XCODE values for units and maps. None until btloadmech() or
+        # btloadmap() is ran on the object.
+        self.xcode = None
+        # Units only. The UnitTemplate that was loaded.
+        self.unit_template = None
+        # Maps only. (x, y) -> (terrain, elevation)
+        self.hexes = {}
+        # Character skills/attributes set with btsetcharvalue().
+        self.char_values = {}
+        # Commands that were @forced on the object. We don't run these.
+        self.forced_commands = []
+
+    def __repr__(self):
+        return "<MuxObject %s %s(%s)>" % (self.otype, self.name, self.dbref)
+
+    def get_attr(self, attr_name):
+        """
+        Looks up an attribute, checking parents if the object doesn't have
+        the attribute itself.
+
+        :param str attr_name: The attribute to look up.
+        :rtype: str or None
+        :returns: The attribute value, or None if it's not set on the object
+            or any of its parents.
+        """
+
+        attr_name = attr_name.upper()
+        obj = self
+        # Parent chains are capped at 10 in MUX, too.
+        for _ in range(10):
+            if obj is None:
+                break
+            if attr_name in obj.attrs:
+                return obj.attrs[attr_name]
+            obj = obj.parent
+        return None
+
+    def set_attr(self, attr_name, value):
+        """
+        Sets an attribute. An empty value clears it.
+        """
+
+        attr_name = attr_name.upper()
+        if value:
+            self.attrs[attr_name] = value
+        else:
+            self.attrs.pop(attr_name, None)
+
+    def is_unit(self):
+        return self.xcode is not None and 'mechname' in self.xcode
+
+    def is_map(self):
+        return self.xcode is not None and 'mapwidth' in self.xcode
+
+
+class FakeWorld(object):
+    """
+    The whole fake MUX database.
+    """
+
+    def __init__(self, unit_templates=None, map_sizes=None, seed=None):
+        """
+        :keyword list unit_templates: :py:class:`UnitTemplate` instances that
+            btloadmech() can load. Defaults to a few stock units.
+        :keyword dict map_sizes: Map filenames mapped to ``(width, height)``.
+            Any map that isn't in here is :py:data:`DEFAULT_MAP_SIZE`.
+        :keyword seed: Seeds the random number generator used for
+            :py:meth:`simulate_tick`, for repeatable runs.
+        """
+
+        self.objects = {}
+        self._next_dbref = 0
+        if unit_templates is None:
+            unit_templates = DEFAULT_UNIT_TEMPLATES
+        self.unit_templates = dict((t.ref, t) for t in unit_templates)
+        self.map_sizes = map_sizes or {}
+        self.random = random.Random(seed)
+        # Players that are currently connected, mapped to a callable that
+        # sends them a line.
+        self.connected_players = {}
+        # (target dbref, message) for every pemit, and (channel, message)
+        # for every cemit. Handy for tests.
+        self.emits = []
+        self.channel_emits = []
+        # (object dbref, attribute, args) for every @trigger. We don't run
+        # the attribute.
+        self.triggers = []
+        self._contact_ids = {}
+        # Object #0 is the starting room, like on a real MUX.
+        self.create_object('Limbo', TYPE_ROOM)
+
+    def create_object(self, name, otype=TYPE_THING, dbref=None,
+                      location=None):
+        """
+        :param str name: The new object's name.
+        :keyword str otype: One of the ``TYPE_*`` constants.
+        :keyword str dbref: If specified, the object is created with this
+            dbref instead of the next free one. Used to set up objects that
+            the bot's settings refer to.
+        :keyword MuxObject location: Where the object starts out.
+        :rtype: MuxObject
+        """
+
+        if dbref is None:
+            while '#%d' % self._next_dbref in self.objects:
+                self._next_dbref += 1
+            dbref = '#%d' % self._next_dbref
+        elif dbref in self.objects:
+            raise ValueError("Object already exists: %s" % dbref)
+        obj = MuxObject(dbref, name, otype)
+        self.objects[dbref] = obj
+        if location is not None:
+            self.move_object(obj, location)
+        return obj
+
+    def destroy_object(self, obj):
+        """
+        Removes an object from the world. Anything inside it goes home to
+        Limbo.
+        """
+
+        for content in list(obj.contents):
+            self.move_object(content, self.objects['#0'])
+        if obj.location is not None:
+            obj.location.contents.remove(obj)
+        for child in self.children(obj):
+            child.parent = None
+        del self.objects[obj.dbref]
+
+    def move_object(self, obj, destination):
+        """
+        :param MuxObject obj: The object to move.
+        :param MuxObject destination: Where to put it.
+        """
+
+        if obj.location is not None:
+            obj.location.contents.remove(obj)
+        obj.location = destination
+        destination.contents.append(obj)
+
+    def get_object(self, dbref):
+        """
+        :rtype: MuxObject or None
+        """
+
+        return self.objects.get(dbref.strip())
+
+    def match_object(self, name, looker):
+        """
+        Resolves an object string the same way most MUX functions do.
+
+        :param str name: 'me', 'here', a dbref, '*player', or the name of
+            something near the looker.
+        :param MuxObject looker: The object doing the matching.
+        :rtype: MuxObject or None
+        """
+
+        name = name.strip()
+        lowered = name.lower()
+        if lowered == 'me':
+            return looker
+        if lowered == 'here':
+            return looker.location
+        if name.startswith('#'):
+            return self.objects.get(name)
+        if name.startswith('*'):
+            return self.find_player(name[1:])
+        nearby = list(looker.contents)
+        if looker.location is not None:
+            nearby += looker.location.contents
+        for obj in nearby:
+            if obj.name.lower() == lowered:
+                return obj
+        return None
+
+    def find_player(self, name):
+        """
+        :rtype: MuxObject or None
+        """
+
+        lowered = name.strip().lower()
+        for obj in self.objects.values():
+            if obj.otype == TYPE_PLAYER and obj.name.lower() == lowered:
+                return obj
+        return None
+
+    def children(self, parent):
+        """
+        :rtype: list
+        :returns: Objects whose parent is ``parent``, by dbref.
+        """
+
+        return sorted(
+            (obj for obj in self.objects.values() if obj.parent is parent),
+            key=lambda obj: int(obj.dbref[1:]))
+
+    def notify(self, obj, message):
+        """
+        Sends a message to an object. Only connected players actually see
+        anything.
+        """
+
+        self.emits.append((obj.dbref, message))
+        send = self.connected_players.get(obj.dbref)
+        if send:
+            send(message)
+
+    #
+    ## BattletechMUX stuff.
+
+    def load_unit(self, obj, ref):
+        """
+        Loads a unit template onto an object.
+
+        :rtype: bool
+        :returns: False if there's no such template.
+        """
+
+        template = self.unit_templates.get(ref)
+        if template is None:
+            return False
+        obj.xcode = template.get_xcode_values()
+        obj.unit_template = template
+        return True
+
+    def load_map(self, obj, map_name):
+        """
+        Turns an object into an empty map.
+        """
+
+        width, height = self.map_sizes.get(map_name, DEFAULT_MAP_SIZE)
+        obj.xcode = {
+            'mapname': map_name,
+            'mapwidth': width,
+            'mapheight': height,
+        }
+        obj.hexes = {}
+
+    def place_unit(self, unit, map_obj, x, y, z=None):
+        """
+        Puts a loaded unit on a map, handing it a contact ID if it doesn't
+        have one yet.
+
+        :rtype: bool
+        :returns: False if the coordinates are off of the map.
+        """
+
+        x, y = int(x), int(y)
+        if not (0 <= x < map_obj.xcode['mapwidth'] and
+                0 <= y < map_obj.xcode['mapheight']):
+            return False
+        if unit.location is not map_obj:
+            self.move_object(unit, map_obj)
+        unit.xcode['x'] = x
+        unit.xcode['y'] = y
+        if z is not None:
+            unit.xcode['z'] = int(z)
+        if not unit.xcode['id']:
+            unit.xcode['id'] = self._next_contact_id(map_obj)
+        return True
+
+    def _next_contact_id(self, map_obj):
+        ids = self._contact_ids.get(map_obj.dbref)
+        if ids is None:
+            ids = self._contact_ids[map_obj.dbref] = (
+                ''.join(pair) for pair in itertools.product(
+                    string.ascii_uppercase, repeat=2))
+        return next(ids)
+
+    def list_units(self, map_obj):
+        """
+        :rtype: list
+        :returns: The units on a map.
+        """
+
+        return [obj for obj in map_obj.contents if obj.is_unit()]
+
+    def damage_unit(self, unit, amount):
+        """
+        Knocks ``amount`` off of a unit's armor, then its internals. The
+        unit is destroyed if it runs out of internals.
+        """
+
+        xcode = unit.xcode
+        armor_damage = min(amount, xcode['armor'])
+        xcode['armor'] -= armor_damage
+        xcode['internals'] = max(0, xcode['internals'] - (amount - armor_damage))
+        xcode['damage_taken'] += amount
+        if not xcode['internals']:
+            self.destroy_unit(unit)
+
+    def destroy_unit(self, unit):
+        """
+        Marks a unit as destroyed. It stays on the map, like a wreck would.
+        """
+
+        if 'f' not in unit.xcode['status']:
+            unit.xcode['status'] += 'f'
+        unit.xcode['speed'] = 0.0
+
+    def simulate_tick(self):
+        """
+        Moves every live unit on every map one hex in a random direction, so
+        that the bot sees something change each time it looks.
+        """
+
+        rand = self.random
+        for map_obj in self.objects.values():
+            if not map_obj.is_map():
+                continue
+            width = map_obj.xcode['mapwidth']
+            height = map_obj.xcode['mapheight']
+            for unit in self.list_units(map_obj):
+                xcode = unit.xcode
+                if 'f' in xcode['status']:
+                    continue
+                xcode['x'] = min(width - 1, max(0, xcode['x'] + rand.randint(-1, 1)))
+                xcode['y'] = min(height - 1, max(0, xcode['y'] + rand.randint(-1, 1)))
+                xcode['heading'] = rand.randint(0, 359) * 32
+                xcode['speed'] = rand.uniform(0, xcode['maxspeed'])
+                xcode['heat'] = rand.uniform(0, 30)
+                xcode['hexes_walked'] += 1
+
+
+def create_battlesnake_fixtures(world, settings):
+    """
+    Creates the objects that the bot's settings point at (parents, the dead
+    mech compactor, etc), along with the softcode attributes that the bot
+    calls on them.
+
+    :param FakeWorld world: The world to add the objects to.
+    :param settings: The bot's settings.
+    """
+
+    def create_fixture(dbref, name, attrs=None):
+        if world.get_object(dbref) is None:
+            obj = world.create_object(name, dbref=dbref)
+            obj.attrs.update(attrs or {})
+
+    arena_master = settings['arena_master']
+    create_fixture(
+        arena_master['arena_master_parent_dbref'], 'Arena Master Parent', {
+            # Used by the contact puller to tell units apart from everything
+            # else on a map.
+            'IS_SCENARIO_UNIT.F': '[strmatch(get(%0/Xtype),MECH)]',
+        })
+    create_fixture(arena_master['map_parent_dbref'], 'Arena Map Parent')
+    create_fixture(
+        arena_master['puppet_ol_parent_dbref'], 'Arena Puppet OL Parent')
+    create_fixture(
+        settings['unit_spawning']['unit_parent_dbref'], 'Unit Parent', {
+            'UNITNAME.F': '[get(%0/Mechname)]',
+        })
+    create_fixture(
+        settings['unit_spawning']['dead_mech_compactor_dbref'],
+        'Dead Mech Compactor')
+    create_fixture(settings['ai']['ai_parent_dbref'], 'AI Parent')
@@ -1,3 +1,7 @@
+import re
+
+from battlesnake.outbound_commands import mux_commands
+
 
 def hudinfo_set_key(protocol, key_str):
     """
@@ -13,15 +17,23 @@ def hudinfo_set_key(protocol, key_str):
 
     command_str = 'hudinfo key=%s' % key_str
     regex_str = r'^#HUD:(?P<hudinfo_key>.*):KEY:R# Key set\r$'
-    deferred = protocol.expect(regex_str, return_regex_group='hudinfo_key')
-    protocol.write(command_str)
-    return deferred
+    return protocol.write_and_expect(
+        command_str, regex_str, return_regex_group='hudinfo_key')
 
 
 def hudinfo_contacts(protocol):
     """
-    Gets a HUDINFO contacts listing. We don't attempt to capture the output
-    here, but maybe we will some day.
+    Gets a HUDINFO contacts listing. HUDINFO must be enabled, so that the
+    protocol has a key set.
+
+    :rtype: defer.Deferred
+    :returns: A Deferred that fires with a list of contact lines, minus
+        their ``#HUD:<key>:C:L#`` prefix.
     """
 
-    protocol.write('hudinfo c')
+    prefix = '#HUD:%s:C:L# ' % protocol.hudinfo_key
+    deferred = mux_commands.capture_command_output(
+        protocol, 'hudinfo c', capture_regex_str='^' + re.escape(prefix))
+    deferred.addCallback(
+        lambda lines: [line[len(prefix):] for line in lines])
+    return deferred
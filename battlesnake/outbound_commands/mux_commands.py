@@ -2,10 +2,18 @@
 Outbound command wrappers for base MUX commands.
 """
 
-from battlesnake.core.utils import generate_unique_token
+from battlesnake.core.call_sites import get_caller_name
+from battlesnake.core.metrics import ROUND_TRIP_METRICS
+from battlesnake.core.mux_errors import check_think_result
+from battlesnake.core.protocols.acknowledgement import ACK_EACH
+from battlesnake.core.protocols.outbound_scheduler import PRIORITY_NORMAL
+from battlesnake.core.read_cache import invalidate_on_write
+from battlesnake.core.response_watcher import FRAME_BEGIN, FRAME_CHUNK, \
+    FRAME_END
+from battlesnake.core.utils import generate_compact_token
 
 
-def set_attr(protocol, obj, attr, val):
+def set_attr(protocol, obj, attr, val, ack_mode=ACK_EACH):
     """
     Wrapper for @set, in the context of an attribute.
 
@@ -13,39 +21,47 @@ def set_attr(protocol, obj, attr, val):
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
     :param str attr: The attribute name.
     :param str val: The attribute value.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     command_str = "@set {obj}={attr}:{val}".format(
         obj=obj, attr=attr, val=val)
-    return protocol.write_and_wait(command_str)
+    return invalidate_on_write(
+        protocol, protocol.write_and_wait(command_str, ack_mode=ack_mode),
+        obj, [attr])
 
 
-def startup(protocol, obj, startup_val):
+def startup(protocol, obj, startup_val, ack_mode=ACK_EACH):
     """
     Wrapper for @startup.
 
     :param BattlesnakeTelnetProtocol protocol:
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
     :param str startup_val: Value for the object's Startup attribute.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     startup_str = "@startup {obj}={startup_val}".format(
         obj=obj, startup_val=startup_val)
-    return protocol.write_and_wait(startup_str)
+    return protocol.write_and_wait(startup_str, ack_mode=ack_mode)
 
 
-def parent(protocol, obj, parent_obj):
+def parent(protocol, obj, parent_obj, ack_mode=ACK_EACH):
     """
     Wrapper for @parent.
 
     :param BattlesnakeTelnetProtocol protocol:
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
     :param str parent_obj: A MUX object string for the parent to set.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     parent_str = "@parent {obj}={parent_obj}".format(
         obj=obj, parent_obj=parent_obj)
-    return protocol.write_and_wait(parent_str)
+    return protocol.write_and_wait(parent_str, ack_mode=ack_mode)
 
 
 def say(protocol, message):
@@ -69,7 +85,8 @@ def remit(protocol, obj, message):
     protocol.write(remit_str)
 
 
-def pemit(protocol, targets, message, switches=None, replace_returns=True):
+def pemit(protocol, targets, message, switches=None, replace_returns=True,
+          priority=PRIORITY_NORMAL):
     """
     Wrapper for @pemit. Handles multiple targets gracefully.
 
@@ -79,6 +96,7 @@ def pemit(protocol, targets, message, switches=None, replace_returns=True):
     :keyword set switches: A set of switches to send.
     :keyword bool replace_returns: If ``True``, replace all carriage returns
         with the MUX %r return.
+    :keyword int priority: The outbound scheduler priority class.
     """
 
     if replace_returns:
@@ -94,7 +112,8 @@ def pemit(protocol, targets, message, switches=None, replace_returns=True):
 
     target_str = ' '.join(targets)
     switch_str = '/' + '/'.join(list(switches))
-    protocol.write("@pemit%s %s=%s" % (switch_str, target_str, message))
+    protocol.write(
+        "@pemit%s %s=%s" % (switch_str, target_str, message), priority=priority)
 
 
 def cemit(protocol, channel, message, no_header=False, force_cemit=False):
@@ -126,7 +145,9 @@ def idle(protocol):
     protocol.write("IDLE")
 
 
-def think(protocol, thought, return_output=True, debug_info=None):
+def think(protocol, thought, return_output=True, debug_info=None,
+          priority=PRIORITY_NORMAL, batchable=False, read_only=False,
+          shard_key=None, check_errors=False):
     """
     Runs the 'think' command, which is useful for performing actions or
     retrieving values from the MUX. By setting a dynamic prefix, we can
@@ -143,23 +164,125 @@ def think(protocol, thought, return_output=True, debug_info=None):
     :keyword debug_info: Something to repr() if the watcher expires without
         ever being fired. Should help a developer track down where this
         watcher was created from.
+    :keyword int priority: The outbound scheduler priority class.
+    :keyword bool batchable: If ``True`` (and think batching is enabled),
+        this think may be merged with others issued in the same reactor turn.
+        Batched thoughts share setq() registers and the MUX's per-command
+        limits, so only pass this for short reads that don't change
+        anything, don't use registers, and can't output a line break.
+    :keyword bool read_only: If ``True``, this think may be sent over one of
+        the worker connections. Only pass this for thoughts that don't
+        change anything, don't refer to ``me``, and don't need to see the
+        effects of commands we haven't had acknowledged yet.
+    :keyword shard_key: Implies ``read_only``. Thinks with the same shard
+        key always go over the same connection, so they stay in order.
+        An arena's map dbref is a good choice for per-arena traffic.
+    :keyword bool check_errors: If ``True`` and the output is a function
+        error (a missing function, or a permission problem), the Deferred
+        errs with a :py:exc:`MuxError <battlesnake.core.mux_errors.MuxError>`
+        instead of firing with the error text. Only pass this when the
+        caller has no use for that text, like a create() whose dbref is
+        used right away.
     :rtype: None or defer.Deferred
     :returns: A Deferred if ``return_output`` is ``True``, ``None`` if not.
     """
 
-    prefix = generate_unique_token()
+    if read_only or shard_key is not None:
+        protocol = protocol.get_connection(shard_key)
+    prefix = generate_compact_token()
     command_str = 'think %s%s' % (prefix, thought)
-    if return_output:
-        regex_str = r'^' + prefix + '(?P<value>.*)\r$'
-        deferred = protocol.expect(
-            regex_str, return_regex_group='value', debug_info=debug_info)
-    protocol.write(command_str)
-    if return_output:
-        # noinspection PyUnboundLocalVariable
-        return deferred
+    if not return_output:
+        protocol.write(command_str, priority=priority)
+        return
+
+    if batchable and protocol.think_batcher:
+        deferred = protocol.think_batcher.think(
+            prefix, thought, debug_info=debug_info, priority=priority)
+    else:
+        deferred = protocol.write_and_expect_token(
+            command_str, prefix, debug_info=debug_info, priority=priority)
+    if check_errors:
+        deferred.addCallback(check_think_result, thought)
+    return ROUND_TRIP_METRICS.track(deferred, get_caller_name())
+
+
+def think_each(protocol, list_str, thought, timeout_secs=3.0, debug_info=None,
+               priority=PRIORITY_NORMAL, read_only=False, shard_key=None):
+    """
+    Evaluates ``thought`` once for each item in a list, using ``@dolist``.
+    Each item's output comes back on its own line, so unlike an ``iter()``
+    in a single 'think', the combined output isn't limited to one line.
+
+    :param BattlesnakeTelnetProtocol protocol:
+    :param str list_str: Softcode that evaluates to a space-separated list.
+    :param str thought: Evaluated for each item. As with ``iter()``, ``##``
+        is replaced with the item and ``#@`` with its position. It's also
+        evaluated once more, for the end sentinel, with ``##`` being the
+        response token. That output is thrown away, but the thought must
+        not have side effects.
+    :keyword float timeout_secs: How many seconds to wait for each line of
+        the response.
+    :keyword debug_info: Something to repr() if the watcher expires without
+        ever being fired.
+    :keyword int priority: The outbound scheduler priority class.
+    :keyword bool read_only: See :py:func:`think`.
+    :keyword shard_key: See :py:func:`think`.
+    :rtype: defer.Deferred
+    :returns: A Deferred that fires with a list of each item's output, in
+        list order.
+    """
+
+    if read_only or shard_key is not None:
+        protocol = protocol.get_connection(shard_key)
+    token = generate_compact_token()
+    # The token goes on the end of the list, and its turn sends the end
+    # sentinel with the item count. The list is only evaluated once, so the
+    # count always matches the chunks, even if the list changes before
+    # @dolist's queued commands run.
+    lines = [
+        '@dolist [%s] %s=think %s[if(strmatch(##,%s),%s[sub(#@,1)]:,%s#@:)]%s' % (
+            list_str, token, token, token, FRAME_END, FRAME_CHUNK, thought),
+    ]
+    deferred = protocol.write_and_expect_framed(
+        lines, token, timeout_secs=timeout_secs, debug_info=debug_info,
+        priority=priority)
+    return ROUND_TRIP_METRICS.track(deferred, get_caller_name())
+
+
+def capture_command_output(protocol, command_str, capture_regex_str=None,
+                           timeout_secs=3.0, debug_info=None,
+                           priority=PRIORITY_NORMAL):
+    """
+    Runs a command and captures all of its output, however many lines that
+    turns out to be. The command is wrapped in a pair of 'think' sentinels.
+
+    :param BattlesnakeTelnetProtocol protocol:
+    :param str command_str: The command to run.
+    :keyword str capture_regex_str: If specified, only lines that match
+        this are captured. Anything else that shows up in the meantime
+        (channel chatter, pages, and so on) is handled as usual.
+    :keyword float timeout_secs: How many seconds to wait for each line of
+        the response.
+    :keyword debug_info: Something to repr() if the watcher expires without
+        ever being fired.
+    :keyword int priority: The outbound scheduler priority class.
+    :rtype: defer.Deferred
+    :returns: A Deferred that fires with a list of the captured lines.
+    """
+
+    token = generate_compact_token()
+    lines = [
+        'think %s%s' % (token, FRAME_BEGIN),
+        command_str,
+        'think %s%s' % (token, FRAME_END),
+    ]
+    deferred = protocol.write_and_expect_framed(
+        lines, token, timeout_secs=timeout_secs, debug_info=debug_info,
+        priority=priority, capture_regex_str=capture_regex_str)
+    return ROUND_TRIP_METRICS.track(deferred, get_caller_name())
 
 
-def lock(protocol, obj, lockval, whichlock=None):
+def lock(protocol, obj, lockval, whichlock=None, ack_mode=ACK_EACH):
     """
     Wrapper for @lock in the object (not attribute) form.
 
@@ -170,6 +293,8 @@ def lock(protocol, obj, lockval, whichlock=None):
     :type whichlock: str or None
     :param whichlock: One of the lock types: use, enter, leave. If not specified,
         the default lock is assumed.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     if whichlock:
@@ -178,63 +303,74 @@ def lock(protocol, obj, lockval, whichlock=None):
         whichlock_switch = ''
     command_str = "@lock{whichlock_switch} {obj}={lockval}".format(
         whichlock_switch=whichlock_switch, obj=obj, lockval=lockval)
-    return protocol.write_and_wait(command_str)
+    return protocol.write_and_wait(command_str, ack_mode=ack_mode)
 
 
-def link(protocol, obj, target_obj):
+def link(protocol, obj, target_obj, ack_mode=ACK_EACH):
     """
     Links an object to the target.
 
     :param BattlesnakeTelnetProtocol protocol:
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
     :param str target_obj: A MUX object string for the target to link to.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     command_str = "@link {obj}={target_obj}".format(
         obj=obj, target_obj=target_obj)
-    return protocol.write_and_wait(command_str)
+    return protocol.write_and_wait(command_str, ack_mode=ack_mode)
 
 
-def newpassword(protocol, obj, new_password):
+def newpassword(protocol, obj, new_password, ack_mode=ACK_EACH):
     """
     Changes a player's password.
 
     :param BattlesnakeTelnetProtocol protocol:
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
     :param str new_password: The player's new password.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     command_str = "@newpassword {obj}={new_password}".format(
         obj=obj, new_password=new_password)
-    return protocol.write_and_wait(command_str)
+    return protocol.write_and_wait(command_str, ack_mode=ack_mode)
 
 
-def force(protocol, obj, force_command):
+def force(protocol, obj, force_command, priority=PRIORITY_NORMAL,
+          ack_mode=ACK_EACH):
     """
     Forces an object to do something.
 
     :param BattlesnakeTelnetProtocol protocol:
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
     :param str force_command: The command to force the object to do.
+    :keyword int priority: The outbound scheduler priority class.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     command_str = "@force {obj}={force_command}".format(
         obj=obj, force_command=force_command)
-    return protocol.write_and_wait(command_str)
+    return protocol.write_and_wait(
+        command_str, priority=priority, ack_mode=ack_mode)
 
 
-def name(protocol, obj, new_name):
+def name(protocol, obj, new_name, ack_mode=ACK_EACH):
     """
     Re-names an object.
 
     :param BattlesnakeTelnetProtocol protocol:
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
     :param str new_name: The object's new name.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     command_str = "@name {obj}={new_name}".format(
         obj=obj, new_name=new_name)
-    return protocol.write_and_wait(command_str)
+    return protocol.write_and_wait(command_str, ack_mode=ack_mode)
 
 
 def mechdesc(protocol, obj, desc):
@@ -251,7 +387,7 @@ def mechdesc(protocol, obj, desc):
     return protocol.write(command_str)
 
 
-def chzone(protocol, obj, zone_dbref):
+def chzone(protocol, obj, zone_dbref, ack_mode=ACK_EACH):
     """
     Changes an object's zone.
 
@@ -260,65 +396,76 @@ def chzone(protocol, obj, zone_dbref):
     :type zone_dbref: str or None
     :param zone_dbref: The dbref to set the object's zone to. None or
         an empty string removes the zone.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     new_zone = zone_dbref or 'None'
     command_str = "@chzone {obj}={new_zone}".format(
         obj=obj, new_zone=new_zone)
-    return protocol.write_and_wait(command_str)
+    return protocol.write_and_wait(command_str, ack_mode=ack_mode)
 
 
-def xtype(protocol, obj, new_xtype):
+def xtype(protocol, obj, new_xtype, ack_mode=ACK_EACH):
     """
     Changes an object's xtype.
 
     :param BattlesnakeTelnetProtocol protocol:
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
     :param str new_xtype: The xtype to set the object to.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     command_str = "@xtype {obj}={new_xtype}".format(
         obj=obj, new_xtype=new_xtype)
-    return protocol.write_and_wait(command_str)
+    return protocol.write_and_wait(command_str, ack_mode=ack_mode)
 
 
-def drain(protocol, obj):
+def drain(protocol, obj, ack_mode=ACK_EACH):
     """
     Runs @drain on an object.
 
     :param BattlesnakeTelnetProtocol protocol:
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     command_str = "@drain {obj}".format(obj=obj)
-    return protocol.write_and_wait(command_str)
+    return protocol.write_and_wait(command_str, ack_mode=ack_mode)
 
 
-def notify(protocol, obj):
+def notify(protocol, obj, ack_mode=ACK_EACH):
     """
     Runs @notify on an object.
 
     :param BattlesnakeTelnetProtocol protocol:
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     command_str = "@notify {obj}".format(obj=obj)
-    return protocol.write_and_wait(command_str)
+    return protocol.write_and_wait(command_str, ack_mode=ack_mode)
 
 
-def destroy(protocol, obj):
+def destroy(protocol, obj, ack_mode=ACK_EACH):
     """
     Destroys an object.
 
     :param BattlesnakeTelnetProtocol protocol:
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     command_str = "@dest {obj}".format(obj=obj)
-    return protocol.write_and_wait(command_str)
+    return invalidate_on_write(
+        protocol, protocol.write_and_wait(command_str, ack_mode=ack_mode), obj)
 
 
-def trigger(protocol, obj, attr, params=None):
+def trigger(protocol, obj, attr, params=None, ack_mode=ACK_EACH):
     """
     Runs @trigger on an object.
 
@@ -327,6 +474,8 @@ def trigger(protocol, obj, attr, params=None):
     :param str attr: The attribute to trigger.
     :type params: list or None
     :param params: A list of param strings to pass to the trigger attribute.
+    :keyword str ack_mode: How to acknowledge the command. See
+        :py:mod:`battlesnake.core.protocols.acknowledgement`.
     """
 
     param_str = ""
@@ -334,4 +483,4 @@ def trigger(protocol, obj, attr, params=None):
         param_str = "=" + ','.join(params)
     command_str = "@trigger {obj}/{attr}{param_str}".format(
         obj=obj, attr=attr, param_str=param_str)
-    return protocol.write_and_wait(command_str)
+    return protocol.write_and_wait(command_str, ack_mode=ack_mode)
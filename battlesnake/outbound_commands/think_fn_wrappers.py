@@ -2,16 +2,33 @@
 Functions wrappers using the 'think' command.
 """
 
-import inspect
 import itertools
 
 from twisted.internet.defer import inlineCallbacks, returnValue
+from battlesnake.core.call_sites import capture_debug_info
+from battlesnake.core.read_cache import invalidate_on_write, xcode_name
 from battlesnake.core.utils import add_escaping_percent_sequences
 
 from battlesnake.outbound_commands import mux_commands
 from btmux_template_io.item_table import WEAPON_TYPE_IDS
 
 
+def _cached_read(protocol, obj, name, cache_ttl, fetch):
+    """
+    :param str name: The attribute name, or an XCODE value's
+        :py:func:`xcode_name <battlesnake.core.read_cache.xcode_name>`.
+    :type cache_ttl: float or None
+    :param cache_ttl: The caller's ``cache_ttl``. If None, the cache is
+        bypassed.
+    :param callable fetch: Reads the value from the MUX.
+    :rtype: defer.Deferred
+    """
+
+    if cache_ttl is None:
+        return fetch()
+    return protocol.read_cache.get(obj, name, fetch, cache_ttl)
+
+
 def create(protocol, name, otype='r'):
     """
     :param str name: The new object will take this name.
@@ -23,7 +40,9 @@ def create(protocol, name, otype='r'):
     think_str = "[create({name},1,{otype})]".format(
         name=name, otype=otype,
     )
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(
+        protocol, think_str, debug_info=capture_debug_info(),
+        check_errors=True)
 
 
 def tel(protocol, obj, dest):
@@ -34,7 +53,7 @@ def tel(protocol, obj, dest):
     """
 
     think_str = "[tel({obj},{dest})]".format(obj=obj, dest=dest)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
 def pemit(protocol, objects, message):
@@ -52,7 +71,7 @@ def pemit(protocol, objects, message):
     think_str = "[pemit({obj_dbrefs},{message})]".format(
         obj_dbrefs=obj_dbrefs, message=message,
     )
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
 def cemit(protocol, channel, message):
@@ -64,7 +83,7 @@ def cemit(protocol, channel, message):
     think_str = "[cemit({channel},{message})]".format(
         channel=channel, message=message,
     )
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
 @inlineCallbacks
@@ -88,7 +107,10 @@ def set_attrs(protocol, obj, attr_dict, iter_delim='|'):
         think_str = "[set({obj},{key}:{val})]".format(
             obj=obj, key=key, val=val,
         )
-        yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+        yield invalidate_on_write(
+            protocol, mux_commands.think(
+                protocol, think_str, debug_info=capture_debug_info()),
+            obj, [key])
 
     iter_vals = []
     for key, val in attr_dict.items():
@@ -97,21 +119,35 @@ def set_attrs(protocol, obj, attr_dict, iter_delim='|'):
     iter_vals_str = '|'.join(iter_vals)
     think_str = "[iter({iter_vals},[set({obj},##)],{iter_delim})]".format(
         iter_vals=iter_vals_str, obj=obj, iter_delim=iter_delim)
-    yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    yield invalidate_on_write(
+        protocol, mux_commands.think(
+            protocol, think_str, debug_info=capture_debug_info()),
+        obj, attr_dict.keys())
 
 
-def get(protocol, obj, attr_name):
+def get(protocol, obj, attr_name, cache_ttl=None):
     """
     Retrieves an attribute from an object.
 
     :param BattlesnakeTelnetProtocol protocol:
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
     :param str attr_name: The name of the attribute to retrieve.
+    :keyword float cache_ttl: If given, the value may come from (and is
+        stored in) the read cache for up to this many seconds. Only pass
+        this for values that hardly ever change.
     """
 
+    debug_info = capture_debug_info()
+    return _cached_read(
+        protocol, obj, attr_name, cache_ttl,
+        lambda: _get(protocol, obj, attr_name, debug_info))
+
+
+def _get(protocol, obj, attr_name, debug_info):
     think_str = "[get({obj}/{attr_name})]".format(
         obj=obj, attr_name=attr_name)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(
+        protocol, think_str, debug_info=debug_info, batchable=True)
 
 
 @inlineCallbacks
@@ -130,7 +166,7 @@ def get_attrs(protocol, obj, attr_list, attr_delim='@&~'):
     key_iter_str = '|'.join(attr_list)
     think_str = "[iter({key_iter_str},[get({obj}/##)]{attr_delim},|)]".format(
         key_iter_str=key_iter_str, obj=obj, attr_delim=attr_delim)
-    result = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    result = yield mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
     vals = result.split(attr_delim)
     combined = itertools.izip(attr_list, vals)
     returnValue({k: v.strip() for k, v in combined})
@@ -145,7 +181,27 @@ def name(protocol, obj):
     """
 
     think_str = "[name({obj})]".format(obj=obj)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(
+        protocol, think_str, debug_info=capture_debug_info(),
+        batchable=True)
+
+
+@inlineCallbacks
+def is_staff(protocol, obj):
+    """
+    :param BattlesnakeTelnetProtocol protocol:
+    :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
+    :rtype: defer.Deferred
+    :returns: A Deferred whose callback value is True if the object is a
+        wizard, royalty, or has the STAFF flag.
+    """
+
+    think_str = (
+        "[or(hasflag({obj},WIZARD),hasflag({obj},ROYALTY),"
+        "hasflag({obj},STAFF))]").format(obj=obj)
+    result = yield mux_commands.think(
+        protocol, think_str, debug_info=capture_debug_info())
+    returnValue(result == '1')
 
 
 def set_flags(protocol, obj, flags):
@@ -163,7 +219,7 @@ def set_flags(protocol, obj, flags):
     iter_vals = ' '.join(flags)
     think_str = "[iter({iter_vals},[set({obj},##)])]".format(
         iter_vals=iter_vals, obj=obj)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
 def teleport(protocol, obj, dest_obj):
@@ -175,7 +231,7 @@ def teleport(protocol, obj, dest_obj):
 
     think_str = "[tel({obj},{dest_obj})]".format(
         obj=obj, dest_obj=dest_obj)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
 def btloadmech(protocol, obj, unit_ref):
@@ -187,7 +243,9 @@ def btloadmech(protocol, obj, unit_ref):
 
     think_str = "[btloadmech({obj},{unit_ref})]".format(
         obj=obj, unit_ref=unit_ref)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return invalidate_on_write(
+        protocol, mux_commands.think(
+            protocol, think_str, debug_info=capture_debug_info()), obj)
 
 
 def btloadmap(protocol, obj, map_filename):
@@ -199,7 +257,9 @@ def btloadmap(protocol, obj, map_filename):
 
     think_str = "[btloadmap({obj},{map_filename})]".format(
         obj=obj, map_filename=map_filename)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return invalidate_on_write(
+        protocol, mux_commands.think(
+            protocol, think_str, debug_info=capture_debug_info()), obj)
 
 
 def btsetmaphex(protocol, obj, x, y, terrain, elev):
@@ -215,7 +275,7 @@ def btsetmaphex(protocol, obj, x, y, terrain, elev):
     escaped_terrain = add_escaping_percent_sequences(terrain)
     think_str = "[btsetmaphex({obj},{x},{y},{terrain},{elev})]".format(
         obj=obj, x=x, y=y, terrain=escaped_terrain, elev=elev)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
 def btsetmaphex_line(protocol, obj, y, terrain_line, elev_line):
@@ -239,7 +299,7 @@ def btsetmaphex_line(protocol, obj, y, terrain_line, elev_line):
         escaped_terrain = add_escaping_percent_sequences(terrain)
         buf += "[btsetmaphex({obj},{x},{y},{terrain},{elev})]".format(
             obj=obj, x=x, y=y, terrain=escaped_terrain, elev=elev)
-    return mux_commands.think(protocol, buf, debug_info=inspect.stack())
+    return mux_commands.think(protocol, buf, debug_info=capture_debug_info())
 
 
 def btsetxy(protocol, obj, map_obj, unit_x, unit_y, unit_z=''):
@@ -259,7 +319,7 @@ def btsetxy(protocol, obj, map_obj, unit_x, unit_y, unit_z=''):
     else:
         think_str = "[btsetxy({obj},{map_obj},{unit_x},{unit_y})]".format(
             obj=obj, map_obj=map_obj, unit_x=unit_x, unit_y=unit_y)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
 def btsetxcodevalue(protocol, obj, key, val):
@@ -272,7 +332,11 @@ def btsetxcodevalue(protocol, obj, key, val):
 
     think_str = "[btsetxcodevalue({obj},{key},{val})]".format(
         obj=obj, key=key, val=val)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    # XCODE values depend on each other (damage affects the unit's status,
+    # for one), so the whole object is forgotten.
+    return invalidate_on_write(
+        protocol, mux_commands.think(
+            protocol, think_str, debug_info=capture_debug_info()), obj)
 
 
 def btsetcharvalue(protocol, obj, skill_or_attrib, val, mode):
@@ -294,19 +358,30 @@ def btsetcharvalue(protocol, obj, skill_or_attrib, val, mode):
 
     think_str = "[btsetcharvalue({obj},{skill_or_attrib},{val},{mode})]".format(
         obj=obj, skill_or_attrib=skill_or_attrib, val=val, mode=mode)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
-def btgetxcodevalue(protocol, obj, key):
+def btgetxcodevalue(protocol, obj, key, cache_ttl=None):
     """
     :param str obj: A valid MUX object string. 'me', 'here', a dbref, etc.
     :param str key: The XCODE key to retrieve the value for.
+    :keyword float cache_ttl: If given, the value may come from (and is
+        stored in) the read cache for up to this many seconds. Only pass
+        this for values that hardly ever change.
     :rtype: defer.Deferred
     """
 
+    debug_info = capture_debug_info()
+    return _cached_read(
+        protocol, obj, xcode_name(key), cache_ttl,
+        lambda: _btgetxcodevalue(protocol, obj, key, debug_info))
+
+
+def _btgetxcodevalue(protocol, obj, key, debug_info):
     think_str = "[btgetxcodevalue({obj},{key})]".format(
         obj=obj, key=key)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(
+        protocol, think_str, debug_info=debug_info, batchable=True)
 
 
 def btgetxcodevalue_ref(protocol, unit_ref, key):
@@ -318,7 +393,9 @@ def btgetxcodevalue_ref(protocol, unit_ref, key):
 
     think_str = "[btgetxcodevalue_ref({unit_ref},{key})]".format(
         unit_ref=unit_ref, key=key)
-    return mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    return mux_commands.think(
+        protocol, think_str, debug_info=capture_debug_info(),
+        batchable=True)
 
 
 @inlineCallbacks
@@ -329,7 +406,9 @@ def btgetbv2_ref(protocol, unit_ref):
     """
 
     think_str = "[btgetbv2_ref({unit_ref})]".format(unit_ref=unit_ref)
-    func_result = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    func_result = yield mux_commands.think(
+        protocol, think_str, debug_info=capture_debug_info(),
+        batchable=True)
     returnValue(float(func_result))
 
 
@@ -342,7 +421,9 @@ def btgetobv_ref(protocol, unit_ref):
     """
 
     think_str = "[btgetobv_ref({unit_ref})]".format(unit_ref=unit_ref)
-    func_result = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    func_result = yield mux_commands.think(
+        protocol, think_str, debug_info=capture_debug_info(),
+        batchable=True)
     returnValue(float(func_result))
 
 
@@ -355,7 +436,9 @@ def btgetdbv_ref(protocol, unit_ref):
     """
 
     think_str = "[btgetdbv_ref({unit_ref})]".format(unit_ref=unit_ref)
-    func_result = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    func_result = yield mux_commands.think(
+        protocol, think_str, debug_info=capture_debug_info(),
+        batchable=True)
     returnValue(float(func_result))
 
 
@@ -367,7 +450,9 @@ def btfasabasecost_ref(protocol, unit_ref):
     """
 
     think_str = "[btfasabasecost_ref({unit_ref})]".format(unit_ref=unit_ref)
-    func_result = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    func_result = yield mux_commands.think(
+        protocol, think_str, debug_info=capture_debug_info(),
+        batchable=True)
     returnValue(max(0, int(func_result)))
 
 
@@ -381,7 +466,7 @@ def btdesignex(protocol, unit_ref):
 
     think_str = "[btdesignex({unit_ref})]".format(
         unit_ref=unit_ref)
-    func_result = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    func_result = yield mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
     returnValue(func_result == '1')
 
 
@@ -393,7 +478,7 @@ def bttechlist_ref(protocol, unit_ref):
     """
 
     think_str = "[bttechlist_ref({unit_ref})]".format(unit_ref=unit_ref)
-    func_result = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    func_result = yield mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
     returnValue(set(func_result.split()))
 
 
@@ -405,7 +490,7 @@ def btpayload_ref(protocol, unit_ref):
     """
 
     think_str = "[btpayload_ref({unit_ref})]".format(unit_ref=unit_ref)
-    func_result = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    func_result = yield mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
     retval = {}
     if not func_result:
         returnValue(retval)
@@ -435,7 +520,7 @@ def btweapstat(protocol, weapon):
     for field in fields:
         think_list.append(weapstat_str.format(field=field, weapon=weapon))
     think_str = '^'.join(think_list)
-    func_result = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    func_result = yield mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
     vrt, weap_type, heat, damage, min_range, short_range, medium_range, \
         long_range, crits, ammo_pt, weight, bv = func_result.split('^')
 
@@ -491,7 +576,7 @@ def btunitpartslist_ref(protocol, unit_ref):
     """
 
     think_str = "[btunitpartslist_ref({unit_ref})]".format(unit_ref=unit_ref)
-    pl_output = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    pl_output = yield mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
     returnValue(_parse_partslist(pl_output))
 
 
@@ -503,20 +588,33 @@ def btunitpartslist(protocol, obj):
     """
 
     think_str = "[btunitpartslist({obj})]".format(obj=obj)
-    pl_output = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    pl_output = yield mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
     returnValue(_parse_partslist(pl_output))
 
 
-@inlineCallbacks
-def get_map_dimensions(protocol, map_dbref):
+def get_map_dimensions(protocol, map_dbref, cache_ttl=None):
     """
     :param str map_dbref: A valid MAP dbref.
-    :rtype: tuple
-    :returns: A tuple in the form of (width, height).
+    :keyword float cache_ttl: If given, the value may come from (and is
+        stored in) the read cache for up to this many seconds. Only pass
+        this for values that hardly ever change.
+        Loading a new map with :py:func:`btloadmap` clears the cached value.
+    :rtype: defer.Deferred
+    :returns: A Deferred that fires with a tuple in the form of
+        (width, height).
     """
 
+    debug_info = capture_debug_info()
+    return _cached_read(
+        protocol, map_dbref, xcode_name('mapwidth') + ',MAPHEIGHT', cache_ttl,
+        lambda: _get_map_dimensions(protocol, map_dbref, debug_info))
+
+
+@inlineCallbacks
+def _get_map_dimensions(protocol, map_dbref, debug_info):
     think_str = "[btgetxcodevalue({map_dbref}, mapwidth)] [btgetxcodevalue({map_dbref}, mapheight)]".format(
         map_dbref=map_dbref)
-    func_result = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    func_result = yield mux_commands.think(
+        protocol, think_str, debug_info=debug_info, batchable=True)
     coords = func_result.split()
     returnValue((int(coords[0]), int(coords[1])))
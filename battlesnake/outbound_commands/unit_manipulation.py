@@ -2,10 +2,10 @@
 Contains some useful unit manipulation sequences.
 """
 
-import inspect
-
 from twisted.internet.defer import inlineCallbacks
 
+from battlesnake.core.call_sites import capture_debug_info
+from battlesnake.core.protocols.acknowledgement import ACK_NONE
 from battlesnake.outbound_commands import mux_commands
 from battlesnake.outbound_commands.think_fn_wrappers import btgetxcodevalue, \
     btsetxcodevalue
@@ -86,7 +86,7 @@ def heal_unit_pilot(protocol, unit_dbref):
             unit_dbref=unit_dbref
         )
     )
-    mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
 def reset_unit_counters(protocol, unit_dbref):
@@ -108,7 +108,7 @@ def reset_unit_counters(protocol, unit_dbref):
             unit_dbref=unit_dbref
         )
     )
-    mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
 def save_unit_tics_to_pilot(protocol, unit):
@@ -121,7 +121,7 @@ def save_unit_tics_to_pilot(protocol, unit):
     unit_dbref = unit.dbref
     think_str = "[u({unit_dbref}/STORETICS.F,get({unit_dbref}/Pilot))]".format(
         unit_dbref=unit_dbref)
-    mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
 def save_unit_mechprefs_to_pilot(protocol, unit):
@@ -137,7 +137,7 @@ def save_unit_mechprefs_to_pilot(protocol, unit):
         "[set({pilot_dbref},"
             "MECHPREFS.D:[btgetxcodevalue({unit_dbref},mechprefs)])]".format(
         pilot_dbref=pilot_dbref, unit_dbref=unit_dbref))
-    mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    mux_commands.think(protocol, think_str, debug_info=capture_debug_info())
 
 
 def restore_mechprefs_on_unit(protocol, unit):
@@ -150,4 +150,5 @@ def restore_mechprefs_on_unit(protocol, unit):
     if not pilot_dbref:
         return
     mux_commands.trigger(
-        protocol, unit_dbref, 'SETLOADPREFS_MECHPREFS.T', [pilot_dbref])
+        protocol, unit_dbref, 'SETLOADPREFS_MECHPREFS.T', [pilot_dbref],
+        ack_mode=ACK_NONE)
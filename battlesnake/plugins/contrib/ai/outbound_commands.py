@@ -3,6 +3,7 @@ import time
 from twisted.internet.defer import inlineCallbacks, returnValue
 
 from battlesnake.conf import settings
+from battlesnake.core.protocols.acknowledgement import ACK_SHARED, ACK_NONE
 from battlesnake.plugins.contrib.ai.signals import on_unit_ai_started
 from battlesnake.outbound_commands import think_fn_wrappers
 from battlesnake.outbound_commands import mux_commands
@@ -28,7 +29,7 @@ def start_unit_ai(
     ai_dbref = yield think_fn_wrappers.create(protocol, ai_name, otype='t')
     # Dead mech/AI compactor dbref.
     compactor_dbref = settings['unit_spawning']['dead_mech_compactor_dbref']
-    mux_commands.link(protocol, ai_dbref, compactor_dbref)
+    mux_commands.link(protocol, ai_dbref, compactor_dbref, ack_mode=ACK_NONE)
     yield think_fn_wrappers.teleport(protocol, ai_dbref, unit_dbref)
     # AI pilot is in place, set some attribs on him
     yield think_fn_wrappers.set_attrs(protocol, ai_dbref, {
@@ -39,7 +40,8 @@ def start_unit_ai(
     # We can't set this with set(), have to use @set or @startup.
     yield mux_commands.startup(
         p, ai_dbref,
-        '@fo me={disengage;delcommand -1;addcommand startup;addcommand autogun on;engage}',)
+        '@fo me={disengage;delcommand -1;addcommand startup;addcommand autogun on;engage}',
+        ack_mode=ACK_SHARED)
     # Now set some values on the mech that are needed to make things work.
     yield think_fn_wrappers.set_attrs(protocol, unit_dbref, {
         'MECHSKILLS': '%s %s' % (piloting_skill, gunnery_skill),
@@ -51,11 +53,14 @@ def start_unit_ai(
     ]
     # This activates the AI when the XCODE flag is set.
     yield think_fn_wrappers.set_flags(protocol, ai_dbref, flags)
-    mux_commands.parent(p, ai_dbref, settings['ai']['ai_parent_dbref'])
-    mux_commands.lock(p, ai_dbref, ai_dbref)
+    # Nothing waits on these, so there's no need to watch for them. Failures
+    # get logged by the protocol's no-ack monitor.
+    mux_commands.parent(
+        p, ai_dbref, settings['ai']['ai_parent_dbref'], ack_mode=ACK_NONE)
+    mux_commands.lock(p, ai_dbref, ai_dbref, ack_mode=ACK_NONE)
     # This sequence will engage the AI and start the unit.
     force_cmd = "{addcommand startup;addcommand autogun on;engage;@wait 1=sendchannel a=Engaged and starting up!}"
-    mux_commands.force(p, ai_dbref, force_cmd)
+    mux_commands.force(p, ai_dbref, force_cmd, ack_mode=ACK_NONE)
 
     on_unit_ai_started.send(None, ai_dbref=ai_dbref, unit_dbref=unit_dbref)
     returnValue(ai_dbref)
@@ -1,6 +1,7 @@
 from twisted.internet.defer import inlineCallbacks
 
 from battlesnake.conf import settings
+from battlesnake.core.read_cache import STATIC_VALUE_TTL
 from battlesnake.outbound_commands import think_fn_wrappers
 from battlesnake.outbound_commands import mux_commands
 
@@ -51,7 +52,11 @@ def _clear_map(protocol, arena_master_dbref):
     """
 
     p = protocol
-    map_dbref = yield think_fn_wrappers.get(p, arena_master_dbref, 'MAP.DBREF')
+    map_dbref = yield think_fn_wrappers.get(
+        p, arena_master_dbref, 'MAP.DBREF', cache_ttl=STATIC_VALUE_TTL)
+    # The map is destroyed along with the rest of the zone, which the read
+    # cache doesn't see. Its dbref may be recycled for the next arena.
+    p.read_cache.invalidate(map_dbref)
     mux_commands.trigger(p, map_dbref, 'DEST_ALL_MECHS.T')
     mux_commands.force(p, map_dbref, 'CLEARMAP')
 
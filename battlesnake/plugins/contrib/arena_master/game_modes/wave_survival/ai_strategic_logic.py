@@ -34,26 +34,22 @@ def get_logical_roam_destination(puppet, edge_padding=8):
     return x, y
 
 
-def find_nearest_enemy(ai_unit, enemy_units):
+def find_nearest_enemy(unit_store, ai_unit, enemy_ids):
     """
-    Given a unit and a list of its opponents, find the nearest one and return it.
+    Given a unit and its opponents, find the nearest one and return it.
 
+    :param ArenaMapUnitStore unit_store: The store the units are in.
     :param ArenaMapUnit ai_unit: The unit whose enemies to find.
-    :param list enemy_units: List of enemy ArenaMapUnit instances.
+    :param set enemy_ids: The contact IDs of the unit's enemies.
     :rtype: ArenaMapUnit or None
     :returns: The enemy nearest to the given unit, or None if no enemies
         are present.
     """
 
-    nearest_unit = None
-    range_to_nearest = None
-    for enemy in enemy_units:
-        range_to = ai_unit.distance_to_unit(enemy)
-        if not nearest_unit or range_to < range_to_nearest:
-            range_to_nearest = range_to
-            nearest_unit = enemy
-            continue
-    return nearest_unit
+    nearest_units = unit_store.find_nearest_units(
+        ai_unit.x_coord, ai_unit.y_coord,
+        predicate=lambda unit: unit.contact_id in enemy_ids)
+    return nearest_units[0] if nearest_units else None
 
 
 def move_idle_units(puppet, friendly_ai_units, enemy_units):
@@ -66,6 +62,7 @@ def move_idle_units(puppet, friendly_ai_units, enemy_units):
     """
 
     protocol = puppet.protocol
+    enemy_ids = set(enemy.contact_id for enemy in enemy_units)
 
     for unit in friendly_ai_units:
         if unit.is_immobile():
@@ -109,7 +106,7 @@ def move_idle_units(puppet, friendly_ai_units, enemy_units):
         # At this point, we've determined that the unit is idle and needs
         # something to do. Start by trying to find the nearest enemy unit.
         # If none can be found, we resort to roaming the map.
-        nearest_enemy = find_nearest_enemy(unit, enemy_units)
+        nearest_enemy = find_nearest_enemy(puppet.unit_store, unit, enemy_ids)
         if nearest_enemy:
             new_dest = nearest_enemy.x_coord, nearest_enemy.y_coord
             print "  - New destination (%s) %s" % (nearest_enemy, new_dest)
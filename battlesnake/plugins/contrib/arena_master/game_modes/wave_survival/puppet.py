@@ -1,5 +1,5 @@
 import random
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, gatherResults
 
 from battlesnake.conf import settings
 from battlesnake.outbound_commands import mux_commands
@@ -73,9 +73,8 @@ class WaveSurvivalPuppet(ArenaMasterPuppet):
         but this will do for now.
         """
 
-        units_by_faction = self.unit_store.list_units_by_faction()
-        attacking_units = units_by_faction.get(self.attacking_faction_dbref, [])
-        defending_units = units_by_faction.get(self.defending_faction_dbref, [])
+        attacking_units = self.list_attacking_units()
+        defending_units = self.list_defending_units()
 
         attacking_ai_units = [unit for unit in attacking_units if unit.is_ai]
         # Put any idle/slacking units to work.
@@ -249,9 +248,8 @@ class WaveSurvivalPuppet(ArenaMasterPuppet):
         :returns: A list of all remaining defending units still on the map.
         """
 
-        units_by_faction = self.unit_store.list_units_by_faction(
-            piloted_only=piloted_only)
-        return units_by_faction.get(self.defending_faction_dbref, [])
+        return self.unit_store.list_units_in_faction(
+            self.defending_faction_dbref, piloted_only=piloted_only)
 
     def calc_total_defending_units_bv2(self):
         """
@@ -270,9 +268,8 @@ class WaveSurvivalPuppet(ArenaMasterPuppet):
         :returns: A list of all remaining attacking units still on the map.
         """
 
-        units_by_faction = self.unit_store.list_units_by_faction(
-            piloted_only=piloted_only)
-        return units_by_faction.get(self.attacking_faction_dbref, [])
+        return self.unit_store.list_units_in_faction(
+            self.attacking_faction_dbref, piloted_only=piloted_only)
 
     def calc_total_attacking_units_bv2(self):
         """
@@ -297,14 +294,24 @@ class WaveSurvivalPuppet(ArenaMasterPuppet):
         Repairs all defending units on the map.
         """
 
+        # The units are all repaired at once so that they can share round
+        # trips.
+        yield gatherResults([
+            self._repair_unit(unit) for unit in self.list_defending_units()],
+            consumeErrors=True)
+
+    @inlineCallbacks
+    def _repair_unit(self, unit):
+        """
+        :param ArenaMapUnit unit: The unit to repair.
+        """
+
         p = self.protocol
-        for unit in self.list_defending_units():
-            yield unit_manipulation.heal_unit_pilot(p, unit.dbref)
-            # Rather than deal with manually setting counters and fixing
-            # some of the other hidden state, just reload the units entirely.
-            # The map change will cause the auto-restart.
-            yield think_fn_wrappers.btloadmech(
-                p, unit.dbref, unit.unit_ref)
+        yield unit_manipulation.heal_unit_pilot(p, unit.dbref)
+        # Rather than deal with manually setting counters and fixing
+        # some of the other hidden state, just reload the units entirely.
+        # The map change will cause the auto-restart.
+        yield think_fn_wrappers.btloadmech(p, unit.dbref, unit.unit_ref)
 
     def announce_num_units_remaining(self, exclude_unit=None):
         """
@@ -338,7 +345,10 @@ class WaveSurvivalPuppet(ArenaMasterPuppet):
         if random.random() > fixer_probability:
             return
 
-        fx, fy = self.unit_store.get_random_hex_near_unit(unit, max_distance=5)
+        # A fixer that lands under a unit can't be picked up until the unit
+        # moves off of it and back.
+        fx, fy = self.unit_store.get_random_hex_near_unit(
+            unit, max_distance=5, unoccupied=True)
         if random.random() <= 0.7:
             fixer_type = 'armor'
         else:
@@ -2,6 +2,7 @@ import random
 
 from twisted.internet.defer import inlineCallbacks, returnValue
 
+from battlesnake.core.read_cache import STATIC_VALUE_TTL
 from battlesnake.outbound_commands.think_fn_wrappers import get_map_dimensions
 from battlesnake.plugins.contrib.ai.outbound_commands import start_unit_ai
 from battlesnake.plugins.contrib.arena_master.game_modes.wave_survival.defines import \
@@ -134,7 +135,8 @@ def spawn_wave(protocol, wave_num, opposing_bv2, difficulty_level,
     ai_gunnery = wave_diff_defines['ai_gunnery_skills']
     ai_piloting = wave_diff_defines['ai_piloting_skills']
     map_dbref = arena_master_puppet.map_dbref
-    map_width, map_height = yield get_map_dimensions(protocol, map_dbref)
+    map_width, map_height = yield get_map_dimensions(
+        protocol, map_dbref, cache_ttl=STATIC_VALUE_TTL)
     refs = yield pick_refs_for_wave(wave_num, opposing_bv2, difficulty_level)
     faction = get_faction(ATTACKER_FACTION_DBREF)
 
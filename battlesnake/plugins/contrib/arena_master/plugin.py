@@ -7,7 +7,7 @@ from battlesnake.plugins.contrib.arena_master.game_modes.wave_survival.timers im
 from battlesnake.plugins.contrib.arena_master.inbound_commands import \
     ArenaMasterCommandTable
 from battlesnake.plugins.contrib.arena_master.puppets.units.store_populater import \
-    populate_puppet_store
+    populate_puppet_store, SOFTCODE_HELPERS
 from battlesnake.plugins.contrib.arena_master.puppets.units.timers import \
     ArenaPuppetMasterUnitStoreTimerTable
 from battlesnake.plugins.contrib.arena_master.staging_room.inbound_commands import \
@@ -32,6 +32,8 @@ class ArenaMasterPlugin(BattlesnakePlugin):
         WaveSurvivalTimerTable,
     ]
 
+    softcode_helpers = SOFTCODE_HELPERS
+
     @inlineCallbacks
     def do_after_plugin_is_loaded(self):
         yield populate_puppet_store(self.protocol)
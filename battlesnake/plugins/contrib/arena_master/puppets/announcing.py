@@ -2,10 +2,10 @@
 Emits and announcements.
 """
 
-import inspect
-
 from twisted.internet.defer import inlineCallbacks
 
+from battlesnake.core.call_sites import capture_debug_info
+from battlesnake.core.protocols.outbound_scheduler import PRIORITY_LOW
 from battlesnake.outbound_commands import mux_commands
 
 
@@ -20,6 +20,8 @@ def announce_arena_state_change(protocol, message):
 
     # We do the setdiff() here to remove dupes.
     think_str = "[setdiff(iter(lwho(),ifelse(hasflag(loc(##),IN_CHARACTER),,##)),)]"
-    func_result = yield mux_commands.think(protocol, think_str, debug_info=inspect.stack())
+    func_result = yield mux_commands.think(
+        protocol, think_str, debug_info=capture_debug_info(),
+        priority=PRIORITY_LOW)
     ooc_players = func_result.split()
-    mux_commands.pemit(protocol, ooc_players, full_msg)
+    mux_commands.pemit(protocol, ooc_players, full_msg, priority=PRIORITY_LOW)
@@ -1,5 +1,6 @@
 from twisted.internet.defer import inlineCallbacks
 
+from battlesnake.core.protocols.outbound_scheduler import PRIORITY_HIGH
 from battlesnake.outbound_commands import think_fn_wrappers
 from battlesnake.outbound_commands import mux_commands
 
@@ -15,9 +16,11 @@ def order_ai(protocol, arena_puppet, orders):
     """
 
     command = "sendchannel a={orders}".format(orders=orders)
+    # Orders are combat-critical, don't let them get stuck behind the
+    # contact puller and friends.
     yield mux_commands.force(
         protocol, arena_puppet.dbref,
-        force_command=command)
+        force_command=command, priority=PRIORITY_HIGH)
 
 
 @inlineCallbacks
@@ -1,5 +1,6 @@
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, gatherResults
 
+from battlesnake.core.read_cache import STATIC_VALUE_TTL
 from battlesnake.outbound_commands import think_fn_wrappers
 from battlesnake.outbound_commands import mux_commands
 from battlesnake.outbound_commands import unit_manipulation
@@ -87,7 +88,7 @@ class ArenaMasterPuppet(object):
 
         self.difficulty_level = self.difficulty_level.lower()
         self.map_width, self.map_height = yield get_map_dimensions(
-            p, arena_kwargs['map_dbref'])
+            p, arena_kwargs['map_dbref'], cache_ttl=STATIC_VALUE_TTL)
         self.unit_store = ArenaMapUnitStore(
             arena_master_puppet=self, unit_change_callback=self.handle_unit_change)
 
@@ -187,22 +188,37 @@ class ArenaMasterPuppet(object):
             # This yanks all units off of the map.
             yield think_fn_wrappers.btloadmap(p, self.map_dbref, mmap_or_mapname)
             self.map_width, self.map_height = yield get_map_dimensions(
-                p, self.map_dbref)
+                p, self.map_dbref, cache_ttl=STATIC_VALUE_TTL)
         else:
             yield self._populate_arena_map_from_memory(mmap_or_mapname)
             self.map_width, self.map_height = mmap_or_mapname.dimensions
 
-        # Now we'll put all of the units back on the map.
-        for unit in self.unit_store.list_all_units():
-            yield think_fn_wrappers.btsetxy(
-                p, unit.dbref, self.map_dbref,
-                self.map_width / 2, self.map_height / 2)
-            if unit.pilot_dbref:
-                restore_mechprefs_on_unit(p, unit)
-                mux_commands.force(p, unit.pilot_dbref, 'startup')
+        # Now we'll put all of the units back on the map. These are all
+        # fired off at once so that they can share round trips.
+        yield gatherResults([
+            self._put_unit_back_on_map(unit)
+            for unit in self.unit_store.list_all_units()],
+            consumeErrors=True)
         # And reload the staging and puppet OLs.
         yield self.reload_observers()
 
+    @inlineCallbacks
+    def _put_unit_back_on_map(self, unit):
+        """
+        Moves a unit to the middle of the freshly loaded map, and starts it
+        back up.
+
+        :param ArenaMapUnit unit:
+        """
+
+        p = self.protocol
+        yield think_fn_wrappers.btsetxy(
+            p, unit.dbref, self.map_dbref,
+            self.map_width / 2, self.map_height / 2)
+        if unit.pilot_dbref:
+            restore_mechprefs_on_unit(p, unit)
+            mux_commands.force(p, unit.pilot_dbref, 'startup')
+
     @inlineCallbacks
     def _populate_arena_map_from_memory(self, mmap):
         """
@@ -238,7 +254,8 @@ class ArenaMasterPuppet(object):
         """
 
         p = self.protocol
-        map_width, map_height = yield get_map_dimensions(p, self.map_dbref)
+        map_width, map_height = yield get_map_dimensions(
+            p, self.map_dbref, cache_ttl=STATIC_VALUE_TTL)
         for ol_dbref in [self.staging_dbref, self.puppet_ol_dbref]:
             yield think_fn_wrappers.btsetxy(
                 p, ol_dbref, self.map_dbref, map_width / 2, map_height / 2)
@@ -9,6 +9,8 @@ from twisted.internet.defer import inlineCallbacks, returnValue
 from battlesnake.core.utils import is_valid_dbref
 from battlesnake.plugins.contrib.arena_master.game_modes.wave_survival.puppet import \
     WaveSurvivalPuppet
+from battlesnake.plugins.contrib.arena_master.puppets.units.signals import \
+    on_new_unit_detected, on_stale_unit_removed
 
 
 class ArenaMasterPuppetStore(object):
@@ -19,6 +21,12 @@ class ArenaMasterPuppetStore(object):
 
     def __init__(self):
         self._puppet_store = {}
+        # Unit dbrefs mapped to the puppet whose arena they're in. Kept up
+        # to date by the unit stores' signals. Units that are purged some
+        # other way (like being destroyed) are weeded out on lookup.
+        self._unit_puppets = {}
+        on_new_unit_detected.connect(self._on_new_unit_detected)
+        on_stale_unit_removed.connect(self._on_stale_unit_removed)
 
     def __iter__(self):
         for puppet in self._puppet_store.values():
@@ -92,7 +100,10 @@ class ArenaMasterPuppetStore(object):
         """
 
         assert is_valid_dbref(puppet_dbref), "Invalid puppet dbref."
-        del self._puppet_store[puppet_dbref]
+        puppet = self._puppet_store.pop(puppet_dbref)
+        if puppet.unit_store is not None:
+            for unit in puppet.unit_store:
+                self._forget_unit_puppet(unit.dbref, puppet)
 
     def find_puppet_for_unit_dbref(self, unit_dbref):
         """
@@ -102,12 +113,38 @@ class ArenaMasterPuppetStore(object):
         :rtype: ArenaMasterPuppet or None
         """
 
-        for puppet in self.list_arena_master_puppets():
-            try:
+        puppet = self._unit_puppets.get(unit_dbref)
+        if puppet is None:
+            return None
+        try:
+            if self._puppet_store.get(puppet.dbref) is puppet:
                 puppet.unit_store.get_unit_by_dbref(unit_dbref)
                 return puppet
-            except ValueError:
-                continue
+        except ValueError:
+            pass
+        # The unit has left the arena, or the arena is gone.
+        del self._unit_puppets[unit_dbref]
+        return None
+
+    def _on_new_unit_detected(self, unit_store, unit):
+        puppet = unit_store.arena_master_puppet
+        if puppet is not None:
+            self._unit_puppets[unit.dbref] = puppet
+
+    def _on_stale_unit_removed(self, unit_store, unit):
+        puppet = unit_store.arena_master_puppet
+        if puppet is not None:
+            self._forget_unit_puppet(unit.dbref, puppet)
+
+    def _forget_unit_puppet(self, unit_dbref, puppet):
+        """
+        :param str unit_dbref: The unit to forget the puppet of, unless it
+            has since turned up in another arena.
+        :param ArenaMasterPuppet puppet: The puppet the unit was in.
+        """
+
+        if self._unit_puppets.get(unit_dbref) is puppet:
+            del self._unit_puppets[unit_dbref]
 
 
 # Lame that we have to pollute the global namespace, but whatevs.
@@ -0,0 +1,98 @@
+"""
+Lookups on the arena unit store that are kept up to date as units come and
+go, so that listing a faction's units (for example) doesn't mean looking at
+every unit on the map.
+"""
+
+# Flags that units are filed under by UNIT_FLAG_INDEX_SPEC.
+FLAG_PILOTED = 'piloted'
+FLAG_HUMAN = 'human'
+FLAG_AI = 'ai'
+FLAG_POWERUP = 'powerup'
+
+
+class UnitGroupIndex(object):
+    """
+    Files units under one or more keys, worked out from their fields.
+    """
+
+    def __init__(self, fields, get_keys):
+        """
+        :param tuple fields: The unit fields that the keys are worked out
+            from. The unit is re-filed when any of these change.
+        :param callable get_keys: Called with a unit, returns the keys to
+            file it under.
+        """
+
+        self.fields = frozenset(fields)
+        self.get_keys = get_keys
+        # Keys mapped to dicts of contact IDs to units.
+        self._groups = {}
+        # Contact IDs mapped to the keys the unit is filed under.
+        self._unit_keys = {}
+
+    def add(self, unit):
+        """
+        Files a unit. If it's already in the index, it's re-filed.
+
+        :param ArenaMapUnit unit:
+        """
+
+        contact_id = unit.contact_id
+        keys = tuple(self.get_keys(unit))
+        old_keys = self._unit_keys.get(contact_id, ())
+        for key in old_keys:
+            if key not in keys:
+                self._remove_from_group(key, contact_id)
+        for key in keys:
+            self._groups.setdefault(key, {})[contact_id] = unit
+        self._unit_keys[contact_id] = keys
+
+    def remove(self, contact_id):
+        """
+        :param str contact_id: The contact ID of the unit to take out. It's
+            fine if it's not in the index.
+        """
+
+        for key in self._unit_keys.pop(contact_id, ()):
+            self._remove_from_group(key, contact_id)
+
+    def _remove_from_group(self, key, contact_id):
+        group = self._groups[key]
+        del group[contact_id]
+        if not group:
+            del self._groups[key]
+
+    def get(self, key):
+        """
+        :rtype: dict
+        :returns: Contact IDs mapped to the units filed under ``key``. Don't
+            modify it.
+        """
+
+        return self._groups.get(key, {})
+
+    def keys(self):
+        """
+        :rtype: list
+        :returns: Every key that has units filed under it.
+        """
+
+        return self._groups.keys()
+
+
+def _get_unit_flags(unit):
+    if unit.pilot_dbref:
+        yield FLAG_PILOTED
+        yield FLAG_AI if unit.is_ai else FLAG_HUMAN
+    if unit.is_powerup:
+        yield FLAG_POWERUP
+
+
+# (fields, get_keys) pairs for the store's indexes.
+UNIT_DBREF_INDEX_SPEC = (('dbref',), lambda unit: (unit.dbref,))
+UNIT_FACTION_INDEX_SPEC = (
+    ('faction_dbref',),
+    lambda unit: (unit.faction_dbref,) if unit.faction_dbref else ())
+UNIT_TYPE_INDEX_SPEC = (('unit_type',), lambda unit: (unit.unit_type,))
+UNIT_FLAG_INDEX_SPEC = (('pilot_dbref', 'is_ai', 'is_powerup'), _get_unit_flags)
@@ -0,0 +1,189 @@
+"""
+Finds units by position without looking at every unit in the arena. The map
+is cut up into square buckets of hexes, and each unit is filed under the
+bucket it's in. Queries only look in the buckets near the point being
+asked about, so their cost depends on how crowded that part of the map is.
+
+Distances are the same flat x/y range as
+:py:meth:`ArenaMapUnit.distance_to_unit
+<battlesnake.plugins.contrib.arena_master.puppets.units.unit_store.ArenaMapUnit.distance_to_unit>`.
+"""
+
+import heapq
+
+from battlesnake.core.utils import calc_xy_range
+
+# How many hexes wide and tall each bucket is.
+HEX_BUCKET_SIZE = 8
+
+
+class HexBucketIndex(object):
+    """
+    Units, filed by the bucket that their hex is in.
+    """
+
+    # The unit fields that a unit's bucket is worked out from.
+    fields = frozenset(['x_coord', 'y_coord'])
+
+    def __init__(self, bucket_size=HEX_BUCKET_SIZE):
+        """
+        :keyword int bucket_size: How many hexes wide and tall each bucket
+            is.
+        """
+
+        self.bucket_size = bucket_size
+        # Bucket keys mapped to dicts of contact IDs to units.
+        self._buckets = {}
+        # Contact IDs mapped to the key of the bucket the unit is in.
+        self._unit_buckets = {}
+
+    def __len__(self):
+        return len(self._unit_buckets)
+
+    def _bucket_key(self, x_coord, y_coord):
+        return x_coord // self.bucket_size, y_coord // self.bucket_size
+
+    def add(self, unit):
+        """
+        Files a unit under its current position. If it's already in the
+        index, it's moved.
+
+        :param ArenaMapUnit unit:
+        """
+
+        key = self._bucket_key(unit.x_coord, unit.y_coord)
+        old_key = self._unit_buckets.get(unit.contact_id)
+        if old_key == key:
+            # Still in the same bucket, but this may be a new instance.
+            self._buckets[key][unit.contact_id] = unit
+            return
+        if old_key is not None:
+            self._remove_from_bucket(old_key, unit.contact_id)
+        self._buckets.setdefault(key, {})[unit.contact_id] = unit
+        self._unit_buckets[unit.contact_id] = key
+
+    # Units are re-filed the same way they're filed in the first place.
+    move = add
+
+    def remove(self, contact_id):
+        """
+        :param str contact_id: The contact ID of the unit to take out. It's
+            fine if it's not in the index.
+        """
+
+        key = self._unit_buckets.pop(contact_id, None)
+        if key is not None:
+            self._remove_from_bucket(key, contact_id)
+
+    def _remove_from_bucket(self, key, contact_id):
+        bucket = self._buckets[key]
+        del bucket[contact_id]
+        if not bucket:
+            del self._buckets[key]
+
+    def clear(self):
+        self._buckets.clear()
+        self._unit_buckets.clear()
+
+    def units_in_hex(self, x_coord, y_coord):
+        """
+        :param int x_coord:
+        :param int y_coord:
+        :rtype: list
+        :returns: The units in the hex.
+        """
+
+        bucket = self._buckets.get(self._bucket_key(x_coord, y_coord))
+        if not bucket:
+            return []
+        return [unit for unit in bucket.itervalues()
+                if unit.x_coord == x_coord and unit.y_coord == y_coord]
+
+    def units_within(self, x_coord, y_coord, radius):
+        """
+        :param int x_coord:
+        :param int y_coord:
+        :param float radius: The farthest a unit can be from the point.
+        :rtype: list
+        :returns: The units within ``radius`` of the point, nearest first.
+        """
+
+        center_x, center_y = self._bucket_key(x_coord, y_coord)
+        reach = int(radius) // self.bucket_size + 1
+        found = []
+        for bucket_x in range(center_x - reach, center_x + reach + 1):
+            for bucket_y in range(center_y - reach, center_y + reach + 1):
+                bucket = self._buckets.get((bucket_x, bucket_y))
+                if not bucket:
+                    continue
+                for unit in bucket.itervalues():
+                    distance = calc_xy_range(
+                        x_coord, y_coord, unit.x_coord, unit.y_coord)
+                    if distance <= radius:
+                        found.append((distance, unit))
+        found.sort(key=lambda pair: pair[0])
+        return [found_unit for _, found_unit in found]
+
+    def nearest(self, x_coord, y_coord, count=1, predicate=None):
+        """
+        Looks outward from the point, one ring of buckets at a time, until
+        nothing unchecked could be any nearer than what's been found.
+
+        :param int x_coord:
+        :param int y_coord:
+        :keyword int count: The most units to return.
+        :keyword callable predicate: If given, only units that it returns
+            True for are considered.
+        :rtype: list
+        :returns: Up to ``count`` units, nearest first.
+        """
+
+        if not self._buckets or count < 1:
+            return []
+        center_x, center_y = self._bucket_key(x_coord, y_coord)
+        # Past this ring, there are no more buckets with units in them.
+        max_ring = max(
+            max(abs(bucket_x - center_x), abs(bucket_y - center_y))
+            for bucket_x, bucket_y in self._buckets)
+        # A max-heap (by negated distance) of the nearest units so far.
+        nearest = []
+        for ring in range(max_ring + 1):
+            for key in _ring_keys(center_x, center_y, ring):
+                bucket = self._buckets.get(key)
+                if not bucket:
+                    continue
+                for unit in bucket.itervalues():
+                    if predicate is not None and not predicate(unit):
+                        continue
+                    distance = calc_xy_range(
+                        x_coord, y_coord, unit.x_coord, unit.y_coord)
+                    entry = (-distance, unit.contact_id, unit)
+                    if len(nearest) < count:
+                        heapq.heappush(nearest, entry)
+                    elif distance < -nearest[0][0]:
+                        heapq.heapreplace(nearest, entry)
+            # Anything in the rings we haven't checked is at least this far
+            # away.
+            if len(nearest) == count and \
+                    -nearest[0][0] <= ring * self.bucket_size:
+                break
+        nearest.sort(reverse=True)
+        return [unit for _, _, unit in nearest]
+
+
+def _ring_keys(center_x, center_y, ring):
+    """
+    :rtype: generator
+    :returns: The keys of the buckets ``ring`` buckets out from the center,
+        in a square.
+    """
+
+    if ring == 0:
+        yield center_x, center_y
+        return
+    for bucket_x in range(center_x - ring, center_x + ring + 1):
+        yield bucket_x, center_y - ring
+        yield bucket_x, center_y + ring
+    for bucket_y in range(center_y - ring + 1, center_y + ring):
+        yield center_x - ring, bucket_y
+        yield center_x + ring, bucket_y
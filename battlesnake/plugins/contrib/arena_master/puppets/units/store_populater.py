@@ -1,13 +1,90 @@
-import inspect
-
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, returnValue
 
 from battlesnake.conf import settings
+from battlesnake.core.call_sites import capture_debug_info
+from battlesnake.core.protocols.outbound_scheduler import PRIORITY_LOW
 from battlesnake.outbound_commands import mux_commands
 from battlesnake.plugins.contrib.arena_master.puppets.puppet_store import \
     PUPPET_STORE
 from battlesnake.plugins.contrib.arena_master.puppets.units.unit_store import \
-    ArenaMapUnit
+    parse_contact_puller_output, parse_contact_delta_output
+
+# Everything the contact puller needs to know about a unit, as one
+# ':'-separated record. ## is the unit's dbref.
+UNIT_RECORD_THOUGHT = (
+    "##:"
+    "[btgetxcodevalue(##,id)]:"
+    "[get(##/Mechtype)]:"
+    "[btgetxcodevalue(##,mechtype)]:"
+    "[btgetxcodevalue(##,mechmovetype)]:"
+    "[get(##/Mechname)]:"
+    "[btgetxcodevalue(##,x)]:"
+    "[btgetxcodevalue(##,y)]:"
+    "[btgetxcodevalue(##,z)]:"
+    "[btgetxcodevalue(##,speed)]:"
+    "[btgetxcodevalue(##,heading)]:"
+    "[btgetxcodevalue(##,tons)]:"
+    "[btgetxcodevalue(##,heat)]:"
+    "[btgetxcodevalue(##,status)]:"
+    "[btgetxcodevalue(##,status2)]:"
+    "[btgetxcodevalue(##,critstatus)]:"
+    "[btgetxcodevalue(##,critstatus2)]:"
+    "[get(##/Faction)]:"
+    "[btgetbv2_ref(get(##/Mechtype))]:"
+    "[btgetxcodevalue(##,target)]:"
+    "[btgetxcodevalue(##,shots_fired)]:"
+    "[btgetxcodevalue(##,shots_hit)]:"
+    "[btgetxcodevalue(##,damage_inflicted)]:"
+    "[btgetxcodevalue(##,damage_taken)]:"
+    "[btgetxcodevalue(##,shots_missed)]:"
+    "[btgetxcodevalue(##,units_killed)]:"
+    "[btgetxcodevalue(##,maxspeed)]:"
+    "[default(##/IS_AI_CONTROLLED,0)]:"
+    "[get(##/Pilot)]:"
+    "[default(##/IS_POWERUP,0)]:"
+    "[default(##/OPTIMAL_WEAP_RANGE.D,3)]:"
+    "[btarmorstatus(##,all)]:"
+    "[btgetxcodevalue(##,hexes_walked)]"
+)
+# The record as a helper that's installed in-game, with the dbref as %0.
+UNIT_RECORD_HELPER = 'BS_UNIT_RECORD'
+SOFTCODE_HELPERS = {
+    UNIT_RECORD_HELPER: UNIT_RECORD_THOUGHT.replace('##', '%0'),
+}
+# The delta contact puller keeps the last record it sent for each unit on
+# the unit, and the dbrefs of the units it sent for a map on the map.
+PULLED_RECORD_ATTR = 'BS_PULLED.D'
+PULLED_UNITS_ATTR = 'BS_PULLED_UNITS.D'
+# Sends a unit's record if it has changed, or if the unit is new to the map
+# (%q3). Unchanged units turn into nothing.
+UNIT_DELTA_THOUGHT = (
+    "[setq(2,{record})]"
+    "[if(or(member(%q3,##),comp(%q2,get(##/{pulled_attr}))),"
+    "[set(##,{pulled_attr}:%q2)]%q2^)]"
+)
+# Sends a unit's record no matter what.
+UNIT_FULL_THOUGHT = "[setq(2,{record})][set(##,{pulled_attr}:%q2)]%q2^"
+# The same, for think_each(). That also evaluates the thought for its end
+# sentinel, with ## being something other than a dbref, so the set() has
+# to be skipped there.
+UNIT_FULL_EACH_THOUGHT = (
+    "[setq(2,{record})]"
+    "[if(strmatch(##,#*),set(##,{pulled_attr}:%q2))]%q2"
+)
+# Units on the map go in %q0, the ones we sent last time in %q1. The output
+# starts with the units that have left, then a '~', then the unit records.
+DELTA_PULL_THOUGHT = (
+    "[setq(0,{units_str})]"
+    "[setq(1,get({map_dbref}/{pulled_units_attr}))]"
+    "[setq(3,setdiff(%q0,%q1))]"
+    "[set({map_dbref},{pulled_units_attr}:%q0)]"
+    "[setdiff(%q1,%q0)]~[iter(%q0,{unit_thought})]"
+)
+# Notes the units on the map for a chunked full pull, and lists them.
+FULL_PULL_UNITS_THOUGHT = (
+    "[setq(0,{units_str})]"
+    "[set({map_dbref},{pulled_units_attr}:%q0)]%q0"
+)
 
 
 @inlineCallbacks
@@ -29,7 +106,7 @@ def populate_puppet_store(protocol):
     # Find all arena puppet master dbrefs.
     thought = "[children({parent_dbref})]".format(
         parent_dbref=puppet_parent_dbref)
-    puppet_master_dbrefs = yield mux_commands.think(protocol, thought, debug_info=inspect.stack())
+    puppet_master_dbrefs = yield mux_commands.think(protocol, thought, debug_info=capture_debug_info())
     # Returns a list of dbrefs which we can then call into the game for more
     # details on.
     puppet_master_split = puppet_master_dbrefs.split()
@@ -57,81 +134,126 @@ def update_store_from_btfuncs(protocol, arena_unit_store):
 
     puppet_parent_dbref = settings['arena_master']['arena_master_parent_dbref']
     map_dbref = arena_unit_store.arena_master_puppet.map_dbref
-    thought = (
-        "[setq(0,filter({puppet_parent_dbref}/IS_SCENARIO_UNIT.F, lcon({map_dbref})))]"
-        "[iter(%q0,"
-            "##:"
-            "[btgetxcodevalue(##,id)]:"
-            "[get(##/Mechtype)]:"
-            "[btgetxcodevalue(##,mechtype)]:"
-            "[btgetxcodevalue(##,mechmovetype)]:"
-            "[get(##/Mechname)]:"
-            "[btgetxcodevalue(##,x)]:"
-            "[btgetxcodevalue(##,y)]:"
-            "[btgetxcodevalue(##,z)]:"
-            "[btgetxcodevalue(##,speed)]:"
-            "[btgetxcodevalue(##,heading)]:"
-            "[btgetxcodevalue(##,tons)]:"
-            "[btgetxcodevalue(##,heat)]:"
-            "[btgetxcodevalue(##,status)]:"
-            "[btgetxcodevalue(##,status2)]:"
-            "[btgetxcodevalue(##,critstatus)]:"
-            "[btgetxcodevalue(##,critstatus2)]:"
-            "[get(##/Faction)]:"
-            "[btgetbv2_ref(get(##/Mechtype))]:"
-            "[btgetxcodevalue(##,target)]:"
-            "[btgetxcodevalue(##,shots_fired)]:"
-            "[btgetxcodevalue(##,shots_hit)]:"
-            "[btgetxcodevalue(##,damage_inflicted)]:"
-            "[btgetxcodevalue(##,damage_taken)]:"
-            "[btgetxcodevalue(##,shots_missed)]:"
-            "[btgetxcodevalue(##,units_killed)]:"
-            "[btgetxcodevalue(##,maxspeed)]:"
-            "[default(##/IS_AI_CONTROLLED,0)]:"
-            "[get(##/Pilot)]:"
-            "[default(##/IS_POWERUP,0)]:"
-            "[default(##/OPTIMAL_WEAP_RANGE.D,3)]:"
-            "[btarmorstatus(##,all)]:"
-            "[btgetxcodevalue(##,hexes_walked)]"
-        "^)]"
-    ).format(
-        puppet_parent_dbref=puppet_parent_dbref, map_dbref=map_dbref
-    )
-    unit_data = yield mux_commands.think(protocol, thought, debug_info=inspect.stack())
-    unit_data = unit_data.split('^')
-    for unit_entry in unit_data:
-        if not unit_entry:
-            continue
-
-        unit_split = unit_entry.split(':')
-        dbref, contact_id, unit_ref, unit_type, unit_move_type, mech_name,\
-            x_coord, y_coord, z_coord, speed, heading, tonnage, heat,\
-            status, status2, critstatus, critstatus2, faction_dbref, \
-            battle_value2, target_dbref, shots_fired, shots_landed,\
-            damage_inflicted, damage_taken, shots_missed, units_killed, maxspeed,\
-            is_ai, pilot_dbref, is_powerup, ai_optimal_weap_range,\
-            armor_int_total, hexes_walked = unit_split
-        unit_obj = ArenaMapUnit(
-            dbref=dbref, contact_id=contact_id, unit_ref=unit_ref,
-            unit_type=unit_type, unit_move_type=unit_move_type,
-            mech_name=mech_name, x_coord=x_coord, y_coord=y_coord,
-            z_coord=z_coord, speed=speed, heading=heading, tonnage=tonnage,
-            heat=heat, status=status, status2=status2, critstatus=critstatus,
-            critstatus2=critstatus2, faction_dbref=faction_dbref,
-            battle_value2=battle_value2, target_dbref=target_dbref,
-            shots_fired=shots_fired, shots_landed=shots_landed,
-            damage_inflicted=damage_inflicted, damage_taken=damage_taken,
-            shots_missed=shots_missed, units_killed=units_killed,
-            maxspeed=maxspeed, is_ai=is_ai, pilot_dbref=pilot_dbref,
-            is_powerup=is_powerup, ai_optimal_weap_range=ai_optimal_weap_range,
-            armor_int_total=armor_int_total, hexes_walked=hexes_walked,
-        )
-        if not unit_obj.contact_id:
-            continue
-        if not unit_obj.mech_name:
-            continue
-        if unit_obj.is_invisible():
-            continue
+    units_str = (
+        "filter({puppet_parent_dbref}/IS_SCENARIO_UNIT.F, lcon({map_dbref}))"
+    ).format(puppet_parent_dbref=puppet_parent_dbref, map_dbref=map_dbref)
+    if protocol.softcode_helpers.installed:
+        record = protocol.softcode_helpers.u(UNIT_RECORD_HELPER, '##')
+    else:
+        record = UNIT_RECORD_THOUGHT
+    if settings['arena_master']['delta_contact_puller']:
+        yield _delta_pull(
+            protocol, arena_unit_store, puppet_parent_dbref, units_str,
+            record)
+        return
 
+    # This runs every second or so per arena. Falling a tick behind is
+    # better than holding up AI orders. Nothing in here is written, so it
+    # can go over one of the worker connections.
+    if settings['arena_master']['chunked_contact_puller']:
+        # One line per unit, so big arenas don't run into line length
+        # limits.
+        unit_records = yield mux_commands.think_each(
+            protocol, units_str, record,
+            debug_info=capture_debug_info(), priority=PRIORITY_LOW,
+            shard_key=map_dbref)
+        unit_data = '^'.join(unit_records)
+    else:
+        # This uses setq() and produces a lot of output, so it doesn't get
+        # batched with other thinks.
+        thought = "[setq(0,{units_str})][iter(%q0,{record}^)]".format(
+            units_str=units_str, record=record)
+        unit_data = yield mux_commands.think(
+            protocol, thought, debug_info=capture_debug_info(),
+            priority=PRIORITY_LOW, batchable=False, shard_key=map_dbref)
+    for unit_obj in parse_contact_puller_output(unit_data):
         arena_unit_store.update_or_add_unit(unit_obj)
     arena_unit_store.purge_stale_units()
+
+
+@inlineCallbacks
+def _delta_pull(protocol, arena_unit_store, puppet_parent_dbref, units_str,
+                record):
+    """
+    Pulls only the units that have changed since the last pull, and the
+    dbrefs of those that have left the map. Every
+    ``contact_puller_full_pull_every`` pulls, and after a pull that fails,
+    every unit is pulled so that any drift gets corrected.
+
+    Pulls set attributes on the map and its units, so they're sent over the
+    primary connection. Worker accounts may not control them.
+
+    :param BattlesnakeTelnetProtocol protocol:
+    :param ArenaMapUnitStore arena_unit_store: The unit store to update.
+    :param str puppet_parent_dbref: The arena master parent's dbref.
+    :param str units_str: Softcode for the list of units on the map.
+    :param str record: Softcode for a unit's record, with ``##`` as the
+        unit's dbref.
+    """
+
+    store = arena_unit_store
+    full_pull_every = settings['arena_master']['contact_puller_full_pull_every']
+    if store.delta_pulls_since_full_pull + 1 >= full_pull_every:
+        store.full_pull_due = True
+    map_dbref = store.arena_master_puppet.map_dbref
+    # The MUX has already noted what it sent by the time we get it. If we
+    # never do, the next pull has to start over from scratch.
+    full_pull = store.full_pull_due
+    store.full_pull_due = True
+    if full_pull and settings['arena_master']['chunked_contact_puller']:
+        # Every unit's record would be too much for one line.
+        changed_units = yield _chunked_full_pull(
+            protocol, map_dbref, puppet_parent_dbref, units_str, record)
+        removed_dbrefs = []
+    else:
+        if full_pull:
+            unit_thought = UNIT_FULL_THOUGHT
+        else:
+            unit_thought = UNIT_DELTA_THOUGHT
+        thought = DELTA_PULL_THOUGHT.format(
+            units_str=units_str, map_dbref=map_dbref,
+            pulled_units_attr=PULLED_UNITS_ATTR,
+            unit_thought=unit_thought.format(
+                record=record, pulled_attr=PULLED_RECORD_ATTR))
+        delta_data = yield mux_commands.think(
+            protocol, thought, debug_info=capture_debug_info(),
+            priority=PRIORITY_LOW, batchable=False)
+        changed_units, removed_dbrefs = parse_contact_delta_output(delta_data)
+    store.apply_contact_delta(
+        changed_units, removed_dbrefs, full_pull=full_pull)
+    if full_pull:
+        store.delta_pulls_since_full_pull = 0
+    else:
+        store.delta_pulls_since_full_pull += 1
+    store.full_pull_due = False
+
+
+@inlineCallbacks
+def _chunked_full_pull(protocol, map_dbref, puppet_parent_dbref, units_str,
+                       record):
+    """
+    A delta puller full pull with one line per unit, for when
+    ``chunked_contact_puller`` is on.
+
+    :rtype: list
+    :returns: ArenaMapUnit instances for every unit on the map.
+    """
+
+    thought = FULL_PULL_UNITS_THOUGHT.format(
+        units_str=units_str, map_dbref=map_dbref,
+        pulled_units_attr=PULLED_UNITS_ATTR)
+    unit_dbrefs = yield mux_commands.think(
+        protocol, thought, debug_info=capture_debug_info(),
+        priority=PRIORITY_LOW, batchable=False)
+    # Units that are no longer scenario units by the time the @dolist runs
+    # are left out. Those that have left the map since are reported as
+    # removed by the next delta pull.
+    list_str = "filter({puppet_parent_dbref}/IS_SCENARIO_UNIT.F,{dbrefs})".format(
+        puppet_parent_dbref=puppet_parent_dbref, dbrefs=unit_dbrefs.strip())
+    unit_thought = UNIT_FULL_EACH_THOUGHT.format(
+        record=record, pulled_attr=PULLED_RECORD_ATTR)
+    unit_records = yield mux_commands.think_each(
+        protocol, list_str, unit_thought, debug_info=capture_debug_info(),
+        priority=PRIORITY_LOW)
+    changed_units, _ = parse_contact_delta_output('~' + '^'.join(unit_records))
+    returnValue(changed_units)
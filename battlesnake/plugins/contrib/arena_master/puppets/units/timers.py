@@ -1,3 +1,5 @@
+from twisted.internet.defer import DeferredList
+
 from battlesnake.conf import settings
 from battlesnake.core.timers import TimerTable, IntervalTimer
 
@@ -24,8 +26,11 @@ class ThinkBTContactPullerTimer(IntervalTimer):
         print "* arena_master contact puller interval: %ss" % cls.interval
 
     def run(self, protocol):
-        for arena_puppet in PUPPET_STORE:
+        # The next pull is skipped if this one is still going, so that a
+        # lagging MUX doesn't get more pulls piled onto it.
+        return DeferredList([
             update_store_from_btfuncs(protocol, arena_puppet.unit_store)
+            for arena_puppet in PUPPET_STORE])
 
 
 class ArenaPuppetMasterUnitStoreTimerTable(TimerTable):
@@ -1,15 +1,26 @@
+import time
 import random
-import datetime
 import math
 
 from battlesnake.conf import settings
 from battlesnake.core.utils import calc_xy_range
 
+from battlesnake.plugins.contrib.arena_master.puppets.units.indexes import \
+    UnitGroupIndex, UNIT_DBREF_INDEX_SPEC, UNIT_FACTION_INDEX_SPEC, \
+    UNIT_TYPE_INDEX_SPEC, UNIT_FLAG_INDEX_SPEC, FLAG_PILOTED, FLAG_HUMAN, \
+    FLAG_POWERUP
+from battlesnake.plugins.contrib.arena_master.puppets.units.spatial_index import \
+    HexBucketIndex
 from battlesnake.plugins.contrib.arena_master.puppets.units.signals import on_stale_unit_removed, \
     on_new_unit_detected, on_unit_destroyed, on_shot_landed, on_shot_missed, \
     on_unit_state_changed
 
 
+# How many random hexes get_random_hex_near_unit() tries when looking for an
+# unoccupied one.
+MAX_UNOCCUPIED_HEX_TRIES = 10
+
+
 class ArenaMapUnitStore(object):
     """
     This class is responsible for storing data about the units on the map that
@@ -25,8 +36,22 @@ class ArenaMapUnitStore(object):
         """
 
         self._unit_store = {}
+        # The same units, filed by position.
+        self._hex_index = HexBucketIndex()
+        # ...and by dbref, faction, unit type, and flags like FLAG_HUMAN.
+        self._dbref_index = UnitGroupIndex(*UNIT_DBREF_INDEX_SPEC)
+        self._faction_index = UnitGroupIndex(*UNIT_FACTION_INDEX_SPEC)
+        self._type_index = UnitGroupIndex(*UNIT_TYPE_INDEX_SPEC)
+        self._flag_index = UnitGroupIndex(*UNIT_FLAG_INDEX_SPEC)
+        self._indexes = (
+            self._hex_index, self._dbref_index, self._faction_index,
+            self._type_index, self._flag_index)
         self.arena_master_puppet = arena_master_puppet
         self.unit_change_callback = unit_change_callback
+        # Used by the delta contact puller. If True, the next pull fetches
+        # every unit instead of just the ones that changed.
+        self.full_pull_due = True
+        self.delta_pulls_since_full_pull = 0
 
     def __iter__(self):
         for unit in self._unit_store.values():
@@ -43,7 +68,7 @@ class ArenaMapUnitStore(object):
         """
 
         if piloted_only:
-            return [unit for unit in self._unit_store.values() if unit.pilot_dbref]
+            return self._flag_index.get(FLAG_PILOTED).values()
         else:
             return self._unit_store.values()
 
@@ -53,7 +78,7 @@ class ArenaMapUnitStore(object):
         :returns: A list of human-piloted ArenaMapUnit instances.
         """
 
-        return [unit for unit in self._unit_store.values() if unit.has_human_pilot()]
+        return self._flag_index.get(FLAG_HUMAN).values()
 
     def add_unit(self, unit):
         """
@@ -63,10 +88,21 @@ class ArenaMapUnitStore(object):
         """
 
         # New unit. Add it and let the connected clients know.
-        self._unit_store[unit.contact_id] = unit
+        self._file_unit(unit)
         print "New unit detected", unit
         on_new_unit_detected.send(self, unit=unit)
 
+    def _file_unit(self, unit):
+        """
+        Puts a unit in the store and its indexes, without announcing it.
+
+        :param ArenaMapUnit unit:
+        """
+
+        self._unit_store[unit.contact_id] = unit
+        for index in self._indexes:
+            index.add(unit)
+
     def update_unit(self, new_unit):
         """
         Given a new unit received from one of the populating methods, see
@@ -92,10 +128,10 @@ class ArenaMapUnitStore(object):
         self.unit_change_callback(old_unit, new_unit, changes)
 
         # Update all fields that have changed.
-        # This could be a lot more efficient, but we'll worry about that later.
-        for change in changes:
-            new_value = getattr(new_unit, change)
-            setattr(old_unit, change, new_value)
+        old_unit.copy_fields_from(new_unit, changes)
+        for index in self._indexes:
+            if not index.fields.isdisjoint(changes):
+                index.add(old_unit)
 
         # Broadcast the changes to all connected users.
         on_unit_state_changed.send(
@@ -137,6 +173,8 @@ class ArenaMapUnitStore(object):
         """
 
         del self._unit_store[unit_id]
+        for index in self._indexes:
+            index.remove(unit_id)
 
     def get_unit_by_dbref(self, dbref):
         """
@@ -148,10 +186,10 @@ class ArenaMapUnitStore(object):
         :raises: ValueError when an invalid dbref is provided.
         """
 
-        for unit in self:
-            if unit.dbref == dbref:
-                return unit
-        raise ValueError('Invalid unit dbref: %s' % dbref)
+        units = self._dbref_index.get(dbref)
+        if not units:
+            raise ValueError('Invalid unit dbref: %s' % dbref)
+        return units.itervalues().next()
 
     def list_powerup_units(self):
         """
@@ -159,43 +197,103 @@ class ArenaMapUnitStore(object):
         :returns: A list of powerup units.
         """
 
-        return [unit for unit in self.__iter__() if unit.is_powerup]
+        return self._flag_index.get(FLAG_POWERUP).values()
+
+    def list_units_by_type(self, unit_type):
+        """
+        :param str unit_type: The unit type (Mech, Vehicle, etc).
+        :rtype: list
+        :returns: A list of units of the given type.
+        """
+
+        return self._type_index.get(unit_type).values()
 
     def list_units_by_faction(self, piloted_only=True):
         """
         Breaks the units up by faction into a dict of lists.
 
+        :keyword bool piloted_only: If True, only include units that have
+            an AI or human pilot.
         :rtype: dict
         :returns: A dict with the keys being faction dbrefs and the values
             being a list of units belonging to said faction.
         """
 
         units_by_faction = {}
-        for unit in self.__iter__():
-            unit_faction = unit.faction_dbref
-            if not unit_faction:
-                continue
-            if piloted_only and not unit.pilot_dbref:
-                continue
-            if unit_faction not in units_by_faction:
-                units_by_faction[unit_faction] = []
-            units_by_faction[unit_faction].append(unit)
+        for faction_dbref in self._faction_index.keys():
+            units = self.list_units_in_faction(
+                faction_dbref, piloted_only=piloted_only)
+            if units:
+                units_by_faction[faction_dbref] = units
         return units_by_faction
 
+    def list_units_in_faction(self, faction_dbref, piloted_only=True):
+        """
+        :param str faction_dbref: The dbref of the faction.
+        :keyword bool piloted_only: If True, only include units that have
+            an AI or human pilot.
+        :rtype: list
+        :returns: A list of the units belonging to the faction.
+        """
+
+        units = self._faction_index.get(faction_dbref)
+        if not piloted_only:
+            return units.values()
+        piloted = self._flag_index.get(FLAG_PILOTED)
+        return [unit for contact_id, unit in units.iteritems()
+                if contact_id in piloted]
+
     def purge_stale_units(self):
         """
         Goes through all of the units in the store, expiring any that we
         haven't seen for a while.
         """
 
-        now = datetime.datetime.now()
         puller_interval = settings['arena_master']['contact_puller_interval']
-        cutoff = now - datetime.timedelta(seconds=puller_interval * 3)
+        cutoff = time.time() - puller_interval * 3
         for unit_id, unit in self._unit_store.items():
             if unit.last_seen < cutoff:
-                print "Removing stale unit:", unit
-                on_stale_unit_removed.send(self, unit=unit)
-                self.purge_unit_by_id(unit.contact_id)
+                self._remove_stale_unit(unit)
+
+    def _remove_stale_unit(self, unit):
+        """
+        :param ArenaMapUnit unit: A unit that's no longer on the map.
+        """
+
+        print "Removing stale unit:", unit
+        on_stale_unit_removed.send(self, unit=unit)
+        self.purge_unit_by_id(unit.contact_id)
+
+    def apply_contact_delta(self, changed_units, removed_dbrefs,
+                            full_pull=False):
+        """
+        Applies a delta contact pull's results. Units that weren't mentioned
+        haven't changed, so they count as seen.
+
+        :param list changed_units: ArenaMapUnit instances for the units that
+            changed since the last pull.
+        :param list removed_dbrefs: Dbrefs of units that left the map (or
+            can no longer be seen) since the last pull.
+        :keyword bool full_pull: If True, ``changed_units`` is every unit on
+            the map, and anything else we have is removed.
+        """
+
+        if full_pull:
+            pulled_dbrefs = set(unit.dbref for unit in changed_units)
+            for unit in self._unit_store.values():
+                if unit.dbref not in pulled_dbrefs:
+                    self._remove_stale_unit(unit)
+        else:
+            for unit in self._unit_store.values():
+                unit.mark_as_seen()
+            for dbref in removed_dbrefs:
+                try:
+                    unit = self.get_unit_by_dbref(dbref)
+                except ValueError:
+                    continue
+                self._remove_stale_unit(unit)
+        for unit in changed_units:
+            self.update_or_add_unit(unit)
 
     def record_hit(self, victim_id, aggressor_id, weapon_name):
         """
@@ -223,24 +321,12 @@ class ArenaMapUnitStore(object):
         :param ArenaMapUnit unit1:
         :param ArenaMapUnit unit2:
         :rtype: list
-        :returns: A list of changed attributes.
-        """
-
-        unit1_dict = unit1.__dict__
-        unit2_dict = unit2.__dict__
-        ignored_keys = [
-            'last_seen', 'ai_last_destination', 'ai_idle_counter',
-            'has_been_ran_over', 'ai_optimal_weap_range',
-        ]
-        changes = []
-        for key, val in unit1_dict.items():
-            if key in ignored_keys:
-                continue
-            unit1_val = val
-            unit2_val = unit2_dict[key]
-            if unit1_val != unit2_val:
-                changes.append(key)
-        return changes
+        :returns: A list of changed attributes, from
+            :py:data:`UNIT_COMPARED_FIELDS`.
+        """
+
+        return [field for field in UNIT_COMPARED_FIELDS
+                if getattr(unit1, field) != getattr(unit2, field)]
 
     def find_units_in_hex(self, x_coord, y_coord):
         """
@@ -250,16 +336,34 @@ class ArenaMapUnitStore(object):
         :returns: A list of units in the same hex.
         """
 
-        units = []
-        for unit in self.__iter__():
-            if unit.x_coord != x_coord:
-                continue
-            if unit.y_coord != y_coord:
-                continue
-            units.append(unit)
-        return units
+        return self._hex_index.units_in_hex(x_coord, y_coord)
+
+    def find_units_within(self, x_coord, y_coord, radius):
+        """
+        :param int x_coord:
+        :param int y_coord:
+        :param float radius: The farthest a unit can be from the coordinate.
+        :rtype: list
+        :returns: A list of units within ``radius`` hexes, nearest first.
+        """
+
+        return self._hex_index.units_within(x_coord, y_coord, radius)
 
-    def get_random_hex_near_unit(self, unit, max_distance):
+    def find_nearest_units(self, x_coord, y_coord, count=1, predicate=None):
+        """
+        :param int x_coord:
+        :param int y_coord:
+        :keyword int count: The most units to return.
+        :keyword callable predicate: If given, only units that it returns
+            True for are considered.
+        :rtype: list
+        :returns: A list of up to ``count`` units, nearest first.
+        """
+
+        return self._hex_index.nearest(
+            x_coord, y_coord, count=count, predicate=predicate)
+
+    def get_random_hex_near_unit(self, unit, max_distance, unoccupied=False):
         """
         Given a unit, find a random hex within ``max_distance`` hexes.
 
@@ -267,8 +371,18 @@ class ArenaMapUnitStore(object):
         :param int max_distance: A maximum 2D distance between the generated
             coordinate and the unit's current coordinate. Constrains the
             radius.
+        :keyword bool unoccupied: If True, try a few times to find a hex
+            with no units in it. If they're all taken, the last one tried
+            is returned anyway.
         """
 
+        for _ in range(MAX_UNOCCUPIED_HEX_TRIES - 1 if unoccupied else 0):
+            rand_x, rand_y = self._random_hex_near_unit(unit, max_distance)
+            if not self.find_units_in_hex(rand_x, rand_y):
+                return rand_x, rand_y
+        return self._random_hex_near_unit(unit, max_distance)
+
+    def _random_hex_near_unit(self, unit, max_distance):
         map_width = self.arena_master_puppet.map_width
         map_height = self.arena_master_puppet.map_height
         x = unit.x_coord
@@ -291,11 +405,44 @@ class ArenaMapUnitStore(object):
         return rand_x, rand_y
 
 
+# The fields in a contact puller record, in order. These are also
+# ArenaMapUnit's constructor args.
+UNIT_RECORD_FIELDS = (
+    'dbref', 'contact_id', 'unit_ref', 'unit_type', 'unit_move_type',
+    'mech_name', 'x_coord', 'y_coord', 'z_coord', 'speed', 'heading',
+    'tonnage', 'heat', 'status', 'status2', 'critstatus', 'critstatus2',
+    'faction_dbref', 'battle_value2', 'target_dbref', 'shots_fired',
+    'shots_landed', 'damage_inflicted', 'damage_taken', 'shots_missed',
+    'units_killed', 'maxspeed', 'is_ai', 'pilot_dbref', 'is_powerup',
+    'ai_optimal_weap_range', 'armor_int_total', 'hexes_walked',
+)
+# Values worked out when a unit is parsed, mapped to the record field that
+# they're worked out from.
+UNIT_DERIVED_FIELDS = {
+    'armor_condition': 'armor_int_total',
+}
+# State that the bot keeps on each unit.
+UNIT_LOCAL_FIELDS = (
+    'ai_last_destination', 'ai_idle_counter', 'has_been_ran_over',
+    'last_seen',
+)
+# The fields that a unit's changes are looked for in. The optimal weapon
+# range is only taken from the first record we see for a unit.
+UNIT_COMPARED_FIELDS = tuple(
+    field for field in UNIT_RECORD_FIELDS if field != 'ai_optimal_weap_range')
+
+
 class ArenaMapUnit(object):
     """
     Represents a single unit on the map. A mech, tank, vtol, suit, etc.
+
+    There are hundreds of these per arena, and a new one is parsed for each
+    unit on every contact pull, so only the fields above may be set.
     """
 
+    __slots__ = (
+        UNIT_RECORD_FIELDS + tuple(UNIT_DERIVED_FIELDS) + UNIT_LOCAL_FIELDS)
+
     def __init__(self, dbref, contact_id, unit_ref, unit_type, unit_move_type,
                  mech_name, x_coord, y_coord, z_coord, speed, heading, tonnage,
                  heat, status, status2, critstatus, critstatus2, faction_dbref,
@@ -335,6 +482,7 @@ class ArenaMapUnit(object):
         self.pilot_dbref = pilot_dbref
         self.is_powerup = is_powerup == '1'
         self.armor_int_total = armor_int_total
+        self.armor_condition = _parse_armor_condition(armor_int_total)
 
         # If the arena master wanted this unit to go somewhere, this is
         # where it last asked.
@@ -345,7 +493,7 @@ class ArenaMapUnit(object):
         # For example, a powerup.
         self.has_been_ran_over = False
 
-        self.last_seen = datetime.datetime.now()
+        self.last_seen = time.time()
 
     def __repr__(self):
         return "[%s] %s" % (self.contact_id, self.mech_name)
@@ -363,12 +511,29 @@ class ArenaMapUnit(object):
         """
         :rtype: float
         :returns: A 0...1 percentage of the remaining armor on the unit.
+        :raises: ValueError if the unit's armor status couldn't be parsed.
         """
 
-        armor_totals = self.armor_int_total.split('|')[0]
-        current_armor, max_armor = armor_totals.split('/')
-        armor_perc = float(current_armor) / float(max_armor)
-        return float('%.2f' % armor_perc)
+        if self.armor_condition is None:
+            raise ValueError(
+                'Invalid armor status: %s' % self.armor_int_total)
+        return self.armor_condition
+
+    def copy_fields_from(self, other_unit, fields):
+        """
+        Copies fields from a newer copy of this unit, along with anything
+        that's worked out from them.
+
+        :param ArenaMapUnit other_unit: The newer copy.
+        :param list fields: The names of the fields to copy, as returned
+            by :py:meth:`ArenaMapUnitStore.compare_units`.
+        """
+
+        for field in fields:
+            setattr(self, field, getattr(other_unit, field))
+        for derived_field, field in UNIT_DERIVED_FIELDS.iteritems():
+            if field in fields:
+                setattr(self, derived_field, getattr(other_unit, derived_field))
 
     def distance_to_unit(self, other_unit):
         """
@@ -400,7 +565,7 @@ class ArenaMapUnit(object):
         Called every time the bot sees this unit. Prevents expiration.
         """
 
-        self.last_seen = datetime.datetime.now()
+        self.last_seen = time.time()
 
     def get_target_dbref(self):
         """
@@ -436,7 +601,7 @@ class ArenaMapUnit(object):
             means of locomotion.
         """
 
-        if self.maxspeed == '0.0' or self.unit_move_type == 'None':
+        if self.maxspeed == 0.0 or self.unit_move_type == 'None':
             return True
         if self.unit_type == "Vehicle" and 'h' in self.status:
             return True
@@ -488,3 +653,96 @@ class ArenaMapUnit(object):
 
     def is_invisible(self):
         return 'A' in self.critstatus
+
+
+def parse_contact_puller_output(unit_data):
+    """
+    Parses the output of the contact puller's think in
+    :py:func:`update_store_from_btfuncs
+    <battlesnake.plugins.contrib.arena_master.puppets.units.store_populater.update_store_from_btfuncs>`.
+
+    :param str unit_data: The raw think output. Units are separated by ``^``,
+        fields by ``:``.
+    :rtype: list
+    :returns: A list of ArenaMapUnit instances. Units without a contact ID or
+        name, and invisible units, are left out.
+    """
+
+    units = []
+    for unit_entry in unit_data.split('^'):
+        if not unit_entry:
+            continue
+        unit_obj = _parse_unit_record(unit_entry)
+        if unit_obj is not None:
+            units.append(unit_obj)
+    return units
+
+
+def parse_contact_delta_output(delta_data):
+    """
+    Parses the output of the delta contact puller's think in
+    :py:func:`update_store_from_btfuncs
+    <battlesnake.plugins.contrib.arena_master.puppets.units.store_populater.update_store_from_btfuncs>`.
+
+    :param str delta_data: The raw think output. This is the dbrefs of the
+        units that left the map, a ``~``, and then the changed units in the
+        same format as :py:func:`parse_contact_puller_output`.
+    :rtype: tuple
+    :returns: A tuple in the form of (changed_units, removed_dbrefs).
+        Changed units that :py:func:`parse_contact_puller_output` would
+        leave out are counted as removed.
+    """
+
+    removed_str, _, unit_data = delta_data.partition('~')
+    changed_units = []
+    removed_dbrefs = removed_str.split()
+    for unit_entry in unit_data.split('^'):
+        # Unchanged units leave a space behind.
+        unit_entry = unit_entry.strip()
+        if not unit_entry:
+            continue
+        unit_obj = _parse_unit_record(unit_entry)
+        if unit_obj is None:
+            removed_dbrefs.append(unit_entry.split(':', 1)[0])
+        else:
+            changed_units.append(unit_obj)
+    return changed_units, removed_dbrefs
+
+
+def _parse_unit_record(unit_entry):
+    """
+    :param str unit_entry: One unit's ``:``-separated record.
+    :rtype: ArenaMapUnit or None
+    :returns: The unit, or None if it has no contact ID or name, or is
+        invisible.
+    """
+
+    unit_split = unit_entry.split(':')
+    if len(unit_split) != len(UNIT_RECORD_FIELDS):
+        raise ValueError('Expected %d unit fields, got %d: %s' % (
+            len(UNIT_RECORD_FIELDS), len(unit_split), unit_entry))
+    unit_obj = ArenaMapUnit(*unit_split)
+    if not unit_obj.contact_id:
+        return None
+    if not unit_obj.mech_name:
+        return None
+    if unit_obj.is_invisible():
+        return None
+    return unit_obj
+
+
+def _parse_armor_condition(armor_int_total):
+    """
+    :param str armor_int_total: The unit's ``btarmorstatus(unit,all)``.
+    :rtype: float or None
+    :returns: A 0...1 percentage of the remaining armor on the unit, or
+        None if the armor status can't be made sense of.
+    """
+
+    armor_totals = armor_int_total.split('|')[0]
+    try:
+        current_armor, max_armor = armor_totals.split('/')
+        armor_perc = float(current_armor) / float(max_armor)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return float('%.2f' % armor_perc)
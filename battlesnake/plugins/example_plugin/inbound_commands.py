@@ -6,11 +6,15 @@ from twisted.internet import task
 from twisted.internet import reactor
 from twisted.internet.defer import inlineCallbacks
 
+from battlesnake.core.call_sites import capture_debug_info
 from battlesnake.core.inbound_command_handling.command_table import InboundCommandTable
-from battlesnake.core.inbound_command_handling.base import BaseCommand
+from battlesnake.core.inbound_command_handling.base import BaseCommand, \
+    CommandError
 from battlesnake.core.inbound_command_handling.btargparse import \
     BTMuxArgumentParser
+from battlesnake.core.metrics import ROUND_TRIP_METRICS
 from battlesnake.outbound_commands import mux_commands
+from battlesnake.outbound_commands import think_fn_wrappers
 
 
 class BotInfoCommand(BaseCommand):
@@ -43,6 +47,55 @@ class BotInfoCommand(BaseCommand):
         mux_commands.pemit(protocol, invoker_dbref, pval)
 
 
+class BotMetricsCommand(BaseCommand):
+    """
+    Shows round-trip latency stats for outbound commands, grouped by the
+    function that sent them. Pass a ``reset`` kwarg to clear the stats
+    after showing them. Staff only, since the report names the worker
+    accounts and a reset wipes everyone's stats.
+    """
+
+    command_name = "botmetrics"
+
+    @inlineCallbacks
+    def run(self, protocol, parsed_line, invoker_dbref):
+        is_staff = yield think_fn_wrappers.is_staff(protocol, invoker_dbref)
+        if not is_staff:
+            raise CommandError("Only staff may view the bot's metrics.")
+        scheduler_stats = protocol.outbound_scheduler.get_stats()
+        pval = self._get_header_str("Battlesnake Round Trips")
+        report_lines = ROUND_TRIP_METRICS.format_report(limit=30)
+        report_lines.append(
+            "Outbound queue depth: %d (peak %d)  In flight: %d/%d" % (
+                scheduler_stats['queue_depth'],
+                scheduler_stats['peak_queue_depth'],
+                scheduler_stats['in_flight'],
+                scheduler_stats['max_in_flight']))
+        if protocol.worker_pool:
+            pool_stats = protocol.worker_pool.get_stats()
+            report_lines.append(
+                "Worker connections: %d/%d  Sent over the primary: %d" % (
+                    pool_stats['workers_connected'],
+                    len(pool_stats['workers']),
+                    pool_stats['requests_on_primary']))
+            for worker in pool_stats['workers']:
+                report_lines.append("  %-20s %-5s load %-4d sent %d" % (
+                    worker['username'],
+                    'up' if worker['connected'] else 'down',
+                    worker['load'], worker['requests_routed']))
+        report_lines += protocol.command_scheduler.format_report(limit=10)
+        report_lines += protocol.timer_scheduler.format_report()
+        for line in report_lines:
+            # The MUX would otherwise compress our column padding.
+            pval += "\r " + line.replace(' ', '%b')
+        pval += self._get_footer_str()
+        mux_commands.pemit(protocol, invoker_dbref, pval)
+
+        if parsed_line.kwargs.get('reset'):
+            ROUND_TRIP_METRICS.reset()
+            mux_commands.pemit(protocol, invoker_dbref, "Stats reset.")
+
+
 class BotWaitTestCommand(BaseCommand):
     """
     A command used to test deferred output.
@@ -74,9 +127,9 @@ class CliffTestCommand(BaseCommand):
 
     @inlineCallbacks
     def run(self, protocol, parsed_line, invoker_dbref):
-        import inspect
         mux_commands.pemit(protocol, invoker_dbref, "YAR")
-        yield protocol.expect(r'^test', debug_info=inspect.stack(), timeout_secs=1.0)
+        yield protocol.expect(
+            r'^test', debug_info=capture_debug_info(), timeout_secs=1.0)
 
 
 class ExampleCommandTable(InboundCommandTable):
@@ -86,6 +139,7 @@ class ExampleCommandTable(InboundCommandTable):
 
     commands = [
         BotInfoCommand,
+        BotMetricsCommand,
         BotWaitTestCommand,
         CliffTestCommand,
     ]
@@ -1,6 +1,7 @@
 from battlesnake.core.base_plugin import BattlesnakePlugin
 
 from battlesnake.plugins.example_plugin.inbound_commands import ExampleCommandTable
+from battlesnake.plugins.example_plugin.timers import ExampleTimerTable
 from battlesnake.plugins.example_plugin.triggers import ExampleTriggerTable
 
 
@@ -10,4 +11,5 @@ class ExamplePlugin(BattlesnakePlugin):
     """
 
     trigger_tables = [ExampleTriggerTable]
+    timer_tables = [ExampleTimerTable]
     command_tables = [ExampleCommandTable]
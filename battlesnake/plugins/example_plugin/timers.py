@@ -0,0 +1,31 @@
+from battlesnake.conf import settings
+from battlesnake.core.metrics import ROUND_TRIP_METRICS
+from battlesnake.core.timers import IntervalTimer
+from battlesnake.core.timers import TimerTable
+
+
+class RoundTripMetricsLogTimer(IntervalTimer):
+    """
+    Periodically dumps the outbound command round-trip stats to the log.
+    """
+
+    interval = settings['bot']['round_trip_metrics_log_interval']
+
+    def run(self, protocol):
+        if not ROUND_TRIP_METRICS.histograms:
+            return
+        for line in ROUND_TRIP_METRICS.format_report():
+            print line
+        print "Outbound scheduler:", protocol.outbound_scheduler.get_stats()
+        for line in protocol.timer_scheduler.format_report():
+            print line
+
+
+class ExampleTimerTable(TimerTable):
+    """
+    Bot management timers.
+    """
+
+    timers = []
+    if RoundTripMetricsLogTimer.interval:
+        timers.append(RoundTripMetricsLogTimer)
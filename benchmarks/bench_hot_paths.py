@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+"""
+Microbenchmarks for the code that runs on every line the bot sends or
+receives: command parsing, response watcher and trigger matching, the
+%-sequence and ANSI helpers, and the contact puller's parsing and unit
+comparison.
+
+Results are compared against the baselines stored in
+``benchmarks/baselines/bench_hot_paths.json``. Anything that got slower by
+more than ``--tolerance`` is flagged. Baselines are only meaningful on the
+machine that recorded them, so re-record them (``--save``) before
+comparing on a new box. Changes that speed up or slow down these paths on
+purpose should re-record them in the same commit.
+
+Run from the repo root::
+
+    PYTHONPATH=. python benchmarks/bench_hot_paths.py
+    PYTHONPATH=. python benchmarks/bench_hot_paths.py --save
+    PYTHONPATH=. python benchmarks/bench_hot_paths.py --check --tolerance 0.3
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+
+from battlesnake.core.ansi import remove_ansi_codes
+from battlesnake.core.inbound_command_handling.command_parser import \
+    parse_line
+from battlesnake.core.response_watcher import ResponseWatcherManager
+from battlesnake.core.triggers import Trigger, TriggerTable, TriggerEngine
+from battlesnake.core.utils import remove_all_percent_sequences, \
+    add_escaping_percent_sequences, generate_compact_token
+from battlesnake.plugins.contrib.arena_master.puppets.units.unit_store import \
+    ArenaMapUnitStore, parse_contact_puller_output
+
+# The contact record factory lives with the tests.
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'))
+from unit_records import make_unit_record
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'baselines', 'bench_hot_paths.json')
+# Each benchmark is timed this many times, and the fastest run is kept.
+REPEAT = 5
+# Roughly how long (in seconds) each timed run should take.
+TARGET_RUN_SECS = 0.05
+
+# The delimiters that BattlesnakeTelnetFactory gives the protocol.
+CMD_PREFIX = "@G$>"
+CMD_KWARG_DELIMITER = "&R^"
+CMD_KWARG_LIST_DELIMITER = "#E$"
+# A line from the in-game command softcode, as seen by the protocol.
+COMMAND_LINE = (
+    "@G$>arena-spawn&R^#123&R^unit_ref=AS7-D&R^"
+    "coords=10#E$12#E$0&R^faction=#55&R^\r")
+CHATTER_LINE = 'Somebody says, "Anyone up for a match?"\r'
+COLORED_TEXT = (
+    "%ch%cy[Arena 4]%cn %cgWave 3%cn has begun! %cr12%cn hostiles inbound.")
+PLAIN_TEXT = "Wave 3 (12 hostiles) [arena 4]\thas begun!\r"
+# The number of units in the simulated contact puller output.
+NUM_UNITS = 30
+# How many pending watchers of each kind to have while matching.
+NUM_TOKEN_WATCHERS = 50
+NUM_REGEX_WATCHERS = 5
+
+
+class _BenchTrigger(Trigger):
+    def run(self, protocol, line, re_match):
+        pass
+
+
+def _make_trigger(regex_str):
+    return type('BenchTrigger', (_BenchTrigger,), {
+        'line_regex': re.compile(regex_str)})
+
+
+class BenchTriggerTable(TriggerTable):
+    """
+    About what a bot with the contrib plugins loaded has registered.
+    """
+
+    triggers = [
+        _make_trigger(r'(?P<talker>.*) says "[Hh]ello"'),
+        _make_trigger(
+            r'.*\[(?P<channel>.*)\] (?P<author>[\w`$_\-.,\']+)[:] (?P<message>.*)\r'),
+        _make_trigger(r'^\[(?P<unit>[A-Z]{2})\] has been destroyed'),
+        _make_trigger(r'^MUX shutdown in (?P<secs>\d+) seconds'),
+        _make_trigger(r'^(?P<player>\w+) has (connected|disconnected)\.\r'),
+        _make_trigger(r'^#(?P<dbref>\d+) is now idle'),
+    ]
+
+
+def contact_puller_output(num_units):
+    """
+    :param int num_units: How many units to include.
+    :rtype: str
+    :returns: Output shaped like the contact puller's think.
+    """
+
+    entries = []
+    for num in range(num_units):
+        contact_id = chr(ord('A') + num // 26) + chr(ord('A') + num % 26)
+        entries.append(make_unit_record(
+            '#%d' % (1000 + num), contact_id, x_coord=str(num % 30),
+            y_coord=str(num * 7 % 30)))
+    return '^'.join(entries) + '^'
+
+
+def bench_parse_line():
+    yield lambda: parse_line(
+        COMMAND_LINE, CMD_PREFIX, CMD_KWARG_DELIMITER, CMD_KWARG_LIST_DELIMITER)
+
+
+def bench_parse_line_non_command():
+    yield lambda: parse_line(
+        CHATTER_LINE, CMD_PREFIX, CMD_KWARG_DELIMITER, CMD_KWARG_LIST_DELIMITER)
+
+
+class _NullDelayedCall(object):
+    def active(self):
+        return True
+
+    def cancel(self):
+        pass
+
+
+class _NullClock(object):
+    """
+    Never fires anything. task.Clock re-sorts its pending calls every time
+    one is added, which would swamp the watcher lookups being timed.
+    """
+
+    def callLater(self, delay, func, *args, **kwargs):
+        return _NullDelayedCall()
+
+
+def _watcher_manager():
+    manager = ResponseWatcherManager(clock=_NullClock())
+    for _ in range(NUM_TOKEN_WATCHERS):
+        manager.watch_token(generate_compact_token(), 10)
+    for num in range(NUM_REGEX_WATCHERS):
+        manager.watch(r'^Response %d: (?P<value>.*)\r' % num, 10, 'value')
+    return manager
+
+
+def bench_watcher_match_token():
+    manager = _watcher_manager()
+    token = generate_compact_token()
+
+    def run():
+        # Matching removes the watcher, so it has to go back in every time.
+        manager.watch_token(token, 10)
+        manager.match_line(token + "AA:AS7-D:10:12\r")
+    yield run
+
+
+def bench_watcher_non_match():
+    manager = _watcher_manager()
+    yield lambda: manager.match_line(CHATTER_LINE)
+
+
+def bench_trigger_table_non_match():
+    table = BenchTriggerTable()
+    yield lambda: table.match_line(CHATTER_LINE)
+
+
+def bench_trigger_table_match():
+    table = BenchTriggerTable()
+    yield lambda: table.match_line('Gankin has connected.\r')
+
+
+def bench_trigger_engine_non_match():
+    engine = TriggerEngine([BenchTriggerTable()])
+    yield lambda: engine.match_line(CHATTER_LINE)
+
+
+def bench_trigger_engine_match():
+    engine = TriggerEngine([BenchTriggerTable()])
+    yield lambda: engine.match_line('Gankin has connected.\r')
+
+
+def bench_remove_all_percent_sequences():
+    yield lambda: remove_all_percent_sequences(COLORED_TEXT)
+
+
+def bench_add_escaping_percent_sequences():
+    yield lambda: add_escaping_percent_sequences(PLAIN_TEXT)
+
+
+def bench_remove_ansi_codes():
+    yield lambda: remove_ansi_codes(COLORED_TEXT)
+
+
+def bench_contact_puller_parse():
+    unit_data = contact_puller_output(NUM_UNITS)
+    yield lambda: parse_contact_puller_output(unit_data)
+
+
+def bench_arena_map_unit_init():
+    # One unit's worth of output, which is mostly ArenaMapUnit.__init__.
+    unit_data = contact_puller_output(1)
+    yield lambda: parse_contact_puller_output(unit_data)
+
+
+def bench_compare_units():
+    store = ArenaMapUnitStore(None, None)
+    unit1, unit2 = parse_contact_puller_output(contact_puller_output(2))
+    unit2.contact_id = unit1.contact_id
+    yield lambda: store.compare_units(unit1, unit2)
+
+
+# (name, setup) pairs, in the order they're ran. Each setup is a generator
+# that does its prep work, then yields the callable to time.
+BENCHMARKS = [
+    ('parse_line', bench_parse_line),
+    ('parse_line_non_command', bench_parse_line_non_command),
+    ('watcher_match_token', bench_watcher_match_token),
+    ('watcher_non_match', bench_watcher_non_match),
+    ('trigger_table_match', bench_trigger_table_match),
+    ('trigger_table_non_match', bench_trigger_table_non_match),
+    ('trigger_engine_match', bench_trigger_engine_match),
+    ('trigger_engine_non_match', bench_trigger_engine_non_match),
+    ('remove_all_percent_sequences', bench_remove_all_percent_sequences),
+    ('add_escaping_percent_sequences', bench_add_escaping_percent_sequences),
+    ('remove_ansi_codes', bench_remove_ansi_codes),
+    ('contact_puller_parse_%d_units' % NUM_UNITS, bench_contact_puller_parse),
+    ('arena_map_unit_init', bench_arena_map_unit_init),
+    ('compare_units', bench_compare_units),
+]
+
+
+def time_callable(func):
+    """
+    :param callable func: The thing to time.
+    :rtype: float
+    :returns: The fastest time per call, in microseconds.
+    """
+
+    # Work out how many calls fill up a run.
+    loops = 1
+    while True:
+        start = time.time()
+        for _ in xrange(loops):
+            func()
+        elapsed = time.time() - start
+        if elapsed >= TARGET_RUN_SECS / 10:
+            break
+        loops *= 10
+    loops = max(1, int(loops * TARGET_RUN_SECS / max(elapsed, 1e-9)))
+
+    best = None
+    for _ in range(REPEAT):
+        start = time.time()
+        for _ in xrange(loops):
+            func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / loops * 1e6
+
+
+def load_baselines():
+    """
+    :rtype: dict
+    :returns: Benchmark names mapped to their baseline usec/call.
+    """
+
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as fobj:
+        return json.load(fobj)['usec_per_call']
+
+
+def save_baselines(results):
+    with open(BASELINE_PATH, 'w') as fobj:
+        json.dump({
+            'python': sys.version.split()[0],
+            'usec_per_call': results,
+        }, fobj, indent=2, sort_keys=True, separators=(',', ': '))
+        fobj.write('\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument(
+        '--save', action='store_true',
+        help="Store the results as the new baselines.")
+    parser.add_argument(
+        '--check', action='store_true',
+        help="Exit non-zero if anything regressed.")
+    parser.add_argument(
+        '--tolerance', type=float, default=0.25,
+        help="How much slower (0.25 is 25%%) than the baseline is too slow.")
+    parser.add_argument(
+        'only', nargs='*', help="Only run benchmarks whose names contain these.")
+    args = parser.parse_args()
+
+    baselines = load_baselines()
+    results = {}
+    regressions = []
+    print "%-34s %10s %10s %8s" % ('Benchmark', 'usec/call', 'Baseline', 'Change')
+    for name, setup in BENCHMARKS:
+        if args.only and not any(only in name for only in args.only):
+            continue
+        usec = time_callable(next(setup()))
+        results[name] = round(usec, 3)
+        baseline = baselines.get(name)
+        if baseline:
+            change = (usec - baseline) / baseline
+            flag = ''
+            if change > args.tolerance:
+                flag = ' SLOWER'
+                regressions.append(name)
+            print "%-34s %10.3f %10.3f %+7.0f%%%s" % (
+                name, usec, baseline, change * 100, flag)
+        else:
+            print "%-34s %10.3f %10s %8s" % (name, usec, '-', '-')
+
+    if args.save:
+        if args.only:
+            # Keep the baselines for the benchmarks we didn't run.
+            baselines.update(results)
+            results = baselines
+        save_baselines(results)
+        print "\nBaselines saved to", BASELINE_PATH
+    if regressions:
+        print "\n%d benchmark(s) regressed by more than %d%%: %s" % (
+            len(regressions), args.tolerance * 100, ', '.join(regressions))
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+Compares how fast received data is split into lines by:
+
+* ``LineReceiver`` - Twisted's line framing, which is what the bot uses
+  with ``fast_line_framing`` turned off.
+* ``TelnetTransport`` - The same, behind conch's telnet transport, which
+  parses every byte in Python to pick out telnet commands.
+* ``TelnetLineFramer`` - The bot's own framer, used with
+  ``fast_line_framing`` turned on.
+
+The data is a few seconds' worth of contact puller responses (one long
+line per map) and general chatter, cut up into chunks the size of a
+socket read.
+
+Run from the repo root::
+
+    PYTHONPATH=. python benchmarks/bench_line_framing.py
+    PYTHONPATH=. python benchmarks/bench_line_framing.py --units 200 --iac
+"""
+
+import sys
+import time
+import argparse
+
+from twisted.conch.telnet import TelnetTransport, StatefulTelnetProtocol
+from twisted.test.proto_helpers import StringTransport
+
+from battlesnake.core.protocols.line_framing import TelnetLineFramer
+
+# Each run is timed this many times, and the fastest is kept.
+REPEAT = 3
+CHATTER_LINE = 'Somebody says, "Anyone up for a match?"\r'
+# One unit's record in the contact puller's output.
+UNIT_RECORD = ':'.join([
+    '#1000', 'AA', 'AS7-D', 'Mech', 'Biped', 'Atlas', '10', '12', '0',
+    '32.25', '4096', '100', '12.5', 'd', '', '', '', '#55', '1897', '-1',
+    '10', '6', '45', '30', '4', '1', '54.0', '1', '#77', '0', '6',
+    '300/304|152/152', '123.5'])
+
+
+class CountingLineProtocol(StatefulTelnetProtocol):
+    """
+    Counts the lines it gets. The contact puller's lines are longer than
+    LineReceiver's default limit, so that's raised.
+    """
+
+    MAX_LENGTH = 10 * 1024 * 1024
+
+    def __init__(self):
+        self.lines = 0
+
+    def lineReceived(self, line):
+        self.lines += 1
+
+
+def build_stream(num_maps, num_units, chatter_lines, with_iac):
+    """
+    :rtype: str
+    :returns: The data the bot would receive over one contact puller tick,
+        repeated a few times.
+    """
+
+    token = "5Fq2zA:"
+    lines = []
+    for _ in range(num_maps):
+        lines.append(token + '^'.join([UNIT_RECORD] * num_units) + '^\r')
+        lines.extend([CHATTER_LINE] * (chatter_lines // num_maps))
+    tick = '\n'.join(lines) + '\n'
+    if with_iac:
+        # A go-ahead after every chatter line, like some MUXes send.
+        tick = tick.replace(CHATTER_LINE + '\n', CHATTER_LINE + '\n\xff\xf9')
+    return tick * 5
+
+
+def chunk(data, chunk_size):
+    return [data[pos:pos + chunk_size]
+            for pos in range(0, len(data), chunk_size)]
+
+
+def run_line_receiver(chunks):
+    protocol = CountingLineProtocol()
+    protocol.makeConnection(StringTransport())
+    for data in chunks:
+        protocol.dataReceived(data)
+    return protocol.lines
+
+
+def run_telnet_transport(chunks):
+    protocol = CountingLineProtocol()
+    transport = TelnetTransport(lambda: protocol)
+    transport.makeConnection(StringTransport())
+    for data in chunks:
+        transport.dataReceived(data)
+    return protocol.lines
+
+
+def run_fast_framer(chunks):
+    framer = TelnetLineFramer()
+    lines = 0
+    for data in chunks:
+        lines += len(framer.feed(data))
+    return lines
+
+
+MODES = [
+    ('LineReceiver', run_line_receiver),
+    ('TelnetTransport', run_telnet_transport),
+    ('TelnetLineFramer', run_fast_framer),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--maps', type=int, default=10)
+    parser.add_argument('--units', type=int, default=50, help="Per map.")
+    parser.add_argument(
+        '--chatter', type=int, default=200,
+        help="Short lines per tick, spread between the maps.")
+    parser.add_argument(
+        '--chunk-size', type=int, default=4096,
+        help="How many bytes each dataReceived() call gets.")
+    parser.add_argument(
+        '--iac', action='store_true',
+        help="Put a telnet go-ahead after every chatter line.")
+    args = parser.parse_args()
+
+    data = build_stream(
+        args.maps, args.units, args.chatter, args.iac)
+    chunks = chunk(data, args.chunk_size)
+    megabytes = len(data) / (1024.0 * 1024.0)
+    print "%.2f MB in %d chunks of %d bytes" % (
+        megabytes, len(chunks), args.chunk_size)
+    print "%-18s %8s %10s %10s" % ('Mode', 'Lines', 'Secs', 'MB/sec')
+    for name, run in MODES:
+        best = None
+        for _ in range(REPEAT):
+            started_at = time.time()
+            lines = run(chunks)
+            elapsed = time.time() - started_at
+            best = elapsed if best is None else min(best, elapsed)
+        print "%-18s %8d %10.4f %10.1f" % (
+            name, lines, best, megabytes / best)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
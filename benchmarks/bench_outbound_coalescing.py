@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Compares sending outbound lines one ``sendLine`` at a time with sending them
+through :py:class:`OutboundLineBuffer
+<battlesnake.core.protocols.outbound_buffer.OutboundLineBuffer>`, under a
+simulated arena load. Everything goes over a real loopback TCP connection.
+
+For each mode we report the number of transport writes, ``send()``
+syscalls, and reads on the receiving end (a stand-in for packets).
+
+Run from the repo root::
+
+    PYTHONPATH=. python benchmarks/bench_outbound_coalescing.py
+"""
+
+import sys
+import time
+
+from twisted.internet import reactor, tcp
+from twisted.internet.protocol import Protocol, ServerFactory, ClientCreator
+from twisted.protocols.basic import LineReceiver
+
+from battlesnake.core.protocols.outbound_buffer import OutboundLineBuffer
+
+# How many units are in the simulated arena.
+NUM_UNITS = 40
+# How many simulated contact puller/AI ticks to run.
+NUM_TICKS = 200
+# Each unit gets this many lines per tick (a couple of btsetxcodevalue
+# calls and an ack think, more or less).
+LINES_PER_UNIT = 3
+# Each unit's lines are written from its own reactor turn, like they would
+# be from separate deferred callbacks.
+UNIT_LINE = "think btsetxcodevalue(#%d, heat, 0)[btsetxcodevalue(#%d, ammo, 10)]"
+
+_send_calls = [0]
+_orig_write_some_data = tcp.Connection.writeSomeData
+
+
+def _counting_write_some_data(self, data):
+    _send_calls[0] += 1
+    return _orig_write_some_data(self, data)
+
+tcp.Connection.writeSomeData = _counting_write_some_data
+
+
+class CountingReceiver(Protocol):
+    def connectionMade(self):
+        self.factory.receiver = self
+        self.reads = 0
+        self.bytes = 0
+
+    def dataReceived(self, data):
+        self.reads += 1
+        self.bytes += len(data)
+        if self.bytes >= self.factory.expected_bytes:
+            self.factory.on_done()
+
+
+class Sender(LineReceiver):
+    pass
+
+
+def run_mode(coalesce, on_done):
+    factory = ServerFactory()
+    factory.protocol = CountingReceiver
+    factory.expected_bytes = 0
+    for unit in range(NUM_UNITS):
+        line = UNIT_LINE % (unit, unit)
+        factory.expected_bytes += (len(line) + 2) * LINES_PER_UNIT
+    factory.expected_bytes *= NUM_TICKS
+    port = reactor.listenTCP(0, factory, interface='127.0.0.1')
+
+    def connected(sender):
+        counts = {'writes': 0}
+        buf = OutboundLineBuffer()
+        buf.transport = sender.transport
+        orig_write = sender.transport.write
+
+        def counting_write(data):
+            counts['writes'] += 1
+            orig_write(data)
+        sender.transport.write = counting_write
+
+        def write_unit_lines(unit):
+            line = UNIT_LINE % (unit, unit)
+            for _ in range(LINES_PER_UNIT):
+                if coalesce:
+                    buf.write(line)
+                else:
+                    sender.sendLine(line)
+
+        def tick(remaining):
+            for unit in range(NUM_UNITS):
+                reactor.callLater(0, write_unit_lines, unit)
+            if remaining > 1:
+                reactor.callLater(0.001, tick, remaining - 1)
+
+        def done():
+            elapsed = time.time() - start
+            receiver = factory.receiver
+            print "%s:" % ("coalesced" if coalesce else "sendLine per command")
+            print "  lines:            %d" % (
+                NUM_UNITS * LINES_PER_UNIT * NUM_TICKS)
+            print "  transport writes: %d" % counts['writes']
+            print "  send() syscalls:  %d" % (_send_calls[0] - start_sends)
+            print "  receiver reads:   %d" % receiver.reads
+            print "  elapsed:          %.3fs" % elapsed
+            sender.transport.loseConnection()
+            port.stopListening()
+            on_done()
+        factory.on_done = done
+
+        start_sends = _send_calls[0]
+        start = time.time()
+        tick(NUM_TICKS)
+
+    creator = ClientCreator(reactor, Sender)
+    d = creator.connectTCP('127.0.0.1', port.getHost().port)
+    d.addCallback(connected)
+
+
+def main():
+    modes = [False, True]
+
+    def next_mode():
+        if not modes:
+            reactor.stop()
+            return
+        # Let the previous connection finish closing.
+        reactor.callLater(0.1, run_mode, modes.pop(0), next_mode)
+
+    reactor.callWhenRunning(next_mode)
+    reactor.run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
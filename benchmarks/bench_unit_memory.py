@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Measures how much memory and garbage collector work the arena unit stores
+cost, with hundreds of units per arena:
+
+* Bytes per unit - The ArenaMapUnit instance, plus its ``__dict__`` if it
+  has one. Field values are left out, since most are shared or small.
+* GC-tracked objects - How many more objects the collector has to walk
+  once the stores are full.
+* Full collection - How long one ``gc.collect()`` takes with the stores
+  full.
+* Tick - Parsing every arena's contact puller output and updating its
+  store, with about a tenth of the units having moved. This is timed with
+  the collector on and off, and the difference is what it cost.
+
+Run from the repo root::
+
+    PYTHONPATH=. python benchmarks/bench_unit_memory.py
+    PYTHONPATH=. python benchmarks/bench_unit_memory.py --arenas 20 --units 500
+"""
+
+import gc
+import os
+import sys
+import time
+import random
+import argparse
+
+from battlesnake.plugins.contrib.arena_master.puppets.units.unit_store import \
+    ArenaMapUnitStore, parse_contact_puller_output
+
+# The contact record factory lives with the tests.
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'))
+from unit_records import make_unit_record
+
+# Each tick is timed this many times, and the fastest is kept.
+REPEAT = 3
+
+
+def contact_id_for(num):
+    return chr(ord('A') + num // 26 % 26) + chr(ord('A') + num % 26)
+
+
+def unit_record(num, x_coord, y_coord):
+    """
+    :rtype: str
+    :returns: One unit's record, as the contact puller sends it.
+    """
+
+    return make_unit_record(
+        '#%d' % (1000 + num), contact_id_for(num), x_coord=str(x_coord),
+        y_coord=str(y_coord))
+
+
+def build_arena_outputs(num_arenas, num_units, num_ticks, rand):
+    """
+    :rtype: list
+    :returns: A list with a list of contact puller outputs (one per arena)
+        for each tick.
+    """
+
+    positions = [[(rand.randint(0, 99), rand.randint(0, 99))
+                  for _ in range(num_units)] for _ in range(num_arenas)]
+    ticks = []
+    for _ in range(num_ticks + 1):
+        outputs = []
+        for arena_positions in positions:
+            for num in rand.sample(range(num_units), num_units // 10):
+                x_coord, y_coord = arena_positions[num]
+                arena_positions[num] = (x_coord + 1, y_coord)
+            outputs.append('^'.join(
+                unit_record(num, x_coord, y_coord)
+                for num, (x_coord, y_coord) in enumerate(arena_positions)))
+        ticks.append(outputs)
+    return ticks
+
+
+def run_tick(stores, outputs):
+    for store, unit_data in zip(stores, outputs):
+        for unit in parse_contact_puller_output(unit_data):
+            store.update_unit(unit)
+
+
+def time_ticks(stores, ticks):
+    best = None
+    for _ in range(REPEAT):
+        started_at = time.time()
+        for outputs in ticks:
+            run_tick(stores, outputs)
+        elapsed = (time.time() - started_at) / len(ticks)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def unit_size(unit):
+    size = sys.getsizeof(unit)
+    if hasattr(unit, '__dict__'):
+        size += sys.getsizeof(unit.__dict__)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--arenas', type=int, default=10)
+    parser.add_argument(
+        '--units', type=int, default=300, help="Per arena (at most 676).")
+    parser.add_argument('--ticks', type=int, default=10)
+    args = parser.parse_args()
+
+    rand = random.Random(1)
+    ticks = build_arena_outputs(args.arenas, args.units, args.ticks, rand)
+
+    gc.collect()
+    tracked_before = len(gc.get_objects())
+    stores = []
+    for unit_data in ticks.pop(0):
+        store = ArenaMapUnitStore(None, lambda old_unit, new_unit, changes: None)
+        # Skips add_unit(), which announces every unit.
+        for unit in parse_contact_puller_output(unit_data):
+            store._file_unit(unit)
+        stores.append(store)
+    gc.collect()
+    tracked = len(gc.get_objects()) - tracked_before
+    total_units = args.arenas * args.units
+
+    started_at = time.time()
+    gc.collect()
+    collect_secs = time.time() - started_at
+
+    tick_secs = time_ticks(stores, ticks)
+    gc.disable()
+    try:
+        tick_secs_no_gc = time_ticks(stores, ticks)
+    finally:
+        gc.enable()
+
+    print "%d arena(s) x %d unit(s), %d tick(s)" % (
+        args.arenas, args.units, len(ticks))
+    print "%-26s %10d" % ('Bytes per unit', unit_size(stores[0].list_all_units()[0]))
+    print "%-26s %10d (%.1f per unit)" % (
+        'GC-tracked objects', tracked, tracked / float(total_units))
+    print "%-26s %10.2f ms" % ('Full collection', collect_secs * 1000)
+    print "%-26s %10.2f ms" % ('Tick', tick_secs * 1000)
+    print "%-26s %10.2f ms" % ('Tick, GC off', tick_secs_no_gc * 1000)
+    print "%-26s %10.2f ms" % ('GC cost per tick', (tick_secs - tick_secs_no_gc) * 1000)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
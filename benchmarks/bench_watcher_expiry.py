@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Measures response watcher registration, matching, and expiration with
+thousands of watchers pending at once. Expirations are driven by the real
+reactor, so the reported lateness is what the bot would actually see.
+
+Run from the repo root::
+
+    PYTHONPATH=. python benchmarks/bench_watcher_expiry.py
+"""
+
+import sys
+import time
+import random
+
+from twisted.internet import reactor
+
+from battlesnake.core.response_watcher import ResponseWatcherManager, \
+    NoResponseMatchFoundError
+from battlesnake.core.utils import generate_compact_token
+
+# How many watchers to have pending at once.
+WATCHER_COUNTS = [1000, 5000, 20000]
+# The fraction of watchers that get a response before their timeout.
+MATCHED_FRACTION = 0.5
+# Timeouts are spread evenly across this range (in seconds).
+MIN_TIMEOUT = 0.5
+MAX_TIMEOUT = 1.5
+
+
+def percentile(values, perc):
+    """
+    :param list values: A sorted list of values.
+    :param float perc: 0...100
+    """
+
+    if not values:
+        return 0.0
+    index = int(round((len(values) - 1) * perc / 100.0))
+    return values[index]
+
+
+def run_scenario(num_watchers, on_done):
+    manager = ResponseWatcherManager()
+    lateness = []
+
+    def on_expired(failure, deadline):
+        failure.trap(NoResponseMatchFoundError)
+        lateness.append(time.time() - deadline)
+        if len(lateness) == num_expiring:
+            report()
+
+    tokens = []
+    start = time.time()
+    for _ in range(num_watchers):
+        token = generate_compact_token()
+        timeout = random.uniform(MIN_TIMEOUT, MAX_TIMEOUT)
+        d = manager.watch_token(token, timeout_secs=timeout)
+        d.addErrback(on_expired, time.time() + timeout)
+        tokens.append(token)
+    register_secs = time.time() - start
+
+    random.shuffle(tokens)
+    num_matched = int(num_watchers * MATCHED_FRACTION)
+    num_expiring = num_watchers - num_matched
+    start = time.time()
+    for token in tokens[:num_matched]:
+        manager.match_line(token + "some response value\r")
+    match_secs = time.time() - start
+
+    # Lines that don't belong to any watcher still have to be checked.
+    start = time.time()
+    for _ in range(num_matched):
+        manager.match_line("Somebody says \"hello\"\r")
+    miss_secs = time.time() - start
+
+    def report():
+        lateness.sort()
+        print "%d pending watchers (%d expiring)" % (num_watchers, num_expiring)
+        print "  register:     %6.2f usec/watcher" % (
+            register_secs / num_watchers * 1e6)
+        print "  match:        %6.2f usec/line" % (match_secs / num_matched * 1e6)
+        print "  non-match:    %6.2f usec/line" % (miss_secs / num_matched * 1e6)
+        print "  expiry late:  p50 %.1fms  p99 %.1fms  max %.1fms" % (
+            percentile(lateness, 50) * 1000,
+            percentile(lateness, 99) * 1000,
+            lateness[-1] * 1000)
+        on_done()
+
+
+def main():
+    counts = list(WATCHER_COUNTS)
+
+    def next_scenario():
+        if not counts:
+            reactor.stop()
+            return
+        run_scenario(counts.pop(0), next_scenario)
+
+    reactor.callWhenRunning(next_scenario)
+    reactor.run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+"""
+Runs the bot against a fake MUX (see :py:mod:`battlesnake.fake_mux`) through
+a full wave cycle, for a number of arenas at once:
+
+* **setup** - An arena puppet and map are created for each arena.
+* **spawn** - Each arena spawns a wave of AI-piloted units, one at a time,
+  with the same commands that unit spawning and the AI plugin send.
+* **fight** - The contact puller runs for each arena every tick, and a few
+  units per arena get new AI orders. The fake MUX moves units around between
+  ticks.
+* **teardown** - Every unit is destroyed. The contact puller notices, then
+  the units and their AIs are @destroyed.
+
+For each phase we report how many commands the fake MUX ran per second, and
+the latency of the phase's operations (spawning a unit, one contact pull,
+and so on). The bot's per-call-site round trip metrics follow.
+
+The unit library lookup that unit spawning does needs the database, so that
+step is skipped. Everything else goes through the real protocol.
+
+Run from the repo root::
+
+    PYTHONPATH=. python benchmarks/bench_wave_cycle.py battlesnake.cfg
+    PYTHONPATH=. python benchmarks/bench_wave_cycle.py battlesnake.cfg \\
+        --arenas 20 --units 12 --latency 0.02 --jitter 0.01
+    PYTHONPATH=. python benchmarks/bench_wave_cycle.py battlesnake.cfg \\
+        --connection-cost 0.002 --workers 3
+"""
+
+import sys
+import time
+import random
+import argparse
+
+from twisted.internet import reactor, task
+from twisted.internet.defer import inlineCallbacks, returnValue, \
+    gatherResults, Deferred
+
+from battlesnake.fake_mux.server import FakeMuxFactory
+from battlesnake.fake_mux.world import FakeWorld, create_battlesnake_fixtures
+
+# Units are spawned from these refs, in rotation.
+UNIT_REFS = ['AS7-D', 'HBK-4G', 'LCT-1V', 'Demolisher']
+# Each fight tick, this many units per arena get new orders.
+ORDERS_PER_TICK = 2
+
+
+class LoadTestArena(object):
+    """
+    Stands in for an arena master puppet. The contact puller and unit store
+    only need to know where the map is and how big it is.
+    """
+
+    def __init__(self, dbref, map_dbref, map_width, map_height, faction_dbref):
+        from battlesnake.plugins.contrib.arena_master.puppets.units.unit_store \
+            import ArenaMapUnitStore
+
+        self.dbref = dbref
+        self.map_dbref = map_dbref
+        self.map_width = map_width
+        self.map_height = map_height
+        self.faction_dbref = faction_dbref
+        self.unit_store = ArenaMapUnitStore(self, lambda *args: None)
+        # (unit dbref, AI dbref) tuples.
+        self.spawned = []
+
+
+def timed(histogram, d):
+    """
+    Records how long ``d`` takes to fire in ``histogram``.
+    """
+
+    started = time.time()
+
+    def record(result):
+        histogram.record(time.time() - started)
+        return result
+    return d.addCallback(record)
+
+
+@inlineCallbacks
+def create_arena(protocol, arena_num, faction_dbref):
+    from battlesnake.conf import settings
+    from battlesnake.outbound_commands import mux_commands, think_fn_wrappers
+
+    p = protocol
+    puppet_dbref = yield think_fn_wrappers.create(
+        p, 'LoadTestArena%d' % arena_num, otype='t')
+    yield mux_commands.parent(
+        p, puppet_dbref, settings['arena_master']['arena_master_parent_dbref'])
+    map_dbref = yield think_fn_wrappers.create(
+        p, 'LoadTestArena%dMap' % arena_num, otype='t')
+    yield mux_commands.parent(
+        p, map_dbref, settings['arena_master']['map_parent_dbref'])
+    yield think_fn_wrappers.btloadmap(p, map_dbref, 'loadtest')
+    map_width, map_height = yield think_fn_wrappers.get_map_dimensions(
+        p, map_dbref)
+    returnValue(LoadTestArena(
+        puppet_dbref, map_dbref, map_width, map_height, faction_dbref))
+
+
+@inlineCallbacks
+def spawn_unit(protocol, arena, unit_ref):
+    """
+    Sends the commands that unit spawning's create_unit() does, then starts
+    an AI on the unit.
+
+    :rtype: defer.Deferred
+    :returns: A Deferred that fires with a (unit dbref, AI dbref) tuple.
+    """
+
+    from battlesnake.conf import settings
+    from battlesnake.outbound_commands import mux_commands, think_fn_wrappers
+    from battlesnake.plugins.contrib.ai.outbound_commands import start_unit_ai
+    from battlesnake.plugins.contrib.arena_master.game_modes.wave_survival.\
+        wave_spawning import choose_unit_spawn_spot
+
+    p = protocol
+    unit_dbref = yield think_fn_wrappers.create(p, 'UnitBeingCreated', otype='t')
+    unit_name = yield think_fn_wrappers.btgetxcodevalue_ref(
+        p, unit_ref, 'mechname')
+    mux_commands.parent(
+        p, unit_dbref, settings['unit_spawning']['unit_parent_dbref'])
+    mux_commands.chzone(p, unit_dbref, arena.dbref)
+    mux_commands.lock(p, unit_dbref, unit_dbref)
+    mux_commands.lock(p, unit_dbref, 'ELOCK/1', whichlock='enter')
+    mux_commands.lock(p, unit_dbref, 'LLOCK/1', whichlock='leave')
+    mux_commands.lock(p, unit_dbref, 'ULOCK/1', whichlock='use')
+    mux_commands.link(p, unit_dbref, arena.map_dbref)
+    yield think_fn_wrappers.set_attrs(p, unit_dbref, {
+        'Mechtype': unit_ref,
+        'Mechname': unit_name,
+        'FACTION': arena.faction_dbref,
+        'Xtype': 'MECH',
+        'OPTIMAL_WEAP_RANGE.D': 3,
+    })
+    yield think_fn_wrappers.teleport(p, unit_dbref, arena.map_dbref)
+    yield think_fn_wrappers.set_flags(p, unit_dbref, [
+        'INHERIT', 'IN_CHARACTER', 'XCODE', 'ENTER_OK', 'OPAQUE', 'QUIET'])
+    yield think_fn_wrappers.btloadmech(p, unit_dbref, unit_ref)
+    yield think_fn_wrappers.btsetxcodevalue(p, unit_dbref, 'team', 2)
+    yield think_fn_wrappers.set_attrs(p, unit_dbref, {'Mechname': unit_name})
+    mux_commands.name(p, unit_dbref, '[u({dbref}/UNITNAME.F,{dbref})]'.format(
+        dbref=unit_dbref))
+    mux_commands.trigger(p, unit_dbref, 'UPDATE_FREQ.T')
+    unit_x, unit_y = choose_unit_spawn_spot(arena.map_width, arena.map_height)
+    yield think_fn_wrappers.btsetxy(
+        p, unit_dbref, arena.map_dbref, unit_x, unit_y)
+    mux_commands.force(
+        p, unit_dbref, '@fo %s={setchanneltitle a=%s;setchannelmode a=G}' % (
+            unit_dbref, unit_ref))
+    for key, val in [('radiotype', 54), ('scanrange', 30), ('tacrange', 40),
+                     ('lrsrange', 50), ('radiorange', 300)]:
+        yield think_fn_wrappers.btsetxcodevalue(p, unit_dbref, key, val)
+    contact_id = yield think_fn_wrappers.btgetxcodevalue(p, unit_dbref, 'id')
+    mux_commands.mechdesc(
+        p, unit_dbref, '%%%[{contact_id}%%%] {unit_name} appears to be of type '
+                       '{unit_ref}.'.format(contact_id=contact_id,
+                                            unit_name=unit_name,
+                                            unit_ref=unit_ref))
+    ai_dbref = yield start_unit_ai(p, unit_dbref)
+    returnValue((unit_dbref, ai_dbref))
+
+
+@inlineCallbacks
+def spawn_wave(protocol, arena, num_units, histogram):
+    """
+    Spawns units one after another, like wave spawning does.
+    """
+
+    for unit_num in range(num_units):
+        unit_ref = UNIT_REFS[unit_num % len(UNIT_REFS)]
+        spawned = yield timed(histogram, spawn_unit(protocol, arena, unit_ref))
+        arena.spawned.append(spawned)
+
+
+@inlineCallbacks
+def run_arena_tick(protocol, arena):
+    """
+    Pulls contacts, then hands out orders the way the strategic logic does.
+    """
+
+    from battlesnake.plugins.contrib.arena_master.puppets.outbound_commands \
+        import order_ai
+    from battlesnake.plugins.contrib.arena_master.puppets.units.\
+        store_populater import update_store_from_btfuncs
+
+    yield update_store_from_btfuncs(protocol, arena.unit_store)
+    units = arena.unit_store.list_all_units()
+    orders = []
+    for unit in random.sample(units, min(ORDERS_PER_TICK, len(units))):
+        dest_x, dest_y = arena.unit_store.get_random_hex_near_unit(unit, 5)
+        orders.append(order_ai(protocol, arena, '%s goto %d %d' % (
+            unit.contact_id, dest_x, dest_y)))
+        orders.append(order_ai(
+            protocol, arena, '%s chasetarg on' % unit.contact_id))
+    yield gatherResults(orders)
+
+
+@inlineCallbacks
+def teardown_arena(protocol, arena, histogram):
+    """
+    Lets the contact puller see the destroyed units, then cleans them up.
+    """
+
+    from battlesnake.outbound_commands import mux_commands
+    from battlesnake.plugins.contrib.arena_master.puppets.units.\
+        store_populater import update_store_from_btfuncs
+
+    yield update_store_from_btfuncs(protocol, arena.unit_store)
+    cleanups = []
+    for unit_dbref, ai_dbref in arena.spawned:
+        cleanups.append(timed(histogram, gatherResults([
+            mux_commands.destroy(protocol, ai_dbref),
+            mux_commands.destroy(protocol, unit_dbref),
+        ])))
+    yield gatherResults(cleanups)
+
+
+class PhaseResult(object):
+    def __init__(self, name, elapsed_secs, commands, histogram):
+        self.name = name
+        self.elapsed_secs = elapsed_secs
+        self.commands = commands
+        self.histogram = histogram
+
+    def format_line(self):
+        histogram = self.histogram
+        return "%-10s %8.2f %9d %9.0f %7d %8.1f %8.0f %8.0f %8.1f" % (
+            self.name, self.elapsed_secs, self.commands,
+            self.commands / self.elapsed_secs if self.elapsed_secs else 0.0,
+            histogram.count, histogram.mean_ms, histogram.percentile_ms(50),
+            histogram.percentile_ms(99), histogram.max_secs * 1000.0)
+
+
+@inlineCallbacks
+def run_phase(name, results, mux_factory, run):
+    """
+    :param str name: The phase's name, for the report.
+    :param list results: The phase's :py:class:`PhaseResult` is appended
+        to this.
+    :param FakeMuxFactory mux_factory: The fake MUX, for counting commands.
+    :param callable run: Called with a :py:class:`LatencyHistogram` for the
+        phase's operations. Returns a Deferred that fires when the phase
+        is done.
+    """
+
+    from battlesnake.core.metrics import LatencyHistogram
+
+    histogram = LatencyHistogram()
+    commands_before = mux_factory.commands_ran
+    started = time.time()
+    yield run(histogram)
+    results.append(PhaseResult(
+        name, time.time() - started,
+        mux_factory.commands_ran - commands_before, histogram))
+
+
+@inlineCallbacks
+def run_wave_cycle(protocol, world, mux_factory, args):
+    from battlesnake.core.metrics import ROUND_TRIP_METRICS
+    from battlesnake.outbound_commands import think_fn_wrappers
+
+    results = []
+    cycle_started = time.time()
+    commands_before = mux_factory.commands_ran
+    faction_dbref = yield think_fn_wrappers.create(
+        protocol, 'LoadTestFaction', otype='t')
+    arenas = []
+
+    def setup(histogram):
+        d = gatherResults([
+            timed(histogram, create_arena(protocol, num, faction_dbref))
+            for num in range(args.arenas)])
+        return d.addCallback(arenas.extend)
+
+    def spawn(histogram):
+        return gatherResults([
+            spawn_wave(protocol, arena, args.units, histogram)
+            for arena in arenas])
+
+    @inlineCallbacks
+    def fight(histogram):
+        for _ in range(args.ticks):
+            world.simulate_tick()
+            yield gatherResults([
+                timed(histogram, run_arena_tick(protocol, arena))
+                for arena in arenas])
+
+    def teardown(histogram):
+        for arena in arenas:
+            for unit in world.list_units(world.get_object(arena.map_dbref)):
+                world.destroy_unit(unit)
+        return gatherResults([
+            teardown_arena(protocol, arena, histogram) for arena in arenas])
+
+    yield run_phase('setup', results, mux_factory, setup)
+    ROUND_TRIP_METRICS.reset()
+    yield run_phase('spawn', results, mux_factory, spawn)
+    yield run_phase('fight', results, mux_factory, fight)
+    yield run_phase('teardown', results, mux_factory, teardown)
+    total_secs = time.time() - cycle_started
+    total_commands = mux_factory.commands_ran - commands_before
+
+    print
+    print "Wave cycle: %d arena(s) x %d unit(s), %d fight tick(s)" % (
+        args.arenas, args.units, args.ticks)
+    print "Fake MUX latency %.0fms +/- %.0fms, %.1fms per command, " \
+          "%.1fms per command per connection" % (
+              args.latency * 1000, args.jitter * 1000,
+              args.command_cost * 1000, args.connection_cost * 1000)
+    print "Worker connections: %d" % args.workers
+    print
+    print "%-10s %8s %9s %9s %7s %8s %8s %8s %8s" % (
+        'Phase', 'Secs', 'Commands', 'Cmds/sec', 'Ops', 'Mean ms',
+        'p50 ms', 'p99 ms', 'Max ms')
+    for result in results:
+        print result.format_line()
+    print "%-10s %8.2f %9d %9.0f" % (
+        'total', total_secs, total_commands, total_commands / total_secs)
+    print
+    for line in ROUND_TRIP_METRICS.format_report(limit=15):
+        print line
+    print
+    print "Peak outbound queue depth: %d" % (
+        protocol.outbound_scheduler.peak_queue_depth)
+    if protocol.worker_pool:
+        pool_stats = protocol.worker_pool.get_stats()
+        print "Read-only thinks per worker: %s (%d on the primary)" % (
+            ', '.join(str(worker['requests_routed'])
+                      for worker in pool_stats['workers']),
+            pool_stats['requests_on_primary'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('config', help="The bot's config file.")
+    parser.add_argument('--arenas', type=int, default=10)
+    parser.add_argument('--units', type=int, default=12, help="Per arena.")
+    parser.add_argument('--ticks', type=int, default=20)
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help="Seconds that each command waits before running.")
+    parser.add_argument(
+        '--jitter', type=float, default=0.0,
+        help="Each command's wait varies by up to this many seconds.")
+    parser.add_argument(
+        '--command-cost', type=float, default=0.0,
+        help="Seconds that each command keeps the fake MUX busy.")
+    parser.add_argument(
+        '--connection-cost', type=float, default=0.0,
+        help="Seconds that each command keeps its own connection busy.")
+    parser.add_argument(
+        '--workers', type=int, default=0,
+        help="How many worker connections to spread read-only thinks over.")
+    parser.add_argument(
+        '--no-softcode-helpers', action='store_true',
+        help="Send the contact puller's full softcode instead of a u() call.")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # Settings have to be loaded before anything else gets imported.
+    from battlesnake.conf import read_config
+    read_config(args.config)
+    from battlesnake.conf import settings
+    settings['bot']['plugins'] = []
+    settings['bot']['enable_hudinfo'] = False
+    settings['bot']['session_recording_path'] = ''
+    settings['bot']['worker_accounts'] = [
+        'LoadTestWorker%d x' % num for num in range(args.workers)]
+
+    from battlesnake.core.protocols.telnet import BattlesnakeTelnetFactory, \
+        BattlesnakeTelnetProtocol
+    from battlesnake.plugins.contrib.arena_master.puppets.units.\
+        store_populater import SOFTCODE_HELPERS
+
+    random.seed(args.seed)
+    world = FakeWorld(seed=args.seed)
+    create_battlesnake_fixtures(world, settings)
+    mux_factory = FakeMuxFactory(
+        world, latency=args.latency, jitter=args.jitter,
+        command_cost=args.command_cost, connection_cost=args.connection_cost,
+        seed=args.seed)
+    port = reactor.listenTCP(0, mux_factory, interface='127.0.0.1')
+    # The worker connections find the fake MUX through the settings.
+    settings['mux']['hostname'] = '127.0.0.1'
+    settings['mux']['port'] = port.getHost().port
+
+    logged_in = Deferred()
+
+    class LoadTestProtocol(BattlesnakeTelnetProtocol):
+        def _install_softcode_helpers_and_load_plugins(self):
+            # The arena master plugin isn't loaded, but we use its contact
+            # puller.
+            if not args.no_softcode_helpers:
+                self.softcode_helpers.register(SOFTCODE_HELPERS)
+            return BattlesnakeTelnetProtocol.\
+                _install_softcode_helpers_and_load_plugins(self)
+
+        def _load_plugins(self):
+            BattlesnakeTelnetProtocol._load_plugins(self)
+            logged_in.callback(self)
+
+    class LoadTestFactory(BattlesnakeTelnetFactory):
+        protocol = LoadTestProtocol
+
+    @inlineCallbacks
+    def wait_for_workers(protocol):
+        while protocol.worker_pool and \
+                protocol.worker_pool.get_stats()['workers_connected'] < \
+                args.workers:
+            yield task.deferLater(reactor, 0.05, lambda: None)
+        returnValue(protocol)
+
+    reactor.connectTCP('127.0.0.1', port.getHost().port, LoadTestFactory())
+    logged_in.addCallback(wait_for_workers)
+    logged_in.addCallback(run_wave_cycle, world, mux_factory, args)
+    logged_in.addErrback(lambda failure: failure.printTraceback())
+    logged_in.addBoth(lambda _: reactor.stop())
+    reactor.run()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Runs a fake MUX that the bot can connect to, for trying things out without a
+live game. See :py:mod:`battlesnake.fake_mux`.
+
+Usage::
+
+    PYTHONPATH=. python bin/fake_mux.py --port 4201
+    PYTHONPATH=. python bin/fake_mux.py --config battlesnake.cfg --latency 0.05 --jitter 0.02
+
+Point the bot's ``[mux]`` settings at the port. If ``--config`` is given,
+the objects that the bot's settings refer to (parents and such) are created
+before the bot connects.
+"""
+
+import argparse
+
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+
+from battlesnake.fake_mux.server import FakeMuxFactory
+from battlesnake.fake_mux.world import FakeWorld, create_battlesnake_fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--port', type=int, default=4201)
+    parser.add_argument('--interface', default='127.0.0.1')
+    parser.add_argument(
+        '--config', help="The bot's config file. Used to set up fixtures.")
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help="Seconds that each command waits before running.")
+    parser.add_argument(
+        '--jitter', type=float, default=0.0,
+        help="Each command's wait varies by up to this many seconds.")
+    parser.add_argument(
+        '--command-cost', type=float, default=0.0,
+        help="Seconds that each command keeps the server busy.")
+    parser.add_argument(
+        '--connection-cost', type=float, default=0.0,
+        help="Seconds that each command keeps its own connection busy.")
+    parser.add_argument(
+        '--tick-interval', type=float, default=1.0,
+        help="Seconds between unit movement ticks. 0 turns movement off.")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    world = FakeWorld(seed=args.seed)
+    if args.config:
+        from battlesnake.conf import read_config
+        read_config(args.config)
+        from battlesnake.conf import settings
+        create_battlesnake_fixtures(world, settings)
+
+    factory = FakeMuxFactory(
+        world, latency=args.latency, jitter=args.jitter,
+        command_cost=args.command_cost, connection_cost=args.connection_cost,
+        seed=args.seed)
+    reactor.listenTCP(args.port, factory, interface=args.interface)
+    if args.tick_interval:
+        LoopingCall(world.simulate_tick).start(args.tick_interval, now=False)
+    print "Fake MUX listening on %s:%d" % (args.interface, args.port)
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
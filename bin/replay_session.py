@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Replays a session recorded with the ``session_recording_path`` setting
+through the bot's watchers, triggers, and commands, with no MUX connection.
+Reports how long each inbound line took to dispatch.
+
+Usage::
+
+    PYTHONPATH=. python bin/replay_session.py battlesnake.cfg session.log
+    PYTHONPATH=. python bin/replay_session.py battlesnake.cfg session.log --speed 10
+
+Without ``--speed``, the recording is replayed as fast as possible. Only
+the plugins' triggers and commands are loaded. Their timers and setup
+methods aren't run.
+"""
+
+import argparse
+
+from twisted.internet import reactor
+from twisted.test.proto_helpers import StringTransport
+
+
+class DiscardingTransport(StringTransport):
+    """
+    Anything the bot tries to send during the replay goes nowhere.
+    """
+
+    def write(self, data):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('config', help="The bot's config file.")
+    parser.add_argument('recording', help="The session recording to replay.")
+    parser.add_argument(
+        '--speed', type=float, default=None,
+        help="Replay at this multiple of the original pace.")
+    args = parser.parse_args()
+
+    # Settings have to be loaded before anything else gets imported.
+    from battlesnake.conf import read_config
+    read_config(args.config)
+    from battlesnake.conf import settings
+    # Don't record the replay.
+    settings['bot']['session_recording_path'] = ''
+
+    from battlesnake.core.protocols.telnet import BattlesnakeTelnetFactory
+    from battlesnake.core.protocols.session_recording import SessionReplayer, \
+        read_recording
+
+    protocol = BattlesnakeTelnetFactory().buildProtocol(None)
+    protocol.makeConnection(DiscardingTransport())
+    protocol.state = 'monitoring'
+    # Plugin setup and timers would talk to the MUX on their own schedule,
+    # and muddy the dispatch timings.
+    protocol._load_plugins(dispatch_only=True)
+
+    replayer = SessionReplayer(
+        protocol, read_recording(args.recording), speed=args.speed)
+    d = replayer.run()
+
+    def print_report(stats):
+        for line in stats.format_report():
+            print line
+
+    d.addCallback(print_report)
+    d.addBoth(lambda _: reactor.stop())
+    reactor.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import unittest
+
+from twisted.internet import defer
+from twisted.internet.task import Clock
+
+from battlesnake.core.protocols.acknowledgement import SharedAckBarrier, \
+    NoAckMonitor
+from battlesnake.core.mux_errors import MuxError, ERROR_HUH
+from battlesnake.core.protocols.outbound_scheduler import PRIORITY_HIGH, \
+    PRIORITY_NORMAL
+
+
+class SharedAckBarrierTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.barriers = []
+        self.barrier = SharedAckBarrier(self._send_barrier, clock=self.clock)
+
+    def _send_barrier(self, priority):
+        d = defer.Deferred()
+        self.barriers.append((priority, d))
+        return d
+
+    def test_one_barrier_per_turn(self):
+        """
+        Everything written in a turn shares a barrier per priority class.
+        """
+
+        acked = []
+        for _ in range(3):
+            self.barrier.add(PRIORITY_NORMAL).addCallback(acked.append)
+        self.barrier.add(PRIORITY_HIGH).addCallback(acked.append)
+        self.assertEqual(self.barriers, [])
+
+        self.clock.advance(0)
+        self.assertEqual(
+            [priority for priority, _ in self.barriers],
+            [PRIORITY_HIGH, PRIORITY_NORMAL])
+        self.barriers[1][1].callback('')
+        self.assertEqual(acked, [''] * 3)
+        self.assertEqual(self.barrier.barriers_sent, 2)
+
+    def test_barrier_failure(self):
+        """
+        A failed barrier fails everything waiting on it.
+        """
+
+        failures = []
+        self.barrier.add(PRIORITY_NORMAL).addErrback(failures.append)
+        self.barrier.add(PRIORITY_NORMAL).addErrback(failures.append)
+        self.barrier.flush()
+        self.barriers[0][1].errback(RuntimeError())
+        self.assertEqual(len(failures), 2)
+
+
+class NoAckMonitorTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.barriers = []
+        self.monitor = NoAckMonitor(
+            self._send_barrier, interval=5.0, clock=self.clock)
+
+    def _send_barrier(self):
+        d = defer.Deferred()
+        self.barriers.append(d)
+        return d
+
+    def test_periodic_barrier(self):
+        """
+        A barrier goes out some time after the first unacknowledged write,
+        and covers everything written until then.
+        """
+
+        self.monitor.note_write("@lock #1=#1")
+        self.clock.advance(4.0)
+        self.monitor.note_write("@parent #1=#2")
+        self.assertEqual(self.barriers, [])
+        self.clock.advance(1.0)
+        self.assertEqual(len(self.barriers), 1)
+        self.barriers[0].callback('')
+        self.assertEqual(self.monitor.writes_confirmed, 2)
+
+        # Nothing is sent while there's nothing to confirm.
+        self.clock.advance(10.0)
+        self.assertEqual(len(self.barriers), 1)
+
+    def test_errors(self):
+        """
+        Errors pinned on one of our commands take it off our hands. Errors
+        that couldn't be pinned count against everything waiting on the
+        barrier.
+        """
+
+        self.monitor.note_write("@lock #1=#1")
+        self.monitor.note_write("@parent #1=#2")
+        self.monitor.note_error(
+            "Huh?", MuxError(ERROR_HUH, "Huh?", ["@lock #1=#1"]))
+        self.assertEqual(self.monitor.writes_failed, 1)
+        self.clock.advance(5.0)
+        self.monitor.note_error("Huh?")
+        self.barriers[0].callback('')
+        self.assertEqual(self.monitor.writes_possibly_failed, 1)
+        self.assertEqual(self.monitor.writes_confirmed, 0)
@@ -0,0 +1,51 @@
+import unittest
+
+from battlesnake.core.call_sites import capture_call_sites, format_debug_info, \
+    CallSite, CapturedStack, _capture_frames
+
+
+def _outer():
+    return _inner()
+
+
+def _inner():
+    return capture_call_sites(depth=2)
+
+
+class CallSiteTests(unittest.TestCase):
+
+    def test_capture_call_sites(self):
+        """
+        Call sites are recorded innermost first, up to the requested depth.
+        """
+
+        call_sites = _outer()
+        self.assertEqual(len(call_sites), 2)
+        self.assertEqual(call_sites[0].function, '_inner')
+        self.assertEqual(call_sites[1].function, '_outer')
+        self.assertTrue(call_sites[0].filename.endswith('test_call_sites.py'))
+
+    def test_format_debug_info(self):
+        """
+        Both compact and full-stack records can be formatted.
+        """
+
+        lines = format_debug_info([
+            CallSite('/some/file.py', 12, 'btgetxcodevalue'),
+            ('/other/file.py', 34, 'create_unit', None, None),
+        ])
+        self.assertEqual(lines[0], '/some/file.py:12 in btgetxcodevalue()')
+        self.assertTrue(lines[1].startswith("('/other/file.py', 34"))
+
+    def test_format_captured_stack(self):
+        """
+        Captured stacks are resolved when formatted, with source lines if
+        asked for.
+        """
+
+        frames = _capture_frames(depth=1, skip=0)
+        lines = format_debug_info(CapturedStack(frames, with_source=True))
+        self.assertEqual(len(lines), 1)
+        self.assertIn('in test_format_captured_stack(): frames = ', lines[0])
+        lines = format_debug_info(CapturedStack(frames))
+        self.assertTrue(lines[0].endswith('in test_format_captured_stack()'))
@@ -0,0 +1,123 @@
+import unittest
+
+from twisted.internet.defer import Deferred, inlineCallbacks
+from twisted.internet.task import Clock
+
+from battlesnake.core.inbound_command_handling.base import BaseCommand
+from battlesnake.core.inbound_command_handling.command_scheduler import \
+    InboundCommandScheduler, CommandBusyError, CommandTimeoutError
+
+
+class SlowCommand(BaseCommand):
+    """
+    Doesn't finish until its Deferred is fired.
+    """
+
+    command_name = "slow"
+
+    def __init__(self):
+        self.deferred = None
+
+    def run(self, protocol, parsed_line, invoker_dbref):
+        self.deferred = Deferred()
+        return self.deferred
+
+
+class InboundCommandSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.scheduler = InboundCommandScheduler(
+            max_running=3, max_running_per_invoker=1, max_queued=3,
+            max_queued_per_invoker=2, timeout_secs=10, clock=self.clock)
+
+    def _submit(self, invoker_dbref):
+        command = SlowCommand()
+        results = []
+        d = self.scheduler.submit(command, None, None, invoker_dbref)
+        d.addBoth(results.append)
+        return command, results
+
+    def test_per_invoker_limit(self):
+        """
+        An invoker's second command waits for their first to finish, while
+        other invokers' commands go right ahead.
+        """
+
+        first, first_results = self._submit('#1')
+        second, _ = self._submit('#1')
+        other, _ = self._submit('#2')
+        self.assertIsNotNone(first.deferred)
+        self.assertIsNone(second.deferred)
+        self.assertIsNotNone(other.deferred)
+
+        first.deferred.callback('done')
+        self.assertEqual(first_results, ['done'])
+        self.assertIsNotNone(second.deferred)
+        self.assertEqual(self.scheduler.running, 2)
+
+    def test_busy(self):
+        """
+        Commands beyond the queue limits are turned away.
+        """
+
+        self._submit('#1')
+        self._submit('#1')
+        self._submit('#1')
+        _, results = self._submit('#1')
+        self.assertTrue(results[0].check(CommandBusyError))
+
+        # Someone else can still get in line.
+        _, results = self._submit('#2')
+        _, results = self._submit('#3')
+        self._submit('#4')
+        _, results = self._submit('#5')
+        self.assertTrue(results[0].check(CommandBusyError))
+        self.assertEqual(self.scheduler.commands_rejected, 2)
+
+    def test_timeout(self):
+        """
+        The invoker hears about commands that run too long, but they keep
+        their slot until they really finish.
+        """
+
+        slow, results = self._submit('#1')
+        waiting, _ = self._submit('#1')
+        self.clock.advance(11)
+        self.assertTrue(results[0].check(CommandTimeoutError))
+        self.assertIsNone(waiting.deferred)
+        self.assertEqual(self.scheduler.commands_timed_out, 1)
+        # Whatever the command does later is ignored.
+        slow.deferred.callback('too late')
+        self.assertEqual(len(results), 1)
+        self.assertIsNotNone(waiting.deferred)
+        self.assertEqual(self.scheduler.running, 1)
+
+    def test_timed_out_inline_callbacks_command(self):
+        """
+        An inlineCallbacks command keeps going after it times out, so it
+        keeps holding its slot.
+        """
+
+        step = Deferred()
+        steps_run = []
+
+        class InlineCommand(BaseCommand):
+            command_name = "inline"
+
+            @inlineCallbacks
+            def run(self, protocol, parsed_line, invoker_dbref):
+                yield step
+                steps_run.append('after timeout')
+
+        results = []
+        self.scheduler.submit(InlineCommand(), None, None, '#1').addBoth(
+            results.append)
+        waiting, _ = self._submit('#1')
+        self.clock.advance(11)
+        self.assertTrue(results[0].check(CommandTimeoutError))
+        self.assertIsNone(waiting.deferred)
+
+        step.callback(None)
+        self.assertEqual(steps_run, ['after timeout'])
+        self.assertIsNotNone(waiting.deferred)
+        self.assertEqual(self.scheduler.running, 1)
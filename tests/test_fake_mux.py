@@ -0,0 +1,137 @@
+import unittest
+
+from twisted.internet.task import Clock
+from twisted.test.proto_helpers import StringTransport
+
+from battlesnake.fake_mux.server import FakeMuxFactory, HUH_MESSAGE
+from battlesnake.fake_mux.softcode import EvalContext, evaluate
+from battlesnake.fake_mux.world import FakeWorld, TYPE_PLAYER
+
+
+class SoftcodeTests(unittest.TestCase):
+    def setUp(self):
+        self.world = FakeWorld(seed=1)
+        self.player = self.world.create_object(
+            'Battlesnake', TYPE_PLAYER, location=self.world.get_object('#0'))
+
+    def _eval(self, text):
+        return evaluate(text, EvalContext(self.world, self.player))
+
+    def test_substitutions_and_nesting(self):
+        """
+        Bracketed calls are evaluated, braces and escapes protect text
+        from evaluation.
+        """
+
+        self.assertEqual(self._eval('tok[add(1,sub(5,2))]%b\\[x]'), 'tok4 [x]')
+        self.assertEqual(self._eval('[iter(a b,{[##]})]'), '[a] [b]')
+        self.assertEqual(self._eval('[setq(0,a b c)][words(%q0)]'), '3')
+
+    def test_iter_and_filter(self):
+        """
+        ## is replaced in iter(), and filter() keeps items that u() to 1.
+        """
+
+        parent = self.world.create_object('Parent')
+        parent.set_attr('IS_BIG.F', '[gt(%0,2)]')
+        self.assertEqual(
+            self._eval('[iter(1|2|3,##:#@^,|)]'), '1:1^ 2:2^ 3:3^')
+        self.assertEqual(
+            self._eval('[filter(%s/IS_BIG.F,1 2 3 4)]' % parent.dbref), '3 4')
+
+    def test_errors(self):
+        """
+        Unknown functions and bad argument counts produce MUX-style errors.
+        """
+
+        self.assertEqual(
+            self._eval('[nosuchfn(1)]'), '#-1 FUNCTION (NOSUCHFN) NOT FOUND')
+        self.assertEqual(
+            self._eval('[sub(1)]'), '#-1 FUNCTION (SUB) EXPECTS 2 ARGUMENTS')
+
+    def test_unit_lifecycle(self):
+        """
+        Units can be created, loaded, placed, and queried with btfuncs.
+        """
+
+        map_dbref = self._eval('[create(Map,1,t)]')
+        self._eval('[btloadmap(%s,somemap)]' % map_dbref)
+        unit_dbref = self._eval('[create(Unit,1,t)]')
+        self.assertEqual(self._eval('[btloadmech(%s,LCT-1V)]' % unit_dbref), '1')
+        self.assertEqual(
+            self._eval('[btsetxy(%s,%s,5,6)]' % (unit_dbref, map_dbref)), '1')
+        self.assertEqual(self._eval('[lcon(%s)]' % map_dbref), unit_dbref)
+        self.assertEqual(
+            self._eval('[btgetxcodevalue(%s,id)]:[btgetxcodevalue(%s,x)]' % (
+                unit_dbref, unit_dbref)), 'AA:5')
+        self._eval('[btsetxcodevalue(%s,heat,12)]' % unit_dbref)
+        self.assertEqual(
+            self._eval('[btgetxcodevalue(%s,heat)]' % unit_dbref), '12')
+        self.assertEqual(
+            self._eval('[btunitpartslist(%s)]' % unit_dbref),
+            'MachineGun:2|MediumLaser:1')
+        self.assertEqual(
+            self._eval('[btsetxy(%s,%s,99,6)]' % (unit_dbref, map_dbref)),
+            '#-1 INVALID COORDINATES')
+
+
+class FakeMuxServerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.world = FakeWorld(seed=1)
+
+    def _connect(self, **kwargs):
+        factory = FakeMuxFactory(self.world, clock=self.clock, **kwargs)
+        protocol = factory.buildProtocol(None)
+        transport = StringTransport()
+        protocol.makeConnection(transport)
+        return protocol, transport
+
+    def _send(self, protocol, transport, line):
+        transport.clear()
+        protocol.dataReceived(line + '\r\n')
+        return transport.value().split('\r\n')[:-1]
+
+    def test_login_and_commands(self):
+        """
+        The bot's login trigger and success strings show up, and commands
+        run as the logged in player.
+        """
+
+        protocol, transport = self._connect(accounts={'Battlesnake': 'pw'})
+        self.assertIn('QUIT', transport.value())
+        self.assertIn('has a different password.', self._send(
+            protocol, transport, 'connect "Battlesnake" wrong')[0])
+        self.assertEqual(self._send(
+            protocol, transport, 'connect "Battlesnake" pw'), ['Connected.'])
+
+        self.assertEqual(
+            self._send(protocol, transport, 'think abc[name(me)]'),
+            ['abcBattlesnake'])
+        self._send(protocol, transport, '@set me=SOME_ATTR:value')
+        self.assertEqual(
+            self._send(protocol, transport, 'think [get(me/some_attr)]'),
+            ['value'])
+        self.assertEqual(
+            self._send(protocol, transport, '@dolist a b=think ##:#@'),
+            ['a:1', 'b:2'])
+        self.assertEqual(
+            self._send(protocol, transport, 'frobnicate'), [HUH_MESSAGE])
+
+    def test_latency_preserves_order(self):
+        """
+        With jitter, commands still run in the order they came in.
+        """
+
+        protocol, transport = self._connect(latency=0.1, jitter=0.09, seed=3)
+        protocol.dataReceived('connect "Battlesnake" pw\r\n')
+        self.clock.advance(1)
+        transport.clear()
+        for num in range(20):
+            protocol.dataReceived('think %d\r\n' % num)
+        self.assertEqual(transport.value(), '')
+        self.clock.advance(0.005)
+        self.clock.pump([0.01] * 30)
+        self.assertEqual(
+            transport.value().split('\r\n')[:-1],
+            [str(num) for num in range(20)])
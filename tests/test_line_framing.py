@@ -0,0 +1,38 @@
+import unittest
+
+from battlesnake.core.protocols.line_framing import TelnetLineFramer
+
+
+class TelnetLineFramerTests(unittest.TestCase):
+    def setUp(self):
+        self.framer = TelnetLineFramer()
+
+    def test_lines_split_over_chunks(self):
+        """
+        Lines can be split across any number of chunks, and a chunk can
+        finish several lines.
+        """
+
+        self.assertEqual(self.framer.feed("one\r\ntw"), ["one\r"])
+        self.assertEqual(self.framer.feed("o"), [])
+        self.assertEqual(self.framer.partial_length, 3)
+        self.assertEqual(
+            self.framer.feed("\r\nthree\r\nfour\r\n"),
+            ["two\r", "three\r", "four\r"])
+        self.assertEqual(self.framer.partial_length, 0)
+        self.assertEqual(self.framer.iac_chunks_received, 0)
+
+    def test_telnet_commands_stripped(self):
+        """
+        Telnet commands are dropped, even when split across chunks, and
+        escaped IACs come through as data.
+        """
+
+        self.assertEqual(
+            self.framer.feed("Welcome\xff\xfb\x01\r\nHP \xff\xff5\xff"),
+            ["Welcome\r"])
+        self.assertEqual(
+            self.framer.feed("\xf9\xff\xfa\x18\x01\xff"), [])
+        self.assertEqual(
+            self.framer.feed("\xf0!\r\n"), ["HP \xff5!\r"])
+        self.assertEqual(self.framer.iac_chunks_received, 3)
@@ -0,0 +1,46 @@
+import unittest
+
+from twisted.internet import defer
+
+from battlesnake.core.call_sites import get_caller_name
+from battlesnake.core.metrics import RoundTripMetrics, LatencyHistogram
+from battlesnake.core.response_watcher import NoResponseMatchFoundError, \
+    TokenResponseWatcher
+
+
+class RoundTripMetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.metrics = RoundTripMetrics()
+
+    def test_histogram_percentiles(self):
+        histogram = LatencyHistogram()
+        for _ in range(98):
+            histogram.record(0.004)
+        histogram.record(0.150)
+        histogram.record(7.5)
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.percentile_ms(50), 5.0)
+        self.assertEqual(histogram.percentile_ms(99), 200.0)
+        self.assertEqual(histogram.percentile_ms(100), 7500.0)
+
+    def test_track(self):
+        """
+        Responses and timeouts are recorded against the call site.
+        """
+
+        d = self.metrics.track(defer.Deferred(), 'btgetxcodevalue')
+        d.callback('1')
+        watcher = TokenResponseWatcher('AAAAAAAAAA', 3.0, None)
+        d = self.metrics.track(defer.Deferred(), 'btgetxcodevalue')
+        d.addErrback(lambda failure: failure.trap(NoResponseMatchFoundError))
+        d.errback(NoResponseMatchFoundError(watcher))
+
+        histogram = self.metrics.histograms['btgetxcodevalue']
+        self.assertEqual(histogram.count, 1)
+        self.assertEqual(histogram.timeouts, 1)
+        self.assertEqual(len(self.metrics.format_report()), 3)
+
+    def test_get_caller_name(self):
+        def wrapper():
+            return get_caller_name()
+        self.assertEqual(wrapper(), 'test_get_caller_name')
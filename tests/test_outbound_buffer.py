@@ -0,0 +1,53 @@
+import unittest
+
+from twisted.internet.task import Clock
+from twisted.test.proto_helpers import StringTransport
+
+from battlesnake.core.protocols.outbound_buffer import OutboundLineBuffer
+
+
+class OutboundLineBufferTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.transport = StringTransport()
+        self.buffer = OutboundLineBuffer(clock=self.clock)
+        self.buffer.transport = self.transport
+
+    def test_lines_coalesced_per_turn(self):
+        """
+        Lines written in the same reactor turn go out in one write.
+        """
+
+        self.buffer.write("think one")
+        self.buffer.write("think two")
+        self.assertEqual(self.transport.value(), "")
+
+        self.clock.advance(0)
+        self.assertEqual(self.transport.value(), "think one\r\nthink two\r\n")
+        self.assertEqual(self.buffer.transport_writes, 1)
+        self.assertEqual(self.buffer.lines_written, 2)
+
+    def test_explicit_flush(self):
+        """
+        Flushing sends everything buffered so far, in order, and cancels
+        the scheduled flush.
+        """
+
+        self.buffer.write("think one")
+        self.buffer.write("think two", flush=True)
+        self.assertEqual(self.transport.value(), "think one\r\nthink two\r\n")
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        # Nothing left to send.
+        self.buffer.flush()
+        self.assertEqual(self.buffer.transport_writes, 1)
+
+    def test_clear(self):
+        """
+        Clearing the buffer drops unsent lines.
+        """
+
+        self.buffer.write("think one")
+        self.buffer.clear()
+        self.clock.advance(0)
+        self.assertEqual(self.transport.value(), "")
+        self.assertEqual(self.buffer.pending_line_count(), 0)
@@ -0,0 +1,105 @@
+import unittest
+
+from twisted.internet.task import Clock
+
+from battlesnake.core.mux_errors import MuxError, ERROR_HUH
+from battlesnake.core.protocols.outbound_scheduler import OutboundScheduler, \
+    PRIORITY_HIGH, PRIORITY_LOW
+from battlesnake.core.response_watcher import ResponseWatcherManager, \
+    TokenResponseWatcher
+
+
+class OutboundSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.manager = ResponseWatcherManager(clock=self.clock)
+        self.sent = []
+        self.scheduler = OutboundScheduler(
+            self.sent.append, self.manager, max_in_flight=1)
+
+    def _request(self, line, token, priority=PRIORITY_LOW):
+        watcher = TokenResponseWatcher(token, 3.0, None)
+        self.scheduler.submit([line], priority=priority, watcher=watcher)
+        return watcher.deferred
+
+    def test_priority_order(self):
+        """
+        Once a slot opens up, higher priority commands go first. Commands
+        in the same class keep their order.
+        """
+
+        self._request("think AAAAAAAAAA", "AAAAAAAAAA")
+        self._request("think BBBBBBBBBB", "BBBBBBBBBB")
+        self.scheduler.submit(["@pemit me=low"], priority=PRIORITY_LOW)
+        self._request("@force #1=high", "CCCCCCCCCC", priority=PRIORITY_HIGH)
+        self.assertEqual(self.sent, ["think AAAAAAAAAA"])
+        self.assertEqual(self.scheduler.queue_depth(), 3)
+
+        self.manager.match_line("AAAAAAAAAA\r")
+        self.assertEqual(self.sent[1:], ["@force #1=high"])
+        self.manager.match_line("CCCCCCCCCC\r")
+        # The pemit waits behind the think that was queued before it, but
+        # doesn't need a slot of its own.
+        self.assertEqual(
+            self.sent[2:], ["think BBBBBBBBBB", "@pemit me=low"])
+        self.manager.match_line("BBBBBBBBBB\r")
+        self.assertEqual(self.scheduler.in_flight, 0)
+
+    def test_timeout_starts_on_send(self):
+        """
+        Time spent waiting in the queue doesn't count against a request's
+        timeout, and timeouts free up their slot.
+        """
+
+        errors = []
+        self._request("think AAAAAAAAAA", "AAAAAAAAAA").addErrback(
+            errors.append)
+        self._request("think BBBBBBBBBB", "BBBBBBBBBB").addErrback(
+            errors.append)
+
+        self.clock.advance(3.0)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(self.sent[1:], ["think BBBBBBBBBB"])
+        self.clock.advance(2.9)
+        self.assertEqual(len(errors), 1)
+        self.clock.advance(0.1)
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(self.scheduler.get_stats()['in_flight'], 0)
+
+    def test_errors_pinned_when_unambiguous(self):
+        """
+        An error line fails the one command that hasn't finished, without
+        waiting for its timeout. Errors that could belong to more than one
+        command are only logged.
+        """
+
+        self.scheduler.max_in_flight = 0
+        results = []
+        errors = []
+        self.scheduler.submit(["@pemit me=hi"])
+        self._request("think AAAAAAAAAA", "AAAAAAAAAA").addCallback(
+            results.append)
+        self._request("hudinfo key=xyz", "BBBBBBBBBB").addErrback(
+            errors.append)
+        # Still waiting on the think, so this could be about either.
+        self.assertIsNone(self.scheduler.pin_error(ERROR_HUH, "Huh?"))
+
+        # The pemit was sent before the think, so it's done too.
+        self.manager.match_line("AAAAAAAAAA\r")
+        self.assertEqual(results, [""])
+        error = self.scheduler.pin_error(ERROR_HUH, "Huh?")
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].check(MuxError))
+        self.assertEqual(error.lines, ["hudinfo key=xyz"])
+        self.assertEqual(self.scheduler.in_flight, 0)
+        self.assertEqual(self.manager.pending_watcher_count(), 0)
+        self.assertIsNone(self.scheduler.pin_error(ERROR_HUH, "Huh?"))
+
+    def test_write_after_request_is_ambiguous(self):
+        errors = []
+        self._request("hudinfo key=xyz", "BBBBBBBBBB").addErrback(
+            errors.append)
+        self.scheduler.submit(["@pemit me=hi"])
+        self.assertIsNone(self.scheduler.pin_error(ERROR_HUH, "Huh?"))
+        self.assertEqual(errors, [])
+        self.assertEqual(self.manager.pending_watcher_count(), 1)
@@ -0,0 +1,47 @@
+import unittest
+
+from battlesnake.plugins.contrib.arena_master.puppets.puppet_store import \
+    ArenaMasterPuppetStore
+from battlesnake.plugins.contrib.arena_master.puppets.units.unit_store import \
+    ArenaMapUnitStore, parse_contact_puller_output
+
+from unit_records import make_unit_record
+
+
+class FakePuppet(object):
+    def __init__(self, dbref):
+        self.dbref = dbref
+        self.unit_store = ArenaMapUnitStore(self, None)
+
+
+class FindPuppetForUnitTests(unittest.TestCase):
+    def setUp(self):
+        self.puppet_store = ArenaMasterPuppetStore()
+        self.puppets = [FakePuppet('#1'), FakePuppet('#2')]
+        for puppet in self.puppets:
+            self.puppet_store.update_or_add_puppet(puppet)
+        self.units = parse_contact_puller_output('^'.join([
+            make_unit_record('#100', 'AA'), make_unit_record('#101', 'AB')]))
+        self.puppets[0].unit_store.add_unit(self.units[0])
+        self.puppets[1].unit_store.add_unit(self.units[1])
+
+    def test_find(self):
+        """
+        Units are found in whichever arena detected them, until they're
+        removed from it.
+        """
+
+        find = self.puppet_store.find_puppet_for_unit_dbref
+        self.assertIs(find('#100'), self.puppets[0])
+        self.assertIs(find('#101'), self.puppets[1])
+        self.assertIs(find('#102'), None)
+
+        self.puppets[0].unit_store._remove_stale_unit(self.units[0])
+        self.assertIs(find('#100'), None)
+        # Destroyed units are purged without a stale unit signal.
+        self.puppets[1].unit_store.purge_unit_by_id('AB')
+        self.assertIs(find('#101'), None)
+
+    def test_removed_puppet(self):
+        self.puppet_store.remove_puppet_by_dbref('#2')
+        self.assertIs(self.puppet_store.find_puppet_for_unit_dbref('#101'), None)
@@ -0,0 +1,62 @@
+import unittest
+
+from twisted.internet.defer import Deferred
+from twisted.internet.task import Clock
+
+from battlesnake.core.read_cache import ReadThroughCache, xcode_name
+
+
+class ReadThroughCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = ReadThroughCache(clock=self.clock)
+        self.fetches = []
+        self.results = []
+
+    def _fetch(self):
+        deferred = Deferred()
+        self.fetches.append(deferred)
+        return deferred
+
+    def _get(self, obj='#10', name='MAP.DBREF', ttl=60.0):
+        self.cache.get(obj, name, self._fetch, ttl).addCallback(
+            self.results.append)
+
+    def test_coalesced_and_cached(self):
+        """
+        Identical reads in flight at once share a fetch, and the value is
+        served from the cache until its TTL runs out.
+        """
+
+        self._get()
+        self._get(name='map.dbref')
+        self.assertEqual(len(self.fetches), 1)
+        self.fetches[0].callback('#20')
+        self.assertEqual(self.results, ['#20', '#20'])
+
+        self.clock.advance(59)
+        self._get()
+        self.assertEqual(len(self.fetches), 1)
+        self.clock.advance(1)
+        self._get()
+        self.assertEqual(len(self.fetches), 2)
+        self.assertEqual(
+            (self.cache.hits, self.cache.misses, self.cache.coalesced),
+            (1, 2, 1))
+
+    def test_invalidated_while_in_flight(self):
+        """
+        A value that was being read when it was written to isn't stored,
+        though the caller still gets it.
+        """
+
+        self._get(name=xcode_name('mapwidth'))
+        self.cache.invalidate('#10')
+        self.fetches[0].callback('50')
+        self.assertEqual(self.results, ['50'])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_only_dbrefs_cached(self):
+        self._get(obj='me')
+        self._get(obj='me')
+        self.assertEqual(len(self.fetches), 2)
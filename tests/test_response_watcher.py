@@ -0,0 +1,129 @@
+import unittest
+
+from twisted.internet.task import Clock
+
+from battlesnake.core.response_watcher import ResponseWatcherManager, \
+    NoResponseMatchFoundError
+from battlesnake.core.utils import generate_compact_token, COMPACT_TOKEN_LENGTH
+
+
+class ResponseWatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.manager = ResponseWatcherManager(clock=self.clock)
+        self.results = []
+        self.errors = []
+
+    def test_compact_tokens(self):
+        """
+        Compact tokens are fixed-length and don't repeat.
+        """
+
+        tokens = [generate_compact_token() for _ in range(1000)]
+        self.assertEqual(len(set(tokens)), len(tokens))
+        for token in tokens:
+            self.assertEqual(len(token), COMPACT_TOKEN_LENGTH)
+            self.assertTrue(token.isalnum())
+
+    def test_token_match(self):
+        """
+        Token watchers get the remainder of the line, minus the trailing
+        carriage return.
+        """
+
+        token = generate_compact_token()
+        d = self.manager.watch_token(token, timeout_secs=3.0)
+        d.addCallback(self.results.append)
+
+        self.assertFalse(self.manager.match_line("Someone says \"hi\"\r"))
+        self.assertTrue(self.manager.match_line(token + "#123 #456\r"))
+        self.assertEqual(self.results, ["#123 #456"])
+        # Watchers only fire once.
+        self.assertFalse(self.manager.match_line(token + "#123 #456\r"))
+        self.assertEqual(self.manager.token_watchers, {})
+
+    def test_regex_fallback(self):
+        """
+        Arbitrary regex watchers still work alongside the token index.
+        """
+
+        d = self.manager.watch(
+            r'^#HUD:(?P<key>.*):KEY:R# Key set\r$', timeout_secs=3.0,
+            return_regex_group='key')
+        d.addCallback(self.results.append)
+
+        self.assertTrue(self.manager.match_line("#HUD:abc:KEY:R# Key set\r"))
+        self.assertEqual(self.results, ["abc"])
+        self.assertEqual(self.manager.watcher_store, {})
+
+    def test_expiration(self):
+        """
+        Watchers are errback'd once their timeout elapses, and not before.
+        """
+
+        token = generate_compact_token()
+        d = self.manager.watch_token(token, timeout_secs=3.0)
+        d.addErrback(lambda failure: self.errors.append(
+            failure.trap(NoResponseMatchFoundError)))
+
+        self.clock.advance(2.9)
+        self.assertEqual(self.errors, [])
+        self.clock.advance(0.1)
+        self.assertEqual(self.errors, [NoResponseMatchFoundError])
+        self.assertEqual(self.manager.pending_watcher_count(), 0)
+        # A late response is ignored.
+        self.assertFalse(self.manager.match_line(token + "late\r"))
+
+    def test_match_cancels_expiration(self):
+        """
+        Matched watchers don't leave their expiration calls lying around.
+        """
+
+        token = generate_compact_token()
+        self.manager.watch_token(token, timeout_secs=3.0)
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+        self.manager.match_line(token + "\r")
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_framed_chunks(self):
+        """
+        Chunks are put back in order, and we wait for the count given by
+        the end sentinel.
+        """
+
+        token = generate_compact_token()
+        d = self.manager.watch_framed(token, timeout_secs=3.0)
+        d.addCallback(self.results.append)
+
+        self.assertTrue(self.manager.match_line(token + ".2:#12:BB\r"))
+        self.assertTrue(self.manager.match_line(token + "-3:#-1 NO MATCH\r"))
+        self.assertFalse(self.manager.match_line("Someone says \"hi\"\r"))
+        # Each line restarts the timeout.
+        self.clock.advance(2.5)
+        self.assertTrue(self.manager.match_line(token + ".1:#11:AA\r"))
+        self.clock.advance(2.5)
+        self.assertTrue(self.manager.match_line(token + ".3:\r"))
+        self.assertEqual(self.results, [["#11:AA", "#12:BB", ""]])
+        self.assertEqual(self.manager.pending_watcher_count(), 0)
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_framed_capture(self):
+        """
+        Lines between the sentinels that match the capture regex are
+        collected. Anything else is left alone.
+        """
+
+        token = generate_compact_token()
+        d = self.manager.watch_framed(
+            token, timeout_secs=3.0, capture_regex_str=r'^#HUD:abc:C:')
+        d.addCallback(self.results.append)
+
+        self.assertFalse(self.manager.match_line("#HUD:abc:C:L# early\r"))
+        self.manager.match_line(token + "+\r")
+        self.assertTrue(self.manager.match_line("#HUD:abc:C:L# AA\r"))
+        self.assertFalse(self.manager.match_line("Someone says \"hi\"\r"))
+        self.assertTrue(self.manager.match_line("#HUD:abc:C:D# Done\r"))
+        self.manager.match_line(token + "-\r")
+        self.assertEqual(
+            self.results, [["#HUD:abc:C:L# AA", "#HUD:abc:C:D# Done"]])
+        self.assertEqual(self.manager.capturing_watchers, [])
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+from twisted.internet.task import Clock
+
+from battlesnake.core.protocols.session_recording import SessionRecorder, \
+    SessionReplayer, read_recording, get_think_token, INBOUND, OUTBOUND
+from battlesnake.core.response_watcher import ResponseWatcherManager
+
+
+class FakeProtocol(object):
+    def __init__(self, clock):
+        self.watcher_manager = ResponseWatcherManager(clock=clock)
+        self.lines = []
+        self.matched = []
+
+    def telnet_monitoring(self, line):
+        self.lines.append(line)
+        self.matched.append(self.watcher_manager.match_line(line))
+
+
+class SessionRecordingTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.clock = Clock()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_round_trip(self):
+        """
+        Recorded lines come back out as-is, apart from passwords.
+        """
+
+        recorder = SessionRecorder(self.path)
+        recorder.record_outbound('connect "Battlesnake" hunter2')
+        recorder.record_inbound('Someone says, "tab\there"\r')
+        recorder.close()
+
+        records = list(read_recording(self.path))
+        self.assertEqual(
+            [(direction, line) for _, direction, line in records],
+            [(OUTBOUND, 'connect <redacted>'),
+             (INBOUND, 'Someone says, "tab\there"\r')])
+
+    def test_get_think_token(self):
+        self.assertEqual(get_think_token('think AAAAAAAAAA[add(1,1)]'),
+                         'AAAAAAAAAA')
+        self.assertEqual(get_think_token('@set me=FOO:1'), None)
+
+    def test_replay(self):
+        """
+        Inbound lines are dispatched on the recording's schedule, and
+        recorded thinks get their responses matched.
+        """
+
+        records = [
+            (100.0, OUTBOUND, 'think AAAAAAAAAA[add(1,1)]'),
+            (100.5, INBOUND, 'AAAAAAAAAA2\r'),
+            (102.0, INBOUND, 'Someone has connected.\r'),
+        ]
+        protocol = FakeProtocol(self.clock)
+        replayer = SessionReplayer(
+            protocol, records, speed=2.0, clock=self.clock)
+        results = []
+        replayer.run().addCallback(results.append)
+
+        self.clock.advance(0)
+        self.assertEqual(protocol.lines, [])
+        self.clock.advance(0.25)
+        self.assertEqual(protocol.matched, [True])
+        self.clock.advance(0.75)
+        self.assertEqual(protocol.matched, [True, False])
+        self.assertEqual(len(results[0].timings), 2)
+        self.assertEqual(len(results[0].format_report()), 6)
@@ -0,0 +1,28 @@
+import unittest
+
+from battlesnake.core.softcode_helpers import SoftcodeHelperLibrary
+
+
+class SoftcodeHelperLibraryTests(unittest.TestCase):
+    def test_version_follows_code(self):
+        """
+        The version changes whenever any helper does, and doesn't depend
+        on registration order.
+        """
+
+        library = SoftcodeHelperLibrary()
+        library.register({'BS_ONE': '[add(%0,1)]', 'bs_two': '[name(%0)]'})
+        other = SoftcodeHelperLibrary()
+        other.register({'BS_TWO': '[name(%0)]'})
+        other.register({'BS_ONE': '[add(%0,1)]'})
+        self.assertEqual(library.version, other.version)
+
+        other.helpers['BS_ONE'] = '[add(%0,2)]'
+        self.assertNotEqual(library.version, other.version)
+
+    def test_u(self):
+        library = SoftcodeHelperLibrary()
+        library.register({'BS_UNIT': '[name(%0)]'})
+        library.obj_dbref = '#5'
+        library.installed = True
+        self.assertEqual(library.u('BS_UNIT', '##'), '[u(#5/BS_UNIT,##)]')
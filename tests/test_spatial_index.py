@@ -0,0 +1,65 @@
+import random
+import unittest
+
+from battlesnake.core.utils import calc_xy_range
+from battlesnake.plugins.contrib.arena_master.puppets.units.spatial_index import \
+    HexBucketIndex
+
+
+class FakeUnit(object):
+    def __init__(self, contact_id, x_coord, y_coord):
+        self.contact_id = contact_id
+        self.x_coord = x_coord
+        self.y_coord = y_coord
+
+
+class HexBucketIndexTests(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(1)
+        self.index = HexBucketIndex(bucket_size=4)
+        self.units = []
+        for num in range(60):
+            unit = FakeUnit(
+                'U%d' % num, rand.randint(0, 40), rand.randint(0, 40))
+            self.units.append(unit)
+            self.index.add(unit)
+
+    def _distance(self, unit, x_coord=20, y_coord=20):
+        return calc_xy_range(x_coord, y_coord, unit.x_coord, unit.y_coord)
+
+    def test_queries_match_brute_force(self):
+        """
+        Point, radius, and nearest queries find the same units as checking
+        every unit would.
+        """
+
+        unit = self.units[0]
+        self.assertIn(unit, self.index.units_in_hex(unit.x_coord, unit.y_coord))
+
+        within = self.index.units_within(20, 20, 9)
+        self.assertEqual(
+            set(within),
+            set(other for other in self.units if self._distance(other) <= 9))
+        self.assertEqual(within, sorted(within, key=self._distance))
+
+        nearest = self.index.nearest(20, 20, count=5)
+        expected = sorted(self.units, key=self._distance)[:5]
+        self.assertEqual(
+            [self._distance(found) for found in nearest],
+            [self._distance(other) for other in expected])
+
+        odd = self.index.nearest(
+            0, 40, predicate=lambda unit: int(unit.contact_id[1:]) % 2)
+        expected = min(
+            self.units[1::2], key=lambda unit: self._distance(unit, 0, 40))
+        self.assertEqual(
+            self._distance(odd[0], 0, 40), self._distance(expected, 0, 40))
+
+    def test_move_and_remove(self):
+        unit = self.units[0]
+        unit.x_coord, unit.y_coord = 100, 100
+        self.index.move(unit)
+        self.assertEqual(self.index.units_in_hex(100, 100), [unit])
+        self.index.remove(unit.contact_id)
+        self.assertEqual(self.index.units_in_hex(100, 100), [])
+        self.assertEqual(len(self.index), 59)
@@ -0,0 +1,111 @@
+import unittest
+
+from twisted.internet.task import Clock
+
+from battlesnake.core.protocols.think_batcher import ThinkBatcher, \
+    ThinkBatchTruncatedError, split_batched_response
+from battlesnake.core.response_watcher import ResponseWatcherManager
+
+
+class ThinkBatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.manager = ResponseWatcherManager(clock=self.clock)
+        self.sent = []
+        self.batcher = ThinkBatcher(
+            self._send_request, max_line_length=100, clock=self.clock)
+        self.results = []
+
+    def _send_request(self, line, token, timeout_secs, debug_info, priority):
+        self.sent.append((line, token))
+        return self.manager.watch_token(token, timeout_secs, debug_info)
+
+    def test_batched_round_trip(self):
+        """
+        Thinks from the same turn go out as one, and each caller gets
+        its own result.
+        """
+
+        self.batcher.think('AAAAAAAAAA', '[add(1,1)]').addCallback(
+            self.results.append)
+        self.batcher.think('BBBBBBBBBB', '[add(2,2)]').addCallback(
+            self.results.append)
+        self.assertEqual(self.sent, [])
+
+        self.clock.advance(0)
+        self.assertEqual(len(self.sent), 1)
+        line, batch_token = self.sent[0]
+        self.assertEqual(
+            line, 'think %sAAAAAAAAAA[add(1,1)]BBBBBBBBBB[add(2,2)]%s' % (
+                batch_token, batch_token))
+
+        self.manager.match_line(
+            batch_token + 'AAAAAAAAAA2BBBBBBBBBB4' + batch_token + '\r')
+        self.assertEqual(self.results, ['2', '4'])
+
+    def test_single_think_not_wrapped(self):
+        """
+        A think with nobody to share a batch with goes out as-is.
+        """
+
+        self.batcher.think('AAAAAAAAAA', '[add(1,1)]').addCallback(
+            self.results.append)
+        self.batcher.flush()
+        self.assertEqual(
+            self.sent, [('think AAAAAAAAAA[add(1,1)]', 'AAAAAAAAAA')])
+        self.manager.match_line('AAAAAAAAAA2\r')
+        self.assertEqual(self.results, ['2'])
+
+    def test_max_line_length(self):
+        """
+        A think that would push a batch past the length limit starts a
+        new batch.
+        """
+
+        self.batcher.think('AAAAAAAAAA', 'x' * 60)
+        self.batcher.think('BBBBBBBBBB', 'y' * 60)
+        self.assertEqual(len(self.sent), 1)
+        self.batcher.flush()
+        self.assertEqual(len(self.sent), 2)
+
+    def test_truncated_response(self):
+        """
+        Items whose output didn't make it back are errback'd.
+        """
+
+        errors = []
+        trap_truncated = lambda failure: errors.append(
+            failure.trap(ThinkBatchTruncatedError))
+        self.batcher.think('AAAAAAAAAA', '[a]').addErrback(trap_truncated)
+        self.batcher.think('BBBBBBBBBB', '[b]').addErrback(trap_truncated)
+        self.batcher.flush()
+        batch_token = self.sent[0][1]
+        self.manager.match_line(batch_token + 'AAAAAAAAAAa\r')
+        # There's no way to tell whether the first item's output is complete
+        # either, so it fails too.
+        self.assertEqual(errors, [ThinkBatchTruncatedError] * 2)
+
+    def test_last_item_truncated(self):
+        """
+        The last item's output is only used if the closing token made it.
+        """
+
+        results = []
+        self.batcher.think('AAAAAAAAAA', '[a]').addBoth(results.append)
+        self.batcher.think('BBBBBBBBBB', '[b]').addBoth(results.append)
+        self.batcher.flush()
+        batch_token = self.sent[0][1]
+        self.manager.match_line(batch_token + 'AAAAAAAAAAaBBBBBBBBBBbb\r')
+        self.assertEqual(results[0], 'a')
+        self.assertTrue(results[1].check(ThinkBatchTruncatedError))
+
+    def test_split_batched_response(self):
+        self.assertEqual(
+            split_batched_response('T1aT2T3cT0', ['T1', 'T2', 'T3'], 'T0'),
+            ['a', '', 'c'])
+        self.assertEqual(
+            split_batched_response('T1aT2b', ['T1', 'T2', 'T3'], 'T0'),
+            ['a', None, None])
+        self.assertEqual(
+            split_batched_response('T1aT2b', ['T1', 'T2'], 'T0'),
+            ['a', None])
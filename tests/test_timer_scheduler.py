@@ -0,0 +1,96 @@
+import unittest
+
+from twisted.internet.defer import Deferred
+from twisted.internet.task import Clock
+
+from battlesnake.core.timer_scheduler import TimerScheduler, OVERRUN_SKIP, \
+    OVERRUN_COALESCE, OVERRUN_QUEUE
+
+
+def make_timer(overrun_policy, interval=1.0):
+    """
+    :rtype: type
+    :returns: A timer class whose runs don't finish until the test fires
+        their Deferreds. The Deferreds are kept in ``runs``.
+    """
+
+    runs = []
+
+    class SlowTimer(object):
+        @classmethod
+        def fire(cls, protocol):
+            d = Deferred()
+            runs.append(d)
+            return d
+
+    SlowTimer.interval = interval
+    SlowTimer.overrun_policy = overrun_policy
+    SlowTimer.runs = runs
+    return SlowTimer
+
+
+class TimerSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.scheduler = TimerScheduler(None, start_jitter=0, clock=self.clock)
+
+    def _run_overlapping(self, overrun_policy):
+        """
+        Starts a timer, then lets it come due three more times while its
+        first run is still going.
+        """
+
+        timer_class = make_timer(overrun_policy)
+        timer = self.scheduler.add_timer(timer_class)
+        self.clock.pump([1.0] * 4)
+        self.assertEqual(len(timer_class.runs), 1)
+        timer_class.runs[0].callback(None)
+        return timer_class, timer
+
+    def test_skip(self):
+        timer_class, timer = self._run_overlapping(OVERRUN_SKIP)
+        self.assertEqual(len(timer_class.runs), 1)
+        self.assertEqual(timer.skipped, 3)
+
+    def test_coalesce(self):
+        timer_class, timer = self._run_overlapping(OVERRUN_COALESCE)
+        self.assertEqual(len(timer_class.runs), 2)
+        timer_class.runs[1].callback(None)
+        self.assertEqual(len(timer_class.runs), 2)
+        self.assertEqual(timer.coalesced, 2)
+
+    def test_queue(self):
+        timer_class, timer = self._run_overlapping(OVERRUN_QUEUE)
+        for num in range(1, 4):
+            self.assertEqual(len(timer_class.runs), num + 1)
+            timer_class.runs[num].callback(None)
+        self.assertEqual(len(timer_class.runs), 4)
+        self.assertEqual(timer.fires, 4)
+
+    def test_no_drift_or_burst(self):
+        """
+        Fires stay on the original schedule, and a stall doesn't cause a
+        burst of catch-up fires.
+        """
+
+        fire_times = []
+
+        class QuickTimer(object):
+            interval = 1.0
+            overrun_policy = OVERRUN_SKIP
+
+            @classmethod
+            def fire(cls, protocol):
+                fire_times.append(self.clock.seconds())
+
+        self.scheduler.add_timer(QuickTimer)
+        self.clock.advance(1.25)
+        self.clock.advance(1.0)
+        self.clock.advance(0.75)
+        self.assertEqual(fire_times, [1.25, 2.25, 3.0])
+
+        # Stall for a few intervals.
+        self.clock.advance(4.5)
+        self.assertEqual(len(fire_times), 4)
+        self.clock.advance(0.5)
+        self.assertEqual(fire_times[-1], 8.0)
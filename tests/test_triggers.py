@@ -1,6 +1,10 @@
+import re
 import unittest
 
-from battlesnake.plugins.example_plugin.triggers import ExampleTriggerTable
+from battlesnake.core.triggers import Trigger, TriggerTable, TriggerEngine, \
+    derive_required_literal
+from battlesnake.plugins.example_plugin.triggers import ExampleTriggerTable, \
+    SayHelloTrigger
 
 
 class TriggerTests(unittest.TestCase):
@@ -14,3 +18,77 @@ class TriggerTests(unittest.TestCase):
 
         _, match = self.trigger_table.match_line('Some Guy says "hello"')
         self.assertEqual(match.group('talker'), 'Some Guy')
+
+
+class _OrderedTriggerA(Trigger):
+    line_regex = re.compile(r'.*[Ss](?P<num>\d+)')
+
+
+class _OrderedTriggerB(Trigger):
+    line_regex = re.compile(r'[Ff](?P<num>\d+)')
+
+
+class _BackrefTrigger(Trigger):
+    line_regex = re.compile(r'(?P<word>\w+) again (?P=word)')
+
+
+class _PrefilteredTrigger(Trigger):
+    line_regex = re.compile(r'^#HUD:(?P<key>\w+):')
+    line_prefilter = '#HUD:'
+
+
+class _TestTriggerTable(TriggerTable):
+    triggers = [
+        _PrefilteredTrigger,
+        _OrderedTriggerA,
+        _OrderedTriggerB,
+        _BackrefTrigger,
+    ]
+
+
+class TriggerEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = TriggerEngine([ExampleTriggerTable(), _TestTriggerTable()])
+
+    def test_say_hello(self):
+        """
+        The engine finds the same matches as the tables themselves.
+        """
+
+        trigger, match = self.engine.match_line('Some Guy says "hello"')
+        self.assertEqual(trigger, SayHelloTrigger)
+        self.assertEqual(match.group('talker'), 'Some Guy')
+
+    def test_first_match_wins(self):
+        """
+        An earlier trigger wins, even when a later one matches further to
+        the left in the line.
+        """
+
+        trigger, match = self.engine.match_line('F1 S2')
+        self.assertEqual(trigger, _OrderedTriggerA)
+        self.assertEqual(match.group('num'), '2')
+
+        trigger, match = self.engine.match_line('F1')
+        self.assertEqual(trigger, _OrderedTriggerB)
+        self.assertEqual(match.group('num'), '1')
+
+    def test_uncombinable_and_prefiltered(self):
+        """
+        Triggers with back-references or explicit prefilters still match.
+        """
+
+        trigger, match = self.engine.match_line('hey again hey')
+        self.assertEqual(trigger, _BackrefTrigger)
+        trigger, match = self.engine.match_line('#HUD:abc:R# stuff')
+        self.assertEqual(trigger, _PrefilteredTrigger)
+        self.assertEqual(match.group('key'), 'abc')
+
+    def test_no_match(self):
+        self.assertEqual(self.engine.match_line('Nothing to see here.\r'), None)
+
+    def test_derive_required_literal(self):
+        self.assertEqual(
+            derive_required_literal(SayHelloTrigger.line_regex), ' says "')
+        self.assertEqual(
+            derive_required_literal(re.compile(r'foo|bar')), None)
@@ -0,0 +1,112 @@
+import unittest
+
+from battlesnake.plugins.contrib.arena_master.puppets.units.unit_store import \
+    ArenaMapUnitStore, parse_contact_puller_output, \
+    parse_contact_delta_output
+
+from unit_records import make_unit_record
+
+
+class ParseContactPullerOutputTests(unittest.TestCase):
+    def test_parse(self):
+        """
+        Units are split apart and their fields converted.
+        """
+
+        unit_data = '^'.join([
+            make_unit_record(), make_unit_record('#101', 'ab', x_coord='7')]) + '^'
+        units = parse_contact_puller_output(unit_data)
+        self.assertEqual(len(units), 2)
+        self.assertEqual(units[0].dbref, '#100')
+        self.assertEqual(units[0].x_coord, 5)
+        self.assertEqual(units[0].heading, 128)
+        self.assertEqual(units[0].calc_armor_condition(), 0.99)
+        self.assertEqual(units[1].contact_id, 'AB')
+        changes = ArenaMapUnitStore(None, None).compare_units(*units)
+        self.assertEqual(set(changes), set(['dbref', 'contact_id', 'x_coord']))
+
+    def test_copy_fields_from(self):
+        """
+        Copying a changed field brings along the values worked out from it.
+        """
+
+        old_unit, new_unit = parse_contact_puller_output('^'.join([
+            make_unit_record(),
+            make_unit_record(armor_int_total='152/304|152/152')]))
+        changes = ArenaMapUnitStore(None, None).compare_units(new_unit, old_unit)
+        self.assertEqual(changes, ['armor_int_total'])
+        old_unit.copy_fields_from(new_unit, changes)
+        self.assertEqual(old_unit.calc_armor_condition(), 0.5)
+
+    def test_skipped_units(self):
+        """
+        Units without a contact ID or name, and invisible units, are left out.
+        """
+
+        unit_data = '^'.join([
+            make_unit_record(contact_id=''),
+            make_unit_record(mech_name=''),
+            make_unit_record(critstatus='A'),
+        ])
+        self.assertEqual(parse_contact_puller_output(unit_data), [])
+
+
+class ContactDeltaTests(unittest.TestCase):
+    def test_parse_and_apply(self):
+        """
+        Changed units are added or updated, and units that left the map or
+        went invisible are removed.
+        """
+
+        store = ArenaMapUnitStore(None, None)
+        store.apply_contact_delta(parse_contact_puller_output('^'.join([
+            make_unit_record(), make_unit_record('#101', 'AB'),
+            make_unit_record('#102', 'AC')])), [], full_pull=True)
+        self.assertEqual(len(store.list_all_units()), 3)
+
+        delta_data = '#101 ~ %s^  ' % make_unit_record('#102', 'AC', critstatus='A')
+        changed_units, removed_dbrefs = parse_contact_delta_output(delta_data)
+        self.assertEqual(changed_units, [])
+        self.assertEqual(removed_dbrefs, ['#101', '#102'])
+        store.apply_contact_delta(changed_units, removed_dbrefs)
+        self.assertEqual(
+            [unit.dbref for unit in store.list_all_units()], ['#100'])
+
+        # A full pull drops anything it didn't mention.
+        store.apply_contact_delta(parse_contact_puller_output(
+            make_unit_record('#103', 'AD')), [], full_pull=True)
+        self.assertEqual(
+            [unit.dbref for unit in store.list_all_units()], ['#103'])
+
+
+class UnitStoreIndexTests(unittest.TestCase):
+    def test_indexes_follow_changes(self):
+        """
+        Units are re-filed when their faction or pilot changes, and dropped
+        when they're purged.
+        """
+
+        store = ArenaMapUnitStore(None, lambda old_unit, new_unit, changes: None)
+        for unit in parse_contact_puller_output('^'.join([
+                make_unit_record(), make_unit_record('#101', 'AB')])):
+            store.add_unit(unit)
+        self.assertEqual(len(store.list_units_in_faction('#55')), 2)
+        self.assertEqual(len(store.list_units_by_type('Mech')), 2)
+
+        unit_data = make_unit_record(
+            '#101', 'AB', faction_dbref='#56', pilot_dbref='')
+        store.update_unit(parse_contact_puller_output(unit_data)[0])
+        moved_unit = store.get_unit_by_dbref('#101')
+        self.assertEqual(store.list_units_in_faction('#56'), [])
+        self.assertEqual(
+            store.list_units_in_faction('#56', piloted_only=False),
+            [moved_unit])
+        self.assertEqual(
+            store.list_units_by_faction(),
+            {'#55': [store.get_unit_by_dbref('#100')]})
+        self.assertEqual(len(store.list_all_units(piloted_only=True)), 1)
+
+        store.purge_unit_by_id('AB')
+        self.assertRaises(ValueError, store.get_unit_by_dbref, '#101')
+        self.assertEqual(store.list_units_by_faction(piloted_only=False).keys(),
+                         ['#55'])
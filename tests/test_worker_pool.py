@@ -0,0 +1,76 @@
+import unittest
+
+from battlesnake.core.protocols.worker_pool import WorkerConnectionPool, \
+    parse_worker_accounts
+
+
+class FakeScheduler(object):
+    def __init__(self, load):
+        self.in_flight = load
+
+    def queue_depth(self):
+        return 0
+
+
+class FakeConnection(object):
+    def __init__(self, name, load=0):
+        self.name = name
+        self.outbound_scheduler = FakeScheduler(load)
+
+    def __repr__(self):
+        return self.name
+
+
+class WorkerConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.primary = FakeConnection('primary')
+        self.pool = WorkerConnectionPool(
+            self.primary, parse_worker_accounts(['w0 pw0', 'w1 pw1', 'w2 pw2']))
+        self.workers = [FakeConnection('w%d' % num) for num in range(3)]
+
+    def test_parse_worker_accounts(self):
+        self.assertEqual(
+            parse_worker_accounts(['Worker1 some password']),
+            [('Worker1', 'some password')])
+
+    def test_no_workers_connected(self):
+        """
+        Everything goes over the primary until workers log in.
+        """
+
+        self.assertIs(self.pool.get_connection(), self.primary)
+        self.assertIs(self.pool.get_connection('#123'), self.primary)
+        self.assertEqual(self.pool.get_stats()['requests_on_primary'], 2)
+
+    def test_shard_keys_stick(self):
+        """
+        A shard key always maps to the same worker, and falls back to the
+        primary while that worker is down.
+        """
+
+        for slot, worker in enumerate(self.workers):
+            self.pool.worker_ready(slot, worker)
+        slot = self.pool.get_slot('#123')
+        for _ in range(5):
+            self.assertIs(
+                self.pool.get_connection('#123'), self.workers[slot])
+
+        self.pool.worker_lost(slot, self.workers[slot])
+        self.assertIs(self.pool.get_connection('#123'), self.primary)
+
+    def test_least_loaded(self):
+        """
+        Requests without a shard key go to the worker with the least load.
+        """
+
+        self.workers[0].outbound_scheduler.in_flight = 5
+        self.workers[1].outbound_scheduler.in_flight = 1
+        self.workers[2].outbound_scheduler.in_flight = 3
+        for slot, worker in enumerate(self.workers):
+            self.pool.worker_ready(slot, worker)
+        self.assertIs(self.pool.get_connection(), self.workers[1])
+        self.pool.worker_lost(1, self.workers[1])
+        self.assertIs(self.pool.get_connection(), self.workers[2])
+        self.assertEqual(
+            [worker['requests_routed']
+             for worker in self.pool.get_stats()['workers']], [0, 1, 1])
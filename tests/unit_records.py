@@ -0,0 +1,61 @@
+"""
+Canned contact puller output, for tests and benchmarks that need units on
+hand without going through the contact puller's softcode. The benchmarks
+import this from here too.
+"""
+
+from battlesnake.plugins.contrib.arena_master.puppets.units.unit_store import \
+    UNIT_RECORD_FIELDS
+
+# A healthy, AI-piloted Atlas. Fields are strings, as the contact puller
+# sends them.
+SAMPLE_UNIT_FIELDS = {
+    'dbref': '#100',
+    'contact_id': 'AA',
+    'unit_ref': 'AS7-D',
+    'unit_type': 'Mech',
+    'unit_move_type': 'Biped',
+    'mech_name': 'Atlas',
+    'x_coord': '5',
+    'y_coord': '6',
+    'z_coord': '0',
+    'speed': '32.25',
+    'heading': '4096',
+    'tonnage': '100',
+    'heat': '12.5',
+    'status': 'd',
+    'status2': '',
+    'critstatus': '',
+    'critstatus2': '',
+    'faction_dbref': '#55',
+    'battle_value2': '1897',
+    'target_dbref': '-1',
+    'shots_fired': '10',
+    'shots_landed': '6',
+    'damage_inflicted': '45',
+    'damage_taken': '30',
+    'shots_missed': '4',
+    'units_killed': '1',
+    'maxspeed': '54.0',
+    'is_ai': '1',
+    'pilot_dbref': '#77',
+    'is_powerup': '0',
+    'ai_optimal_weap_range': '6',
+    'armor_int_total': '300/304|152/152',
+    'hexes_walked': '123.5',
+}
+
+
+def make_unit_record(dbref='#100', contact_id='AA', **fields):
+    """
+    :keyword str dbref:
+    :keyword str contact_id:
+    :keyword fields: Any other fields to change from
+        :py:data:`SAMPLE_UNIT_FIELDS`.
+    :rtype: str
+    :returns: One unit's worth of contact puller output.
+    """
+
+    record = dict(SAMPLE_UNIT_FIELDS, dbref=dbref, contact_id=contact_id)
+    record.update(fields)
+    return ':'.join(record[field] for field in UNIT_RECORD_FIELDS)